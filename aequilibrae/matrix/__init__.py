@@ -1,3 +1,4 @@
 from .aequilibrae_matrix import AequilibraeMatrix, matrix_export_types
 from .aequilibrae_data import AequilibraeData, data_export_types
 from .sparse_matrix import Sparse, COO
+from .sparse_demand import SparseDemand
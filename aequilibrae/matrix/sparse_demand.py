@@ -0,0 +1,102 @@
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+if False:
+    import pyarrow as pa
+
+
+class SparseDemand:
+    """Demand matrix kept only for the OD pairs with demand, so it can be assigned without a dense matrix
+
+    Origins and destinations are stored as indices of the centroids of the graph, and the demand from each origin is
+    kept in compressed sparse row format: the destinations with demand from origin *i* are
+    *destinations[ptr[i]:ptr[i + 1]]*, and their demand for all matrix cores is in the same rows of *values*.
+
+    .. code-block:: python
+
+        >>> import pandas as pd
+        >>> from aequilibrae.matrix import SparseDemand
+
+        >>> df = pd.DataFrame({"origin": [1, 1, 2], "destination": [2, 3, 1], "car": [10.0, 5.0, 7.5]})
+        >>> demand = SparseDemand(df.set_index(["origin", "destination"]), centroids=[1, 2, 3])
+        >>> demand.view_names
+        ['car']
+    """
+
+    def __init__(self, demand: Union[pd.DataFrame, "pa.Table"], centroids, fill: float = 0.0):
+        """
+        :Arguments:
+            **demand** (:obj:`Union[pd.DataFrame, pa.Table]`): Demand for all matrix cores. DataFrames must have a
+            2-level MultiIndex of origin and destination IDs, as in *RouteChoice.add_demand*. Arrow tables must have
+            the origin and destination IDs in their first two columns. All other columns are matrix cores, and must
+            be either float32 or float64
+
+            **centroids** (:obj:`np.ndarray`): Centroids of the graph the demand will be assigned on
+
+            **fill** (:obj:`float`, *Optional*): Value to fill any NaNs with. Defaults to 0
+        """
+        if not isinstance(demand, pd.DataFrame):
+            if not hasattr(demand, "column_names"):
+                raise TypeError(f"unknown argument type '{(type(demand).__name__)}'")
+            demand = demand.to_pandas().set_index(demand.column_names[:2])
+
+        if demand.index.nlevels != 2:
+            raise ValueError("provided pd.DataFrame doesn't have a 2-level multi-index")
+
+        cores = demand.select_dtypes(["float64", "float32"])
+        if cores.shape[1] != demand.shape[1]:
+            raise TypeError("All matrix cores must be either float32 or float64")
+        if cores.shape[1] == 0:
+            raise ValueError("Demand has no matrix cores")
+
+        self.index = np.array(centroids, dtype=np.int64)
+        self.zones = self.index.shape[0]
+        self.view_names = [str(x) for x in cores.columns]
+        self.names = self.view_names
+        self.index_names = ["main_index"]
+        self.file_path = None
+
+        indices = pd.Series(np.arange(self.zones), index=self.index)
+        origins = indices.reindex(demand.index.get_level_values(0)).to_numpy()
+        destinations = indices.reindex(demand.index.get_level_values(1)).to_numpy()
+        if np.isnan(origins).any() or np.isnan(destinations).any():
+            raise ValueError("Demand has origins or destinations that are not centroids of the graph")
+
+        # Repeated OD pairs are added up, and only the ones with demand are kept
+        od_pairs, position = np.unique(origins.astype(np.int64) * self.zones + destinations, return_inverse=True)
+        values = np.zeros((od_pairs.shape[0], cores.shape[1]), dtype=np.float64)
+        np.add.at(values, position, np.nan_to_num(cores.to_numpy(np.float64), nan=fill))
+        has_demand = np.any(values > 0, axis=1)
+        od_pairs, values = od_pairs[has_demand], values[has_demand]
+
+        self.ptr = np.zeros(self.zones + 1, dtype=np.int64)
+        self.ptr[1:] = np.cumsum(np.bincount(od_pairs // self.zones, minlength=self.zones))
+        self.destinations = od_pairs % self.zones
+        self.values = values
+
+    @property
+    def csr(self):
+        """Pointers to the first destination of each origin, destinations with demand and their demand"""
+        return self.ptr, self.destinations, self.values
+
+    def totals(self) -> Dict[str, float]:
+        """Total demand for each matrix core"""
+        return {nm: float(np.sum(self.values[:, i])) for i, nm in enumerate(self.view_names)}
+
+    def row(self, origin: int, core: int) -> np.ndarray:
+        """Demand from an origin to all zones for one matrix core
+
+        :Arguments:
+            **origin** (:obj:`int`): Index of the origin
+
+            **core** (:obj:`int`): Index of the matrix core
+
+        :Returns:
+            **demand** (:obj:`np.ndarray`): Demand to all zones
+        """
+        row = np.zeros(self.zones, dtype=np.float64)
+        first, last = self.ptr[origin], self.ptr[origin + 1]
+        row[self.destinations[first:last]] = self.values[first:last, core]
+        return row
@@ -4,9 +4,12 @@ from aequilibrae.paths.multi_threaded_skimming import MultiThreadedNetworkSkimmi
 from aequilibrae.paths.network_skimming import NetworkSkimming
 from aequilibrae.paths.all_or_nothing import allOrNothing
 from aequilibrae.paths.assignment_paths import AssignmentPaths
+from aequilibrae.paths.select_link_replay import SelectLinkReplay
+from aequilibrae.paths.contraction_hierarchy import ContractionHierarchy
+from aequilibrae.paths.landmarks import Landmarks
 from aequilibrae.paths.traffic_class import TrafficClass, TransitClass
 from aequilibrae.paths.traffic_assignment import TrafficAssignment, TransitAssignment
-from aequilibrae.paths.vdf import VDF
+from aequilibrae.paths.vdf import VDF, register_vdf
 from aequilibrae.paths.graph import Graph, TransitGraph
 from aequilibrae.paths.optimal_strategies import OptimalStrategies
 from aequilibrae.paths.public_transport import HyperpathGenerating
@@ -18,7 +21,10 @@ from aequilibrae import global_logger
 try:
     from aequilibrae.paths.AoN import (
         one_to_all,
+        all_to_all,
+        all_to_all_classes,
         skimming_single_origin,
+        skimming_all_origins,
         path_computation,
         update_path_trace,
     )
@@ -1,14 +1,15 @@
-import threading
-from multiprocessing.dummy import Pool as ThreadPool
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 
 from aequilibrae import global_logger
-from aequilibrae.matrix import AequilibraeMatrix
+from aequilibrae.matrix import AequilibraeMatrix, SparseDemand
+from .multi_process_aon import SharedArrays, assign_in_processes
 from .multi_threaded_aon import MultiThreadedAoN
 
 try:
-    from aequilibrae.paths.AoN import one_to_all, assign_link_loads
+    from aequilibrae.paths.AoN import AoNWorkspace, all_to_all, all_to_all_classes, assign_link_loads, sum_axis0
 except ImportError as ie:
     global_logger.warning(f"Could not import procedures from the binary. {ie.args}")
 
@@ -18,22 +19,33 @@ if False:
     from .results import AssignmentResults
     from .graph import Graph
 
+# Demand matrices denser than this are loaded from the dense matrix, as the sparse copy would only add memory
+SPARSE_DEMAND_MAX_DENSITY = 0.5
+
 
 class allOrNothing:
-    def __init__(self, class_name, matrix, graph, results):
-        # type: (AequilibraeMatrix, Graph, AssignmentResults)->None
+    def __init__(self, class_name, matrix, graph, results, demand_csr=None):
+        # type: (str, Union[AequilibraeMatrix, SparseDemand], Graph, AssignmentResults, Optional[Tuple])->None
         self.assignment: SIGNAL = None
 
         self.class_name = class_name
         self.matrix = matrix
         self.graph = graph
         self.results = results
+        self.demand_csr = demand_csr
         self.aux_res = MultiThreadedAoN()
+        # Arrays shared with the worker processes, when the processes backend is used
+        self._shared_arrays = SharedArrays()
+
+        # Sparse demand is only ever assigned from its sparse format
+        self._dense = not isinstance(matrix, SparseDemand)
+        if not self._dense:
+            self.demand_csr = matrix.csr
 
         if results._graph_id != graph._id:
             raise ValueError("Results object not prepared. Use --> results.prepare(graph)")
 
-        elif matrix.matrix_view is None:
+        elif self._dense and matrix.matrix_view is None:
             raise ValueError(
                 "Matrix was not prepared for assignment. "
                 "Please create a matrix_procedures view with all classes you want to assign"
@@ -51,42 +63,161 @@ class allOrNothing:
         self.execute()
 
     def execute(self):
+        if self._in_processes():
+            self._execute_in_processes()
+            return
+
+        origins = self._prepare_origins()
+
+        # All origins are computed in a single call that releases the GIL, while we poll its progress from here
+        progress = np.zeros(self.results.cores, dtype=np.int64)
+        args = (
+            origins,
+            self.matrix if self._dense else None,
+            self.graph,
+            self.results,
+            self.aux_res,
+            progress,
+            self.results.cores,
+            self.demand_csr,
+        )
+        _run_polling(all_to_all, args, progress, self)
+        self.assignment.emit(["update", self.matrix.index.shape[0], self.class_name])
+        self._finalise()
+
+    def _in_processes(self) -> bool:
+        """Whether origins are assigned by worker processes. Select link analysis and path and tree stores always
+        use threads"""
+        if self.results._selected_links or self.results.path_store is not None or self.results.tree_store is not None:
+            return False
+        return self.results.backend == "processes"
+
+    def _execute_in_processes(self, cost: Optional[np.ndarray] = None):
+        origins = self._prepare_origins()
+        assign_in_processes(self, origins, cost)
+        self.assignment.emit(["update", self.matrix.index.shape[0], self.class_name])
+
+    def _report_progress(self, cumulative: int):
+        self.cumulative = cumulative
+        self.assignment.emit(["update", self.cumulative, self.class_name])
+
+    def _prepare_origins(self) -> np.ndarray:
+        """Prepares the auxiliary arrays and returns the compressed graph indices of the origins to assign"""
         self._build_signal()
         self.report = []
         self.cumulative = 0
-        self.aux_res.prepare(self.graph, self.results)
-        self.matrix.matrix_view = self.matrix.matrix_view.reshape(
-            (self.graph.num_zones, self.graph.num_zones, self.results.classes["number"])
-        )
-        mat = self.matrix.matrix_view
-        pool = ThreadPool(self.results.cores)
-        all_threads = {"count": 0}
+        # Worker processes prepare their own auxiliary arrays
+        if not self._in_processes():
+            self.aux_res.prepare(self.graph, self.results)
+        if self._dense:
+            self.matrix.matrix_view = self.matrix.matrix_view.reshape(
+                (self.graph.num_zones, self.graph.num_zones, self.results.classes["number"])
+            )
+        origins = []
         for orig in self.matrix.index:
             i = int(self.graph.nodes_to_indices[orig])
-            if np.nansum(mat[i, :, :]) > 0 or self.results.num_skims > 0:
+            if self.demand_csr is not None:
+                has_demand = self.demand_csr[0][i + 1] > self.demand_csr[0][i]
+            else:
+                has_demand = np.nansum(self.matrix.matrix_view[i, :, :]) > 0
+            if has_demand or self.results.num_skims > 0:
                 if self.graph.fs[i] == self.graph.fs[i + 1]:
                     self.report.append("Centroid " + str(orig) + " is not connected")
                 else:
-                    pool.apply_async(self.func_assig_thread, args=(orig, all_threads))
-        pool.close()
-        pool.join()
-        self.assignment.emit(["update", self.matrix.index.shape[0], self.class_name])
-        # TODO: Multi-thread this sum
-        self.results.compact_link_loads = np.sum(self.aux_res.temp_link_loads, axis=0)
+                    origins.append(self.graph.compact_nodes_to_indices[orig])
+        if self.aux_res.shared_link_loads and not self._in_processes():
+            self.results.compact_link_loads.fill(0)
+        origins = np.array(origins, dtype=np.int64)
+        if self.results.save_path_file and self.results.path_store is not None:
+            self.results.path_store.open(origins)
+        if self.results.tree_store is not None:
+            self.results.tree_store.open(origins)
+        return origins
+
+    def _finalise(self):
+        """Reduces the link loads of all threads and maps them back to the original graph"""
+        if self.results.save_path_file and self.results.path_store is not None:
+            self.results.path_store.close()
+        if self.results.tree_store is not None:
+            self.results.tree_store.close()
+        if not self.aux_res.shared_link_loads:
+            sum_axis0(self.results.compact_link_loads, self.aux_res.temp_link_loads, self.results.cores)
         assign_link_loads(
             self.results.link_loads, self.results.compact_link_loads, self.results.crosswalk, self.results.cores
         )
 
-    def func_assig_thread(self, origin, all_threads):
-        thread_id = threading.get_ident()
-        th = all_threads.get(thread_id, all_threads["count"])
-        if th == all_threads["count"]:
-            all_threads[thread_id] = all_threads["count"]
-            all_threads["count"] += 1
-
-        x = one_to_all(origin, self.matrix, self.graph, self.results, self.aux_res, th)
-        self.cumulative += 1
-        if x != origin:
-            self.report.append(x)
-        if self.cumulative % 10 == 0:
-            self.assignment.emit(["update", self.cumulative, self.class_name])
+
+def demand_csr(matrix_view: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Demand matrix in compressed sparse row format, with the destinations with demand from each origin
+
+    :Arguments:
+        **matrix_view** (:obj:`np.ndarray`): Computational view of the demand matrix
+
+    :Returns:
+        **demand_csr** (:obj:`Tuple[np.ndarray, np.ndarray, np.ndarray]`): Pointers to the first destination of each
+        origin, destinations with demand and their demand for all matrix cores. None if the matrix is denser than
+        *SPARSE_DEMAND_MAX_DENSITY*
+    """
+    zones = matrix_view.shape[0]
+    demand = np.nan_to_num(matrix_view.reshape((zones, zones, -1)))
+    has_demand = np.any(demand > 0, axis=2)
+    if np.count_nonzero(has_demand) > SPARSE_DEMAND_MAX_DENSITY * zones * zones:
+        return None
+
+    ptr = np.zeros(zones + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum(np.count_nonzero(has_demand, axis=1))
+    origins, destinations = np.nonzero(has_demand)
+    return ptr, destinations.astype(np.int64), np.ascontiguousarray(demand[origins, destinations, :])
+
+
+def execute_concurrently(aons: List[allOrNothing], costs: Optional[List[np.ndarray]] = None):
+    """All-or-nothing assignment of several traffic classes, with the origins of all of them in a single work queue
+
+    Threads move on to the origins of the next class as soon as they are done with the ones of the current class, so
+    no cores are left idle while the last (and longest) trees of a class are being built. The number of threads used
+    is the smallest number of cores set for any of the classes.
+
+    :Arguments:
+        **aons** (:obj:`List[allOrNothing]`): All-or-nothing assignments to execute. Progress is reported through the
+        signal of the first one
+
+        **costs** (:obj:`List[np.ndarray]`, *Optional*): Link costs in the compressed graph of each assignment.
+        Required when assignments that share a graph need different costs. Defaults to the costs in the graphs
+    """
+    costs = costs or [None] * len(aons)
+
+    # Classes set to the processes backend are assigned by the worker processes, one after the other
+    for aon, cost in zip(aons, costs):
+        if aon._in_processes():
+            aon._execute_in_processes(cost)
+    costs = [cost for aon, cost in zip(aons, costs) if not aon._in_processes()]
+    aons = [aon for aon in aons if not aon._in_processes()]
+    if not aons:
+        return
+
+    cores = min(aon.results.cores for aon in aons)
+
+    workspaces, task_workspace, task_origin = [], [], []
+    for i, (aon, cost) in enumerate(zip(aons, costs)):
+        origins = aon._prepare_origins()
+        matrix = aon.matrix if aon._dense else None
+        workspaces.append(AoNWorkspace(matrix, aon.graph, aon.results, aon.aux_res, cores, cost, aon.demand_csr))
+        task_workspace.append(np.full(origins.shape[0], i, dtype=np.int64))
+        task_origin.append(origins)
+
+    progress = np.zeros(cores, dtype=np.int64)
+    args = (workspaces, np.concatenate(task_workspace), np.concatenate(task_origin), progress, cores)
+    _run_polling(all_to_all_classes, args, progress, aons[0])
+    aons[0].assignment.emit(["update", sum(aon.matrix.index.shape[0] for aon in aons), aons[0].class_name])
+    for aon in aons:
+        aon._finalise()
+
+
+def _run_polling(func, args, progress: np.ndarray, aon: allOrNothing):
+    """Runs a kernel that releases the GIL in another thread, reporting its progress through the signal of *aon*"""
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        job = executor.submit(func, *args)
+        while not wait([job], timeout=0.1).done:
+            aon._report_progress(int(progress.sum()))
+        job.result()
+    aon.cumulative = int(progress.sum())
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+from os import path
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+STATE_FILE = "state.json"
+LATEST_FILE = "latest.json"
+
+
+def write_checkpoint(directory: Union[str, Path], iteration: int, state: dict, arrays: Dict[str, np.ndarray]) -> str:
+    """Writes the state of an assignment at the end of an iteration
+
+    Each checkpoint is a folder with the scalar state in a JSON file and one memory-mapped *.npy* file per array. The
+    checkpoint only replaces the previous one once it has been fully written, so an interrupted write always leaves
+    the previous checkpoint usable
+
+    :Arguments:
+        **directory** (:obj:`Union[str, Path]`): Directory where checkpoints are kept
+
+        **iteration** (:obj:`int`): Iteration of the assignment
+
+        **state** (:obj:`dict`): JSON-serializable state of the assignment
+
+        **arrays** (:obj:`Dict[str, np.ndarray]`): Arrays of the assignment, by name
+
+    :Returns:
+        **checkpoint** (:obj:`str`): Folder of the checkpoint written
+    """
+    folder = f"iteration_{iteration:06d}"
+    checkpoint = path.join(directory, folder)
+    if path.isdir(checkpoint):
+        shutil.rmtree(checkpoint)
+    os.makedirs(checkpoint)
+
+    for name, array in arrays.items():
+        stored = np.lib.format.open_memmap(path.join(checkpoint, f"{name}.npy"), "w+", array.dtype, array.shape)
+        stored[...] = array
+        stored.flush()
+        del stored
+
+    with open(path.join(checkpoint, STATE_FILE), "w") as f:
+        json.dump({**state, "arrays": sorted(arrays.keys())}, f)
+
+    # Switching to the new checkpoint is a single atomic rename
+    latest = path.join(directory, LATEST_FILE)
+    with open(f"{latest}.tmp", "w") as f:
+        json.dump({"iteration": iteration, "folder": folder}, f)
+    os.replace(f"{latest}.tmp", latest)
+
+    for previous in os.listdir(directory):
+        if previous.startswith("iteration_") and previous != folder:
+            shutil.rmtree(path.join(directory, previous), ignore_errors=True)
+    return checkpoint
+
+
+def read_checkpoint(directory: Union[str, Path]) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Reads an assignment checkpoint
+
+    :Arguments:
+        **directory** (:obj:`Union[str, Path]`): Directory where checkpoints are kept, or the folder of a checkpoint
+
+    :Returns:
+        **state** (:obj:`dict`): State of the assignment
+
+        **arrays** (:obj:`Dict[str, np.ndarray]`): Read-only memory-maps of the arrays of the assignment, by name
+    """
+    checkpoint = directory
+    if not path.isfile(path.join(directory, STATE_FILE)):
+        if not path.isfile(path.join(directory, LATEST_FILE)):
+            raise FileNotFoundError(f"There is no assignment checkpoint in {directory}")
+        with open(path.join(directory, LATEST_FILE), "r") as f:
+            checkpoint = path.join(directory, json.load(f)["folder"])
+
+    with open(path.join(checkpoint, STATE_FILE), "r") as f:
+        state = json.load(f)
+
+    arrays = {nm: np.load(path.join(checkpoint, f"{nm}.npy"), mmap_mode="r") for nm in state.pop("arrays")}
+    return state, arrays
@@ -1,8 +1,10 @@
 import os
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
 import numpy as np
 import pandas as pd
 from aequilibrae.context import get_active_project
+from aequilibrae.paths.path_store import PathStore, path_store_file
 
 
 # TODO: let's make it optional to keep path files in memory, although this can get out of control very quickly it should
@@ -63,9 +65,15 @@ class AssignmentPaths(object):
 
         paths = AssignmentPath(table_name_with_assignment_results)
         paths.get_path_for_destination(origin, destination, iteration, traffic_class_id)
+
+        # Many paths at once, with the path to the i-th destination in links[offsets[i]:offsets[i + 1]]
+        offsets, links = paths.get_paths(origins, destinations, iterations, traffic_class_ids)
+
+    The paths from the most recently used origins are kept in memory, so paths from the same origin are read only
+    once.
     """
 
-    def __init__(self, table_name: str, project=None) -> None:
+    def __init__(self, table_name: str, project=None, cache_size: int = 256) -> None:
         """
         Instantiates the class
 
@@ -75,6 +83,9 @@ class AssignmentPaths(object):
             **project** (:obj:`Project`, *Optional*): The Project to connect to.
             By default, uses the currently active project
 
+            **cache_size** (:obj:`int`, *Optional*): Number of origins whose paths are kept in memory.
+            Defaults to 256
+
         """
         project = project or get_active_project()
         self.proj_dir = project.project_base_path
@@ -83,6 +94,9 @@ class AssignmentPaths(object):
         self.path_base_dir = os.path.join(self.proj_dir, "path_files", self.assignment_results.procedure_id)
         self.classes = self.assignment_results.get_traffic_class_names_and_id()
         self.compressed_graph_correspondences = self._read_compressed_graph_correspondence()
+        self.__path_stores = {}
+        self.cache_size = cache_size
+        self.__cache = OrderedDict()
 
     def _read_compressed_graph_correspondence(self) -> Dict:
         compressed_graph_correspondences = {}
@@ -93,10 +107,16 @@ class AssignmentPaths(object):
         return compressed_graph_correspondences
 
     def read_path_file(self, origin: int, iteration: int, traffic_class_id: str) -> (pd.DataFrame, pd.DataFrame):
-        possible_traffic_classes = list(filter(lambda x: x.id == traffic_class_id, self.classes))
-        class_ids = [x.id for x in self.classes]
-        assert len(possible_traffic_classes) == 1, f"traffic class id not unique, please choose one of {class_ids}"
-        traffic_class = possible_traffic_classes[0]
+        traffic_class = self._traffic_class(traffic_class_id)
+
+        store = self._path_store(iteration, traffic_class)
+        if store is not None:
+            stored_in, links, index = store.read_origin(origin)
+            if stored_in != iteration:
+                # Paths that did not change since an earlier iteration are only kept in the store of that iteration
+                _, links, index = self._path_store(stored_in, traffic_class).read_origin(origin)
+            return pd.DataFrame({"data": links}), pd.DataFrame({"data": index})
+
         b_dir = os.path.join(self.path_base_dir, f"iter{iteration}", f"path_c{traffic_class.id}_{traffic_class.name}")
         path_o_f = os.path.join(b_dir, f"o{origin}.feather")
         path_o_index_f = os.path.join(b_dir, f"o{origin}_indexdata.feather")
@@ -104,19 +124,121 @@ class AssignmentPaths(object):
         path_o_index = pd.read_feather(path_o_index_f)
         return path_o, path_o_index
 
+    def _traffic_class(self, traffic_class_id: str) -> TrafficClassIdentifier:
+        possible_traffic_classes = list(filter(lambda x: x.id == traffic_class_id, self.classes))
+        class_ids = [x.id for x in self.classes]
+        assert len(possible_traffic_classes) == 1, f"traffic class id not unique, please choose one of {class_ids}"
+        return possible_traffic_classes[0]
+
+    def _origin_paths(self, origin: int, iteration: int, traffic_class_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Links and index of the paths from an origin, from the cache of the most recently used origins"""
+        key = (iteration, traffic_class_id, origin)
+        if key in self.__cache:
+            self.__cache.move_to_end(key)
+            return self.__cache[key]
+
+        path_o, path_o_index = self.read_path_file(origin, iteration, traffic_class_id)
+        paths = (path_o.values[:, 0], path_o_index.values[:, 0])
+        if self.cache_size > 0:
+            self.__cache[key] = paths
+            while len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last=False)
+        return paths
+
+    def clear_cache(self) -> None:
+        """Drops all paths kept in memory"""
+        self.__cache.clear()
+
+    def _path_store(self, iteration: int, traffic_class: TrafficClassIdentifier):
+        """The path store of a class in an iteration, if paths were saved to path stores"""
+        key = (iteration, traffic_class.id)
+        if key not in self.__path_stores:
+            file_name = path_store_file(self.path_base_dir, iteration, traffic_class.id, traffic_class.name)
+            self.__path_stores[key] = PathStore(file_name) if os.path.isfile(file_name) else None
+        return self.__path_stores[key]
+
     def get_path_for_destination(self, origin: int, destination: int, iteration: int, traffic_class_id: str):
         """Return all link ids, i.e. the full path, for a given destination"""
-        path_o, path_o_index = self.read_path_file(origin, iteration, traffic_class_id)
-        return self.get_path_for_destination_from_files(path_o, path_o_index, destination)
+        links, index = self._origin_paths(origin, iteration, traffic_class_id)
+        lower_incl = 0 if destination == 0 else index[destination - 1]
+        return np.flip(links[lower_incl : index[destination]])
+
+    def get_paths(
+        self,
+        origins: Sequence[int],
+        destinations: Sequence[int],
+        iterations: Sequence[int],
+        traffic_class_ids: Sequence[str],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the paths for many origin-destination pairs at once
+
+        Queries are grouped by origin, so the paths from each origin are read a single time. Arguments are
+        sequences of the same length, with one element per path requested. A single iteration or traffic class id
+        can also be given for all paths.
+
+        :Arguments:
+            **origins** (:obj:`Sequence[int]`): Index of the origin of each path
+
+            **destinations** (:obj:`Sequence[int]`): Index of the destination of each path
+
+            **iterations** (:obj:`Sequence[int]`): Iteration of each path
+
+            **traffic_class_ids** (:obj:`Sequence[str]`): Traffic class id of each path
+
+        :Returns:
+            **offsets** (:obj:`np.ndarray`): Position in *links* where each path starts, with the end of the last
+            path as its last element
+
+            **links** (:obj:`np.ndarray`): Links of all paths in o-d order, with the path of the i-th query in
+            *links[offsets[i]:offsets[i + 1]]*
+        """
+        origins = np.asarray(origins, dtype=np.int64)
+        destinations = np.asarray(destinations, dtype=np.int64)
+        iterations = np.broadcast_to(np.asarray(iterations, dtype=np.int64), origins.shape)
+        class_ids = np.broadcast_to(np.asarray(traffic_class_ids, dtype=object), origins.shape)
+        if destinations.shape != origins.shape:
+            raise ValueError("There must be one destination per origin")
+        if origins.shape[0] == 0:
+            return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # Each group of queries with the same origin, iteration and class reads its paths once
+        class_codes, class_names = pd.factorize(class_ids)
+        order = np.lexsort((origins, iterations, class_codes))
+        keys = np.stack([class_codes[order], iterations[order], origins[order]])
+        starts = np.flatnonzero(np.r_[True, np.any(keys[:, 1:] != keys[:, :-1], axis=0)])
+        groups = np.split(order, starts[1:])
+
+        ends = np.zeros(origins.shape[0], dtype=np.int64)
+        lengths = np.zeros(origins.shape[0], dtype=np.int64)
+        group_links = []
+        for group in groups:
+            first = group[0]
+            links, index = self._origin_paths(origins[first], iterations[first], class_names[class_codes[first]])
+            dest = destinations[group]
+            ends[group] = index[dest]
+            lengths[group] = index[dest] - np.where(dest == 0, 0, index[np.maximum(dest - 1, 0)])
+            group_links.append(links)
+
+        offsets = np.zeros(origins.shape[0] + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        dtype = group_links[0].dtype if group_links else np.int64
+        all_links = np.zeros(offsets[-1], dtype=dtype)
+        for group, links in zip(groups, group_links):
+            # Paths are stored from the destination backwards, so they are read from their end
+            size = lengths[group]
+            positions = np.repeat(offsets[group], size) + _ranges(size)
+            all_links[positions] = links[np.repeat(ends[group] - 1, size) - _ranges(size)]
+        return offsets, all_links
 
     @staticmethod
     def get_path_for_destination_from_files(path_o: pd.DataFrame, path_o_index: pd.DataFrame, destination: int):
         """for a given path file and path index file, and a given destination, return the path links in o-d order"""
-        if destination == 0:
-            lower_incl = 0
-        else:
-            lower_incl = path_o_index.loc[path_o_index.index == destination - 1].values[0][0]
-        upper_non_incl = path_o_index.loc[path_o_index.index == destination].values[0][0]
-        links_on_path = path_o.loc[(path_o.index >= lower_incl) & (path_o.index < upper_non_incl)].values.flatten()
-        links_on_path = np.flip(links_on_path)
-        return links_on_path
+        index = path_o_index.values[:, 0]
+        lower_incl = 0 if destination == 0 else index[destination - 1]
+        return np.flip(path_o.values[lower_incl : index[destination], 0])
+
+
+def _ranges(sizes: np.ndarray) -> np.ndarray:
+    """Concatenation of np.arange(size) for each of the sizes"""
+    starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return np.arange(starts.shape[0], dtype=np.int64) - starts
@@ -0,0 +1,187 @@
+import numpy as np
+from aequilibrae.paths.AoN import bush_initialise, bush_improve, bush_equilibrate, bush_skims, bush_select_link
+
+from aequilibrae.paths.origin_based_assignment import OriginBasedAssignment
+from aequilibrae.paths.traffic_class import TrafficClass
+
+
+class BushBasedAssignment(OriginBasedAssignment):
+    """Origin-based equilibrium assignment using Dial's Algorithm B
+
+    Each origin keeps an acyclic sub-network (bush) with the flows it sends to all destinations. At every iteration
+    the bushes are expanded with the links that shorten their longest paths, and flows are shifted from the longest
+    to the shortest used paths within each bush through Newton steps.
+
+    Final skims are flow-weighted averages over the bush of each origin, and select link results assume that flows
+    mix proportionally at nodes.
+
+    Bushes are kept per origin and user class as the list of their links and the flows on them, so memory
+    consumption grows with the size of the bushes, not with the product of the number of zones and links.
+    """
+
+    def _prepare_workspace(self, c: TrafficClass) -> dict:
+        ws = super()._prepare_workspace(c)
+        g = c.graph
+        itype = g.default_types("int")
+        ftype = g.default_types("float")
+        nodes = g.compact_num_nodes
+        links = g.compact_num_links + 1
+        sets = len(c._selected_links)
+
+        ws.update(
+            {
+                # Links of the bush of each origin (and user class), with their flows
+                "bushes": {},
+                # Bush being worked on, expanded over all links for the kernels
+                "bush": np.zeros(links, dtype=np.uint8),
+                "bush_flow": np.zeros(links, dtype=ftype),
+                "a_nodes": g.compact_graph.a_node.values.astype(itype),
+                "b_nodes": g.compact_graph.b_node.values.astype(itype),
+                "ids": g.compact_graph.id.values.astype(itype),
+                "temp_b_nodes": np.zeros(g.compact_graph.shape[0], dtype=itype),
+                "pred": np.zeros(nodes, dtype=itype),
+                "conn": np.zeros(nodes, dtype=itype),
+                "reached_first": np.zeros(nodes, dtype=itype),
+                "node_load": np.zeros((nodes, 1), dtype=ftype),
+                "in_degree": np.zeros(nodes, dtype=itype),
+                "topo_order": np.zeros(nodes, dtype=itype),
+                "min_label": np.zeros(nodes, dtype=ftype),
+                "max_label": np.zeros(nodes, dtype=ftype),
+                "min_pred": np.zeros(nodes, dtype=itype),
+                "max_pred": np.zeros(nodes, dtype=itype),
+                "stamp": np.zeros(nodes, dtype=itype),
+                "segment": np.zeros(nodes, dtype=itype),
+                "node_flow": np.zeros(nodes, dtype=ftype),
+                "node_skims": np.zeros((nodes, c.results.num_skims + 1), dtype=ftype),
+                "clear_before": np.zeros((nodes, sets), dtype=ftype),
+                "clear_after": np.zeros((nodes, sets), dtype=ftype),
+            }
+        )
+        return ws
+
+    def _update_origin(self, c: TrafficClass, origin: int, user_class: int) -> np.ndarray:
+        g = c.graph
+        ws = self._workspaces[c._id]
+        block = bool(g.block_centroid_flows)
+        bush, bush_flow = self.__expand_bush(ws, origin, user_class)
+        # Flows only change on the links of the bush, before and after it is updated
+        previous = ws["bushes"].get((origin, user_class), (np.zeros(0, dtype=np.int32),))[0]
+        class_flow = c.results.compact_link_loads[:, user_class]
+
+        if self.iter == 1:
+            bush_initialise(
+                origin,
+                g.num_zones,
+                block,
+                self._demand(c, origin, user_class),
+                ws["cost"],
+                g.compact_fs,
+                ws["b_nodes"],
+                ws["ids"],
+                bush,
+                bush_flow,
+                class_flow,
+                ws["temp_b_nodes"],
+                ws["pred"],
+                ws["conn"],
+                ws["reached_first"],
+                ws["node_load"],
+            )
+            return self.__store_bush(ws, origin, user_class)
+
+        labels = [ws["min_label"], ws["max_label"], ws["min_pred"], ws["max_pred"]]
+        bush_improve(
+            origin,
+            g.num_zones,
+            block,
+            ws["cost"],
+            g.compact_fs,
+            ws["b_nodes"],
+            bush,
+            bush_flow,
+            ws["in_degree"],
+            ws["topo_order"],
+            *labels,
+        )
+        bush_equilibrate(
+            origin,
+            g.num_zones,
+            block,
+            ws["cost"],
+            ws["derivative"],
+            g.compact_fs,
+            ws["a_nodes"],
+            ws["b_nodes"],
+            bush,
+            bush_flow,
+            class_flow,
+            ws["in_degree"],
+            ws["topo_order"],
+            *labels,
+            ws["stamp"],
+            ws["segment"],
+            self.inner_iterations,
+            self.rgap_target / 10,
+        )
+        return np.union1d(previous, self.__store_bush(ws, origin, user_class))
+
+    def _origin_skims(self, c: TrafficClass, origin: int, user_class: int, origin_skims: np.ndarray):
+        g = c.graph
+        ws = self._workspaces[c._id]
+        bush_skims(
+            origin,
+            g.num_zones,
+            bool(g.block_centroid_flows),
+            ws["cost"],
+            g.compact_skims,
+            g.compact_fs,
+            ws["b_nodes"],
+            *self.__expand_bush(ws, origin, user_class),
+            ws["in_degree"],
+            ws["topo_order"],
+            ws["node_flow"],
+            ws["node_skims"],
+            origin_skims,
+        )
+
+    def _origin_select_link(self, c, origin, user_class, link_set_mask, sl_od, sl_loading):
+        g = c.graph
+        ws = self._workspaces[c._id]
+        bush_select_link(
+            origin,
+            g.num_zones,
+            bool(g.block_centroid_flows),
+            self._demand(c, origin, user_class),
+            g.compact_fs,
+            ws["b_nodes"],
+            *self.__expand_bush(ws, origin, user_class),
+            link_set_mask,
+            ws["in_degree"],
+            ws["topo_order"],
+            ws["node_flow"],
+            ws["clear_before"],
+            ws["clear_after"],
+            sl_od,
+            sl_loading,
+        )
+
+    @staticmethod
+    def __expand_bush(ws: dict, origin: int, user_class: int):
+        """Expands the bush of an origin over all links of the graph, as used by the kernels"""
+        bush, bush_flow = ws["bush"], ws["bush_flow"]
+        bush.fill(0)
+        bush_flow.fill(0)
+        stored = ws["bushes"].get((origin, user_class))
+        if stored is not None:
+            links, in_bush, flows = stored
+            bush[links] = in_bush
+            bush_flow[links] = flows
+        return bush, bush_flow
+
+    @staticmethod
+    def __store_bush(ws: dict, origin: int, user_class: int) -> np.ndarray:
+        # Links dropped from the bush may keep a negligible flow, which is kept for when they are added back
+        bush, bush_flow = ws["bush"], ws["bush_flow"]
+        links = np.flatnonzero(bush | (bush_flow != 0)).astype(np.int32)
+        ws["bushes"][(origin, user_class)] = (links, bush[links], bush_flow[links])
+        return links
@@ -0,0 +1,142 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from aequilibrae import global_logger
+from aequilibrae.paths.graph import Graph
+
+try:
+    from aequilibrae.paths.AoN import ContractionHierarchyQuery, build_contraction_hierarchy
+except ImportError as ie:
+    global_logger.warning(f"Could not import procedures from the binary. {ie.args}")
+
+
+class ContractionHierarchy:
+    """Contraction hierarchy of a graph, for fast point-to-point shortest paths over fixed link costs
+
+    Building the hierarchy takes longer than a few shortest path computations, but each path is then found by
+    searching a small fraction of the network. It pays off when many paths are computed over the same costs, such as
+    interactive OD lookups or map-matching.
+
+    .. code-block:: python
+
+        >>> from aequilibrae import Project
+        >>> from aequilibrae.paths import ContractionHierarchy, PathResults
+
+        >>> proj = Project.from_path("/tmp/test_project_ch")
+        >>> proj.network.build_graphs()
+
+        >>> graph = proj.network.graphs["c"]
+        >>> graph.set_graph("distance")
+
+        >>> hierarchy = ContractionHierarchy(graph)
+
+        >>> res = PathResults()
+        >>> res.prepare(graph)
+        >>> res.set_contraction_hierarchy(hierarchy)
+        >>> res.compute_path(1, 17)
+
+    The hierarchy is built for the costs and centroid flow blocking of the graph when it is created, and needs to
+    be built again if either changes.
+
+    :Arguments:
+        **graph** (:obj:`Graph`): Prepared graph
+
+        **cost_field** (:obj:`str`, *Optional*): Field with the link costs. Defaults to the cost field of the graph
+
+        **witness_limit** (:obj:`int`, *Optional*): Maximum number of nodes settled by each search for paths that
+        make a shortcut unnecessary. Lower values build the hierarchy faster, but add more shortcuts. Defaults to 500
+    """
+
+    def __init__(self, graph: Graph, cost_field: Optional[str] = None, witness_limit: int = 500):
+        if cost_field is None:
+            if not graph.cost_field:
+                raise ValueError("Graph has no cost field. Use graph.set_graph or pass a cost field")
+            cost_field = graph.cost_field
+        if cost_field not in graph.graph.columns:
+            raise ValueError(f"{cost_field} is not a field of the graph")
+
+        self.cost_field = cost_field
+        self.cost = graph.graph[cost_field].to_numpy(dtype=np.float64, copy=True)
+        self.block_centroid_flows = bool(graph.block_centroid_flows)
+        self.graph_id = graph._id
+        self.nodes = graph.num_nodes
+        self.zones = graph.num_zones
+
+        # Link attributes used to describe paths, kept so they are not looked up in the graph for each path
+        self._link_heads = graph.graph.b_node.to_numpy(dtype=np.int64)
+        self._link_ids = graph.graph.link_id.to_numpy()
+        self._link_directions = graph.graph.direction.to_numpy()
+        self._link_graph_ids = graph.graph.id.to_numpy()
+
+        tails = graph.graph.a_node.to_numpy(dtype=np.int64)
+        heads = graph.graph.b_node.to_numpy(dtype=np.int64, copy=True)
+        nodes = self.nodes
+        if self.block_centroid_flows:
+            # Links into a centroid go to a copy of it without outgoing links, so paths cannot go through centroids
+            heads[heads < self.zones] += self.nodes
+            nodes += self.zones
+
+        # Only the cheapest of parallel links is kept, and loops are never in a shortest path
+        keep = np.isfinite(self.cost) & (tails != heads)
+        links = np.flatnonzero(keep)
+        order = np.lexsort((self.cost[links], heads[links], tails[links]))
+        links = links[order]
+        first = np.r_[True, (tails[links][1:] != tails[links][:-1]) | (heads[links][1:] != heads[links][:-1])]
+        links = links[first]
+
+        args = (nodes, tails[links], heads[links], self.cost[links], links, witness_limit)
+        self.rank, (e_tail, e_head, e_cost, e_link, e_first, e_second) = build_contraction_hierarchy(*args)
+        self.num_shortcuts = int((e_link < 0).sum())
+
+        upward = self.rank[e_tail] < self.rank[e_head]
+        forward = _csr(nodes, np.flatnonzero(upward), e_tail, e_head, e_cost)
+        backward = _csr(nodes, np.flatnonzero(~upward), e_head, e_tail, e_cost)
+        self._query = ContractionHierarchyQuery(*forward, *backward, e_tail, e_head, e_link, e_first, e_second)
+
+    def compute_cost(self, origin_index: int, destination_index: int) -> float:
+        """Cost of the shortest path between two nodes
+
+        :Arguments:
+            **origin_index** (:obj:`int`): Index of the origin in the graph
+
+            **destination_index** (:obj:`int`): Index of the destination in the graph
+
+        :Returns:
+            **cost** (:obj:`float`): Cost of the path. Infinite when the destination cannot be reached
+        """
+        return self._query.cost(origin_index, self.__destination(destination_index))
+
+    def compute_path(self, origin_index: int, destination_index: int) -> Tuple[float, Optional[np.ndarray]]:
+        """Cost and links of the shortest path between two nodes
+
+        :Arguments:
+            **origin_index** (:obj:`int`): Index of the origin in the graph
+
+            **destination_index** (:obj:`int`): Index of the destination in the graph
+
+        :Returns:
+            **cost** (:obj:`float`): Cost of the path. Infinite when the destination cannot be reached
+
+            **links** (:obj:`np.ndarray`): Position of the links of the path in the graph, from origin to
+            destination. None when the destination cannot be reached
+        """
+        return self._query.path(origin_index, self.__destination(destination_index))
+
+    def built_for(self, graph: Graph) -> bool:
+        """Whether the hierarchy was built for the current costs and centroid flow blocking of a graph"""
+        if graph._id != self.graph_id or bool(graph.block_centroid_flows) != self.block_centroid_flows:
+            return False
+        return np.array_equal(np.asarray(graph.cost, dtype=np.float64), self.cost)
+
+    def __destination(self, destination_index: int) -> int:
+        if self.block_centroid_flows and destination_index < self.zones:
+            return destination_index + self.nodes
+        return destination_index
+
+
+def _csr(nodes: int, edges: np.ndarray, tails: np.ndarray, heads: np.ndarray, costs: np.ndarray):
+    edges = edges[np.argsort(tails[edges], kind="stable")]
+    fs = np.zeros(nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails[edges], minlength=nodes), out=fs[1:])
+    return fs, heads[edges].copy(), edges.astype(np.int64), costs[edges].copy()
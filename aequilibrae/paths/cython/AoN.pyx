@@ -9,8 +9,15 @@ include 'bpr.pyx'
 include 'bpr2.pyx'
 include 'conical.pyx'
 include 'inrets.pyx'
+include 'compiled_vdf.pyx'
 include 'parallel_numpy.pyx'
 include 'path_file_saving.pyx'
+include 'bush_based.pyx'
+include 'path_based.pyx'
+include 'multi_origin.pyx'
+include 'select_link_replay.pyx'
+include 'contraction_hierarchy.pyx'
+include 'batched_paths.pyx'
 
 def one_to_all(origin, matrix, graph, result, aux_result, curr_thread):
     # type: (int, AequilibraeMatrix, Graph, AssignmentResults, MultiThreadedAoN, int) -> int
@@ -94,13 +101,21 @@ def one_to_all(origin, matrix, graph, result, aux_result, curr_thread):
         unsigned char [:] has_flow_mask
         long long[:, :] link_list
         bint select_link = False
+        SelectLinkODBuffers sl_od_buffers = None
+        int thread_id = curr_thread
 
     if result._selected_links:
         has_flow_mask = aux_result.has_flow_mask[curr_thread, :]
-        sl_od_matrix_view = aux_result.temp_sl_od_matrix[curr_thread, :, origin_index, :, :]
+        sl_od_buffers = aux_result.sl_od_buffers
+        # Sparse OD matrices only have a placeholder row in the dense array
+        od_row = origin_index if sl_od_buffers is None else 0
+        sl_od_matrix_view = aux_result.temp_sl_od_matrix[curr_thread, :, od_row, :, :]
         sl_link_loading_view = aux_result.temp_sl_link_loading[curr_thread, :, :, :]
         link_list = aux_result.select_links[:, :]  # Read only, don't need to slice on curr_thread
         select_link = True
+
+    # Skims and path files need the paths to all destinations, not only the ones with demand
+    cdef bint early_exit = result.early_exit and skims == 0 and not save_paths
     #Now we do all procedures with NO GIL
     with nogil:
         if block_flows_through_centroids: # Unblocks the centroid if that is the case
@@ -112,15 +127,26 @@ def one_to_all(origin, matrix, graph, result, aux_result, curr_thread):
                                     b_nodes_view,
                                     original_b_nodes_view)
 
-        w = path_finding(origin_index,
-                         -1,  # destination index to disable early exit
-                         g_view,
-                         b_nodes_view,
-                         graph_fs_view,
-                         predecessors_view,
-                         ids_graph_view,
-                         conn_view,
-                         reached_first_view)
+        if early_exit:
+            w = path_finding_to_demand(origin_index,
+                                       demand_view,
+                                       g_view,
+                                       b_nodes_view,
+                                       graph_fs_view,
+                                       predecessors_view,
+                                       ids_graph_view,
+                                       conn_view,
+                                       reached_first_view)
+        else:
+            w = path_finding(origin_index,
+                             -1,  # destination index to disable early exit
+                             g_view,
+                             b_nodes_view,
+                             graph_fs_view,
+                             predecessors_view,
+                             ids_graph_view,
+                             conn_view,
+                             reached_first_view)
 
         if block_flows_through_centroids: # Re-blocks the centroid if that is the case
             b = 1
@@ -152,7 +178,7 @@ def one_to_all(origin, matrix, graph, result, aux_result, curr_thread):
         if select_link:
             # Do SL and network loading at once
             sl_network_loading(link_list, demand_view, predecessors_view, conn_view, link_loads_view, sl_od_matrix_view,
-                               sl_link_loading_view, has_flow_mask, classes)
+                               sl_link_loading_view, has_flow_mask, classes, sl_od_buffers, origin_index, thread_id)
         else:
             # do ONLY reular loading (via cascade assignment)
             network_loading(classes,
@@ -165,8 +191,14 @@ def one_to_all(origin, matrix, graph, result, aux_result, curr_thread):
                             node_load_view,
                             w)
 
+    if result.tree_store is not None:
+        store_tree(origin_index, predecessors_view, conn_view, result.tree_store)
+
     if result.save_path_file == True:
-        save_path_file(origin_index, links, zones, predecessors_view, conn_view, path_file_base, path_index_file_base, write_feather)
+        if result.path_store is not None:
+            store_path_file(origin_index, zones, predecessors_view, conn_view, result.path_store)
+        else:
+            save_path_file(origin_index, links, zones, predecessors_view, conn_view, path_file_base, path_index_file_base, write_feather)
     return origin
 
 def path_computation(origin, destination, graph, results):
@@ -218,15 +250,29 @@ def path_computation(origin, destination, graph, results):
     cdef long long [:] b_nodes_view = new_b_nodes
 
     cdef bint a_star_bint = results.a_star
+    cdef bint bidirectional_bint = results.bidirectional and not results.a_star
+    cdef long long [:] reverse_fs_view
+    cdef long long [:] reverse_tails_view
+    cdef long long [:] reverse_links_view
+    if bidirectional_bint:
+        reverse_fs_view, reverse_tails_view, reverse_links_view = graph.reverse_star()
     cdef double [:] lat_view
     cdef double [:] lon_view
     cdef long long [:] nodes_to_indices_view
+    cdef double [:, :] from_landmarks_view
+    cdef double [:, :] to_landmarks_view
     cdef Heuristic heuristic
     if results.a_star:
-        lat_view = graph.lonlat_index.lat.values
-        lon_view = graph.lonlat_index.lon.values
         nodes_to_indices_view = graph.nodes_to_indices
         heuristic = HEURISTIC_MAP[results._heuristic]
+        if heuristic == LANDMARKS:
+            lat_view = lon_view = np.zeros(0, dtype=np.float64)
+            from_landmarks_view = graph.landmarks.from_landmarks
+            to_landmarks_view = graph.landmarks.to_landmarks
+        else:
+            lat_view = graph.lonlat_index.lat.values
+            lon_view = graph.lonlat_index.lon.values
+            from_landmarks_view = to_landmarks_view = np.zeros((0, 0), dtype=np.float64)
 
 
     #Now we do all procedures with NO GIL
@@ -253,7 +299,24 @@ def path_computation(origin, destination, graph, results):
                 predecessors_view,
                 ids_graph_view,
                 conn_view,
-                heuristic
+                heuristic,
+                from_landmarks_view,
+                to_landmarks_view
+            )
+        elif bidirectional_bint:
+            path_finding_bidirectional(
+                origin_index,
+                dest_index,
+                g_view,
+                b_nodes_view,
+                graph_fs_view,
+                reverse_fs_view,
+                reverse_tails_view,
+                reverse_links_view,
+                predecessors_view,
+                ids_graph_view,
+                conn_view,
+                zones if block_flows_through_centroids else 0
             )
         else:
             w = path_finding(origin_index,
@@ -267,7 +330,7 @@ def path_computation(origin, destination, graph, results):
                              reached_first_view)
 
 
-        if skims > 0 and not a_star_bint:
+        if skims > 0 and not a_star_bint and not bidirectional_bint:
             skim_single_path(origin_index,
                              nodes,
                              skims,
@@ -323,6 +386,7 @@ def update_path_trace(results, destination, graph):
     """
     If `results.early_exit` is `True`, early exit will be enabled if the path is to be recomputed.
     If `results.a_star` is `True`, A* will be used if the path is to be recomputed.
+    If `results.bidirectional` is `True`, bidirectional Dijkstra's will be used if the path is to be recomputed.
 
     :param graph: AequilibraE graph. Needs to have been set with number of centroids and list of skims (if any)
     :param results: AequilibraE Matrix properly set for computation using matrix.computational_view([matrix list])
@@ -346,7 +410,13 @@ def update_path_trace(results, destination, graph):
         # If `a_star` was enabled then the stored tree has no guarantees and may not be useful due to the heuristic used
         # TODO: revisit with heuristic specific reuse logic
         if results.predecessors[dest_index] == -1 and results._early_exit or results._a_star:
-            results.compute_path(results.origin, destination, early_exit=results.early_exit, a_star=results.a_star)
+            results.compute_path(
+                results.origin,
+                destination,
+                early_exit=results.early_exit,
+                a_star=results.a_star,
+                bidirectional=results.bidirectional
+            )
 
         # By the invariant hypothesis presented at https://en.wikipedia.org/wiki/Dijkstra%27s_algorithm#Proof_of_correctness
         # Dijkstra's algorithm produces the shortest path tree for all scanned nodes. That is if a node was scanned,
@@ -14,6 +14,7 @@ from libc.string cimport memset
 from libc.stdlib cimport malloc, free
 
 include 'pq_4ary_heap.pyx'
+include 'select_link_buffers.pyx'
 
 @cython.wraparound(False)
 @cython.embedsignature(True)
@@ -67,6 +68,51 @@ cpdef void network_loading(long classes,
             # Cascades the load from the node to their predecessor
             node_load[predecessor, j] += node_load[node, j]
 
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void sparse_network_loading(long classes,
+                                  long long [:] destinations,
+                                  double[:, :] demand,
+                                  long long [:] pred,
+                                  long long [:] conn,
+                                  double[:, :] link_loads,
+                                  long long [:] reached_first,
+                                  double [:, :] node_load,
+                                  long found) noexcept nogil:
+    """Same as *network_loading*, but with the demand from the origin given only for its destinations with demand
+
+    *node_load* must be all zeros, and is left that way, so it does not need to be cleaned for every origin
+    """
+    cdef long long i, j, node, predecessor
+    cdef double load
+
+    # Loads the demand to the centroids
+    for i in range(destinations.shape[0]):
+        for j in range(classes):
+            if not isnan(demand[i, j]):
+                node_load[destinations[i], j] = demand[i, j]
+
+    # Recursively cascades to the origin, cleaning the nodes as it goes
+    for i in range(found, 0, -1):
+        node = reached_first[i]
+        predecessor = pred[node]
+        for j in range(classes):
+            load = node_load[node, j]
+            if load != 0:
+                link_loads[conn[node], j] += load
+                node_load[predecessor, j] += load
+                node_load[node, j] = 0
+
+    # Destinations that were not reached and the origin itself still hold their loads
+    for i in range(destinations.shape[0]):
+        for j in range(classes):
+            node_load[destinations[i], j] = 0
+    if found >= 0:
+        for j in range(classes):
+            node_load[reached_first[0], j] = 0
+
+
 @cython.wraparound(False)
 @cython.embedsignature(True)
 @cython.boundscheck(False)
@@ -98,7 +144,10 @@ cdef void sl_network_loading(
     double [:, :, :] sl_od_matrix,
     double [:, :, :] sl_link_loading,
     unsigned char [:] has_flow_mask,
-    long classes) noexcept nogil:
+    long classes,
+    SelectLinkODBuffers sl_od_buffers,
+    long long origin_index,
+    int thread_id) noexcept nogil:
 # VARIABLES:
 #   selected_links: 2d memoryview. Each row corresponds to a set of selected links specified by the user
 #   demand:         The input demand matrix for a given origin. The first index corresponds to destination,
@@ -114,6 +163,10 @@ cdef void sl_network_loading(
 #                   The indices are: set of links, link_id, class)
 # has_flow_mask:    An array which acts as a flag for which links were used in retracing a given OD path
 # classes:          the number of subclasses of vehicles for the given TrafficClass
+# sl_od_buffers:    Per-thread buffers the OD pairs are appended to when the OD matrices are sparse. When None,
+#                   they are written to temp_sl_od_matrix
+# origin_index:     Index of the origin, used for the OD pairs in sl_od_buffers
+# thread_id:        Thread whose buffers the OD pairs are appended to
 # 
 # Executes regular loading, while keeping track of SL links
     cdef:
@@ -150,8 +203,11 @@ cdef void sl_network_loading(
                 l += 1
             if found == 0:
                 continue
-            for k in range(classes):
-                sl_od_matrix[i, j, k] = demand[j, k]
+            if sl_od_buffers is None:
+                for k in range(classes):
+                    sl_od_matrix[i, j, k] = demand[j, k]
+            else:
+                sl_od_buffers.append(thread_id, i, origin_index, j, demand)
             connection = conn[j]
             predecessor = pred[j]
             while predecessor >= 0:
@@ -333,11 +389,8 @@ cpdef int path_finding(long origin,
 
         if destination != -1 and tail_vert_idx == destination_vert:
             # If we wish to reuse the tree we've constructed in update_path_trace we need to mark the un-scanned
-            # nodes as unreachable. The nodes not in the heap (NOT_IN_HEAP) are already -1
-            for idx in range(pqueue.length):
-                if pqueue.Elements[idx].state == IN_HEAP:
-                    pred[idx] = -1
-                    connectors[idx] = -1
+            # nodes as unreachable
+            _unreach_unscanned_nodes(&pqueue, pred, connectors)
             break
 
         tail_vert_val = pqueue.Elements[tail_vert_idx].key
@@ -362,11 +415,239 @@ cpdef int path_finding(long origin,
     free_heap(&pqueue)
     return found - 1
 
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef inline void _unreach_unscanned_nodes(PriorityQueue *pqueue,
+                                          long long [:] pred,
+                                          long long [:] connectors) noexcept nogil:
+    # Nodes still in the heap when the search stops are marked as unreachable. The nodes not in the heap
+    # (NOT_IN_HEAP) are already -1
+    cdef size_t idx
+    for idx in range(pqueue.length):
+        if pqueue.Elements[idx].state == IN_HEAP:
+            pred[idx] = -1
+            connectors[idx] = -1
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+cpdef int path_finding_to_demand(long origin,
+                                 double[:, :] demand,
+                                 double[:] graph_costs,
+                                 long long [:] csr_indices,
+                                 long long [:] graph_fs,
+                                 long long [:] pred,
+                                 long long [:] ids,
+                                 long long [:] connectors,
+                                 long long [:] reached_first) noexcept nogil:
+    """Same as *path_finding*, but stops once all destinations with demand from the origin have been settled
+
+    Destinations are the centroids, i.e. the first *demand.shape[0]* nodes. Nodes that were not settled are left
+    unreachable, so the tree is only valid for the destinations with demand
+    """
+    cdef unsigned int M = pred.shape[0]
+    cdef long long zones = demand.shape[0]
+    cdef long long classes = demand.shape[1]
+
+    cdef:
+        size_t tail_vert_idx, head_vert_idx, idx  # indices
+        DTYPE_t tail_vert_val, head_vert_val  # vertex travel times
+        PriorityQueue pqueue  # binary heap
+        ElementState vert_state  # vertex state
+        size_t origin_vert = <size_t>origin
+        ITYPE_t found = 0
+        long long i, j, remaining = 0
+
+    # Number of destinations we still need to settle
+    for i in range(zones):
+        for j in range(classes):
+            if not isnan(demand[i, j]) and demand[i, j] > 0:
+                remaining += 1
+                break
+
+    for i in range(M):
+        pred[i] = -1
+        connectors[i] = -1
+        reached_first[i] = -1
+
+    init_heap(&pqueue, <size_t>M)
+    insert(&pqueue, origin_vert, 0.0)
+
+    while pqueue.size > 0:
+        tail_vert_idx = extract_min(&pqueue)
+        reached_first[found] = tail_vert_idx
+        found += 1
+
+        if <long long>tail_vert_idx < zones:
+            for j in range(classes):
+                if not isnan(demand[tail_vert_idx, j]) and demand[tail_vert_idx, j] > 0:
+                    remaining -= 1
+                    break
+            if remaining == 0:
+                _unreach_unscanned_nodes(&pqueue, pred, connectors)
+                break
+
+        tail_vert_val = pqueue.Elements[tail_vert_idx].key
+
+        # loop on outgoing edges
+        for idx in range(<size_t>graph_fs[tail_vert_idx], <size_t>graph_fs[tail_vert_idx + 1]):
+            head_vert_idx = <size_t>csr_indices[idx]
+            vert_state = pqueue.Elements[head_vert_idx].state
+            if vert_state != SCANNED:
+                head_vert_val = tail_vert_val + graph_costs[idx]
+                if head_vert_val == INFINITY:
+                    continue
+                elif vert_state == NOT_IN_HEAP:
+                    insert(&pqueue, head_vert_idx, head_vert_val)
+                    pred[head_vert_idx] = tail_vert_idx
+                    connectors[head_vert_idx] = ids[idx]
+                elif pqueue.Elements[head_vert_idx].key > head_vert_val:
+                    decrease_key(&pqueue, head_vert_idx, head_vert_val)
+                    pred[head_vert_idx] = tail_vert_idx
+                    connectors[head_vert_idx] = ids[idx]
+
+    free_heap(&pqueue)
+    return found - 1
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void path_finding_distances(long origin,
+                                  double[:] graph_costs,
+                                  long long [:] csr_indices,
+                                  long long [:] graph_fs,
+                                  double[:] distances) noexcept nogil:
+    """Cost of the shortest paths from an origin to all nodes, infinite for the nodes it does not reach
+
+    :Arguments:
+        **origin** (:obj:`long`): Index of the origin
+
+        **graph_costs** (:obj:`double[:]`): Cost of each link of the graph
+
+        **csr_indices** (:obj:`long long[:]`): Head of each link of the graph
+
+        **graph_fs** (:obj:`long long[:]`): Forward star of the graph
+
+        **distances** (:obj:`double[:]`): Array the costs are written to. One position per node
+    """
+    cdef:
+        size_t tail_vert_idx, head_vert_idx, idx
+        DTYPE_t tail_vert_val, head_vert_val
+        PriorityQueue pqueue
+        ElementState vert_state
+        size_t i, M = distances.shape[0]
+
+    init_heap(&pqueue, M)
+    insert(&pqueue, <size_t>origin, 0.0)
+
+    while pqueue.size > 0:
+        tail_vert_idx = extract_min(&pqueue)
+        tail_vert_val = pqueue.Elements[tail_vert_idx].key
+
+        for idx in range(<size_t>graph_fs[tail_vert_idx], <size_t>graph_fs[tail_vert_idx + 1]):
+            head_vert_idx = <size_t>csr_indices[idx]
+            vert_state = pqueue.Elements[head_vert_idx].state
+            if vert_state != SCANNED:
+                head_vert_val = tail_vert_val + graph_costs[idx]
+                if head_vert_val == INFINITY:
+                    continue
+                elif vert_state == NOT_IN_HEAP:
+                    insert(&pqueue, head_vert_idx, head_vert_val)
+                elif pqueue.Elements[head_vert_idx].key > head_vert_val:
+                    decrease_key(&pqueue, head_vert_idx, head_vert_val)
+
+    # Keys of the nodes never reached are still infinite
+    for i in range(M):
+        distances[i] = pqueue.Elements[i].key
+
+    free_heap(&pqueue)
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void path_finding_sparse(long origin,
+                              long destination,
+                              double[:] graph_costs,
+                              long long [:] csr_indices,
+                              long long [:] graph_fs,
+                              long long [:] pred,
+                              long long [:] ids,
+                              long long [:] connectors,
+                              SearchWorkspace *workspace) noexcept nogil:
+    """Same as *path_finding*, but reusing a workspace kept between searches
+
+    Only the nodes touched by the previous search with the workspace are reset, so many short searches (e.g. for
+    route choice sets) do not pay for the whole network each time. Predecessors and connectors must be -1 for all
+    nodes before the first search with a workspace, and should only be changed by searches with that workspace.
+    """
+    cdef:
+        size_t tail_vert_idx, head_vert_idx, idx
+        DTYPE_t tail_vert_val, head_vert_val
+        PriorityQueue *pqueue = &workspace.pqueue
+        ElementState vert_state
+        size_t destination_vert = <size_t>destination
+
+    reset_labels(workspace, pred, connectors)
+    insert_touched(workspace, <size_t>origin, 0.0)
+
+    while pqueue.size > 0:
+        tail_vert_idx = extract_min(pqueue)
+        if destination != -1 and tail_vert_idx == destination_vert:
+            _unreach_unscanned_touched(workspace, pred, connectors)
+            break
+
+        tail_vert_val = pqueue.Elements[tail_vert_idx].key
+        for idx in range(<size_t>graph_fs[tail_vert_idx], <size_t>graph_fs[tail_vert_idx + 1]):
+            head_vert_idx = <size_t>csr_indices[idx]
+            vert_state = pqueue.Elements[head_vert_idx].state
+            if vert_state != SCANNED:
+                head_vert_val = tail_vert_val + graph_costs[idx]
+                if head_vert_val == INFINITY:
+                    continue
+                elif vert_state == NOT_IN_HEAP:
+                    insert_touched(workspace, head_vert_idx, head_vert_val)
+                    pred[head_vert_idx] = tail_vert_idx
+                    connectors[head_vert_idx] = ids[idx]
+                elif pqueue.Elements[head_vert_idx].key > head_vert_val:
+                    decrease_key(pqueue, head_vert_idx, head_vert_val)
+                    pred[head_vert_idx] = tail_vert_idx
+                    connectors[head_vert_idx] = ids[idx]
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void reset_labels(SearchWorkspace *workspace, long long [:] pred, long long [:] connectors) noexcept nogil:
+    """Marks the nodes touched by the last search with a workspace as unreachable, and empties the workspace"""
+    cdef size_t i
+    for i in range(workspace.touched_size):
+        pred[workspace.touched[i]] = -1
+        connectors[workspace.touched[i]] = -1
+    reset_workspace(workspace)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef inline void _unreach_unscanned_touched(SearchWorkspace *workspace,
+                                            long long [:] pred,
+                                            long long [:] connectors) noexcept nogil:
+    # Same as *_unreach_unscanned_nodes*, only looking at the nodes the search touched
+    cdef size_t i, idx
+    for i in range(workspace.touched_size):
+        idx = workspace.touched[i]
+        if workspace.pqueue.Elements[idx].state == IN_HEAP:
+            pred[idx] = -1
+            connectors[idx] = -1
+
 cdef enum Heuristic:
     HAVERSINE
     EQUIRECTANGULAR
+    LANDMARKS
 
-HEURISTIC_MAP = {"haversine": HAVERSINE, "equirectangular": EQUIRECTANGULAR}
+HEURISTIC_MAP = {"haversine": HAVERSINE, "equirectangular": EQUIRECTANGULAR, "landmarks": LANDMARKS}
 
 @cython.wraparound(False)
 @cython.embedsignature(True)
@@ -419,6 +700,41 @@ cdef inline double equirectangular_heuristic(double lat1, double lon1, double la
     return 6371000.0 * sqrt(x * x + y * y)
 
 
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef inline double landmark_heuristic(size_t node,
+                                      size_t destination,
+                                      double[:, :] from_landmarks,
+                                      double[:, :] to_landmarks) noexcept nogil:
+    """
+    The ALT (A*, landmarks, triangle inequality) heuristic. Exact for any non-negative costs, as long as they are
+    not lower than the costs the distances to and from the landmarks were computed with.
+
+    Arguments:
+        **node** (:obj:`size_t`): Index of the node to evaluate
+        **destination** (:obj:`size_t`): Index of the destination
+        **from_landmarks** (:obj:`double[:, :]`): Cost from each landmark (columns) to each node (rows)
+        **to_landmarks** (:obj:`double[:, :]`): Cost from each node (rows) to each landmark (columns)
+
+    Returns the largest lower bound of the cost from node to destination given by the landmarks. Landmarks that do not
+    reach (or are not reached by) both nodes give no bound (NaN terms never win the comparisons), or an infinite one
+    when the destination cannot be reached from the node.
+    """
+    cdef:
+        size_t k
+        double bound, h = 0.0
+
+    for k in range(<size_t>from_landmarks.shape[1]):
+        bound = from_landmarks[destination, k] - from_landmarks[node, k]
+        if bound > h:
+            h = bound
+        bound = to_landmarks[node, k] - to_landmarks[destination, k]
+        if bound > h:
+            h = bound
+    return h
+
+
 @cython.wraparound(False)
 @cython.embedsignature(True)
 @cython.boundscheck(False)
@@ -433,13 +749,18 @@ cpdef void path_finding_a_star(long origin,
                               long long [:] pred,
                               long long [:] ids,
                               long long [:] connectors,
-                              Heuristic heuristic) noexcept nogil:
+                              Heuristic heuristic,
+                              double[:, :] from_landmarks,
+                              double[:, :] to_landmarks) noexcept nogil:
     """
     Based on the pseudocode presented at https://en.wikipedia.org/wiki/A*_search_algorithm#Pseudocode
     The following variables have been renamed to be consistent with out Dijkstra's implementation
      - openSet: pqueue
      - cameFrom: pred
      - fScore: pqueue.Elements[idx].key, for some idx
+
+    Coordinates are only used by the haversine and equirectangular heuristics, and the distances to and from landmarks
+    only by the landmarks heuristic. The ones not used can be empty.
     """
 
     cdef unsigned int N = graph_costs.shape[0]
@@ -456,12 +777,16 @@ cpdef void path_finding_a_star(long origin,
 
     cdef:
         double deg2rad = pi / 180.0
-        double lat1_rad = lats[destination_vert] * deg2rad
-        double lon1_rad = lons[destination_vert] * deg2rad
-        double h, cos_lat1 = cos(lat1_rad)
+        double lat1_rad = 0.0, lon1_rad = 0.0
+        double h, cos_lat1 = 1.0
         double (*heur)(double, double, double, double, void*) noexcept nogil
         void* data
 
+    if heuristic != LANDMARKS:
+        lat1_rad = lats[destination_vert] * deg2rad
+        lon1_rad = lons[destination_vert] * deg2rad
+        cos_lat1 = cos(lat1_rad)
+
     if heuristic == HAVERSINE:
         heur = haversine_heuristic
         data = <void*>&cos_lat1
@@ -497,12 +822,17 @@ cpdef void path_finding_a_star(long origin,
 
             tentative_gScore = gScore[current] + graph_costs[idx]
             if tentative_gScore < gScore[neighbour]:
+                if heuristic == LANDMARKS:
+                    h = landmark_heuristic(neighbour, destination_vert, from_landmarks, to_landmarks)
+                    if h == INFINITY:  # The destination cannot be reached from this node
+                        continue
+                else:
+                    h = heur(lat1_rad, lon1_rad, lats[neighbour] * deg2rad, lons[neighbour] * deg2rad, data)
+
                 pred[neighbour] = current
                 connectors[neighbour] = ids[idx]
                 gScore[neighbour] = tentative_gScore
 
-                h = heur(lat1_rad, lon1_rad, lats[neighbour] * deg2rad, lons[neighbour] * deg2rad, data)
-
                 # Unlike Dijkstra's we can remove a node from the heap and rediscover it with a cheaper path
                 if pqueue.Elements[neighbour].state != IN_HEAP:
                     insert(&pqueue, neighbour, tentative_gScore + h)
@@ -512,3 +842,142 @@ cpdef void path_finding_a_star(long origin,
 
     free_heap(&pqueue)
     free(gScore)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void path_finding_bidirectional(long origin,
+                                      long destination,
+                                      double[:] graph_costs,
+                                      long long [:] csr_indices,
+                                      long long [:] graph_fs,
+                                      long long [:] reverse_fs,
+                                      long long [:] reverse_tails,
+                                      long long [:] reverse_links,
+                                      long long [:] pred,
+                                      long long [:] ids,
+                                      long long [:] connectors,
+                                      long long blocked_zones) noexcept nogil:
+    """Shortest path between two nodes, searched from both of them until the searches meet
+
+    A forward search from the origin and a backward search (over the links into each node) from the destination are
+    alternated, always advancing the one with the lowest key. Every link that connects the two searches gives a path,
+    and the best one is the shortest path once the sum of the lowest keys of both searches is no lower than its cost.
+
+    Predecessors are left as an early exit Dijkstra's would leave them: nodes scanned by the forward search and the
+    nodes of the path have their predecessors, and all other nodes are unreachable.
+
+    :Arguments:
+        **reverse_fs** (:obj:`long long[:]`): Backward star of the graph, with the links into each node
+
+        **reverse_tails** (:obj:`long long[:]`): Tail of each link in the backward star
+
+        **reverse_links** (:obj:`long long[:]`): Position of each link of the backward star in the graph
+
+        **blocked_zones** (:obj:`long long`): Number of centroids flows cannot go through, other than the origin. The
+        forward search is blocked by the B nodes of the graph, as in *blocking_centroid_flows*, and the backward
+        search does not scan links out of these centroids
+    """
+    cdef unsigned int M = pred.shape[0]
+
+    cdef:
+        size_t tail_vert_idx, head_vert_idx, idx, link, node, meeting = M
+        DTYPE_t tail_vert_val, head_vert_val, best = INFINITY
+        PriorityQueue forward, backward
+        ElementState vert_state
+        size_t origin_vert = <size_t>origin
+        size_t destination_vert = <size_t>destination
+        long long meeting_pred = -1, meeting_conn = -1
+        long long *succ = <long long *>malloc(M * sizeof(long long))
+        long long *succ_link = <long long *>malloc(M * sizeof(long long))
+
+    for idx in range(M):
+        pred[idx] = -1
+        connectors[idx] = -1
+
+    init_heap(&forward, <size_t>M)
+    init_heap(&backward, <size_t>M)
+    insert(&forward, origin_vert, 0.0)
+    insert(&backward, destination_vert, 0.0)
+    if origin_vert == destination_vert:
+        best = 0.0
+
+    while forward.size > 0 and backward.size > 0:
+        if forward.Elements[forward.A[0]].key + backward.Elements[backward.A[0]].key >= best:
+            break
+
+        if forward.Elements[forward.A[0]].key <= backward.Elements[backward.A[0]].key:
+            tail_vert_idx = extract_min(&forward)
+            tail_vert_val = forward.Elements[tail_vert_idx].key
+
+            for idx in range(<size_t>graph_fs[tail_vert_idx], <size_t>graph_fs[tail_vert_idx + 1]):
+                head_vert_idx = <size_t>csr_indices[idx]
+                vert_state = forward.Elements[head_vert_idx].state
+                if vert_state != SCANNED:
+                    head_vert_val = tail_vert_val + graph_costs[idx]
+                    if head_vert_val == INFINITY:
+                        continue
+                    elif vert_state == NOT_IN_HEAP:
+                        insert(&forward, head_vert_idx, head_vert_val)
+                    elif forward.Elements[head_vert_idx].key > head_vert_val:
+                        decrease_key(&forward, head_vert_idx, head_vert_val)
+                    else:
+                        continue
+                    pred[head_vert_idx] = tail_vert_idx
+                    connectors[head_vert_idx] = ids[idx]
+
+                    # The backward key is infinite for nodes the backward search has not reached
+                    if head_vert_val + backward.Elements[head_vert_idx].key < best:
+                        best = head_vert_val + backward.Elements[head_vert_idx].key
+                        meeting = head_vert_idx
+        else:
+            tail_vert_idx = extract_min(&backward)
+            tail_vert_val = backward.Elements[tail_vert_idx].key
+
+            for idx in range(<size_t>reverse_fs[tail_vert_idx], <size_t>reverse_fs[tail_vert_idx + 1]):
+                head_vert_idx = <size_t>reverse_tails[idx]
+                if <long long>head_vert_idx < blocked_zones and head_vert_idx != origin_vert:
+                    continue
+                link = <size_t>reverse_links[idx]
+                vert_state = backward.Elements[head_vert_idx].state
+                if vert_state != SCANNED:
+                    head_vert_val = tail_vert_val + graph_costs[link]
+                    if head_vert_val == INFINITY:
+                        continue
+                    elif vert_state == NOT_IN_HEAP:
+                        insert(&backward, head_vert_idx, head_vert_val)
+                    elif backward.Elements[head_vert_idx].key > head_vert_val:
+                        decrease_key(&backward, head_vert_idx, head_vert_val)
+                    else:
+                        continue
+                    succ[head_vert_idx] = tail_vert_idx
+                    succ_link[head_vert_idx] = link
+
+                    if head_vert_val + forward.Elements[head_vert_idx].key < best:
+                        best = head_vert_val + forward.Elements[head_vert_idx].key
+                        meeting = head_vert_idx
+
+    # Only scanned nodes are part of the tree. The meeting node may not be scanned, but its predecessor is
+    if meeting < M:
+        meeting_pred = pred[meeting]
+        meeting_conn = connectors[meeting]
+    _unreach_unscanned_nodes(&forward, pred, connectors)
+
+    if meeting < M and meeting != destination_vert:
+        pred[meeting] = meeting_pred
+        connectors[meeting] = meeting_conn
+        node = meeting
+        while node != destination_vert:
+            link = <size_t>succ_link[node]
+            pred[succ[node]] = node
+            connectors[succ[node]] = ids[link]
+            node = <size_t>succ[node]
+    elif meeting == destination_vert:
+        pred[meeting] = meeting_pred
+        connectors[meeting] = meeting_conn
+
+    free_heap(&forward)
+    free_heap(&backward)
+    free(succ)
+    free(succ_link)
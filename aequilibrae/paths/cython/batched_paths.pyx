@@ -0,0 +1,207 @@
+"""
+Shortest paths for many OD pairs in a single call, without the GIL
+
+Queries are grouped by origin, and each group is solved by one OpenMP thread with a single search that stops once all
+destinations of the group have been settled. Each thread works on its own slice of the auxiliary arrays (indexed by its
+thread id), so no locks are needed: the path of each query is written to its own vector, and its skims to its own row.
+Threads keep their search workspace between origins, so each search only resets the nodes the previous one touched.
+"""
+from cython.parallel cimport parallel, prange, threadid
+from libc.stdlib cimport malloc, free
+from libcpp.vector cimport vector
+from libcpp.algorithm cimport reverse
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def batched_path_finding(long long [:] origins,
+                         long long [:] group_offsets,
+                         long long [:] destinations,
+                         long long [:] queries,
+                         double [:] graph_costs,
+                         long long [:] b_nodes,
+                         long long [:] graph_fs,
+                         long long [:] ids,
+                         double [:, :] graph_skims,
+                         long long nodes,
+                         long long blocked_zones,
+                         int cores):
+    """Shortest paths between many OD pairs
+
+    :Arguments:
+        **origins** (:obj:`long long[:]`): Index of the origin of each group of queries
+
+        **group_offsets** (:obj:`long long[:]`): Position of the first query of each group in *destinations*, plus
+        the total number of queries
+
+        **destinations** (:obj:`long long[:]`): Index of the destination of each query, grouped by origin
+
+        **queries** (:obj:`long long[:]`): Position of each query in the results
+
+        **graph_costs** (:obj:`double[:]`): Cost of each link of the graph
+
+        **b_nodes** (:obj:`long long[:]`): Head of each link of the graph
+
+        **graph_fs** (:obj:`long long[:]`): Forward star of the graph
+
+        **ids** (:obj:`long long[:]`): Position of each link in the graph
+
+        **graph_skims** (:obj:`double[:, :]`): Skims of each link of the graph. One column per skim
+
+        **nodes** (:obj:`long long`): Length of the predecessor arrays. One more than the number of nodes
+
+        **blocked_zones** (:obj:`long long`): Number of centroids flows cannot go through. Zero when not blocking
+
+        **cores** (:obj:`int`): Number of threads
+
+    :Returns:
+        **offsets** (:obj:`np.ndarray`): Position of the first link of the path of each query in *links*, plus the
+        total number of links
+
+        **links** (:obj:`np.ndarray`): Position in the graph of the links of all paths, from origin to destination
+
+        **costs** (:obj:`np.ndarray`): Cost of each path. Infinite when the destination cannot be reached
+
+        **skims** (:obj:`np.ndarray`): Skims of each path. One column per skim
+    """
+    cdef:
+        long long num_queries = destinations.shape[0]
+        long long groups = origins.shape[0]
+        long long num_skims = graph_skims.shape[1]
+        long long g, q, i, j, total = 0
+        int thread_id
+        vector[vector[long long]] paths
+        SearchWorkspace *workspace
+
+    costs = np.zeros(num_queries, dtype=np.float64)
+    skims = np.zeros((num_queries, num_skims), dtype=np.float64)
+    cdef double [:] costs_view = costs
+    cdef double [:, :] skims_view = skims
+
+    cdef long long [:, :] pred_matrix = np.full((cores, nodes), -1, dtype=np.int64)
+    cdef long long [:, :] conn_matrix = np.full((cores, nodes), -1, dtype=np.int64)
+    cdef unsigned char [:, :] targets_matrix = np.zeros((cores, nodes), dtype=np.uint8)
+    cdef long long [:, :] b_nodes_matrix = np.broadcast_to(b_nodes, (cores, b_nodes.shape[0])).copy()
+
+    paths.resize(num_queries)
+    with nogil, parallel(num_threads=cores):
+        thread_id = threadid()
+        workspace = <SearchWorkspace *>malloc(sizeof(SearchWorkspace))
+        init_workspace(workspace, <size_t>nodes)
+        for g in prange(groups, schedule="dynamic"):
+            if blocked_zones > 0:
+                blocking_centroid_flows(0, origins[g], blocked_zones, graph_fs, b_nodes_matrix[thread_id], b_nodes)
+
+            _paths_from_origin(
+                origins[g],
+                destinations[group_offsets[g]:group_offsets[g + 1]],
+                queries[group_offsets[g]:group_offsets[g + 1]],
+                graph_costs,
+                b_nodes_matrix[thread_id],
+                graph_fs,
+                ids,
+                graph_skims,
+                pred_matrix[thread_id],
+                conn_matrix[thread_id],
+                targets_matrix[thread_id],
+                costs_view,
+                skims_view,
+                paths,
+                workspace
+            )
+
+            if blocked_zones > 0:
+                blocking_centroid_flows(1, origins[g], blocked_zones, graph_fs, b_nodes_matrix[thread_id], b_nodes)
+
+        free_workspace(workspace)
+        free(workspace)
+
+    offsets = np.zeros(num_queries + 1, dtype=np.int64)
+    cdef long long [:] offsets_view = offsets
+    for q in range(num_queries):
+        total += paths[q].size()
+        offsets_view[q + 1] = total
+
+    links = np.empty(total, dtype=np.int64)
+    cdef long long [:] links_view = links
+    with nogil:
+        for q in range(num_queries):
+            for i in range(<long long>paths[q].size()):
+                links_view[offsets_view[q] + i] = paths[q][i]
+    return offsets, links, costs, skims
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void _paths_from_origin(long long origin,
+                             long long [:] destinations,
+                             long long [:] queries,
+                             double [:] graph_costs,
+                             long long [:] b_nodes,
+                             long long [:] graph_fs,
+                             long long [:] ids,
+                             double [:, :] graph_skims,
+                             long long [:] pred,
+                             long long [:] connectors,
+                             unsigned char [:] targets,
+                             double [:] costs,
+                             double [:, :] skims,
+                             vector[vector[long long]] &paths,
+                             SearchWorkspace *workspace) noexcept nogil:
+    cdef:
+        size_t tail_vert_idx, head_vert_idx, idx
+        DTYPE_t tail_vert_val, head_vert_val
+        PriorityQueue *pqueue = &workspace.pqueue
+        ElementState vert_state
+        long long i, j, node, link, remaining = 0
+
+    for i in range(destinations.shape[0]):
+        if targets[destinations[i]] == 0 and destinations[i] != origin:
+            targets[destinations[i]] = 1
+            remaining += 1
+
+    # The same search as *path_finding_sparse*, stopping once all destinations have been settled
+    reset_labels(workspace, pred, connectors)
+    insert_touched(workspace, <size_t>origin, 0.0)
+    while pqueue.size > 0 and remaining > 0:
+        tail_vert_idx = extract_min(pqueue)
+        if targets[tail_vert_idx] == 1:
+            remaining -= 1
+
+        tail_vert_val = pqueue.Elements[tail_vert_idx].key
+        for idx in range(<size_t>graph_fs[tail_vert_idx], <size_t>graph_fs[tail_vert_idx + 1]):
+            head_vert_idx = <size_t>b_nodes[idx]
+            vert_state = pqueue.Elements[head_vert_idx].state
+            if vert_state != SCANNED:
+                head_vert_val = tail_vert_val + graph_costs[idx]
+                if head_vert_val == INFINITY:
+                    continue
+                elif vert_state == NOT_IN_HEAP:
+                    insert_touched(workspace, head_vert_idx, head_vert_val)
+                    pred[head_vert_idx] = tail_vert_idx
+                    connectors[head_vert_idx] = ids[idx]
+                elif pqueue.Elements[head_vert_idx].key > head_vert_val:
+                    decrease_key(pqueue, head_vert_idx, head_vert_val)
+                    pred[head_vert_idx] = tail_vert_idx
+                    connectors[head_vert_idx] = ids[idx]
+    _unreach_unscanned_touched(workspace, pred, connectors)
+
+    for i in range(destinations.shape[0]):
+        node = destinations[i]
+        targets[node] = 0
+        if node != origin and pred[node] == -1:
+            costs[queries[i]] = INFINITY
+            for j in range(skims.shape[1]):
+                skims[queries[i], j] = INFINITY
+            continue
+
+        while node != origin:
+            link = connectors[node]
+            paths[queries[i]].push_back(link)
+            costs[queries[i]] += graph_costs[link]
+            for j in range(skims.shape[1]):
+                skims[queries[i], j] += graph_skims[link, j]
+            node = pred[node]
+        reverse(paths[queries[i]].begin(), paths[queries[i]].end())
@@ -0,0 +1,496 @@
+"""
+Kernels for the origin-based (bush) equilibrium assignment, following Dial's Algorithm B
+
+Dial, R.B. (2006) A path-based user-equilibrium traffic assignment algorithm that obviates path storage and
+enumeration. Transportation Research Part B, 40(10), pp. 917-936.
+
+All arrays are indexed on the compressed graph, whose CSR positions coincide with the compressed link IDs.
+"""
+from libc.math cimport isnan, INFINITY
+
+cdef double BUSH_FLOW_EPS = 1e-10
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef inline bint _blocked_node(long long node, long long origin, long long zones, bint block_centroids) noexcept nogil:
+    # Flows can only go through the origin centroid, never through others, when flows through centroids are blocked
+    return block_centroids and node < zones and node != origin
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef long long _bush_topological_order(long long origin,
+                                       long long zones,
+                                       bint block_centroids,
+                                       long long [:] fs,
+                                       long long [:] b_nodes,
+                                       unsigned char [:] bush,
+                                       long long [:] in_degree,
+                                       long long [:] topo_order) noexcept nogil:
+    """Kahn's algorithm over the links in the bush. Returns the number of nodes reached from the origin"""
+    cdef long long i, node, idx, found = 0, cursor = 0
+    cdef long long nodes = fs.shape[0] - 1
+
+    for i in range(nodes):
+        in_degree[i] = 0
+
+    for node in range(nodes):
+        if _blocked_node(node, origin, zones, block_centroids):
+            continue
+        for idx in range(fs[node], fs[node + 1]):
+            if bush[idx]:
+                in_degree[b_nodes[idx]] += 1
+
+    topo_order[found] = origin
+    found += 1
+    while cursor < found:
+        node = topo_order[cursor]
+        cursor += 1
+        if _blocked_node(node, origin, zones, block_centroids):
+            continue
+        for idx in range(fs[node], fs[node + 1]):
+            if bush[idx]:
+                in_degree[b_nodes[idx]] -= 1
+                if in_degree[b_nodes[idx]] == 0:
+                    topo_order[found] = b_nodes[idx]
+                    found += 1
+    return found
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void _bush_labels(long long origin,
+                       long long zones,
+                       bint block_centroids,
+                       long long found,
+                       long long [:] fs,
+                       long long [:] b_nodes,
+                       double [:] cost,
+                       unsigned char [:] bush,
+                       double [:] bush_flow,
+                       bint used_only,
+                       long long [:] topo_order,
+                       double [:] min_label,
+                       double [:] max_label,
+                       long long [:] min_pred,
+                       long long [:] max_pred) noexcept nogil:
+    """Shortest and longest path labels over the bush, computed in topological order
+
+    The longest path labels consider either all links in the bush or only the ones carrying flow
+    """
+    cdef long long i, node, idx, head
+    cdef long long nodes = fs.shape[0] - 1
+
+    for i in range(nodes):
+        min_label[i] = INFINITY
+        max_label[i] = -INFINITY
+        min_pred[i] = -1
+        max_pred[i] = -1
+
+    min_label[origin] = 0
+    max_label[origin] = 0
+
+    for i in range(found):
+        node = topo_order[i]
+        if _blocked_node(node, origin, zones, block_centroids):
+            continue
+        for idx in range(fs[node], fs[node + 1]):
+            if not bush[idx]:
+                continue
+            head = b_nodes[idx]
+            if min_label[node] + cost[idx] < min_label[head]:
+                min_label[head] = min_label[node] + cost[idx]
+                min_pred[head] = idx
+            if used_only and bush_flow[idx] <= BUSH_FLOW_EPS:
+                continue
+            if max_label[node] > -INFINITY and max_label[node] + cost[idx] > max_label[head]:
+                max_label[head] = max_label[node] + cost[idx]
+                max_pred[head] = idx
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void bush_initialise(long long origin,
+                           long long zones,
+                           bint block_centroids,
+                           double [:] demand,
+                           double [:] cost,
+                           long long [:] fs,
+                           long long [:] b_nodes,
+                           long long [:] ids,
+                           unsigned char [:] bush,
+                           double [:] bush_flow,
+                           double [:] class_flow,
+                           long long [:] temp_b_nodes,
+                           long long [:] pred,
+                           long long [:] conn,
+                           long long [:] reached_first,
+                           double [:, :] node_load) noexcept nogil:
+    """Creates the bush for an origin as its shortest path tree and loads the origin's demand onto it"""
+    cdef long long i, found, node
+
+    for i in range(b_nodes.shape[0]):
+        temp_b_nodes[i] = b_nodes[i]
+    if block_centroids:
+        blocking_centroid_flows(0, origin, zones, fs, temp_b_nodes, b_nodes)
+
+    found = path_finding(origin, -1, cost, temp_b_nodes, fs, pred, ids, conn, reached_first)
+
+    for i in range(bush.shape[0]):
+        bush[i] = 0
+        bush_flow[i] = 0
+
+    for i in range(1, found + 1):
+        node = reached_first[i]
+        bush[conn[node]] = 1
+
+    for i in range(node_load.shape[0]):
+        node_load[i, 0] = 0
+    for i in range(zones):
+        if not isnan(demand[i]):
+            node_load[i, 0] = demand[i]
+
+    # Cascades the demand to the origin, as in network_loading
+    for i in range(found, 0, -1):
+        node = reached_first[i]
+        bush_flow[conn[node]] += node_load[node, 0]
+        class_flow[conn[node]] += node_load[node, 0]
+        node_load[pred[node], 0] += node_load[node, 0]
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef long long bush_improve(long long origin,
+                             long long zones,
+                             bint block_centroids,
+                             double [:] cost,
+                             long long [:] fs,
+                             long long [:] b_nodes,
+                             unsigned char [:] bush,
+                             double [:] bush_flow,
+                             long long [:] in_degree,
+                             long long [:] topo_order,
+                             double [:] min_label,
+                             double [:] max_label,
+                             long long [:] min_pred,
+                             long long [:] max_pred) noexcept nogil:
+    """Removes unused links from the bush and adds the ones that are shortcuts with respect to its longest paths.
+
+    Links are only added when they go from a node with a smaller longest path label to one with a larger one, which
+    keeps the bush acyclic. Returns the number of links added.
+    """
+    cdef long long i, node, idx, head, found, added = 0
+    cdef long long nodes = fs.shape[0] - 1
+
+    found = _bush_topological_order(origin, zones, block_centroids, fs, b_nodes, bush, in_degree, topo_order)
+    _bush_labels(origin, zones, block_centroids, found, fs, b_nodes, cost, bush, bush_flow, False, topo_order,
+                 min_label, max_label, min_pred, max_pred)
+
+    # Drops all unused links that are not part of the shortest path tree within the bush
+    for node in range(nodes):
+        for idx in range(fs[node], fs[node + 1]):
+            if bush[idx] and bush_flow[idx] <= BUSH_FLOW_EPS and min_pred[b_nodes[idx]] != idx:
+                bush[idx] = 0
+
+    found = _bush_topological_order(origin, zones, block_centroids, fs, b_nodes, bush, in_degree, topo_order)
+    _bush_labels(origin, zones, block_centroids, found, fs, b_nodes, cost, bush, bush_flow, False, topo_order,
+                 min_label, max_label, min_pred, max_pred)
+
+    for node in range(nodes):
+        if max_label[node] == -INFINITY or _blocked_node(node, origin, zones, block_centroids):
+            continue
+        for idx in range(fs[node], fs[node + 1]):
+            head = b_nodes[idx]
+            if bush[idx] or head == origin or max_label[head] == -INFINITY:
+                continue
+            if max_label[node] + cost[idx] < max_label[head]:
+                bush[idx] = 1
+                added += 1
+    return added
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef double bush_equilibrate(long long origin,
+                              long long zones,
+                              bint block_centroids,
+                              double [:] cost,
+                              double [:] derivative,
+                              long long [:] fs,
+                              long long [:] a_nodes,
+                              long long [:] b_nodes,
+                              unsigned char [:] bush,
+                              double [:] bush_flow,
+                              double [:] class_flow,
+                              long long [:] in_degree,
+                              long long [:] topo_order,
+                              double [:] min_label,
+                              double [:] max_label,
+                              long long [:] min_pred,
+                              long long [:] max_pred,
+                              long long [:] stamp,
+                              long long [:] segment,
+                              int max_passes,
+                              double tolerance) noexcept nogil:
+    """Shifts flow from the longest to the shortest used path segments within the bush (Newton step).
+
+    Link costs are updated with a first order approximation during the shifts. Returns the largest relative
+    difference between longest and shortest used paths found in the last pass.
+    """
+    cdef long long i, j, node, p, q, idx, found, n_min, n_max, k
+    cdef long long nodes = fs.shape[0] - 1
+    cdef double gap, max_gap = 0, g, h, dx
+    cdef int passes
+
+    for i in range(nodes):
+        stamp[i] = -1
+
+    for passes in range(max_passes):
+        max_gap = 0
+        found = _bush_topological_order(origin, zones, block_centroids, fs, b_nodes, bush, in_degree, topo_order)
+        _bush_labels(origin, zones, block_centroids, found, fs, b_nodes, cost, bush, bush_flow, True, topo_order,
+                     min_label, max_label, min_pred, max_pred)
+
+        for i in range(found - 1, 0, -1):
+            node = topo_order[i]
+            if max_pred[node] < 0 or min_pred[node] < 0:
+                continue
+            gap = (max_label[node] - min_label[node]) / min_label[node] if min_label[node] > 0 else 0
+            if gap > max_gap:
+                max_gap = gap
+            if gap <= tolerance:
+                continue
+
+            # Marks the shortest path back to the origin and walks the longest one until they meet
+            p = node
+            stamp[p] = i + passes * nodes
+            while p != origin:
+                p = a_nodes[min_pred[p]]
+                stamp[p] = i + passes * nodes
+
+            q = node
+            n_max = 0
+            g = 0
+            h = 0
+            dx = INFINITY
+            while True:
+                idx = max_pred[q]
+                segment[n_max] = idx
+                n_max += 1
+                g += cost[idx]
+                h += derivative[idx]
+                if bush_flow[idx] < dx:
+                    dx = bush_flow[idx]
+                q = a_nodes[idx]
+                if stamp[q] == i + passes * nodes:
+                    break
+
+            n_min = 0
+            p = node
+            while p != q:
+                idx = min_pred[p]
+                segment[nodes - 1 - n_min] = idx
+                n_min += 1
+                g -= cost[idx]
+                h += derivative[idx]
+                p = a_nodes[idx]
+
+            if g <= 0 or dx <= BUSH_FLOW_EPS:
+                continue
+            if h > 0 and g / h < dx:
+                dx = g / h
+
+            for k in range(n_max):
+                idx = segment[k]
+                bush_flow[idx] -= dx
+                class_flow[idx] -= dx
+                cost[idx] -= derivative[idx] * dx
+                if bush_flow[idx] < BUSH_FLOW_EPS:
+                    class_flow[idx] -= bush_flow[idx]
+                    bush_flow[idx] = 0
+
+            for k in range(n_min):
+                idx = segment[nodes - 1 - k]
+                bush_flow[idx] += dx
+                class_flow[idx] += dx
+                cost[idx] += derivative[idx] * dx
+
+        if max_gap <= tolerance:
+            break
+    return max_gap
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void bush_skims(long long origin,
+                      long long zones,
+                      bint block_centroids,
+                      double [:] cost,
+                      double [:, :] graph_skims,
+                      long long [:] fs,
+                      long long [:] b_nodes,
+                      unsigned char [:] bush,
+                      double [:] bush_flow,
+                      long long [:] in_degree,
+                      long long [:] topo_order,
+                      double [:] node_flow,
+                      double [:, :] node_skims,
+                      double [:, :] final_skims) noexcept nogil:
+    """Flow-weighted average skims over the bush of an origin.
+
+    Nodes that receive no flow are skimmed along the shortest path within the bush, whose cost is kept in the last
+    column of *node_skims*
+    """
+    cdef long long i, j, node, idx, head, found
+    cdef long long nodes = fs.shape[0] - 1
+    cdef long long skims = final_skims.shape[1]
+    cdef double c
+
+    found = _bush_topological_order(origin, zones, block_centroids, fs, b_nodes, bush, in_degree, topo_order)
+
+    for i in range(nodes):
+        node_flow[i] = 0
+        for j in range(skims + 1):
+            node_skims[i, j] = INFINITY
+
+    for i in range(found):
+        node = topo_order[i]
+        if _blocked_node(node, origin, zones, block_centroids):
+            continue
+        for idx in range(fs[node], fs[node + 1]):
+            if bush[idx] and bush_flow[idx] > BUSH_FLOW_EPS:
+                node_flow[b_nodes[idx]] += bush_flow[idx]
+
+    for i in range(nodes):
+        if node_flow[i] > BUSH_FLOW_EPS:
+            for j in range(skims):
+                node_skims[i, j] = 0
+
+    for j in range(skims + 1):
+        node_skims[origin, j] = 0
+
+    # Skims at each node are the average of the skims over all incoming links in the bush, weighted by their flows
+    for i in range(found):
+        node = topo_order[i]
+        if _blocked_node(node, origin, zones, block_centroids):
+            continue
+        for idx in range(fs[node], fs[node + 1]):
+            if not bush[idx]:
+                continue
+            head = b_nodes[idx]
+            c = node_skims[node, skims] + cost[idx]
+            if node_flow[head] > BUSH_FLOW_EPS:
+                if bush_flow[idx] > BUSH_FLOW_EPS:
+                    for j in range(skims):
+                        node_skims[head, j] += bush_flow[idx] / node_flow[head] * (node_skims[node, j] + graph_skims[idx, j])
+                if c < node_skims[head, skims]:
+                    node_skims[head, skims] = c
+            elif c < node_skims[head, skims]:
+                node_skims[head, skims] = c
+                for j in range(skims):
+                    node_skims[head, j] = node_skims[node, j] + graph_skims[idx, j]
+
+    for i in range(zones):
+        for j in range(skims):
+            final_skims[i, j] = node_skims[i, j]
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void bush_select_link(long long origin,
+                            long long zones,
+                            bint block_centroids,
+                            double [:] demand,
+                            long long [:] fs,
+                            long long [:] b_nodes,
+                            unsigned char [:] bush,
+                            double [:] bush_flow,
+                            unsigned char [:, :] link_set_mask,
+                            long long [:] in_degree,
+                            long long [:] topo_order,
+                            double [:] node_flow,
+                            double [:, :] clear_before,
+                            double [:, :] clear_after,
+                            double [:, :] sl_od_matrix,
+                            double [:, :] sl_link_loading) noexcept nogil:
+    """Select link flows for the bush of an origin.
+
+    Flows are assumed to mix proportionally at nodes. The share of the flow in a link that does not use a link set is
+    then the share that has not used it before reaching the link times the share that will not use it afterwards.
+    """
+    cdef long long i, s, node, idx, head, found
+    cdef long long nodes = fs.shape[0] - 1
+    cdef long long sets = link_set_mask.shape[0]
+    cdef double out_flow, share
+
+    found = _bush_topological_order(origin, zones, block_centroids, fs, b_nodes, bush, in_degree, topo_order)
+
+    for i in range(nodes):
+        node_flow[i] = 0
+        for s in range(sets):
+            clear_before[i, s] = 0
+            clear_after[i, s] = 0
+
+    # Flow arriving at each node that has not used each link set
+    for i in range(found):
+        node = topo_order[i]
+        if _blocked_node(node, origin, zones, block_centroids):
+            continue
+        for idx in range(fs[node], fs[node + 1]):
+            if not bush[idx] or bush_flow[idx] <= BUSH_FLOW_EPS:
+                continue
+            head = b_nodes[idx]
+            node_flow[head] += bush_flow[idx]
+            for s in range(sets):
+                if link_set_mask[s, idx]:
+                    continue
+                share = 1 if node == origin else clear_before[node, s] / node_flow[node]
+                clear_before[head, s] += bush_flow[idx] * share
+
+    # Share of the flow leaving each node that will not use each link set
+    for i in range(found - 1, -1, -1):
+        node = topo_order[i]
+        out_flow = 0
+        if node < zones and node != origin and not isnan(demand[node]):
+            out_flow = demand[node]
+        for s in range(sets):
+            clear_after[node, s] = out_flow
+        if not _blocked_node(node, origin, zones, block_centroids):
+            for idx in range(fs[node], fs[node + 1]):
+                if not bush[idx] or bush_flow[idx] <= BUSH_FLOW_EPS:
+                    continue
+                out_flow += bush_flow[idx]
+                for s in range(sets):
+                    if not link_set_mask[s, idx]:
+                        clear_after[node, s] += bush_flow[idx] * clear_after[b_nodes[idx], s]
+        for s in range(sets):
+            clear_after[node, s] = clear_after[node, s] / out_flow if out_flow > 0 else 1
+
+    for i in range(found):
+        node = topo_order[i]
+        if _blocked_node(node, origin, zones, block_centroids):
+            continue
+        for idx in range(fs[node], fs[node + 1]):
+            if not bush[idx] or bush_flow[idx] <= BUSH_FLOW_EPS:
+                continue
+            head = b_nodes[idx]
+            for s in range(sets):
+                if link_set_mask[s, idx]:
+                    sl_link_loading[s, idx] += bush_flow[idx]
+                else:
+                    share = 1 if node == origin else clear_before[node, s] / node_flow[node]
+                    sl_link_loading[s, idx] += bush_flow[idx] * (1 - share * clear_after[head, s])
+
+    for i in range(zones):
+        if i == origin or node_flow[i] <= BUSH_FLOW_EPS or isnan(demand[i]):
+            continue
+        for s in range(sets):
+            sl_od_matrix[s, i] = demand[i] * (1 - clear_before[i, s] / node_flow[i])
@@ -0,0 +1,196 @@
+from libc.math cimport pow, sqrt
+from cython.parallel import prange
+
+# Signature of all volume-delay functions that can be evaluated by the compiled kernels. They receive the flow,
+# capacity, free-flow time and parameters of a link, and write the congested time and its derivative with respect to
+# the flow. The same signature is used by Cython cdef functions and Numba cfuncs
+ctypedef void (*vdf_function)(double flow, double capacity, double fftime, double alpha, double beta,
+                              double* value, double* derivative) noexcept nogil
+
+
+cdef void bpr_fused(double flow, double capacity, double fftime, double alpha, double beta,
+                    double* value, double* derivative) noexcept nogil:
+    cdef double p
+    if flow > 0:
+        p = pow(flow / capacity, beta - 1)
+        value[0] = fftime * (1 + alpha * p * (flow / capacity))
+        derivative[0] = fftime * (alpha * beta * p) / capacity
+    else:
+        value[0] = fftime
+        derivative[0] = fftime
+
+
+cdef void bpr2_fused(double flow, double capacity, double fftime, double alpha, double beta,
+                     double* value, double* derivative) noexcept nogil:
+    cdef double p
+    if flow > 0:
+        if flow > capacity:
+            beta = 2 * beta
+        p = pow(flow / capacity, beta - 1)
+        value[0] = fftime * (1 + alpha * p * (flow / capacity))
+        derivative[0] = fftime * (alpha * beta * p) / capacity
+    else:
+        value[0] = fftime
+        derivative[0] = fftime
+
+
+cdef void conical_fused(double flow, double capacity, double fftime, double alpha, double beta,
+                        double* value, double* derivative) noexcept nogil:
+    cdef double x, root
+    if flow > 0:
+        x = 1 - flow / capacity
+        root = sqrt(pow(alpha, 2) * pow(x, 2) + pow(beta, 2))
+        value[0] = fftime * (root - alpha * x - beta + 2)
+        derivative[0] = fftime * ((alpha / capacity) - (pow(alpha, 2) * x) / (capacity * root))
+    else:
+        value[0] = fftime
+        derivative[0] = fftime
+
+
+cdef void inrets_fused(double flow, double capacity, double fftime, double alpha, double beta,
+                       double* value, double* derivative) noexcept nogil:
+    if flow > 0:
+        if flow > capacity:
+            value[0] = fftime * ((1.1 - alpha) / 0.1) * pow(flow / capacity, 2)
+            derivative[0] = fftime * ((-20) * (alpha - 1.1) * flow) / pow(capacity, 2)
+        else:
+            value[0] = fftime * (1.1 - (alpha * (flow / capacity))) / (1.1 - (flow / capacity))
+            derivative[0] = fftime * ((-110) * (alpha - 1) * capacity) / pow((11 * capacity) - (10 * flow), 2)
+    else:
+        value[0] = fftime
+        derivative[0] = fftime
+
+
+def builtin_vdf_address(name: str) -> int:
+    """Address of the compiled version of one of the volume-delay functions that come with AequilibraE"""
+    cdef vdf_function f
+    name = name.upper()
+    if name == "BPR":
+        f = bpr_fused
+    elif name == "BPR2":
+        f = bpr2_fused
+    elif name == "CONICAL":
+        f = conical_fused
+    elif name == "INRETS":
+        f = inrets_fused
+    else:
+        raise ValueError(f"There is no compiled version of VDF {name}")
+    return <size_t> f
+
+
+def vdf_value_and_derivative(congested_times, derivatives, link_flows, capacity, fftime, alpha, beta, function_ids,
+                             functions, cores):
+    cdef int c = cores
+    cdef bint compute_value = congested_times is not None
+    cdef bint compute_derivative = derivatives is not None
+
+    cdef double [:] link_flows_view = link_flows
+    cdef double [:] congested_view = congested_times if compute_value else link_flows
+    cdef double [:] derivatives_view = derivatives if compute_derivative else link_flows
+    cdef double [:] capacity_view = capacity
+    cdef double [:] fftime_view = fftime
+    cdef double [:] alpha_view = alpha
+    cdef double [:] beta_view = beta
+    cdef long long [:] function_ids_view = function_ids
+    cdef size_t [:] functions_view = functions
+
+    vdf_value_and_derivative_cython(congested_view, derivatives_view, compute_value, compute_derivative,
+                                    link_flows_view, capacity_view, fftime_view, alpha_view, beta_view,
+                                    function_ids_view, functions_view, c)
+
+
+def vdf_directional_derivative(stepsize, direction, solution, capacity, fftime, alpha, beta, function_ids,
+                               functions, cores):
+    cdef int c = cores
+    cdef double stp = stepsize
+
+    cdef double [:] direction_view = direction
+    cdef double [:] solution_view = solution
+    cdef double [:] capacity_view = capacity
+    cdef double [:] fftime_view = fftime
+    cdef double [:] alpha_view = alpha
+    cdef double [:] beta_view = beta
+    cdef long long [:] function_ids_view = function_ids
+    cdef size_t [:] functions_view = functions
+
+    return vdf_directional_derivative_cython(stp, direction_view, solution_view, capacity_view, fftime_view,
+                                             alpha_view, beta_view, function_ids_view, functions_view, c)
+
+
+cdef inline double _vdf_value(vdf_function f, double flow, double capacity, double fftime, double alpha,
+                              double beta) noexcept nogil:
+    cdef double value, derivative
+    f(flow, capacity, fftime, alpha, beta, &value, &derivative)
+    return value
+
+
+cdef inline void _vdf_evaluate(vdf_function f, double flow, double capacity, double fftime, double alpha, double beta,
+                               double* value, double* derivative, bint compute_value,
+                               bint compute_derivative) noexcept nogil:
+    cdef double v, d
+    f(flow, capacity, fftime, alpha, beta, &v, &d)
+    if compute_value:
+        value[0] = v
+    if compute_derivative:
+        derivative[0] = d
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void vdf_value_and_derivative_cython(double[:] congested_time,
+                                           double[:] derivatives,
+                                           bint compute_value,
+                                           bint compute_derivative,
+                                           double[:] link_flows,
+                                           double[:] capacity,
+                                           double[:] fftime,
+                                           double[:] alpha,
+                                           double[:] beta,
+                                           long long[:] function_ids,
+                                           size_t[:] functions,
+                                           int cores) noexcept:
+    # Links use the first function unless they are given their own. Value and derivative come from a single call
+    cdef long long i
+    cdef long long l = link_flows.shape[0]
+    cdef bint per_link = function_ids.shape[0] > 0
+    cdef vdf_function f
+
+    for i in prange(l, nogil=True, num_threads=cores):
+        if per_link:
+            f = <vdf_function> functions[function_ids[i]]
+        else:
+            f = <vdf_function> functions[0]
+        _vdf_evaluate(f, link_flows[i], capacity[i], fftime[i], alpha[i], beta[i], &congested_time[i],
+                      &derivatives[i], compute_value, compute_derivative)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef double vdf_directional_derivative_cython(double stepsize,
+                                               double[:] direction,
+                                               double[:] solution,
+                                               double[:] capacity,
+                                               double[:] fftime,
+                                               double[:] alpha,
+                                               double[:] beta,
+                                               long long[:] function_ids,
+                                               size_t[:] functions,
+                                               int cores) noexcept:
+    # Derivative of the Beckmann objective along the step direction, without materializing the flows or costs
+    cdef long long i
+    cdef long long l = solution.shape[0]
+    cdef bint per_link = function_ids.shape[0] > 0
+    cdef double total = 0
+    cdef double flow
+    cdef vdf_function f
+
+    for i in prange(l, nogil=True, num_threads=cores):
+        if per_link:
+            f = <vdf_function> functions[function_ids[i]]
+        else:
+            f = <vdf_function> functions[0]
+        flow = stepsize * direction[i] + (1.0 - stepsize) * solution[i]
+        total += _vdf_value(f, flow, capacity[i], fftime[i], alpha[i], beta[i]) * (direction[i] - solution[i])
+    return total
@@ -0,0 +1,513 @@
+"""
+Contraction hierarchies for repeated point-to-point shortest path queries over the same link costs
+
+Nodes are contracted one at a time. When a node is contracted, a shortcut is added between each pair of its
+neighbours whose shortest path goes through it, which is checked with a Dijkstra search (witness search) that avoids
+the node and is bounded by the cost of the path through it. Nodes are contracted in the order of their edge
+difference (shortcuts added minus edges removed), plus their number of contracted neighbours and their level in the
+hierarchy, which is updated lazily.
+
+Queries run one Dijkstra search from each end of the path, going only to nodes contracted later, and meet at the last
+contracted node of the shortest path. Shortcuts are unpacked recursively into the links they replace.
+"""
+from libcpp.vector cimport vector
+from libcpp.queue cimport priority_queue
+from libcpp.utility cimport pair
+
+ctypedef pair[double, long long] NodePriority
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def build_contraction_hierarchy(long long nodes, tails, heads, costs, links, long long witness_limit):
+    """Contracts all nodes of a graph
+
+    :Arguments:
+        **nodes** (:obj:`int`): Number of nodes
+
+        **tails** (:obj:`np.ndarray`): Tail node of each link
+
+        **heads** (:obj:`np.ndarray`): Head node of each link
+
+        **costs** (:obj:`np.ndarray`): Cost of each link
+
+        **links** (:obj:`np.ndarray`): Position of each link in the graph
+
+        **witness_limit** (:obj:`int`): Maximum number of nodes settled by each witness search
+
+    :Returns:
+        **rank** (:obj:`np.ndarray`): Position of each node in the contraction order
+
+        **edges** (:obj:`Tuple[np.ndarray]`): Tail, head, cost, link, first and second child of all edges of the
+        hierarchy. Links are -1 for shortcuts, and children are -1 for links
+    """
+    cdef vector[long long] e_tail, e_head, e_link, e_first, e_second
+    cdef vector[double] e_cost
+    cdef long long [:] tails_view = tails
+    cdef long long [:] heads_view = heads
+    cdef double [:] costs_view = costs
+    cdef long long [:] links_view = links
+    cdef long long i
+
+    for i in range(tails_view.shape[0]):
+        e_tail.push_back(tails_view[i])
+        e_head.push_back(heads_view[i])
+        e_cost.push_back(costs_view[i])
+        e_link.push_back(links_view[i])
+        e_first.push_back(-1)
+        e_second.push_back(-1)
+
+    rank = np.full(nodes, -1, dtype=np.int64)
+    cdef long long [:] rank_view = rank
+    with nogil:
+        contract_nodes(nodes, e_tail, e_head, e_cost, e_link, e_first, e_second, rank_view, witness_limit)
+
+    edges = (
+        np.array(e_tail, dtype=np.int64),
+        np.array(e_head, dtype=np.int64),
+        np.array(e_cost, dtype=np.float64),
+        np.array(e_link, dtype=np.int64),
+        np.array(e_first, dtype=np.int64),
+        np.array(e_second, dtype=np.int64),
+    )
+    return rank, edges
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void contract_nodes(long long nodes,
+                         vector[long long] &e_tail,
+                         vector[long long] &e_head,
+                         vector[double] &e_cost,
+                         vector[long long] &e_link,
+                         vector[long long] &e_first,
+                         vector[long long] &e_second,
+                         long long [:] rank,
+                         long long witness_limit) noexcept nogil:
+    cdef:
+        vector[vector[long long]] out_edges, in_edges
+        vector[long long] contracted_neighbours, level, updated_by, neighbours, touched
+        vector[double] priority
+        priority_queue[NodePriority] order
+        PriorityQueue witness
+        long long i, v, e, u, next_rank = 0
+        double p
+
+    out_edges.resize(nodes)
+    in_edges.resize(nodes)
+    contracted_neighbours.assign(nodes, 0)
+    level.assign(nodes, 0)
+    updated_by.assign(nodes, -1)
+    priority.assign(nodes, 0.0)
+    for e in range(<long long>e_tail.size()):
+        out_edges[e_tail[e]].push_back(e)
+        in_edges[e_head[e]].push_back(e)
+
+    init_heap(&witness, <size_t>nodes)
+    for v in range(nodes):
+        priority[v] = _edge_difference(v, out_edges, in_edges, e_tail, e_head, e_cost, e_link, e_first, e_second,
+                                       rank, &witness, touched, witness_limit, False)
+        # The queue takes the largest element first
+        order.push(NodePriority(-priority[v], v))
+
+    while not order.empty():
+        p = -order.top().first
+        v = order.top().second
+        order.pop()
+        if rank[v] >= 0 or p != priority[v]:
+            continue
+
+        # Priorities only change when neighbours are contracted, so they are checked again before contracting
+        priority[v] = contracted_neighbours[v] + level[v] + _edge_difference(
+            v, out_edges, in_edges, e_tail, e_head, e_cost, e_link, e_first, e_second, rank, &witness, touched,
+            witness_limit, False
+        )
+        if not order.empty() and priority[v] > -order.top().first:
+            order.push(NodePriority(-priority[v], v))
+            continue
+
+        _edge_difference(v, out_edges, in_edges, e_tail, e_head, e_cost, e_link, e_first, e_second, rank, &witness,
+                         touched, witness_limit, True)
+        rank[v] = next_rank
+        next_rank += 1
+
+        # Edges of contracted nodes are dropped from their neighbours, which are the only nodes whose priority changes
+        neighbours.clear()
+        for i in range(<long long>out_edges[v].size()):
+            e = out_edges[v][i]
+            if rank[e_head[e]] < 0:
+                neighbours.push_back(e_head[e])
+                _remove_edge(in_edges[e_head[e]], e)
+        for i in range(<long long>in_edges[v].size()):
+            e = in_edges[v][i]
+            if rank[e_tail[e]] < 0:
+                neighbours.push_back(e_tail[e])
+                _remove_edge(out_edges[e_tail[e]], e)
+
+        for i in range(<long long>neighbours.size()):
+            u = neighbours[i]
+            contracted_neighbours[u] += 1
+            if level[u] < level[v] + 1:
+                level[u] = level[v] + 1
+        for i in range(<long long>neighbours.size()):
+            u = neighbours[i]
+            # Nodes that are both successors and predecessors are only updated once
+            if updated_by[u] == v:
+                continue
+            updated_by[u] = v
+            priority[u] = contracted_neighbours[u] + level[u] + _edge_difference(
+                u, out_edges, in_edges, e_tail, e_head, e_cost, e_link, e_first, e_second, rank, &witness, touched,
+                witness_limit, False
+            )
+            order.push(NodePriority(-priority[u], u))
+
+    free_heap(&witness)
+
+
+cdef inline void _remove_edge(vector[long long] &edges, long long edge) noexcept nogil:
+    cdef size_t i
+    for i in range(edges.size()):
+        if edges[i] == edge:
+            edges[i] = edges.back()
+            edges.pop_back()
+            return
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef double _edge_difference(long long v,
+                             vector[vector[long long]] &out_edges,
+                             vector[vector[long long]] &in_edges,
+                             vector[long long] &e_tail,
+                             vector[long long] &e_head,
+                             vector[double] &e_cost,
+                             vector[long long] &e_link,
+                             vector[long long] &e_first,
+                             vector[long long] &e_second,
+                             long long [:] rank,
+                             PriorityQueue *witness,
+                             vector[long long] &touched,
+                             long long witness_limit,
+                             bint contract) noexcept nogil:
+    """Shortcuts needed to contract a node minus the edges it removes. Shortcuts are added when *contract* is True"""
+    cdef:
+        long long i, j, e_in, e_out, u, x, removed = 0, shortcuts = 0
+        double max_out = 0.0, through
+
+    for j in range(<long long>out_edges[v].size()):
+        e_out = out_edges[v][j]
+        if rank[e_head[e_out]] < 0:
+            removed += 1
+            if e_cost[e_out] > max_out:
+                max_out = e_cost[e_out]
+
+    for i in range(<long long>in_edges[v].size()):
+        e_in = in_edges[v][i]
+        u = e_tail[e_in]
+        if rank[u] >= 0:
+            continue
+        removed += 1
+
+        _witness_search(u, v, e_cost[e_in] + max_out, out_edges, e_head, e_cost, rank, witness, touched,
+                        witness_limit)
+        for j in range(<long long>out_edges[v].size()):
+            e_out = out_edges[v][j]
+            x = e_head[e_out]
+            if rank[x] >= 0 or x == u:
+                continue
+            through = e_cost[e_in] + e_cost[e_out]
+            if witness.Elements[x].state != NOT_IN_HEAP and witness.Elements[x].key <= through:
+                continue
+            shortcuts += 1
+            if contract:
+                _add_shortcut(u, x, through, e_in, e_out, out_edges, in_edges, e_tail, e_head, e_cost, e_link,
+                              e_first, e_second)
+        _reset_heap(witness, touched)
+
+    return <double>(shortcuts - removed)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void _witness_search(long long origin,
+                          long long avoid,
+                          double max_cost,
+                          vector[vector[long long]] &out_edges,
+                          vector[long long] &e_head,
+                          vector[double] &e_cost,
+                          long long [:] rank,
+                          PriorityQueue *witness,
+                          vector[long long] &touched,
+                          long long witness_limit) noexcept nogil:
+    """Dijkstra search over nodes not contracted yet, avoiding one of them and bounded in cost and nodes settled"""
+    cdef:
+        long long i, e, tail, head, settled = 0
+        double tail_cost, head_cost
+
+    insert(witness, <size_t>origin, 0.0)
+    touched.push_back(origin)
+    while witness.size > 0 and settled < witness_limit:
+        if peek(witness) > max_cost:
+            break
+        tail = <long long>extract_min(witness)
+        tail_cost = witness.Elements[tail].key
+        settled += 1
+        for i in range(<long long>out_edges[tail].size()):
+            e = out_edges[tail][i]
+            head = e_head[e]
+            if head == avoid or rank[head] >= 0:
+                continue
+            head_cost = tail_cost + e_cost[e]
+            if witness.Elements[head].state == NOT_IN_HEAP:
+                insert(witness, <size_t>head, head_cost)
+                touched.push_back(head)
+            elif witness.Elements[head].state == IN_HEAP and witness.Elements[head].key > head_cost:
+                decrease_key(witness, <size_t>head, head_cost)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void _add_shortcut(long long u,
+                        long long x,
+                        double cost,
+                        long long first,
+                        long long second,
+                        vector[vector[long long]] &out_edges,
+                        vector[vector[long long]] &in_edges,
+                        vector[long long] &e_tail,
+                        vector[long long] &e_head,
+                        vector[double] &e_cost,
+                        vector[long long] &e_link,
+                        vector[long long] &e_first,
+                        vector[long long] &e_second) noexcept nogil:
+    cdef long long i, e
+
+    # An edge between the same nodes is replaced, as it is longer than the shortcut
+    for i in range(<long long>out_edges[u].size()):
+        e = out_edges[u][i]
+        if e_head[e] == x:
+            if cost < e_cost[e]:
+                e_cost[e] = cost
+                e_link[e] = -1
+                e_first[e] = first
+                e_second[e] = second
+            return
+
+    e = <long long>e_tail.size()
+    e_tail.push_back(u)
+    e_head.push_back(x)
+    e_cost.push_back(cost)
+    e_link.push_back(-1)
+    e_first.push_back(first)
+    e_second.push_back(second)
+    out_edges[u].push_back(e)
+    in_edges[x].push_back(e)
+
+
+cdef inline void _reset_heap(PriorityQueue *pqueue, vector[long long] &touched) noexcept nogil:
+    """Empties a heap, resetting only the elements that were inserted in it"""
+    cdef size_t i
+    for i in range(pqueue.size):
+        pqueue.A[i] = pqueue.length
+    pqueue.size = 0
+    for i in range(touched.size()):
+        _initialize_element(pqueue, <size_t>touched[i])
+    touched.clear()
+
+
+cdef class ContractionHierarchyQuery:
+    """Bidirectional search over a contraction hierarchy, keeping its work arrays between queries
+
+    The forward search follows the edges from each node to nodes contracted after it, and the backward search
+    follows the edges into each node from nodes contracted after it. Both are kept in CSR format, with the edge of the
+    hierarchy each entry corresponds to.
+    """
+    cdef:
+        long long [:] forward_fs, forward_nodes, forward_edges
+        long long [:] backward_fs, backward_nodes, backward_edges
+        double [:] forward_costs, backward_costs
+        long long [:] e_tail, e_head, e_link, e_first, e_second
+        long long [:] forward_pred, backward_pred
+        PriorityQueue forward_queue, backward_queue
+        vector[long long] forward_touched, backward_touched, stack
+        public long long meeting
+
+    def __cinit__(self, forward_fs, forward_nodes, forward_edges, forward_costs, backward_fs, backward_nodes,
+                  backward_edges, backward_costs, e_tail, e_head, e_link, e_first, e_second):
+        cdef size_t nodes = forward_fs.shape[0] - 1
+        self.forward_fs = forward_fs
+        self.forward_nodes = forward_nodes
+        self.forward_edges = forward_edges
+        self.forward_costs = forward_costs
+        self.backward_fs = backward_fs
+        self.backward_nodes = backward_nodes
+        self.backward_edges = backward_edges
+        self.backward_costs = backward_costs
+        self.e_tail = e_tail
+        self.e_head = e_head
+        self.e_link = e_link
+        self.e_first = e_first
+        self.e_second = e_second
+        self.forward_pred = np.full(nodes, -1, dtype=np.int64)
+        self.backward_pred = np.full(nodes, -1, dtype=np.int64)
+        init_heap(&self.forward_queue, nodes)
+        init_heap(&self.backward_queue, nodes)
+        self.meeting = -1
+
+    def __dealloc__(self):
+        free_heap(&self.forward_queue)
+        free_heap(&self.backward_queue)
+
+    def cost(self, long long origin, long long destination) -> float:
+        """Cost of the shortest path between two node indices. Infinite if there is no path"""
+        cdef double cost
+        with nogil:
+            cost = self.search(origin, destination)
+        return cost
+
+    def path(self, long long origin, long long destination):
+        """Cost and links of the shortest path between two node indices. Links are None if there is no path"""
+        cdef vector[long long] links
+        cdef double cost
+        with nogil:
+            cost = self.search(origin, destination)
+            if self.meeting >= 0:
+                self.unpack(origin, destination, links)
+        if self.meeting < 0:
+            return cost, None
+
+        path = np.empty(links.size(), dtype=np.int64)
+        cdef long long [:] path_view = path
+        cdef size_t i
+        for i in range(links.size()):
+            path_view[i] = links[i]
+        return cost, path
+
+    @cython.wraparound(False)
+    @cython.boundscheck(False)
+    cdef double search(self, long long origin, long long destination) noexcept nogil:
+        cdef:
+            double best = INFINITY
+            bint forward_open, backward_open
+
+        _reset_search(&self.forward_queue, self.forward_touched, self.forward_pred)
+        _reset_search(&self.backward_queue, self.backward_touched, self.backward_pred)
+        self.meeting = -1
+
+        insert(&self.forward_queue, <size_t>origin, 0.0)
+        self.forward_touched.push_back(origin)
+        insert(&self.backward_queue, <size_t>destination, 0.0)
+        self.backward_touched.push_back(destination)
+
+        # A search stops once no node left in it can be part of a shorter path than the best found
+        while True:
+            forward_open = self.forward_queue.size > 0 and peek(&self.forward_queue) < best
+            backward_open = self.backward_queue.size > 0 and peek(&self.backward_queue) < best
+            if not forward_open and not backward_open:
+                break
+            if forward_open:
+                best = _search_step(&self.forward_queue, &self.backward_queue, self.forward_fs, self.forward_nodes,
+                                    self.forward_edges, self.forward_costs, self.backward_fs, self.backward_nodes,
+                                    self.backward_costs, self.forward_pred, self.forward_touched, best,
+                                    &self.meeting)
+            if backward_open:
+                best = _search_step(&self.backward_queue, &self.forward_queue, self.backward_fs,
+                                    self.backward_nodes, self.backward_edges, self.backward_costs, self.forward_fs,
+                                    self.forward_nodes, self.forward_costs, self.backward_pred,
+                                    self.backward_touched, best, &self.meeting)
+        return best
+
+    @cython.wraparound(False)
+    @cython.boundscheck(False)
+    cdef void unpack(self, long long origin, long long destination, vector[long long] &links) noexcept nogil:
+        """Links of the path found by the last search, from origin to destination"""
+        cdef:
+            vector[long long] up
+            long long node = self.meeting, i
+
+        while node != origin:
+            up.push_back(self.forward_pred[node])
+            node = self.e_tail[self.forward_pred[node]]
+        for i in range(<long long>up.size() - 1, -1, -1):
+            self.unpack_edge(up[i], links)
+
+        node = self.meeting
+        while node != destination:
+            self.unpack_edge(self.backward_pred[node], links)
+            node = self.e_head[self.backward_pred[node]]
+
+    @cython.wraparound(False)
+    @cython.boundscheck(False)
+    cdef void unpack_edge(self, long long edge, vector[long long] &links) noexcept nogil:
+        cdef long long e
+        self.stack.push_back(edge)
+        while not self.stack.empty():
+            e = self.stack.back()
+            self.stack.pop_back()
+            if self.e_link[e] >= 0:
+                links.push_back(self.e_link[e])
+            else:
+                self.stack.push_back(self.e_second[e])
+                self.stack.push_back(self.e_first[e])
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef inline double _search_step(PriorityQueue *queue,
+                                PriorityQueue *other,
+                                long long [:] fs,
+                                long long [:] csr_nodes,
+                                long long [:] csr_edges,
+                                double [:] csr_costs,
+                                long long [:] stall_fs,
+                                long long [:] stall_nodes,
+                                double [:] stall_costs,
+                                long long [:] pred,
+                                vector[long long] &touched,
+                                double best,
+                                long long *meeting) noexcept nogil:
+    """Settles one node of a search, returning the cost of the best path found so far
+
+    Nodes reached more cheaply through a node contracted after them, which the search will not go back down from,
+    are not on a shortest path and are not expanded (stall-on-demand). The edges that do so are the ones the other
+    search follows, in reverse.
+    """
+    cdef:
+        long long i, node, head
+        double cost, head_cost
+
+    node = <long long>extract_min(queue)
+    cost = queue.Elements[node].key
+    if other.Elements[node].state != NOT_IN_HEAP and cost + other.Elements[node].key < best:
+        best = cost + other.Elements[node].key
+        meeting[0] = node
+
+    for i in range(stall_fs[node], stall_fs[node + 1]):
+        head = stall_nodes[i]
+        if queue.Elements[head].state != NOT_IN_HEAP and queue.Elements[head].key + stall_costs[i] < cost:
+            return best
+
+    for i in range(fs[node], fs[node + 1]):
+        head = csr_nodes[i]
+        head_cost = cost + csr_costs[i]
+        if queue.Elements[head].state == NOT_IN_HEAP:
+            insert(queue, <size_t>head, head_cost)
+            touched.push_back(head)
+            pred[head] = csr_edges[i]
+        elif queue.Elements[head].state == IN_HEAP and queue.Elements[head].key > head_cost:
+            decrease_key(queue, <size_t>head, head_cost)
+            pred[head] = csr_edges[i]
+    return best
+
+
+cdef inline void _reset_search(PriorityQueue *queue, vector[long long] &touched, long long [:] pred) noexcept nogil:
+    cdef size_t i
+    for i in range(touched.size()):
+        pred[touched[i]] = -1
+    _reset_heap(queue, touched)
@@ -0,0 +1,520 @@
+"""
+Drivers that run the shortest path computations for a whole set of origins in a single call, without the GIL
+
+Origins are distributed across OpenMP threads, and each thread works on its own slice of the auxiliary arrays
+(indexed by its thread id). Every thread also counts the origins it has finished in its own position of the
+*progress* array, so the caller can poll the overall progress from another thread without any locking.
+
+Link loads can either be accumulated in one array per thread, reduced at the end, or directly into a single shared
+array. In the latter case, each thread cascades the demand of its origin over the node loads of its tree, and then
+adds them to the links in stripes protected by locks. As the link that reaches a node in a shortest path tree always
+ends on that node, stripes of nodes are also disjoint sets of links.
+
+Everything an origin needs is kept in an *AoNWorkspace*, one per traffic class, so the origins of several classes
+can be placed in a single work queue.
+"""
+from cython.parallel cimport parallel, prange, threadid
+from cpython.ref cimport PyObject
+from openmp cimport omp_lock_t, omp_init_lock, omp_destroy_lock, omp_set_lock, omp_unset_lock
+
+
+cdef class AoNWorkspace:
+    """Views and settings used to assign the origins of one traffic class
+
+    :Arguments:
+        **matrix** (:obj:`AequilibraeMatrix`): Demand matrix, with its computational view prepared. None if the
+        demand is only given by *demand_csr*
+
+        **graph** (:obj:`Graph`): Graph for the traffic class
+
+        **result** (:obj:`AssignmentResults`): Results object prepared for the graph and matrix
+
+        **aux_result** (:obj:`MultiThreadedAoN`): Auxiliary arrays prepared for the graph and results
+
+        **cores** (:obj:`int`): Maximum number of threads that will work on the origins
+
+        **cost** (:obj:`np.ndarray`, *Optional*): Link costs in the compressed graph. Defaults to the graph's ones
+
+        **demand_csr** (:obj:`Tuple[np.ndarray, np.ndarray, np.ndarray]`, *Optional*): Demand in compressed sparse
+        row format, as built by *demand_csr*. Link loads are computed from it instead of the dense matrix
+    """
+    cdef:
+        long long nodes, zones, links, classes, stripes
+        int skims
+        bint block_flows_through_centroids, select_link, save_paths, write_feather, shared_loads, early_exit
+        bint sparse_demand, dense_demand, save_trees
+        omp_lock_t *locks
+        string path_file_dir
+        object path_store
+        object tree_store
+
+        double [:, :, :] demand_view
+        long long [:] demand_ptr
+        long long [:] demand_destinations
+        double [:, :] demand_values
+        double [:, :, :] demand_rows
+        long long [:] graph_fs_view
+        double [:] g_view
+        long long [:] ids_graph_view
+        long long [:] original_b_nodes_view
+
+        double [:, :] graph_skim_view
+        double [:, :, :] skim_matrix_view
+        double [:, :, :] final_skim_matrices_view
+        long long [:, :] no_path_view
+
+        long long [:, :] predecessors_view
+        long long [:, :] reached_first_view
+        long long [:, :] conn_view
+        double [:, :, :] link_loads_view
+        double [:, :, :] node_load_view
+        long long [:, :] b_nodes_view
+        double [:, :] shared_link_loads_view
+
+        double [:, :, :, :, :] sl_od_matrix_view
+        double [:, :, :, :] sl_link_loading_view
+        unsigned char [:, :] has_flow_mask
+        long long [:, :] link_list
+        SelectLinkODBuffers sl_od_buffers
+
+    def __cinit__(self):
+        self.locks = NULL
+        self.stripes = 0
+
+    def __init__(self, matrix, graph, result, aux_result, int cores, cost=None, demand_csr=None):
+        cdef long long i
+
+        self.nodes = graph.compact_num_nodes
+        self.links = graph.compact_num_links
+        self.zones = graph.num_zones
+        self.skims = len(graph.skim_fields) if result.compute_skims else 0
+        self.block_flows_through_centroids = graph.block_centroid_flows
+        self.shared_loads = aux_result.shared_link_loads
+
+        self.sparse_demand = demand_csr is not None
+        if self.sparse_demand:
+            self.demand_ptr, self.demand_destinations, self.demand_values = demand_csr
+
+        self.dense_demand = matrix is not None
+        if self.dense_demand:
+            self.demand_view = matrix.matrix_view
+            self.classes = matrix.matrix_view.shape[2]
+        else:
+            # The demand from each origin is written into a row of its thread, so no dense matrix is ever built
+            self.classes = self.demand_values.shape[1]
+            self.demand_rows = np.zeros((cores, self.zones, self.classes))
+
+        # views from the graph
+        self.graph_fs_view = graph.compact_fs
+        self.g_view = graph.compact_cost if cost is None else cost
+        self.ids_graph_view = graph.compact_graph.id.values
+        self.original_b_nodes_view = graph.compact_graph.b_node.values
+
+        if self.skims > 0:
+            self.graph_skim_view = graph.compact_skims
+            self.skim_matrix_view = aux_result.temporary_skims
+            self.final_skim_matrices_view = result.skims.matrix_view
+
+        # views from the result object
+        self.no_path_view = result.no_path
+
+        # views from the aux-result object, with one row per thread
+        self.predecessors_view = aux_result.predecessors
+        self.reached_first_view = aux_result.reached_first
+        self.conn_view = aux_result.connectors
+        self.link_loads_view = aux_result.temp_link_loads
+        self.node_load_view = aux_result.temp_node_loads
+        self.b_nodes_view = aux_result.temp_b_nodes
+
+        if self.shared_loads:
+            self.shared_link_loads_view = result.compact_link_loads
+            self.stripes = min(4 * cores, self.nodes)
+            self.locks = <omp_lock_t *> malloc(self.stripes * sizeof(omp_lock_t))
+            for i in range(self.stripes):
+                omp_init_lock(&self.locks[i])
+
+        self.save_paths = result.save_path_file
+        self.write_feather = True
+        if self.save_paths:
+            self.write_feather = result.write_feather
+            self.path_file_dir = str(result.path_file_dir).encode('utf-8')
+            self.path_store = result.path_store
+
+        # Shortest path trees are stored for select link analysis after the assignment
+        self.tree_store = result.tree_store
+        self.save_trees = self.tree_store is not None
+
+        # Skims and path files need the paths to all destinations, not only the ones with demand
+        self.early_exit = result.early_exit and self.skims == 0 and not self.save_paths
+
+        self.select_link = len(result._selected_links) > 0
+        if self.select_link:
+            self.has_flow_mask = aux_result.has_flow_mask
+            self.sl_od_matrix_view = aux_result.temp_sl_od_matrix
+            self.sl_link_loading_view = aux_result.temp_sl_link_loading
+            self.link_list = aux_result.select_links
+            self.sl_od_buffers = aux_result.sl_od_buffers
+
+    def __dealloc__(self):
+        cdef long long i
+        if self.locks != NULL:
+            for i in range(self.stripes):
+                omp_destroy_lock(&self.locks[i])
+            free(self.locks)
+
+    @cython.wraparound(False)
+    @cython.boundscheck(False)
+    cdef void assign_origin(self, long long origin_index, int thread_id) noexcept nogil:
+        """Shortest path tree, skims, link loads and path file for one origin, using the arrays of a thread"""
+        cdef long w
+        cdef long long i, j, first = 0, last = 0, od_row
+        cdef double [:, :] demand
+
+        if self.sparse_demand:
+            first = self.demand_ptr[origin_index]
+            last = self.demand_ptr[origin_index + 1]
+
+        if self.dense_demand:
+            demand = self.demand_view[origin_index]
+        else:
+            demand = self.demand_rows[thread_id]
+            for i in range(first, last):
+                for j in range(self.classes):
+                    demand[self.demand_destinations[i], j] = self.demand_values[i, j]
+
+        if self.block_flows_through_centroids:  # Unblocks the centroid if that is the case
+            blocking_centroid_flows(0,
+                                    origin_index,
+                                    self.zones,
+                                    self.graph_fs_view,
+                                    self.b_nodes_view[thread_id],
+                                    self.original_b_nodes_view)
+
+        if self.early_exit:
+            w = path_finding_to_demand(origin_index,
+                                       demand,
+                                       self.g_view,
+                                       self.b_nodes_view[thread_id],
+                                       self.graph_fs_view,
+                                       self.predecessors_view[thread_id],
+                                       self.ids_graph_view,
+                                       self.conn_view[thread_id],
+                                       self.reached_first_view[thread_id])
+        else:
+            w = path_finding(origin_index,
+                             -1,  # destination index to disable early exit
+                             self.g_view,
+                             self.b_nodes_view[thread_id],
+                             self.graph_fs_view,
+                             self.predecessors_view[thread_id],
+                             self.ids_graph_view,
+                             self.conn_view[thread_id],
+                             self.reached_first_view[thread_id])
+
+        if self.block_flows_through_centroids:  # Re-blocks the centroid if that is the case
+            blocking_centroid_flows(1,
+                                    origin_index,
+                                    self.zones,
+                                    self.graph_fs_view,
+                                    self.b_nodes_view[thread_id],
+                                    self.original_b_nodes_view)
+
+        if self.skims > 0:
+            skim_single_path(origin_index,
+                             self.nodes,
+                             self.skims,
+                             self.skim_matrix_view[thread_id],
+                             self.predecessors_view[thread_id],
+                             self.conn_view[thread_id],
+                             self.graph_skim_view,
+                             self.reached_first_view[thread_id],
+                             w)
+            _copy_skims(self.skim_matrix_view[thread_id], self.final_skim_matrices_view[origin_index])
+
+        if self.select_link:
+            # Sparse OD matrices only have a placeholder row in the dense array
+            od_row = origin_index if self.sl_od_buffers is None else 0
+            sl_network_loading(self.link_list,
+                               demand,
+                               self.predecessors_view[thread_id],
+                               self.conn_view[thread_id],
+                               self.link_loads_view[thread_id],
+                               self.sl_od_matrix_view[thread_id, :, od_row, :, :],
+                               self.sl_link_loading_view[thread_id],
+                               self.has_flow_mask[thread_id],
+                               self.classes,
+                               self.sl_od_buffers,
+                               origin_index,
+                               thread_id)
+        elif self.shared_loads:
+            _cascade_node_loads(self.classes,
+                                demand,
+                                self.predecessors_view[thread_id],
+                                self.reached_first_view[thread_id],
+                                self.node_load_view[thread_id],
+                                w)
+            _add_tree_loads(self.predecessors_view[thread_id],
+                            self.conn_view[thread_id],
+                            self.node_load_view[thread_id],
+                            self.shared_link_loads_view,
+                            self.locks,
+                            self.stripes,
+                            thread_id)
+        elif self.sparse_demand:
+            sparse_network_loading(self.classes,
+                                   self.demand_destinations[first:last],
+                                   self.demand_values[first:last],
+                                   self.predecessors_view[thread_id],
+                                   self.conn_view[thread_id],
+                                   self.link_loads_view[thread_id],
+                                   self.reached_first_view[thread_id],
+                                   self.node_load_view[thread_id],
+                                   w)
+        else:
+            network_loading(self.classes,
+                            demand,
+                            self.predecessors_view[thread_id],
+                            self.conn_view[thread_id],
+                            self.link_loads_view[thread_id],
+                            self.no_path_view[origin_index],
+                            self.reached_first_view[thread_id],
+                            self.node_load_view[thread_id],
+                            w)
+
+        if self.save_paths:
+            _save_origin_path_file(origin_index,
+                                   self.links,
+                                   self.zones,
+                                   self.predecessors_view[thread_id],
+                                   self.conn_view[thread_id],
+                                   self.path_file_dir,
+                                   self.write_feather,
+                                   self.path_store)
+
+        if self.save_trees:
+            _store_origin_tree(origin_index, self.predecessors_view[thread_id], self.conn_view[thread_id],
+                               self.tree_store)
+
+        if not self.dense_demand:
+            for i in range(first, last):
+                for j in range(self.classes):
+                    demand[self.demand_destinations[i], j] = 0
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def all_to_all(long long [:] origins,
+               matrix,
+               graph,
+               result,
+               aux_result,
+               long long [:] progress,
+               int cores,
+               demand_csr=None):
+    # type: (np.ndarray, AequilibraeMatrix, Graph, AssignmentResults, MultiThreadedAoN, np.ndarray, int, tuple) -> None
+    """All-or-nothing assignment (and skimming) from all origins, given by their indices in the compressed graph"""
+    cdef long long i
+    cdef int thread_id
+    cdef AoNWorkspace workspace = AoNWorkspace(matrix, graph, result, aux_result, cores, None, demand_csr)
+
+    with nogil, parallel(num_threads=cores):
+        thread_id = threadid()
+        for i in prange(origins.shape[0], schedule="dynamic"):
+            workspace.assign_origin(origins[i], thread_id)
+            progress[thread_id] += 1
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def all_to_all_classes(list workspaces,
+                       long long [:] task_workspace,
+                       long long [:] task_origin,
+                       long long [:] progress,
+                       int cores):
+    # type: (List[AoNWorkspace], np.ndarray, np.ndarray, np.ndarray, int) -> None
+    """All-or-nothing assignment of several traffic classes, with the origins of all of them in a single work queue
+
+    Task *i* assigns origin *task_origin[i]* with workspace *task_workspace[i]*. All workspaces must have been
+    created for at least *cores* threads.
+    """
+    cdef long long i, n = len(workspaces)
+    cdef int thread_id
+    cdef PyObject **ptrs = <PyObject **> malloc(n * sizeof(PyObject *))
+
+    for i in range(n):
+        if not isinstance(workspaces[i], AoNWorkspace):
+            free(ptrs)
+            raise TypeError("Workspaces must be AoNWorkspace objects")
+        ptrs[i] = <PyObject *> workspaces[i]
+
+    # The list keeps the workspaces alive while the threads use the borrowed pointers
+    with nogil, parallel(num_threads=cores):
+        thread_id = threadid()
+        for i in prange(task_origin.shape[0], schedule="dynamic"):
+            (<AoNWorkspace> ptrs[task_workspace[i]]).assign_origin(task_origin[i], thread_id)
+            progress[thread_id] += 1
+    free(ptrs)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def skimming_all_origins(long long [:] origins, graph, result, aux_result, long long [:] progress, int cores):
+    # type: (np.ndarray, Graph, SkimResults, MultiThreadedNetworkSkimming, np.ndarray, int) -> None
+    """Skims from all origins, given by their indices in the compressed graph"""
+    cdef long long i, origin_index, nodes, zones, skims
+    cdef long w
+    cdef int thread_id
+    cdef bint block_flows_through_centroids
+
+    if result._graph_id != graph._id:
+        raise ValueError("Results object not prepared. Use --> results.prepare(graph)")
+
+    nodes = graph.compact_num_nodes + 1
+    zones = graph.num_zones
+    skims = result.num_skims
+    block_flows_through_centroids = graph.block_centroid_flows
+
+    # views from the graph
+    cdef long long [:] graph_fs_view = graph.compact_fs
+    cdef double [:] g_view = graph.compact_cost
+    cdef long long [:] ids_graph_view = graph.compact_graph.id.values
+    cdef long long [:] original_b_nodes_view = graph.compact_graph.b_node.values
+    cdef double [:, :] graph_skim_view = graph.compact_skims[:, :]
+
+    cdef double [:, :, :] final_skim_matrices_view = result.skims.matrix_view
+
+    # views from the aux-result object, with one row per thread
+    cdef long long [:, :] predecessors_view = aux_result.predecessors
+    cdef long long [:, :] reached_first_view = aux_result.reached_first
+    cdef long long [:, :] conn_view = aux_result.connectors
+    cdef long long [:, :] b_nodes_view = aux_result.temp_b_nodes
+    cdef double [:, :, :] skim_matrix_view = aux_result.temporary_skims
+
+    with nogil, parallel(num_threads=cores):
+        thread_id = threadid()
+        for i in prange(origins.shape[0], schedule="dynamic"):
+            origin_index = origins[i]
+            if block_flows_through_centroids:  # Unblocks the centroid if that is the case
+                blocking_centroid_flows(0,
+                                        origin_index,
+                                        zones,
+                                        graph_fs_view,
+                                        b_nodes_view[thread_id],
+                                        original_b_nodes_view)
+
+            w = path_finding(origin_index,
+                             -1,  # destination index to disable early exit
+                             g_view,
+                             b_nodes_view[thread_id],
+                             graph_fs_view,
+                             predecessors_view[thread_id],
+                             ids_graph_view,
+                             conn_view[thread_id],
+                             reached_first_view[thread_id])
+
+            skim_multiple_fields(origin_index,
+                                 nodes,
+                                 zones,
+                                 skims,
+                                 skim_matrix_view[thread_id],
+                                 predecessors_view[thread_id],
+                                 conn_view[thread_id],
+                                 graph_skim_view,
+                                 reached_first_view[thread_id],
+                                 w,
+                                 final_skim_matrices_view[origin_index])
+
+            if block_flows_through_centroids:  # Re-blocks the centroid if that is the case
+                blocking_centroid_flows(1,
+                                        origin_index,
+                                        zones,
+                                        graph_fs_view,
+                                        b_nodes_view[thread_id],
+                                        original_b_nodes_view)
+
+            progress[thread_id] += 1
+
+
+cdef void _store_origin_tree(long long origin_index,
+                             long long [:] pred,
+                             long long [:] conn,
+                             object tree_store) noexcept with gil:
+    store_tree(origin_index, pred, conn, tree_store)
+
+
+cdef void _save_origin_path_file(long long origin_index,
+                                 long long links,
+                                 long long zones,
+                                 long long [:] pred,
+                                 long long [:] conn,
+                                 string path_file_dir,
+                                 bint write_feather,
+                                 object path_store) noexcept with gil:
+    if path_store is not None:
+        store_path_file(origin_index, zones, pred, conn, path_store)
+        return
+
+    extension = "feather" if write_feather else "parquet"
+    base_string = os.path.join(path_file_dir.decode('utf-8'), f"o{origin_index}.{extension}")
+    index_string = os.path.join(path_file_dir.decode('utf-8'), f"o{origin_index}_indexdata.{extension}")
+    save_path_file(origin_index, links, zones, pred, conn, base_string.encode('utf-8'),
+                   index_string.encode('utf-8'), write_feather)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void _cascade_node_loads(long classes,
+                              double[:, :] demand,
+                              long long [:] pred,
+                              long long [:] reached_first,
+                              double [:, :] node_load,
+                              long found) noexcept nogil:
+    """Cascades the demand from an origin over its tree. The load on each node is left on the link that reaches it"""
+    cdef long long i, j, node, predecessor
+    cdef long long zones = demand.shape[0]
+
+    node_load[:, :] = 0
+    for j in range(classes):
+        for i in range(zones):
+            if not isnan(demand[i, j]):
+                node_load[i, j] = demand[i, j]
+
+    for i in range(found, 0, -1):
+        node = reached_first[i]
+        predecessor = pred[node]
+        for j in range(classes):
+            node_load[predecessor, j] += node_load[node, j]
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void _add_tree_loads(long long [:] pred,
+                          long long [:] conn,
+                          double [:, :] node_load,
+                          double [:, :] link_loads,
+                          omp_lock_t *locks,
+                          long long stripes,
+                          int thread_id) noexcept nogil:
+    """Adds the loads of a tree to the shared link loads, one stripe of nodes at a time"""
+    cdef long long s, stripe, node, first, last, j
+    cdef long long nodes = node_load.shape[0]
+    cdef long long classes = node_load.shape[1]
+    cdef long long stripe_size = (nodes + stripes - 1) // stripes
+
+    # Threads start from different stripes, so they rarely wait for each other
+    for s in range(stripes):
+        stripe = (s + thread_id) % stripes
+        first = stripe * stripe_size
+        last = min(first + stripe_size, nodes)
+        omp_set_lock(&locks[stripe])
+        for node in range(first, last):
+            if pred[node] < 0:
+                continue
+            for j in range(classes):
+                link_loads[conn[node], j] += node_load[node, j]
+        omp_unset_lock(&locks[stripe])
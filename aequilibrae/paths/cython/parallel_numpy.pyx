@@ -24,6 +24,32 @@ cpdef void sum_axis1_cython(double[:] totals,
           totals[i] += multiples[i, j]
 
 
+def sum_axis0(totals, multiples, cores):
+    cdef int c = cores
+    cdef double [:, :] totals_view = totals
+    cdef double [:, :, :] multiples_view = multiples
+
+    sum_axis0_cython(totals_view, multiples_view, c)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void sum_axis0_cython(double[:, :] totals,
+                            double[:, :, :] multiples,
+                            int cores) noexcept:
+  cdef long long i, j, t
+  cdef long long l = totals.shape[0]
+  cdef long long k = totals.shape[1]
+  cdef long long n = multiples.shape[0]
+
+  for i in prange(l, nogil=True, num_threads=cores):
+      for j in range(k):
+          totals[i, j] = 0
+          for t in range(n):
+              totals[i, j] += multiples[t, i, j]
+
+
 
 def sum_a_times_b_minus_c(array1, array2, array3, cores):
     cdef int c = cores
@@ -334,3 +360,131 @@ cpdef void aggregate_link_costs_cython(double[:] actual,
         k = crosswalk[i]
         if k < c_l:
             compressed[k] += actual[i]
+
+
+def class_flows(target, source, scale, class_totals, totals, first, cores):
+    cdef int c = cores
+    cdef double scl = float(scale)
+    cdef bint frst = first
+
+    cdef double [:, :] target_view = target
+    cdef double [:, :] source_view = source
+    cdef double [:] class_totals_view = class_totals
+    cdef double [:] totals_view = totals
+
+    class_flows_cython(target_view, source_view, scl, class_totals_view, totals_view, frst, c)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void class_flows_cython(double[:, :] target,
+                              double[:, :] source,
+                              double scale,
+                              double[:] class_totals,
+                              double[:] totals,
+                              bint first,
+                              int cores) noexcept:
+    # Scales (or copies) the loads of a class, sums its user classes and adds them to the total over all classes,
+    # all in a single pass over the links. The total is reset by the first class
+    cdef long long i, j
+    cdef double total
+    cdef long long l = target.shape[0]
+    cdef long long k = target.shape[1]
+
+    for i in prange(l, nogil=True, num_threads=cores):
+        total = 0
+        for j in range(k):
+            target[i, j] = source[i, j] * scale
+            total = total + target[i, j]
+        class_totals[i] = total
+        if first:
+            totals[i] = total
+        else:
+            totals[i] = totals[i] + total
+
+
+def conjugate_direction_terms(terms, derivative, direction, solution, aon, cores):
+    cdef int c = cores
+    cdef double [:] terms_view = terms
+
+    cdef double [:] derivative_view = derivative
+    cdef double [:] direction_view = direction
+    cdef double [:] solution_view = solution
+    cdef double [:] aon_view = aon
+
+    conjugate_direction_terms_cython(derivative_view, direction_view, solution_view, aon_view, terms_view, c)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void conjugate_direction_terms_cython(double[:] derivative,
+                                            double[:] direction,
+                                            double[:] solution,
+                                            double[:] aon,
+                                            double[:] terms,
+                                            int cores) noexcept:
+    # Numerator and denominator of the conjugate direction stepsize, computed on flows summed over all classes
+    cdef long long i
+    cdef double numerator = 0.0
+    cdef double denominator = 0.0
+    cdef long long l = derivative.shape[0]
+
+    for i in prange(l, nogil=True, num_threads=cores):
+        numerator += derivative[i] * (direction[i] - solution[i]) * (aon[i] - solution[i])
+        denominator += derivative[i] * (direction[i] - solution[i]) * (aon[i] - direction[i])
+
+    terms[0] = numerator
+    terms[1] = denominator
+
+
+def biconjugate_direction_terms(terms, derivative, direction, previous_direction, solution, aon, stepsize, cores):
+    cdef int c = cores
+    cdef double stpsz = float(stepsize)
+    cdef double [:] terms_view = terms
+
+    cdef double [:] derivative_view = derivative
+    cdef double [:] direction_view = direction
+    cdef double [:] previous_view = previous_direction
+    cdef double [:] solution_view = solution
+    cdef double [:] aon_view = aon
+
+    biconjugate_direction_terms_cython(
+        derivative_view, direction_view, previous_view, solution_view, aon_view, stpsz, terms_view, c
+    )
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void biconjugate_direction_terms_cython(double[:] derivative,
+                                              double[:] direction,
+                                              double[:] previous_direction,
+                                              double[:] solution,
+                                              double[:] aon,
+                                              double stepsize,
+                                              double[:] terms,
+                                              int cores) noexcept:
+    # Numerators and denominators of the biconjugate direction coefficients, computed on flows summed over all classes
+    cdef long long i
+    cdef double x, y, z
+    cdef double mu_numerator = 0.0
+    cdef double mu_denominator = 0.0
+    cdef double nu_numerator = 0.0
+    cdef double nu_denominator = 0.0
+    cdef long long l = derivative.shape[0]
+
+    for i in prange(l, nogil=True, num_threads=cores):
+        x = direction[i] * stepsize + previous_direction[i] * (1.0 - stepsize) - solution[i]
+        y = aon[i] - solution[i]
+        z = direction[i] - solution[i]
+        mu_numerator += derivative[i] * x * y
+        mu_denominator += derivative[i] * x * (previous_direction[i] - direction[i])
+        nu_numerator += derivative[i] * z * y
+        nu_denominator += derivative[i] * z * z
+
+    terms[0] = mu_numerator
+    terms[1] = mu_denominator
+    terms[2] = nu_numerator
+    terms[3] = nu_denominator
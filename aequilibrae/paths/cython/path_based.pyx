@@ -0,0 +1,297 @@
+"""
+Kernels for the path-based equilibrium assignment through gradient projection
+
+Jayakrishnan, R., Tsai, W.K., Prashker, J.N. and Rajadhyaksha, S. (1994) A faster path-based algorithm for traffic
+assignment. Transportation Research Record, 1443, pp. 75-83.
+
+Paths from an origin are kept in a column store on the compressed graph, where paths to destination *j* are the
+ones in *od_ptr[j]:od_ptr[j + 1]* and the links of path *p* are *path_links[path_ptr[p]:path_ptr[p + 1]]*, from
+origin to destination.
+"""
+
+cdef double PATH_FLOW_EPS = 1e-10
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef long long path_shortest_tree(long long origin,
+                                   long long zones,
+                                   bint block_centroids,
+                                   double [:] demand,
+                                   double [:] cost,
+                                   long long [:] fs,
+                                   long long [:] b_nodes,
+                                   long long [:] ids,
+                                   long long [:] temp_b_nodes,
+                                   long long [:] pred,
+                                   long long [:] conn,
+                                   long long [:] reached_first,
+                                   long long [:] tree_length) noexcept nogil:
+    """Shortest path tree from an origin. Returns the number of links in the paths to all destinations with demand"""
+    cdef long long i, node, total = 0
+
+    for i in range(b_nodes.shape[0]):
+        temp_b_nodes[i] = b_nodes[i]
+    if block_centroids:
+        blocking_centroid_flows(0, origin, zones, fs, temp_b_nodes, b_nodes)
+
+    path_finding(origin, -1, cost, temp_b_nodes, fs, pred, ids, conn, reached_first)
+
+    for i in range(zones):
+        tree_length[i] = 0
+        if i == origin or isnan(demand[i]) or demand[i] <= 0:
+            continue
+        node = i
+        while pred[node] >= 0:
+            tree_length[i] += 1
+            node = pred[node]
+        total += tree_length[i]
+    return total
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef inline double _path_cost(long long [:] path_ptr, int [:] path_links, long long p, double [:] cost) noexcept nogil:
+    cdef long long l
+    cdef double c = 0
+    for l in range(path_ptr[p], path_ptr[p + 1]):
+        c += cost[path_links[l]]
+    return c
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef inline void _shift_path_flow(long long [:] path_ptr,
+                                  int [:] path_links,
+                                  double [:] path_flow,
+                                  long long p,
+                                  double dx,
+                                  double [:] cost,
+                                  double [:] derivative,
+                                  double [:] class_flow) noexcept nogil:
+    cdef long long l
+    cdef int link
+    path_flow[p] += dx
+    for l in range(path_ptr[p], path_ptr[p + 1]):
+        link = path_links[l]
+        class_flow[link] += dx
+        cost[link] += derivative[link] * dx
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef long long path_equilibrate(long long origin,
+                                 long long zones,
+                                 double [:] demand,
+                                 long long [:] pred,
+                                 long long [:] conn,
+                                 long long [:] tree_length,
+                                 double [:] cost,
+                                 double [:] derivative,
+                                 double [:] class_flow,
+                                 long long [:] od_ptr,
+                                 long long [:] path_ptr,
+                                 int [:] path_links,
+                                 double [:] path_flow,
+                                 long long [:] new_od_ptr,
+                                 long long [:] new_path_ptr,
+                                 int [:] new_path_links,
+                                 double [:] new_path_flow,
+                                 long long [:] link_stamp,
+                                 int max_passes) noexcept nogil:
+    """Adds the shortest paths to the path set of an origin and shifts flows towards them (gradient projection).
+
+    The updated path set is written into the *new_* arrays, which must have room for all current paths plus the
+    shortest path to each destination. Paths left without flow are dropped. Link costs are updated with a first order
+    approximation while shifting flows. Returns the number of paths in the new path set.
+    """
+    cdef long long i, j, p, q, s, l, node, first, last, cursor = 0, n_paths = 0, stamp = 0
+    cdef double c_p, c_s, g, h, common, dx
+    cdef int passes
+    cdef bint duplicate
+
+    new_od_ptr[0] = 0
+    new_path_ptr[0] = 0
+    for i in range(link_stamp.shape[0]):
+        link_stamp[i] = -1
+
+    for j in range(zones):
+        first = n_paths
+        if tree_length[j] > 0:
+            # Copies the current paths to the destination
+            for p in range(od_ptr[j], od_ptr[j + 1]):
+                for l in range(path_ptr[p], path_ptr[p + 1]):
+                    new_path_links[cursor] = path_links[l]
+                    cursor += 1
+                new_path_flow[n_paths] = path_flow[p]
+                n_paths += 1
+                new_path_ptr[n_paths] = cursor
+
+            # Writes the shortest path from the tree at the end of the store, and keeps it if it is a new one
+            node = j
+            for l in range(tree_length[j] - 1, -1, -1):
+                new_path_links[cursor + l] = conn[node]
+                node = pred[node]
+
+            duplicate = False
+            for p in range(first, n_paths):
+                if new_path_ptr[p + 1] - new_path_ptr[p] != tree_length[j]:
+                    continue
+                duplicate = True
+                for l in range(tree_length[j]):
+                    if new_path_links[new_path_ptr[p] + l] != new_path_links[cursor + l]:
+                        duplicate = False
+                        break
+                if duplicate:
+                    break
+
+            if not duplicate:
+                cursor += tree_length[j]
+                new_path_flow[n_paths] = 0
+                n_paths += 1
+                new_path_ptr[n_paths] = cursor
+                if n_paths - first == 1:
+                    # New destination: its demand goes to the shortest path
+                    _shift_path_flow(new_path_ptr, new_path_links, new_path_flow, first, demand[j], cost,
+                                     derivative, class_flow)
+
+        last = n_paths
+        for passes in range(max_passes):
+            if last - first < 2:
+                break
+
+            s = first
+            c_s = _path_cost(new_path_ptr, new_path_links, s, cost)
+            for p in range(first + 1, last):
+                c_p = _path_cost(new_path_ptr, new_path_links, p, cost)
+                if c_p < c_s:
+                    s = p
+                    c_s = c_p
+
+            stamp += 1
+            for l in range(new_path_ptr[s], new_path_ptr[s + 1]):
+                link_stamp[new_path_links[l]] = stamp
+
+            for p in range(first, last):
+                if p == s or new_path_flow[p] <= 0:
+                    continue
+                c_p = _path_cost(new_path_ptr, new_path_links, p, cost)
+                c_s = _path_cost(new_path_ptr, new_path_links, s, cost)
+                g = c_p - c_s
+                if g <= 0:
+                    continue
+
+                # The second derivative only accounts for the links that are not shared by both paths
+                h = 0
+                common = 0
+                for l in range(new_path_ptr[p], new_path_ptr[p + 1]):
+                    h += derivative[new_path_links[l]]
+                    if link_stamp[new_path_links[l]] == stamp:
+                        common += derivative[new_path_links[l]]
+                for l in range(new_path_ptr[s], new_path_ptr[s + 1]):
+                    h += derivative[new_path_links[l]]
+                h -= 2 * common
+
+                dx = new_path_flow[p]
+                if h > 0 and g / h < dx:
+                    dx = g / h
+                _shift_path_flow(new_path_ptr, new_path_links, new_path_flow, p, -dx, cost, derivative, class_flow)
+                _shift_path_flow(new_path_ptr, new_path_links, new_path_flow, s, dx, cost, derivative, class_flow)
+
+        # Drops the paths without flow, moving their residuals to the shortest one
+        if last - first > 1:
+            s = first
+            for p in range(first + 1, last):
+                if new_path_flow[p] > new_path_flow[s]:
+                    s = p
+            for p in range(first, last):
+                if p != s and new_path_flow[p] <= PATH_FLOW_EPS:
+                    dx = new_path_flow[p]
+                    for l in range(new_path_ptr[p], new_path_ptr[p + 1]):
+                        class_flow[new_path_links[l]] -= dx
+                    for l in range(new_path_ptr[s], new_path_ptr[s + 1]):
+                        class_flow[new_path_links[l]] += dx
+                    new_path_flow[s] += dx
+                    new_path_flow[p] = -1
+
+            q = first
+            cursor = new_path_ptr[first]
+            for p in range(first, last):
+                if new_path_flow[p] < 0:
+                    continue
+                l = new_path_ptr[p]
+                node = new_path_ptr[p + 1]
+                new_path_flow[q] = new_path_flow[p]
+                while l < node:
+                    new_path_links[cursor] = new_path_links[l]
+                    cursor += 1
+                    l += 1
+                q += 1
+                new_path_ptr[q] = cursor
+            n_paths = q
+
+        new_od_ptr[j + 1] = n_paths
+    return n_paths
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void path_skims(long long zones,
+                      double [:, :] graph_skims,
+                      long long [:] od_ptr,
+                      long long [:] path_ptr,
+                      int [:] path_links,
+                      double [:] path_flow,
+                      double [:, :] final_skims) noexcept nogil:
+    """Skims from an origin to all destinations, averaged over its paths and weighted by their flows"""
+    cdef long long j, p, l, k
+    cdef long long skims = final_skims.shape[1]
+    cdef double total
+
+    for j in range(zones):
+        for k in range(skims):
+            final_skims[j, k] = 0
+        total = 0
+        for p in range(od_ptr[j], od_ptr[j + 1]):
+            total += path_flow[p]
+        if total <= 0:
+            continue
+        for p in range(od_ptr[j], od_ptr[j + 1]):
+            for l in range(path_ptr[p], path_ptr[p + 1]):
+                for k in range(skims):
+                    final_skims[j, k] += path_flow[p] / total * graph_skims[path_links[l], k]
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void path_select_link(long long zones,
+                            long long [:] od_ptr,
+                            long long [:] path_ptr,
+                            int [:] path_links,
+                            double [:] path_flow,
+                            unsigned char [:, :] link_set_mask,
+                            double [:, :] sl_od_matrix,
+                            double [:, :] sl_link_loading) noexcept nogil:
+    """Select link flows from the paths of an origin. Paths that use any of the links in a set are selected"""
+    cdef long long j, p, l, s
+    cdef long long sets = link_set_mask.shape[0]
+    cdef bint found
+
+    for j in range(zones):
+        for p in range(od_ptr[j], od_ptr[j + 1]):
+            for s in range(sets):
+                found = False
+                for l in range(path_ptr[p], path_ptr[p + 1]):
+                    if link_set_mask[s, path_links[l]]:
+                        found = True
+                        break
+                if not found:
+                    continue
+                sl_od_matrix[s, j] += path_flow[p]
+                for l in range(path_ptr[p], path_ptr[p + 1]):
+                    sl_link_loading[s, path_links[l]] += path_flow[p]
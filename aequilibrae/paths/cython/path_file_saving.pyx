@@ -2,6 +2,7 @@
 
 from libcpp.vector cimport vector
 from libcpp.string cimport string
+from libc.string cimport memcpy
 import importlib.util as iutil
 spec = iutil.find_spec("pyarrow")
 
@@ -16,6 +17,34 @@ import numpy as np
 cimport numpy as np
 np.import_array()
 
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+cdef void _path_file_data(long zones,
+                          long long [:] pred,
+                          long long [:] conn,
+                          vector[long long] &path_data,
+                          vector[long long] &size_of_path_arrays) noexcept nogil:
+
+    cdef long long node, predecessor, connector
+
+    for node in range(zones):
+        predecessor = pred[node]
+        # need to check if disconnected, also makes sure o==d is not included
+        if predecessor == -1:
+            size_of_path_arrays.push_back(<np.longlong_t> path_data.size())  # need to store index here
+            continue
+        connector = conn[node]
+        path_data.push_back(connector)
+        while predecessor != -1:
+            connector = conn[predecessor] # connector has to be looked up BEFORE predecessor update
+            predecessor = pred[predecessor]
+            if (predecessor != -1) and (connector != -1):
+                path_data.push_back(connector)
+
+        size_of_path_arrays.push_back(<np.longlong_t> path_data.size())
+
+
 @cython.wraparound(False)
 @cython.embedsignature(True)
 @cython.boundscheck(False) # turn of bounds-checking for entire function
@@ -28,7 +57,6 @@ cpdef void save_path_file(long origin_index,
                           string index_file,
                           bool write_feather) noexcept:
 
-    cdef long long class_, node, predecessor, connector, ctr
     cdef vector[long long] path_data
     # could make this an ndarray and not do the conversion, we know the size of the index array is zones
     cdef vector[long long] size_of_path_arrays
@@ -39,21 +67,7 @@ cpdef void save_path_file(long origin_index,
     cdef np.ndarray[np.longlong_t, ndim=1] numpy_array_ind
 
     with nogil:
-        for node in range(zones):
-            predecessor = pred[node]
-            # need to check if disconnected, also makes sure o==d is not included
-            if predecessor == -1:
-                size_of_path_arrays.push_back(<np.longlong_t> path_data.size())  # need to store index here
-                continue
-            connector = conn[node]
-            path_data.push_back(connector)
-            while predecessor != -1:
-                connector = conn[predecessor] # connector has to be looked up BEFORE predecessor update
-                predecessor = pred[predecessor]
-                if (predecessor != -1) and (connector != -1):
-                    path_data.push_back(connector)
-
-            size_of_path_arrays.push_back(<np.longlong_t> path_data.size())
+        _path_file_data(zones, pred, conn, path_data, size_of_path_arrays)
 
     # get a view on data underlying vector, then as numpy array. avoids copying.
     dims[0] = <np.npy_intp> (path_data.size())
@@ -67,3 +81,38 @@ cpdef void save_path_file(long origin_index,
     else:
         pq.write_table(pa.table({"data": numpy_array}), path_file.decode('utf-8'))
         pq.write_table(pa.table({"data": numpy_array_ind}), index_file.decode('utf-8'))
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False) # turn of bounds-checking for entire function
+cpdef void store_path_file(long origin_index,
+                           long zones,
+                           long long [:] pred,
+                           long long [:] conn,
+                           path_store) noexcept:
+    """Adds the paths from an origin to a path store, with the same data written to its path files"""
+
+    cdef vector[long long] path_data
+    cdef vector[long long] size_of_path_arrays
+
+    with nogil:
+        _path_file_data(zones, pred, conn, path_data, size_of_path_arrays)
+
+    links = np.empty(path_data.size(), dtype=np.int64)
+    index = np.empty(size_of_path_arrays.size(), dtype=np.int64)
+    cdef long long [:] links_view = links
+    cdef long long [:] index_view = index
+    if path_data.size() > 0:
+        memcpy(&links_view[0], path_data.data(), path_data.size() * sizeof(long long))
+    if size_of_path_arrays.size() > 0:
+        memcpy(&index_view[0], size_of_path_arrays.data(), size_of_path_arrays.size() * sizeof(long long))
+    path_store.add(origin_index, links, index)
+
+
+cpdef void store_tree(long origin_index,
+                      long long [:] pred,
+                      long long [:] conn,
+                      tree_store) noexcept:
+    """Adds the shortest path tree from an origin to a store of trees"""
+    tree_store.add(origin_index, np.array(pred, dtype=np.int64), np.array(conn, dtype=np.int64))
@@ -55,6 +55,11 @@ cdef struct PriorityQueue:
     Element* Elements  # array storing the elements
     DTYPE_t* keys
 
+cdef struct SearchWorkspace:
+    PriorityQueue pqueue  # heap kept allocated between searches
+    size_t* touched  # elements inserted in the heap since the last reset
+    size_t touched_size
+
 cdef void init_heap(PriorityQueue* pqueue, size_t length) noexcept nogil:
     """Initialize the binary heap.
 
@@ -331,3 +336,68 @@ cdef void _decrease_key_from_node_index(PriorityQueue* pqueue, size_t node_idx,
             i = j
         else:
             break
+
+
+cdef void init_workspace(SearchWorkspace* workspace, size_t length) noexcept nogil:
+    """Initialize a search workspace, to be reused by many searches.
+
+    Searches insert elements with *insert_touched*, so that *reset_workspace* only needs to reinitialize the
+    elements they inserted, and the cost of each search scales with the region it explored instead of the number
+    of elements.
+
+    input
+    =====
+    * SearchWorkspace* workspace : workspace with a 4-ary heap based priority queue
+    * size_t length : length (maximum size) of the heap
+    """
+    init_heap(&workspace.pqueue, length)
+    workspace.touched = <size_t*> malloc(length * sizeof(size_t))
+    workspace.touched_size = 0
+
+
+cdef void free_workspace(SearchWorkspace* workspace) noexcept nogil:
+    """Free a search workspace.
+
+    input
+    =====
+    * SearchWorkspace* workspace : workspace with a 4-ary heap based priority queue
+    """
+    free_heap(&workspace.pqueue)
+    free(workspace.touched)
+
+
+cdef void insert_touched(SearchWorkspace* workspace, size_t element_idx, DTYPE_t key) noexcept nogil:
+    """Insert an element into the heap of a workspace, recording it to be reset.
+
+    input
+    =====
+    * SearchWorkspace* workspace : workspace with a 4-ary heap based priority queue
+    * size_t element_idx : index of the element in the element array
+    * DTYPE_t key : key value of the element
+
+    assumptions
+    ===========
+    * the element pqueue.Elements[element_idx] is not in the heap
+    * its new key is smaller than INFINITY
+    """
+    if workspace.pqueue.Elements[element_idx].state == NOT_IN_HEAP:
+        workspace.touched[workspace.touched_size] = element_idx
+        workspace.touched_size += 1
+    insert(&workspace.pqueue, element_idx, key)
+
+
+cdef void reset_workspace(SearchWorkspace* workspace) noexcept nogil:
+    """Empty the heap of a workspace, reinitializing only the elements inserted since the last reset.
+
+    input
+    =====
+    * SearchWorkspace* workspace : workspace with a 4-ary heap based priority queue
+    """
+    cdef size_t i
+
+    for i in range(workspace.pqueue.size):
+        workspace.pqueue.A[i] = workspace.pqueue.length
+    workspace.pqueue.size = 0
+    for i in range(workspace.touched_size):
+        _initialize_element(&workspace.pqueue, workspace.touched[i])
+    workspace.touched_size = 0
@@ -16,6 +16,11 @@ cdef class RouteChoiceSet:
         long long [:] nodes_to_indices_view
         double [:] lat_view
         double [:] lon_view
+        double [:, :] from_landmarks_view
+        double [:, :] to_landmarks_view
+        long long [:] reverse_fs_view
+        long long [:] reverse_tails_view
+        long long [:] reverse_links_view
         long long [:] ids_graph_view
         long long [:] graph_compressed_id_view
         long long [:] compressed_link_ids
@@ -24,6 +29,7 @@ cdef class RouteChoiceSet:
         long long zones
         bint block_flows_through_centroids
         bint a_star
+        bint bidirectional
 
         unsigned int [:] mapping_idx
         unsigned int [:] mapping_data
@@ -39,7 +45,7 @@ cdef class RouteChoiceSet:
         long long [:] thread_predecessors,
         long long [:] thread_conn,
         long long [:] thread_b_nodes,
-        long long [:] thread_reached_first
+        void *workspace  # SearchWorkspace, defined in pq_4ary_heap.pyx
     ) noexcept nogil
 
     cdef void bfsle(
@@ -54,7 +60,7 @@ cdef class RouteChoiceSet:
         long long [:] thread_predecessors,
         long long [:] thread_conn,
         long long [:] thread_b_nodes,
-        long long [:] _thread_reached_first,
+        void *workspace,
         double penatly,
         unsigned int seed
     ) noexcept nogil
@@ -71,7 +77,7 @@ cdef class RouteChoiceSet:
         long long [:] thread_predecessors,
         long long [:] thread_conn,
         long long [:] thread_b_nodes,
-        long long [:] _thread_reached_first,
+        void *workspace,
         double penatly,
         unsigned int seed
     ) noexcept nogil
@@ -6,6 +6,7 @@ from aequilibrae.paths.cython.coo_demand cimport GeneralisedCOODemand
 from cython.operator cimport dereference as d
 from cython.parallel cimport parallel, prange, threadid
 from libc.limits cimport UINT_MAX
+from libc.stdlib cimport malloc, free
 from libc.string cimport memcpy
 from libcpp cimport nullptr
 from libcpp.algorithm cimport reverse, copy
@@ -129,8 +130,19 @@ cdef class RouteChoiceSet:
         # tmp = graph.lonlat_index.loc[graph.compact_all_nodes]
         # self.lat_view = tmp.lat.values
         # self.lon_view = tmp.lon.values
+        self.lat_view = self.lon_view = np.zeros(0, dtype=np.float64)
         self.a_star = False
 
+        # Landmarks are computed on the full graph. The costs between nodes of the compact graph are the same
+        self.from_landmarks_view = self.to_landmarks_view = np.zeros((0, 0), dtype=np.float64)
+        if graph.landmarks is not None and graph.landmarks.valid_for(graph):
+            idx = graph.nodes_to_indices[graph.compact_all_nodes]
+            self.from_landmarks_view = np.ascontiguousarray(graph.landmarks.from_landmarks[idx])
+            self.to_landmarks_view = np.ascontiguousarray(graph.landmarks.to_landmarks[idx])
+
+        self.bidirectional = False
+        self.reverse_fs_view, self.reverse_tails_view, self.reverse_links_view = graph.reverse_star(compact=True)
+
         self.ids_graph_view = graph.compact_graph.id.values
 
         # We explicitly don't want the links that have been removed from the graph
@@ -197,7 +209,8 @@ cdef class RouteChoiceSet:
             max_misses: int = 100,
             seed: int = 0,
             cores: int = 0,
-            a_star: bool = True,
+            a_star: bool = False,
+            bidirectional: bool = False,
             bfsle: bool = True,
             penalty: float = 1.0,
             where: Optional[str] = None,
@@ -223,6 +236,10 @@ cdef class RouteChoiceSet:
             **seed** (:obj:`int`): Seed used for rng. Must be non-negative. Default of ``0``.
             **cores** (:obj:`int`): Number of cores to use when parallelising over OD pairs. Must be non-negative.
                 Default of ``0`` for all available.
+            **a_star** (:obj:`bool`): Whether to find paths with A* and the landmarks heuristic, which requires
+                landmarks for the current costs of the graph (see ``Graph.prepare_landmarks``). Default ``False``.
+            **bidirectional** (:obj:`bool`): Whether to find paths with bidirectional Dijkstra's. Ignored if
+                ``a_star`` is ``True``. Default ``False``.
             **bfsle** (:obj:`bool`): Whether to use Breadth First Search with Link Removal (BFSLE) over link
                 penalisation. Default ``True``.
             **penalty** (:obj:`float`): Penalty to use for Link Penalisation and BFSLE with LP.
@@ -241,6 +258,9 @@ cdef class RouteChoiceSet:
         if max_routes < 0 or max_depth < 0:
             raise ValueError("`max_routes`, `max_depth`, and `cores` must be non-negative")
 
+        if a_star and self.from_landmarks_view.shape[1] == 0:
+            raise ValueError("A* requires landmarks for the current costs of the graph. See `Graph.prepare_landmarks`")
+
         if path_size_logit and beta < 0:
             raise ValueError("`beta` must be >= 0 for path sized logit model")
 
@@ -267,32 +287,26 @@ cdef class RouteChoiceSet:
             # A* (and Dijkstra's) require memory views, so we must allocate here and take slices. Python can handle this
             # memory
             double [:, :] cost_matrix = np.empty((c_cores, self.cost_view.shape[0]), dtype=float)
-            long long [:, :] predecessors_matrix = np.empty((c_cores, self.num_nodes + 1), dtype=np.int64)
-            long long [:, :] conn_matrix = np.empty((c_cores, self.num_nodes + 1), dtype=np.int64)
+            # Searches only reset the nodes the previous search of their thread touched, so all nodes start unreached
+            long long [:, :] predecessors_matrix = np.full((c_cores, self.num_nodes + 1), -1, dtype=np.int64)
+            long long [:, :] conn_matrix = np.full((c_cores, self.num_nodes + 1), -1, dtype=np.int64)
             long long [:, :] b_nodes_matrix = np.broadcast_to(
                 self.b_nodes_view,
                 (c_cores, self.b_nodes_view.shape[0])
             ).copy()
 
-            # This matrix is never read from, it exists to allow using the Dijkstra's method without changing the
-            # interface.
-            long long [:, :] _reached_first_matrix
-
             size_t max_results_len, j
 
-        # self.a_star = a_star
+        self.a_star = a_star
+        self.bidirectional = bidirectional
 
         pa.set_io_thread_count(c_cores)
 
-        if self.a_star:
-            _reached_first_matrix = np.zeros((c_cores, 1), dtype=np.int64)  # Dummy array to allow slicing
-        else:
-            _reached_first_matrix = np.zeros((c_cores, self.num_nodes + 1), dtype=np.int64)
-
         demand._initalise_c_data()
 
         cdef:
             RouteSet_t *route_set
+            SearchWorkspace *workspace
             shared_ptr[vector[double]] prob_vec
             int thread_id
 
@@ -311,6 +325,8 @@ cdef class RouteChoiceSet:
 
         with nogil, parallel(num_threads=c_cores):
             route_set = new RouteSet_t()
+            workspace = <SearchWorkspace *>malloc(sizeof(SearchWorkspace))
+            init_workspace(workspace, <size_t>(self.num_nodes + 1))
             thread_id = threadid()
             for i in prange(demand.ods.size()):
                 origin_index = self.nodes_to_indices_view[demand.ods[i].first]
@@ -342,7 +358,7 @@ cdef class RouteChoiceSet:
                         predecessors_matrix[thread_id],
                         conn_matrix[thread_id],
                         b_nodes_matrix[thread_id],
-                        _reached_first_matrix[thread_id],
+                        workspace,
                         penalty,
                         c_seed,
                     )
@@ -359,7 +375,7 @@ cdef class RouteChoiceSet:
                         predecessors_matrix[thread_id],
                         conn_matrix[thread_id],
                         b_nodes_matrix[thread_id],
-                        _reached_first_matrix[thread_id],
+                        workspace,
                         penalty,
                         c_seed,
                     )
@@ -387,6 +403,8 @@ cdef class RouteChoiceSet:
                     )
 
             del route_set
+            free_workspace(workspace)
+            free(workspace)
 
         self.get_results()
         if path_size_logit:
@@ -407,7 +425,7 @@ cdef class RouteChoiceSet:
         long long [:] thread_predecessors,
         long long [:] thread_conn,
         long long [:] thread_b_nodes,
-        long long [:] _thread_reached_first
+        void *workspace
     ) noexcept nogil:
         """Small wrapper around path finding, thread locals should be passes as arguments."""
         if self.a_star:
@@ -423,10 +441,28 @@ cdef class RouteChoiceSet:
                 thread_predecessors,
                 self.ids_graph_view,
                 thread_conn,
-                EQUIRECTANGULAR  # FIXME: enum import failing due to redefinition
+                LANDMARKS,
+                self.from_landmarks_view,
+                self.to_landmarks_view
+            )
+        elif self.bidirectional:
+            path_finding_bidirectional(
+                origin_index,
+                dest_index,
+                thread_cost,
+                thread_b_nodes,
+                self.graph_fs_view,
+                self.reverse_fs_view,
+                self.reverse_tails_view,
+                self.reverse_links_view,
+                thread_predecessors,
+                self.ids_graph_view,
+                thread_conn,
+                self.zones if self.block_flows_through_centroids else 0
             )
         else:
-            path_finding(
+            # A* and bidirectional searches reset all labels themselves, so the workspace only serves Dijkstra's
+            path_finding_sparse(
                 origin_index,
                 dest_index,
                 thread_cost,
@@ -435,7 +471,7 @@ cdef class RouteChoiceSet:
                 thread_predecessors,
                 self.ids_graph_view,
                 thread_conn,
-                _thread_reached_first
+                <SearchWorkspace *>workspace
             )
 
     @cython.boundscheck(False)
@@ -454,7 +490,7 @@ cdef class RouteChoiceSet:
         long long [:] thread_predecessors,
         long long [:] thread_conn,
         long long [:] thread_b_nodes,
-        long long [:] _thread_reached_first,
+        void *workspace,
         double penalty,
         unsigned int seed
     ) noexcept nogil:
@@ -523,7 +559,7 @@ cdef class RouteChoiceSet:
                     thread_predecessors,
                     thread_conn,
                     thread_b_nodes,
-                    _thread_reached_first
+                    workspace
                 )
 
                 # Mark this set of banned links as seen
@@ -608,7 +644,7 @@ cdef class RouteChoiceSet:
         long long [:] thread_predecessors,
         long long [:] thread_conn,
         long long [:] thread_b_nodes,
-        long long [:] _thread_reached_first,
+        void *workspace,
         double penalty,
         unsigned int seed
     ) noexcept nogil:
@@ -636,7 +672,7 @@ cdef class RouteChoiceSet:
                 thread_predecessors,
                 thread_conn,
                 thread_b_nodes,
-                _thread_reached_first
+                workspace
             )
 
             if thread_predecessors[dest_index] >= 0:
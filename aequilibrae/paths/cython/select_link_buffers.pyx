@@ -0,0 +1,103 @@
+cimport cython
+from libc.math cimport isnan
+from libc.string cimport memcpy
+from libcpp.vector cimport vector
+
+import numpy as np
+
+
+cdef class SelectLinkODBuffers:
+    """Per-thread buffers, in coordinate format, with the OD pairs whose paths use each set of selected links
+
+    Each thread only appends to its own buffers, so no locking is needed. OD pairs are stored by their key
+    *origin * zones + destination*, followed by their demand for all classes. Buffers keep their capacity when
+    cleared, so consecutive assignments (such as the iterations of an equilibrium assignment) do not reallocate them.
+
+    :Arguments:
+        **threads** (:obj:`int`): Number of threads that append to the buffers
+
+        **sets** (:obj:`int`): Number of sets of selected links
+
+        **zones** (:obj:`int`): Number of zones
+
+        **classes** (:obj:`int`): Number of classes in the demand matrix
+    """
+    cdef:
+        vector[vector[long long]] keys
+        vector[vector[double]] values
+        long long threads, sets, zones, classes
+
+    def __init__(self, int threads, long long sets, long long zones, long long classes):
+        self.threads = threads
+        self.sets = sets
+        self.zones = zones
+        self.classes = classes
+        self.keys.resize(threads * sets)
+        self.values.resize(threads * sets)
+
+    def clear(self):
+        """Empties all buffers, keeping the memory they have"""
+        cdef size_t i
+        for i in range(self.keys.size()):
+            self.keys[i].clear()
+            self.values[i].clear()
+
+    @cython.wraparound(False)
+    @cython.boundscheck(False)
+    cdef void append(self, int thread_id, long long link_set, long long origin, long long destination,
+                     double [:, :] demand) noexcept nogil:
+        """Adds an OD pair to the buffer of a thread and set of links. OD pairs without demand are skipped"""
+        cdef long long k, buffer = thread_id * self.sets + link_set
+        cdef bint has_demand = False
+
+        for k in range(self.classes):
+            if demand[destination, k] != 0 and not isnan(demand[destination, k]):
+                has_demand = True
+        if not has_demand:
+            return
+
+        self.keys[buffer].push_back(origin * self.zones + destination)
+        for k in range(self.classes):
+            self.values[buffer].push_back(demand[destination, k])
+
+    def merge(self, long long link_set):
+        """OD pairs of a set of links appended by all threads
+
+        :Arguments:
+            **link_set** (:obj:`int`): Position of the set of links
+
+        :Returns:
+            **keys** (:obj:`np.ndarray`): Sorted keys of the OD pairs
+
+            **values** (:obj:`np.ndarray`): Demand of all classes for each OD pair
+        """
+        cdef long long t, buffer, size, total = 0
+        for t in range(self.threads):
+            total += self.keys[t * self.sets + link_set].size()
+
+        keys = np.empty(total, dtype=np.int64)
+        values = np.empty((total, self.classes), dtype=np.float64)
+        cdef long long [:] keys_view = keys
+        cdef double [:, :] values_view = values
+
+        # Each OD pair is assigned by a single thread, so there are no repeated keys to sum
+        cdef long long position = 0
+        for t in range(self.threads):
+            buffer = t * self.sets + link_set
+            size = self.keys[buffer].size()
+            if size == 0:
+                continue
+            memcpy(&keys_view[position], self.keys[buffer].data(), size * sizeof(long long))
+            memcpy(&values_view[position, 0], self.values[buffer].data(), size * self.classes * sizeof(double))
+            position += size
+
+        order = np.argsort(keys, kind="stable")
+        return keys[order], values[order]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory currently reserved by the buffers"""
+        cdef size_t i, total = 0
+        for i in range(self.keys.size()):
+            total += self.keys[i].capacity() * sizeof(long long) + self.values[i].capacity() * sizeof(double)
+        return total
@@ -0,0 +1,168 @@
+"""
+Select link and select zone analysis of a finished assignment, replayed over the shortest path trees it stored
+
+The select link results of an equilibrium assignment are a weighted sum of the select link results of the
+all-or-nothing assignments of its iterations, with weights given by their step sizes. Each stored tree is loaded
+once, with the sum of the weights of all iterations in which it was the shortest path tree of its origin.
+"""
+from cython.parallel cimport parallel, prange, threadid
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+def replay_select_links(origins,
+                        weights,
+                        predecessors,
+                        connectors,
+                        demand,
+                        selected_links,
+                        origin_mask,
+                        destination_mask,
+                        sl_od_matrix,
+                        sl_link_loading,
+                        has_flow_mask,
+                        int cores):
+    """Adds the weighted select link results of a set of shortest path trees
+
+    :Arguments:
+        **origins** (:obj:`np.ndarray`): Index of the origin of each tree
+
+        **weights** (:obj:`np.ndarray`): Weight of each tree
+
+        **predecessors** (:obj:`np.ndarray`): Predecessors of each node in each tree, with one row per tree
+
+        **connectors** (:obj:`np.ndarray`): Link that reaches each node in each tree, with one row per tree
+
+        **demand** (:obj:`np.ndarray`): Demand matrix, with origins, destinations and classes as its dimensions
+
+        **selected_links** (:obj:`np.ndarray`): Links of each set, padded with -1. Sets without links take all paths
+
+        **origin_mask** (:obj:`np.ndarray`): Whether each origin is selected in each set
+
+        **destination_mask** (:obj:`np.ndarray`): Whether each destination is selected in each set
+
+        **sl_od_matrix** (:obj:`np.ndarray`): OD matrix of each set, added to
+
+        **sl_link_loading** (:obj:`np.ndarray`): Link loads of each set, for each thread, added to
+
+        **has_flow_mask** (:obj:`np.ndarray`): Work array with one row of links per thread, all zeros
+
+        **cores** (:obj:`int`): Number of threads
+    """
+    cdef long long [:] origins_view = origins
+    cdef double [:] weights_view = weights
+    cdef long long [:, :] predecessors_view = predecessors
+    cdef long long [:, :] connectors_view = connectors
+    cdef double [:, :, :] demand_view = demand
+    cdef long long [:, :] selected_links_view = selected_links
+    cdef unsigned char [:, :] origin_mask_view = origin_mask
+    cdef unsigned char [:, :] destination_mask_view = destination_mask
+    cdef double [:, :, :, :] sl_od_matrix_view = sl_od_matrix
+    cdef double [:, :, :, :] sl_link_loading_view = sl_link_loading
+    cdef unsigned char [:, :] has_flow_mask_view = has_flow_mask
+
+    replay_select_links_cython(origins_view, weights_view, predecessors_view, connectors_view, demand_view,
+                               selected_links_view, origin_mask_view, destination_mask_view, sl_od_matrix_view,
+                               sl_link_loading_view, has_flow_mask_view, cores)
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cpdef void replay_select_links_cython(long long [:] origins,
+                                      double [:] weights,
+                                      long long [:, :] pred,
+                                      long long [:, :] conn,
+                                      double [:, :, :] demand,
+                                      long long [:, :] selected_links,
+                                      unsigned char [:, :] origin_mask,
+                                      unsigned char [:, :] destination_mask,
+                                      double [:, :, :, :] sl_od_matrix,
+                                      double [:, :, :, :] sl_link_loading,
+                                      unsigned char [:, :] has_flow_mask,
+                                      int cores) noexcept:
+    cdef long long i
+    cdef int thread_id
+
+    # Each origin is replayed by a single thread, so their rows of the OD matrices are never written concurrently
+    with nogil, parallel(num_threads=cores):
+        thread_id = threadid()
+        for i in prange(origins.shape[0], schedule="dynamic"):
+            _replay_origin(origins[i],
+                           weights[i],
+                           pred[i],
+                           conn[i],
+                           demand[origins[i]],
+                           selected_links,
+                           origin_mask,
+                           destination_mask,
+                           sl_od_matrix,
+                           sl_link_loading[thread_id],
+                           has_flow_mask[thread_id])
+
+
+@cython.wraparound(False)
+@cython.embedsignature(True)
+@cython.boundscheck(False)
+cdef void _replay_origin(long long origin,
+                         double weight,
+                         long long [:] pred,
+                         long long [:] conn,
+                         double [:, :] demand,
+                         long long [:, :] selected_links,
+                         unsigned char [:, :] origin_mask,
+                         unsigned char [:, :] destination_mask,
+                         double [:, :, :, :] sl_od_matrix,
+                         double [:, :, :] sl_link_loading,
+                         unsigned char [:] has_flow_mask) noexcept nogil:
+    cdef long long j, s, l, k, predecessor, connection
+    cdef long long classes = demand.shape[1], sets = selected_links.shape[0], width = selected_links.shape[1]
+    cdef bint found, has_demand
+
+    for j in range(demand.shape[0]):
+        # Destinations not reached (and the origin itself) have no path
+        if pred[j] < 0:
+            continue
+        has_demand = False
+        for k in range(classes):
+            if demand[j, k] != 0:
+                has_demand = True
+        if not has_demand:
+            continue
+
+        connection = conn[j]
+        predecessor = pred[j]
+        while predecessor >= 0:
+            has_flow_mask[connection] = 1
+            connection = conn[predecessor]
+            predecessor = pred[predecessor]
+
+        for s in range(sets):
+            if origin_mask[s, origin] == 0 or destination_mask[s, j] == 0:
+                continue
+            found = width == 0 or selected_links[s, 0] == -1
+            l = 0
+            while not found and l < width and selected_links[s, l] != -1:
+                found = has_flow_mask[selected_links[s, l]] != 0
+                l += 1
+            if not found:
+                continue
+
+            for k in range(classes):
+                sl_od_matrix[s, origin, j, k] += weight * demand[j, k]
+            connection = conn[j]
+            predecessor = pred[j]
+            while predecessor >= 0:
+                for k in range(classes):
+                    sl_link_loading[s, connection, k] += weight * demand[j, k]
+                connection = conn[predecessor]
+                predecessor = pred[predecessor]
+
+        # Only the links of this path were marked, so only they need to be cleared
+        connection = conn[j]
+        predecessor = pred[j]
+        while predecessor >= 0:
+            has_flow_mask[connection] = 0
+            connection = conn[predecessor]
+            predecessor = pred[predecessor]
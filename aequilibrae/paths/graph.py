@@ -110,6 +110,9 @@ class GraphBase(ABC):  # noqa: B024
         self.block_centroid_flows = True
         self.penalty_through_centroids = np.inf
 
+        self.landmarks = None  # Landmarks for the landmarks heuristic of A*
+        self._reverse_stars = {}  # Backward stars of the graph and of the compact graph, built when first needed
+
         self.centroids = None  # NumPy array of centroid IDs
 
         self.g_link_crosswalk = np.array([])  # 4 a link ID in the BIG graph, a corresponding link in the compressed 1
@@ -195,6 +198,8 @@ class GraphBase(ABC):  # noqa: B024
         self.compressed_link_network_mapping_idx = None
         self.compressed_link_network_mapping_data = None
         self.network_compressed_node_mapping = None
+        self.landmarks = None
+        self._reverse_stars = {}
 
     def __build_compressed_graph(self):
         build_compressed_graph(self)
@@ -410,6 +415,51 @@ class GraphBase(ABC):  # noqa: B024
             return
         self.block_centroid_flows = block_centroid_flows
 
+    def reverse_star(self, compact: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Backward star of the graph, with the links into each node, for searches from the destination of paths
+
+        It is built the first time it is requested after the graph is prepared.
+
+        :Arguments:
+            **compact** (:obj:`bool`, *Optional*): Whether to return the backward star of the compact graph.
+            Defaults to ``False``
+
+        :Returns:
+            **reverse_fs** (:obj:`np.ndarray`): Position of the first link into each node
+
+            **reverse_tails** (:obj:`np.ndarray`): Node each link comes from
+
+            **reverse_links** (:obj:`np.ndarray`): Position of each link in the graph
+        """
+        if compact not in self._reverse_stars:
+            graph, nodes = (self.compact_graph, self.compact_num_nodes) if compact else (self.graph, self.num_nodes)
+            heads = graph.b_node.to_numpy()
+            links = np.argsort(heads, kind="stable").astype(self.__integer_type)
+            reverse_fs = np.zeros(nodes + 1, dtype=self.__integer_type)
+            np.cumsum(np.bincount(heads, minlength=nodes), out=reverse_fs[1:])
+            reverse_tails = graph.a_node.to_numpy()[links].astype(self.__integer_type)
+            self._reverse_stars[compact] = (reverse_fs, reverse_tails, links)
+        return self._reverse_stars[compact]
+
+    def prepare_landmarks(self, landmarks: int = 16, cost_field: Optional[str] = None, seed: int = 0) -> None:
+        """
+        Computes the costs to and from a set of landmark nodes, for the landmarks heuristic of A*
+
+        Landmarks are saved with the graph, and remain valid for any costs not lower than the ones they were computed
+        with. They are discarded when the graph is prepared again.
+
+        :Arguments:
+            **landmarks** (:obj:`int`, *Optional*): Number of landmarks. Defaults to 16
+
+            **cost_field** (:obj:`str`, *Optional*): Field with the link costs. Defaults to the current cost field
+
+            **seed** (:obj:`int`, *Optional*): Seed for the choice of landmarks. Defaults to 0
+        """
+        from aequilibrae.paths.landmarks import Landmarks
+
+        self.landmarks = Landmarks(self, landmarks, cost_field, seed)
+
     # Procedure to pickle graph and save to disk
     def save_to_disk(self, filename: str) -> None:
         """
@@ -436,6 +486,7 @@ class GraphBase(ABC):  # noqa: B024
         mygraph["centroids"] = self.centroids
         mygraph["graph_id"] = self._id
         mygraph["mode"] = self.mode
+        mygraph["landmarks"] = self.landmarks
 
         with open(filename, "wb") as f:
             pickle.dump(mygraph, f)
@@ -466,6 +517,8 @@ class GraphBase(ABC):  # noqa: B024
             self.centroids = mygraph["centroids"]
             self._id = mygraph["graph_id"]
             self.mode = mygraph["mode"]
+            self.landmarks = mygraph.get("landmarks")
+            self._reverse_stars = {}
         self.__build_derived_properties()
 
     def __build_derived_properties(self):
@@ -0,0 +1,98 @@
+from typing import Optional
+
+import numpy as np
+
+from aequilibrae import global_logger
+
+try:
+    from aequilibrae.paths.AoN import path_finding_distances
+except ImportError as ie:
+    global_logger.warning(f"Could not import procedures from the binary. {ie.args}")
+
+
+class Landmarks:
+    """Costs to and from a set of landmark nodes, used by the landmarks (ALT) heuristic of A*
+
+    By the triangle inequality, the cost of the shortest path from a node to a destination is at least the difference
+    between their costs to (or from) any landmark. The best of these bounds guides A* towards the destination much
+    better than straight line distances do, and does so for any non-negative cost, such as travel times.
+
+    Paths remain exact while the costs of the graph are not lower than the costs the landmarks were computed with, so
+    landmarks computed with free flow travel times can be used with congested travel times as well.
+
+    Landmarks are chosen by farthest selection: each landmark is the node with the highest round trip cost to the
+    landmarks already chosen. Landmarks are created with *Graph.prepare_landmarks*, and saved with the graph.
+
+    :Arguments:
+        **graph** (:obj:`Graph`): Prepared graph
+
+        **landmarks** (:obj:`int`, *Optional*): Number of landmarks. Defaults to 16
+
+        **cost_field** (:obj:`str`, *Optional*): Field with the link costs. Defaults to the cost field of the graph
+
+        **seed** (:obj:`int`, *Optional*): Seed for the choice of the node the selection starts from. Defaults to 0
+    """
+
+    def __init__(self, graph, landmarks: int = 16, cost_field: Optional[str] = None, seed: int = 0):
+        if landmarks <= 0:
+            raise ValueError("The number of landmarks must be positive")
+        if cost_field is None:
+            if not graph.cost_field:
+                raise ValueError("Graph has no cost field. Use graph.set_graph or pass a cost field")
+            cost_field = graph.cost_field
+        if cost_field not in graph.graph.columns:
+            raise ValueError(f"{cost_field} is not a field of the graph")
+
+        cost = graph.graph[cost_field].to_numpy(dtype=np.float64, copy=True)
+        if np.any(cost < 0):
+            raise ValueError("Landmarks require non-negative costs")
+
+        self.cost_field = cost_field
+        self.cost = cost
+        self.graph_id = graph._id
+        self.all_nodes = np.array(graph.all_nodes, copy=True)
+
+        # Rows for all nodes, plus the extra position path computation arrays have
+        nodes = graph.num_nodes + 1
+        tails = graph.graph.a_node.to_numpy(dtype=np.int64)
+        heads = graph.graph.b_node.to_numpy(dtype=np.int64)
+        forward = (graph.fs.astype(np.int64), heads, cost)
+        order = np.argsort(heads, kind="stable")
+        backward_fs = np.zeros(nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=nodes), out=backward_fs[1:])
+        backward = (backward_fs, tails[order].copy(), cost[order].copy())
+
+        landmarks = min(landmarks, graph.num_nodes)
+        self.nodes = np.zeros(landmarks, dtype=np.int64)
+        self.from_landmarks = np.empty((nodes, landmarks), dtype=np.float64)
+        self.to_landmarks = np.empty((nodes, landmarks), dtype=np.float64)
+
+        distances = np.empty(nodes, dtype=np.float64)
+        round_trip = np.full(nodes, np.inf)
+        round_trip[graph.num_nodes] = -np.inf
+        start = np.random.default_rng(seed).integers(graph.num_nodes)
+        path_finding_distances(start, forward[2], forward[1], forward[0], distances)
+        # The selection starts from the node farthest from a random one, or from one it does not reach
+        landmark = int(np.argmax(distances[:-1]))
+        for k in range(landmarks):
+            self.nodes[k] = landmark
+            path_finding_distances(landmark, forward[2], forward[1], forward[0], self.from_landmarks[:, k])
+            path_finding_distances(landmark, backward[2], backward[1], backward[0], self.to_landmarks[:, k])
+            np.minimum(round_trip, self.from_landmarks[:, k] + self.to_landmarks[:, k], out=round_trip)
+            round_trip[self.nodes[: k + 1]] = -np.inf
+            landmark = int(np.argmax(round_trip))
+
+    def valid_for(self, graph) -> bool:
+        """Whether the landmarks give exact paths with the current costs of a graph
+
+        :Arguments:
+            **graph** (:obj:`Graph`): Graph the landmarks were computed for
+
+        :Returns:
+            **valid** (:obj:`bool`): True if it is the same graph, and none of its costs are lower than the costs
+            the landmarks were computed with
+        """
+        if graph._id != self.graph_id or not np.array_equal(graph.all_nodes, self.all_nodes):
+            return False
+        cost = np.asarray(graph.cost, dtype=np.float64)
+        return cost.shape == self.cost.shape and bool(np.all(cost >= self.cost))
@@ -3,17 +3,25 @@ import os
 from functools import partial
 from pathlib import Path
 from tempfile import gettempdir
+from time import monotonic
 from typing import List, Dict
 
 import numpy as np
-from aequilibrae.paths.AoN import copy_two_dimensions, copy_three_dimensions
+from aequilibrae.paths.AoN import copy_one_dimension, copy_two_dimensions, copy_three_dimensions
 from aequilibrae.paths.AoN import linear_combination, linear_combination_skims, aggregate_link_costs
-from aequilibrae.paths.AoN import sum_a_times_b_minus_c, linear_combination_1d
+from aequilibrae.paths.AoN import sum_a_times_b_minus_c
 from aequilibrae.paths.AoN import triple_linear_combination, triple_linear_combination_skims
+from aequilibrae.paths.AoN import class_flows, conjugate_direction_terms, biconjugate_direction_terms
 from scipy.optimize import root_scalar
 
-from aequilibrae.paths.all_or_nothing import allOrNothing
+from aequilibrae.matrix import AequilibraeMatrix, SparseDemand
+from aequilibrae.paths.all_or_nothing import allOrNothing, demand_csr, execute_concurrently
+from aequilibrae.paths.assignment_checkpoint import read_checkpoint, write_checkpoint
+from aequilibrae.paths.network_skimming import NetworkSkimming
+from aequilibrae.paths.path_store import PathStoreWriter, TREE_COLUMNS, path_store_file
+from aequilibrae.paths.select_link_replay import tree_store_file, write_tree_manifest
 from aequilibrae.paths.results import AssignmentResults
+from aequilibrae.paths.results.select_link_od import SparseODMatrix
 from aequilibrae.paths.traffic_class import TrafficClass
 
 if False:
@@ -70,6 +78,7 @@ class LinearApproximation:
         self.procedure_id = assig_spec.procedure_id
 
         self.iter = 0
+        self.__first_iteration = 1
         self.rgap = np.inf
         self.stepsize = 1.0
         self.conjugate_stepsize = 0.0
@@ -91,6 +100,14 @@ class LinearApproximation:
         # BFW specific stuff
         self.betas = np.array([1.0, 0.0, 0.0])
 
+        # Direction of each iteration, kept with the shortest path trees to replay select link analysis from them
+        self.__step = {}
+        self.tree_steps = []
+        self.__tree_origins = {}
+
+        # Weight in the current solution of the iterations whose skims are not part of the blended skims yet
+        self.__unskimmed_weight = 1.0
+
         # Instantiates the arrays that we will use over and over
         self.capacity = assig_spec.capacity
 
@@ -104,14 +121,18 @@ class LinearApproximation:
         self.fw_total_flow = assig_spec.total_flow
         self.congested_time = assig_spec.congested_time
         self.vdf_der = np.array(assig_spec.congested_time, copy=True)
-        self.congested_value = np.array(assig_spec.congested_time, copy=True)
 
         self.step_direction = {}  # type: Dict[AssignmentResults]
         self.previous_step_direction = {}  # type: Dict[AssignmentResults]
         self.temp_step_direction_for_copy = {}  # type: Dict[AssignmentResults]
 
         self.aons = {}
+        self._aon_runs = []
 
+        self._prepare_step_directions()
+
+    def _prepare_step_directions(self):
+        """Sizes the result containers for the descent directions"""
         for c in self.traffic_classes:
             r = AssignmentResults()
             r.prepare(c.graph, c.matrix)
@@ -127,28 +148,16 @@ class LinearApproximation:
                     d[c._id] = r
 
     def calculate_conjugate_stepsize(self):
-        self.vdf.apply_derivative(
-            self.vdf_der, self.fw_total_flow, self.capacity, self.free_flow_tt, *self.vdf_parameters, self.cores
+        # Flows of all classes add up in the products of the flow differences, so they are computed on the totals
+        conjugate_direction_terms(
+            self.direction_terms,
+            self.vdf_der,
+            self.step_direction_flow,
+            self.class_flow,
+            self.aon_total_flow,
+            self.cores,
         )
-        numerator = 0.0
-        denominator = 0.0
-        prev_dir_minus_current_sol = {}
-        aon_minus_current_sol = {}
-        aon_minus_prev_dir = {}
-
-        for c in self.traffic_classes:
-            stp_dir = self.step_direction[c._id]
-            prev_dir_minus_current_sol[c._id] = np.sum(stp_dir.link_loads[:, :] - c.results.link_loads[:, :], axis=1)
-            aon_minus_current_sol[c._id] = np.sum(c._aon_results.link_loads[:, :] - c.results.link_loads[:, :], axis=1)
-            aon_minus_prev_dir[c._id] = np.sum(c._aon_results.link_loads[:, :] - stp_dir.link_loads[:, :], axis=1)
-
-        for c_0 in self.traffic_classes:
-            for c_1 in self.traffic_classes:
-                numerator += prev_dir_minus_current_sol[c_0._id] * aon_minus_current_sol[c_1._id]
-                denominator += prev_dir_minus_current_sol[c_0._id] * aon_minus_prev_dir[c_1._id]
-
-        numerator = np.sum(numerator * self.vdf_der)
-        denominator = np.sum(denominator * self.vdf_der)
+        numerator, denominator = self.direction_terms[0], self.direction_terms[1]
 
         alpha = numerator / denominator
         if alpha < 0.0:
@@ -165,46 +174,23 @@ class LinearApproximation:
         self.betas[2] = 0.0
 
     def calculate_biconjugate_direction(self):
-        self.vdf.apply_derivative(
-            self.vdf_der, self.fw_total_flow, self.capacity, self.free_flow_tt, *self.vdf_parameters, self.cores
+        biconjugate_direction_terms(
+            self.direction_terms,
+            self.vdf_der,
+            self.step_direction_flow,
+            self.previous_step_direction_flow,
+            self.class_flow,
+            self.aon_total_flow,
+            self.stepsize,
+            self.cores,
         )
-        mu_numerator = 0.0
-        mu_denominator = 0.0
-        nu_nom = 0.0
-        nu_denom = 0.0
-
-        w_ = {}
-        x_ = {}
-        y_ = {}
-        z_ = {}
-
-        for c in self.traffic_classes:
-            sd = self.step_direction[c._id].link_loads[:, :]
-            psd = self.previous_step_direction[c._id].link_loads[:, :]
-            ll = c.results.link_loads[:, :]
-
-            x_[c._id] = np.sum(sd * self.stepsize + psd * (1.0 - self.stepsize) - ll, axis=1)
-            y_[c._id] = np.sum(c._aon_results.link_loads[:, :] - ll, axis=1)
-            z_[c._id] = np.sum(sd - ll, axis=1)
-            w_[c._id] = np.sum(psd - sd, axis=1)
-
-        for c_0 in self.traffic_classes:
-            for c_1 in self.traffic_classes:
-                mu_numerator += x_[c_0._id] * y_[c_1._id]
-                mu_denominator += x_[c_0._id] * w_[c_1._id]
-                nu_nom += z_[c_0._id] * y_[c_1._id]
-                nu_denom += z_[c_0._id] * z_[c_1._id]
-
-        mu_numerator = np.sum(mu_numerator * self.vdf_der)
-        mu_denominator = np.sum(mu_denominator * self.vdf_der)
+        mu_numerator, mu_denominator, nu_nom, nu_denom = self.direction_terms
         if mu_denominator == 0.0:
             mu = 0.0
         else:
             mu = -mu_numerator / mu_denominator
             mu = max(0.0, mu)
 
-        nu_nom = np.sum(nu_nom * self.vdf_der)
-        nu_denom = np.sum(nu_denom * self.vdf_der)
         if nu_denom == 0.0:
             nu = 0.0
         else:
@@ -217,55 +203,54 @@ class LinearApproximation:
 
     def __calculate_step_direction(self):
         """Calculates step direction depending on the method"""
-        sd_flows = []
-
         # 2nd iteration is a fw step. if the previous step replaced the aggregated
         # solution so far, we need to start anew.
         if self.iter == 2 or self.stepsize == 1.0 or self.do_fw_step or self.algorithm in ["msa", "frank-wolfe"]:
             self.do_fw_step = False
             self.do_conjugate_step = True
             self.conjugate_stepsize = 0.0
-            for c in self.traffic_classes:
+            self.__step = {"direction": "fw", "coefficients": []}
+            for i, c in enumerate(self.traffic_classes):
                 aon_res = c._aon_results
                 stp_dir_res = self.step_direction[c._id]
-                copy_two_dimensions(stp_dir_res.link_loads, aon_res.link_loads, self.cores)
-                stp_dir_res.total_flows()
-                if c.results.num_skims > 0:
+                class_flows(
+                    stp_dir_res.link_loads,
+                    aon_res.link_loads,
+                    1.0,
+                    stp_dir_res.total_link_loads,
+                    self.step_direction_flow,
+                    i == 0,
+                    self.cores,
+                )
+                if self.__blend_skims(c):
                     copy_three_dimensions(stp_dir_res.skims.matrix_view, aon_res.skims.matrix_view, self.cores)
-                sd_flows.append(aon_res.total_link_loads)
 
                 if c._selected_links:
-                    aux_res = self.aons[c._id].aux_res
                     for name, idx in c._aon_results._selected_links.items():
                         copy_two_dimensions(
-                            self.sl_step_dir_ll[c._id][name]["sdr"],
-                            np.sum(aux_res.temp_sl_link_loading, axis=0)[idx, :, :],
-                            self.cores,
-                        )
-                        copy_three_dimensions(
-                            self.sl_step_dir_od[c._id][name]["sdr"],
-                            np.sum(aux_res.temp_sl_od_matrix, axis=0)[idx, :, :, :],
-                            self.cores,
+                            self.sl_step_dir_ll[c._id][name]["sdr"], self.sl_aon_ll[c._id][idx], self.cores
                         )
+                        self.__copy_sl_od(self.sl_step_dir_od[c._id][name]["sdr"], self.sl_aon_od[c._id][idx])
 
         # 3rd iteration is cfw. also, if we had to reset direction search we need a cfw step before bfw
         elif (self.iter == 3) or (self.do_conjugate_step) or (self.algorithm == "cfw"):
             self.do_conjugate_step = False
             self.calculate_conjugate_stepsize()
-            for c in self.traffic_classes:
+            self.__step = {"direction": "conjugate", "coefficients": [self.conjugate_stepsize]}
+            copy_one_dimension(self.previous_step_direction_flow, self.step_direction_flow, self.cores)
+            for i, c in enumerate(self.traffic_classes):
                 sdr = self.step_direction[c._id]
                 previous = self.previous_step_direction[c._id]
 
                 copy_two_dimensions(previous.link_loads, sdr.link_loads, self.cores)
-                previous.total_flows()
-                if c.results.num_skims > 0:
+                if self.__blend_skims(c):
                     copy_three_dimensions(previous.skims.matrix_view, sdr.skims.matrix_view, self.cores)
 
                 linear_combination(
                     sdr.link_loads, sdr.link_loads, c._aon_results.link_loads, self.conjugate_stepsize, self.cores
                 )
 
-                if c.results.num_skims > 0:
+                if self.__blend_skims(c):
                     linear_combination_skims(
                         sdr.skims.matrix_view,
                         sdr.skims.matrix_view,
@@ -275,7 +260,6 @@ class LinearApproximation:
                     )
 
                 if c._selected_links:
-                    aux_res = self.aons[c._id].aux_res
                     for name, idx in c._aon_results._selected_links.items():
                         sl_step_dir_ll = self.sl_step_dir_ll[c._id][name]
                         sl_step_dir_od = self.sl_step_dir_od[c._id][name]
@@ -285,42 +269,45 @@ class LinearApproximation:
                             sl_step_dir_ll["sdr"],
                             self.cores,
                         )
-                        copy_three_dimensions(
-                            sl_step_dir_od["prev_sdr"],
-                            sl_step_dir_od["sdr"],
-                            self.cores,
-                        )
+                        self.__copy_sl_od(sl_step_dir_od["prev_sdr"], sl_step_dir_od["sdr"])
 
                         linear_combination(
                             sl_step_dir_ll["sdr"],
                             sl_step_dir_ll["sdr"],
-                            np.sum(aux_res.temp_sl_link_loading, axis=0)[idx, :, :],
+                            self.sl_aon_ll[c._id][idx],
                             self.conjugate_stepsize,
                             self.cores,
                         )
 
-                        linear_combination_skims(
+                        self.__linear_combination_sl_od(
                             sl_step_dir_od["sdr"],
                             sl_step_dir_od["sdr"],
-                            np.sum(aux_res.temp_sl_od_matrix, axis=0)[idx, :, :, :],
+                            self.sl_aon_od[c._id][idx],
                             self.conjugate_stepsize,
-                            self.cores,
                         )
 
-                sdr.total_flows()
-                sd_flows.append(sdr.total_link_loads)
+                class_flows(
+                    sdr.link_loads,
+                    sdr.link_loads,
+                    1.0,
+                    sdr.total_link_loads,
+                    self.step_direction_flow,
+                    i == 0,
+                    self.cores,
+                )
         # biconjugate
         else:
             self.calculate_biconjugate_direction()
+            self.__step = {"direction": "biconjugate", "coefficients": self.betas.tolist()}
+            copy_one_dimension(self.previous_step_direction_flow, self.step_direction_flow, self.cores)
             # deep copy because we overwrite step_direction but need it on next iteration
-            for c in self.traffic_classes:
+            for i, c in enumerate(self.traffic_classes):
                 ppst = self.temp_step_direction_for_copy[c._id]  # type: AssignmentResults
                 prev_stp_dir = self.previous_step_direction[c._id]  # type: AssignmentResults
                 stp_dir = self.step_direction[c._id]  # type: AssignmentResults
 
                 copy_two_dimensions(ppst.link_loads, stp_dir.link_loads, self.cores)
-                ppst.total_flows()
-                if c.results.num_skims > 0:
+                if self.__blend_skims(c):
                     copy_three_dimensions(ppst.skims.matrix_view, stp_dir.skims.matrix_view, self.cores)
 
                 triple_linear_combination(
@@ -332,8 +319,16 @@ class LinearApproximation:
                     self.cores,
                 )
 
-                stp_dir.total_flows()
-                if c.results.num_skims > 0:
+                class_flows(
+                    stp_dir.link_loads,
+                    stp_dir.link_loads,
+                    1.0,
+                    stp_dir.total_link_loads,
+                    self.step_direction_flow,
+                    i == 0,
+                    self.cores,
+                )
+                if self.__blend_skims(c):
                     triple_linear_combination_skims(
                         stp_dir.skims.matrix_view,
                         c._aon_results.skims.matrix_view,
@@ -344,7 +339,6 @@ class LinearApproximation:
                     )
 
                 if c._selected_links:
-                    aux_res = self.aons[c._id].aux_res
                     for name, idx in c._aon_results._selected_links.items():
                         sl_step_dir_ll = self.sl_step_dir_ll[c._id][name]
                         sl_step_dir_od = self.sl_step_dir_od[c._id][name]
@@ -353,28 +347,23 @@ class LinearApproximation:
                             sl_step_dir_ll["sdr"],
                             self.cores,
                         )
-                        copy_three_dimensions(
-                            sl_step_dir_od["temp_prev_sdr"],
-                            sl_step_dir_od["sdr"],
-                            self.cores,
-                        )
+                        self.__copy_sl_od(sl_step_dir_od["temp_prev_sdr"], sl_step_dir_od["sdr"])
 
                         triple_linear_combination(
                             sl_step_dir_ll["sdr"],
-                            np.sum(aux_res.temp_sl_link_loading, axis=0)[idx, :, :],
+                            self.sl_aon_ll[c._id][idx],
                             sl_step_dir_ll["sdr"],
                             sl_step_dir_ll["prev_sdr"],
                             self.betas,
                             self.cores,
                         )
 
-                        triple_linear_combination_skims(
+                        self.__triple_linear_combination_sl_od(
                             sl_step_dir_od["sdr"],
-                            np.sum(aux_res.temp_sl_od_matrix, axis=0)[idx, :, :, :],
+                            self.sl_aon_od[c._id][idx],
                             sl_step_dir_od["sdr"],
                             sl_step_dir_od["prev_sdr"],
                             self.betas,
-                            self.cores,
                         )
 
                         copy_two_dimensions(
@@ -382,46 +371,100 @@ class LinearApproximation:
                             sl_step_dir_ll["temp_prev_sdr"],
                             self.cores,
                         )
-                        copy_three_dimensions(
-                            sl_step_dir_od["prev_sdr"],
-                            sl_step_dir_od["temp_prev_sdr"],
-                            self.cores,
-                        )
-
-                sd_flows.append(np.sum(stp_dir.link_loads, axis=1))
+                        self.__copy_sl_od(sl_step_dir_od["prev_sdr"], sl_step_dir_od["temp_prev_sdr"])
 
                 copy_two_dimensions(prev_stp_dir.link_loads, ppst.link_loads, self.cores)
-                prev_stp_dir.total_flows()
-                if c.results.num_skims > 0:
+                if self.__blend_skims(c):
                     copy_three_dimensions(prev_stp_dir.skims.matrix_view, ppst.skims.matrix_view, self.cores)
 
-        self.step_direction_flow = np.sum(sd_flows, axis=0)
-
     def __maybe_create_path_file_directories(self):
         path_base_dir = os.path.join(self.project_path, "path_files", self.procedure_id)
         for c in self.traffic_classes:
-            if c._aon_results.save_path_file:
-                c._aon_results.path_file_dir = os.path.join(
-                    path_base_dir, f"iter{self.iter}", f"path_c{c.mode}_{c._id}"
-                )
-                Path(c._aon_results.path_file_dir).mkdir(parents=True, exist_ok=True)
-                if self.iter == 1:  # save simplified graph correspondences, this could change after assignment
+            res = c._aon_results
+            if not res.save_path_file or not res.use_path_store:
+                res.path_store = None
+            if res.save_path_file:
+                res.path_file_dir = os.path.join(path_base_dir, f"iter{self.iter}", f"path_c{c.mode}_{c._id}")
+                if res.use_path_store:
+                    # Paths that did not change are only found by comparing with the previous iteration of this run
+                    previous = res.path_store if self.iter > self.__first_iteration else None
+                    Path(os.path.dirname(res.path_file_dir)).mkdir(parents=True, exist_ok=True)
+                    store = path_store_file(path_base_dir, self.iter, c.mode, c._id)
+                    res.path_store = PathStoreWriter(
+                        store, c.graph.num_zones, self.iter, res.path_store_compression, previous
+                    )
+                else:
+                    Path(res.path_file_dir).mkdir(parents=True, exist_ok=True)
+                # save simplified graph correspondences, this could change after assignment
+                if self.iter == self.__first_iteration:
                     c.graph.save_compressed_correspondence(path_base_dir, c.mode, c._id)
+            if not res.save_trees:
+                res.tree_store = None
+                continue
+            store = tree_store_file(path_base_dir, self.iter, c.mode, c._id)
+            Path(os.path.dirname(store)).mkdir(parents=True, exist_ok=True)
+            previous = res.tree_store if self.iter > self.__first_iteration else None
+            res.tree_store = PathStoreWriter(
+                store, c.graph.num_zones, self.iter, res.path_store_compression, previous, TREE_COLUMNS
+            )
+
+    def __record_trees(self):
+        """Records the step of this iteration and the trees stored in it, so select link analysis can be replayed"""
+        classes = [c for c in self.traffic_classes if c._aon_results.save_trees]
+        if not classes:
+            return
+
+        step = {"direction": "aon"} if self.iter == 1 else {**self.__step, "stepsize": self.stepsize}
+        self.tree_steps.append({"iteration": self.iter, **step})
+        manifest = {"algorithm": self.algorithm, "steps": self.tree_steps, "classes": {}}
+        for c in classes:
+            store = c._aon_results.tree_store
+            iterations = self.__tree_origins.setdefault(c._id, {})
+            iterations[self.iter] = {
+                "origins": store.origins.tolist(),
+                "stored_in": store.stored_in[store.origins].tolist(),
+            }
+            manifest["classes"][c._id] = {
+                "mode": c.mode,
+                "nodes": c.graph.compact_num_nodes,
+                "zones": c.graph.num_zones,
+                "iterations": iterations,
+            }
+        path_base_dir = os.path.join(self.project_path, "path_files", self.procedure_id)
+        write_tree_manifest(path_base_dir, manifest)
 
     def doWork(self):
         self.execute()
 
-    def execute(self):  # noqa: C901
-        # We build the fixed cost field
+    def execute(self, resume_from=None):  # noqa: C901
+        """Runs the assignment
+
+        :Arguments:
+            **resume_from** (:obj:`Union[str, Path]`, *Optional*): Checkpoint directory to resume the assignment from.
+            Defaults to None, when the assignment starts from scratch
+        """
+        # MSA steps do not depend on the solution, so initial link loads would only take the weight of one iteration
+        if self.algorithm == "msa" and self.assig.initial_link_loads is not None and resume_from is None:
+            raise ValueError("MSA cannot start from initial link loads. Use one of the Frank-Wolfe algorithms instead")
 
         self.sl_step_dir_ll = {}
         self.sl_step_dir_od = {}
+        self.sl_aon_ll = {}
+        self.sl_aon_od = {}
+        self._prepare_iteration_arrays()
 
         for c in self.traffic_classes:
             # Copying select link dictionary that maps name to its relevant matrices into the class' results
             c._aon_results._selected_links = c._selected_links
             c.results._selected_links = c._selected_links
 
+            # Sizes the temporary objects used for the results, which tell how many user classes the matrix has
+            c.results.skim_storage = self.assig.skim_storage
+            c._aon_results.skim_storage = self.assig.skim_storage
+            c.results.prepare(c.graph, c.matrix)
+            c._aon_results.prepare(c.graph, c.matrix)
+            c.results.reset()
+
             link_loads_step_dir_shape = (
                 c.graph.compact_num_links,
                 c.results.classes["number"],
@@ -435,6 +478,14 @@ class LinearApproximation:
 
             self.sl_step_dir_ll[c._id] = {}
             self.sl_step_dir_od[c._id] = {}
+            if c._selected_links:
+                # Select link results of the all-or-nothing assignment, summed over the threads that computed them
+                sets = len(c._selected_links)
+                self.sl_aon_ll[c._id] = np.zeros((sets,) + link_loads_step_dir_shape, c.graph.default_types("float"))
+                if self.__sparse_sl_od(c):
+                    self.sl_aon_od[c._id] = [self.__new_sl_od(c) for _ in range(sets)]
+                else:
+                    self.sl_aon_od[c._id] = np.zeros((sets,) + od_step_dir_shape, c.graph.default_types("float"))
             for name in c._selected_links.keys():
                 self.sl_step_dir_ll[c._id][name] = {
                     "sdr": np.zeros(link_loads_step_dir_shape, dtype=c.graph.default_types("float")),
@@ -443,16 +494,11 @@ class LinearApproximation:
                 }
 
                 self.sl_step_dir_od[c._id][name] = {
-                    "sdr": np.zeros(od_step_dir_shape, dtype=c.graph.default_types("float")),
-                    "prev_sdr": np.zeros(od_step_dir_shape, dtype=c.graph.default_types("float")),
-                    "temp_prev_sdr": np.zeros(od_step_dir_shape, dtype=c.graph.default_types("float")),
+                    "sdr": self.__new_sl_od(c),
+                    "prev_sdr": self.__new_sl_od(c),
+                    "temp_prev_sdr": self.__new_sl_od(c),
                 }
 
-            # Sizes the temporary objects used for the results
-            c.results.prepare(c.graph, c.matrix)
-            c._aon_results.prepare(c.graph, c.matrix)
-            c.results.reset()
-
             # Prepares the fixed cost to be used
             if c.fixed_cost_field:
                 # divide fixed cost by volume-dependent prefactor (vot) such that we don't have to do it for
@@ -466,77 +512,86 @@ class LinearApproximation:
             # Just need to create some arrays for cost
             c.graph.set_graph(self.time_field)
 
-            self.aons[c._id] = allOrNothing(c._id, c.matrix, c.graph, c._aon_results)
+            c._prepare_demand_csr()
+            self.aons[c._id] = allOrNothing(c._id, c.matrix, c.graph, c._aon_results, c._demand_csr)
+        self._prepare_aon_runs()
+
+        # Initial link loads, if provided, are taken as the solution of the first iteration
+        self.__first_iteration = 1
+        start = 1
+        self.__unskimmed_weight = 1.0
+        self.tree_steps = []
+        self.__tree_origins = {}
+        if any(c._aon_results.save_trees for c in self.traffic_classes):
+            # Select link results can only be replayed from trees of all iterations, starting from the first one
+            if resume_from is not None or self.assig.initial_link_loads is not None:
+                raise ValueError("Shortest path trees cannot be saved when resuming or warm starting an assignment")
+        if resume_from is not None:
+            start = self.__resume(resume_from)
+        elif self.assig.initial_link_loads is not None and self.algorithm != "all-or-nothing":
+            self.__warm_start()
+            self.__first_iteration = 2
+            start = 2
+        self.__last_checkpoint = monotonic()
 
         self.equilibration.emit(["start", self.max_iter, "Equilibrium Assignment"])
         self.logger.info(f"{self.algorithm} Assignment STATS")
         self.logger.info("Iteration, RelativeGap, stepsize")
-        for self.iter in range(1, self.max_iter + 1):  # noqa: B020
+        for self.iter in range(start, self.max_iter + 1):  # noqa: B020
             self.iteration_issue = []
             self.equilibration.emit(["key_value", "rgap", self.rgap])
             self.equilibration.emit(["key_value", "iterations", self.iter])
 
-            aon_flows = []
-
             self.__maybe_create_path_file_directories()
 
-            for c in self.traffic_classes:  # type: TrafficClass
-                self.assignment.emit(["start", c.matrix.zones, "All-or-Nothing"])
-                # cost = c.fixed_cost / c.vot + self.congested_time #  now only once
-                cost = c.fixed_cost + self.congested_time
-                aggregate_link_costs(cost, c.graph.compact_cost, c.results.crosswalk)
-
-                aon = self.aons[c._id]  # This is a new object every iteration, with new aux_res
-                self.assignment.emit(["refresh"])
-                self.assignment.emit(["reset"])
-                aon.assignment = self.assignment
+            self._execute_aons(self._skims_at_iteration())
+            self.__sum_select_link_threads()
 
-                aon.execute()
-                c._aon_results.link_loads *= c.pce
-                c._aon_results.total_flows()
-                aon_flows.append(c._aon_results.total_link_loads)
-
-            self.aon_total_flow = np.sum(aon_flows, axis=0)
-
-            flows = []
             if self.iter == 1:
-                for c in self.traffic_classes:
-                    copy_two_dimensions(c.results.link_loads, c._aon_results.link_loads, self.cores)
-                    c.results.total_flows()
-                    if c.results.num_skims > 0:
+                for i, c in enumerate(self.traffic_classes):
+                    class_flows(
+                        c.results.link_loads,
+                        c._aon_results.link_loads,
+                        1.0,
+                        c.results.total_link_loads,
+                        self.class_flow,
+                        i == 0,
+                        self.cores,
+                    )
+                    if self.__blend_skims(c):
                         copy_three_dimensions(c.results.skims.matrix_view, c._aon_results.skims.matrix_view, self.cores)
 
                     if c._selected_links:
                         for name, idx in c._aon_results._selected_links.items():
                             # Copy the temporary results into the final od matrix, referenced by link_set name
                             # The temp has an index associated with the link_set name
-                            copy_three_dimensions(
+                            self.__copy_sl_od(
                                 c.results.select_link_od.matrix[name],  # matrix being written into
-                                np.sum(self.aons[c._id].aux_res.temp_sl_od_matrix, axis=0)[
-                                    idx, :, :, :
-                                ],  # results after the iteration
-                                self.cores,  # core count
+                                self.sl_aon_od[c._id][idx],  # results after the iteration
                             )
                             copy_two_dimensions(
                                 c.results.select_link_loading[name],  # ouput matrix
-                                np.sum(self.aons[c._id].aux_res.temp_sl_link_loading, axis=0)[idx, :, :],  # matrix 1
+                                self.sl_aon_ll[c._id][idx],  # matrix 1
                                 self.cores,  # core count
                             )
-                    flows.append(c.results.total_link_loads)
 
             else:
                 self.__calculate_step_direction()
                 self.calculate_stepsize()
-                for c in self.traffic_classes:
+                for i, c in enumerate(self.traffic_classes):
                     stp_dir = self.step_direction[c._id]
 
                     cls_res = c.results
 
+                    # There are no skims for the initial link loads, so we start from the ones in the first direction
+                    if self.iter == self.__first_iteration and self.__blend_skims(c):
+                        copy_three_dimensions(cls_res.skims.matrix_view, stp_dir.skims.matrix_view, self.cores)
+
                     linear_combination(
                         cls_res.link_loads, stp_dir.link_loads, cls_res.link_loads, self.stepsize, self.cores
                     )
 
-                    if cls_res.num_skims > 0:
+                    if self.__blend_skims(c):
                         linear_combination_skims(
                             cls_res.skims.matrix_view,
                             stp_dir.skims.matrix_view,
@@ -549,12 +604,11 @@ class LinearApproximation:
                         for name, idx in c._aon_results._selected_links.items():
                             # Copy the temporary results into the final od matrix, referenced by link_set name
                             # The temp flows have an index associated with the link_set name
-                            linear_combination_skims(
+                            self.__linear_combination_sl_od(
                                 cls_res.select_link_od.matrix[name],  # output matrix
                                 self.sl_step_dir_od[c._id][name]["sdr"],
                                 cls_res.select_link_od.matrix[name],  # matrix 2 (previous iteration)
                                 self.stepsize,  # stepsize
-                                self.cores,  # core count
                             )
 
                             linear_combination(
@@ -565,12 +619,20 @@ class LinearApproximation:
                                 self.cores,  # core count
                             )
 
-                    cls_res.total_flows()
-                    flows.append(cls_res.total_link_loads)
+                    class_flows(
+                        cls_res.link_loads,
+                        cls_res.link_loads,
+                        1.0,
+                        cls_res.total_link_loads,
+                        self.class_flow,
+                        i == 0,
+                        self.cores,
+                    )
 
-            self.fw_total_flow = np.sum(flows, axis=0)
-            if self.preload is not None:
-                self.fw_total_flow += self.preload
+            if self.assig.skimming_policy == "interval":
+                self.__blend_interval_skims(1.0 if self.iter == 1 else self.stepsize)
+            self.__record_trees()
+            self._add_preload()
 
             if self.algorithm == "all-or-nothing":
                 break
@@ -578,14 +640,7 @@ class LinearApproximation:
             # This needs to be done with the current costs, and not the future ones
             converged = self.check_convergence() if self.iter > 1 else False
             self.equilibration.emit(["update", self.iter, f"Equilibrium Assignment: RGap - {self.rgap:.3E}"])
-            self.vdf.apply_vdf(
-                self.congested_time,
-                self.fw_total_flow,
-                self.capacity,
-                self.free_flow_tt,
-                *self.vdf_parameters,
-                self.cores,
-            )
+            self.__update_congested_times()
 
             for c in self.traffic_classes:
                 if self.time_field in c.graph.skim_fields:
@@ -612,6 +667,9 @@ class LinearApproximation:
             else:
                 self.steps_below = 0
 
+            if self.__checkpoint_due():
+                self.__write_checkpoint()
+
             if self.iter < self.max_iter:
                 for c in self.traffic_classes:
                     c._aon_results.reset()
@@ -620,6 +678,9 @@ class LinearApproximation:
                     idx = c.graph.skim_fields.index(self.time_field)
                     c.graph.skims[:, idx] = self.congested_time[:]
 
+        if self.assig.skimming_policy != "blended":
+            self._skim_final_costs()
+
         for c in self.traffic_classes:
             c.results.link_loads /= c.pce
             c.results.total_flows()
@@ -631,15 +692,392 @@ class LinearApproximation:
         self.assignment.emit(["finished"])
         self.equilibration.emit(["finished"])
 
+    def _prepare_aon_runs(self):
+        """Groups traffic classes that share their shortest path trees, so each group is assigned in a single pass
+
+        Classes share their trees when they use the same graph and have the same fixed costs. Each group is assigned
+        as a single all-or-nothing assignment of the demand matrices of all its classes, which are then split back into
+        the results of each class. Classes with select link analysis or path files are always assigned on their own.
+        """
+        groups = []
+        for c in self.traffic_classes:
+            group = None
+            if not self.__assigned_alone(c):
+                group = next((g for g in groups if self.__same_trees(g[0], c)), None)
+            if group is None:
+                groups.append([c])
+            else:
+                group.append(c)
+
+        self._aon_runs = []
+        for group in groups:
+            if len(group) == 1:
+                c = group[0]
+                self._aon_runs.append((group, self.aons[c._id]))
+                continue
+
+            c = group[0]
+            zones = c.matrix.zones
+            views = [x.matrix.matrix_view.reshape((zones, zones, -1)) for x in group]
+            names = [f"core_{i}" for i in range(sum(v.shape[2] for v in views))]
+
+            demand = AequilibraeMatrix()
+            demand.create_empty(zones=zones, matrix_names=names, memory_only=True)
+            demand.index[:] = c.matrix.index[:]
+            demand.matrices[:, :, :] = np.concatenate(views, axis=2)
+            demand.computational_view(names)
+
+            res = AssignmentResults()
+            res.set_cores(c._aon_results.cores)
+            res.link_loads_accumulation = c._aon_results.link_loads_accumulation
+            res.early_exit = c._aon_results.early_exit
+            res.set_backend(c._aon_results.backend, c._aon_results.processes)
+            res.prepare(c.graph, demand)
+            self._aon_runs.append((group, allOrNothing(c._id, demand, c.graph, res, demand_csr(demand.matrix_view))))
+
+        self._aon_costs = [np.zeros_like(group[0].graph.compact_cost) for group, _ in self._aon_runs]
+
+    @staticmethod
+    def __assigned_alone(c: TrafficClass) -> bool:
+        """Whether a class needs results of its own from the all-or-nothing assignment"""
+        return bool(c._selected_links) or c._aon_results.save_path_file or c._aon_results.save_trees
+
+    def __same_trees(self, c1: TrafficClass, c2: TrafficClass) -> bool:
+        if self.__assigned_alone(c1) or self.__assigned_alone(c2) or c1.graph is not c2.graph:
+            return False
+        # Sparse demand is never stacked into a dense matrix
+        if isinstance(c1.matrix, SparseDemand) or isinstance(c2.matrix, SparseDemand):
+            return False
+        return np.array_equal(c1.fixed_cost, c2.fixed_cost)
+
+    def _execute_aons(self, skims: bool = True):
+        """All-or-nothing assignment of all traffic classes with the current link costs, with link loads in PCEs
+
+        :Arguments:
+            **skims** (:obj:`bool`, *Optional*): Whether the classes are also skimmed. Defaults to True
+        """
+        # Classes may share a graph while having different costs, so each run gets its own copy of them
+        for (group, aon), cost in zip(self._aon_runs, self._aon_costs):
+            c = group[0]
+            np.add(c.fixed_cost, self.congested_time, out=self.link_cost)
+            aggregate_link_costs(self.link_cost, cost, c.results.crosswalk)
+            aon.assignment = self.assignment
+            aon.results.compute_skims = skims
+
+        self.assignment.emit(["start", sum(group[0].matrix.zones for group, _ in self._aon_runs), "All-or-Nothing"])
+        self.assignment.emit(["refresh"])
+        self.assignment.emit(["reset"])
+        execute_concurrently([aon for _, aon in self._aon_runs], self._aon_costs)
+
+        for group, aon in self._aon_runs:
+            if len(group) > 1:
+                # Splits the results of the group back into its classes, in the order their matrices were stacked
+                first = 0
+                for x in group:
+                    last = first + x._aon_results.classes["number"]
+                    x._aon_results.link_loads[:, :] = aon.results.link_loads[:, first:last]
+                    x._aon_results.compact_link_loads[:, :] = aon.results.compact_link_loads[:, first:last]
+                    if skims and x._aon_results.num_skims > 0:
+                        x._aon_results.skims.matrix_view[:, :, :] = aon.results.skims.matrix_view[:, :, :]
+                    first = last
+
+        for i, c in enumerate(self.traffic_classes):
+            res = c._aon_results
+            class_flows(
+                res.link_loads, res.link_loads, c.pce, res.total_link_loads, self.aon_total_flow, i == 0, self.cores
+            )
+
+    def _prepare_iteration_arrays(self):
+        """Allocates the link arrays reused by all iterations, so that iterating does not allocate any"""
+        links = self.free_flow_tt.shape[0]
+        self.fw_total_flow = np.zeros(links, dtype=np.float64)
+        self.aon_total_flow = np.zeros(links, dtype=np.float64)
+        # Flows of all classes, without preloads
+        self.class_flow = np.zeros(links, dtype=np.float64)
+        self.step_direction_flow = np.zeros(links, dtype=np.float64)
+        self.previous_step_direction_flow = np.zeros(links, dtype=np.float64)
+        self.link_cost = np.zeros(links, dtype=np.float64)
+        self.direction_terms = np.zeros(4, dtype=np.float64)
+
+    def _add_preload(self):
+        copy_one_dimension(self.fw_total_flow, self.class_flow, self.cores)
+        if self.preload is not None:
+            self.fw_total_flow += self.preload
+
+    def __sum_select_link_threads(self):
+        for c in self.traffic_classes:
+            if c._selected_links:
+                aux_res = self.aons[c._id].aux_res
+                np.sum(aux_res.temp_sl_link_loading, axis=0, out=self.sl_aon_ll[c._id])
+                if aux_res.sl_od_buffers is None:
+                    np.sum(aux_res.temp_sl_od_matrix, axis=0, out=self.sl_aon_od[c._id])
+                    continue
+                # The per-thread buffers of each link set are merged into its sparse matrix
+                for idx, od in enumerate(self.sl_aon_od[c._id]):
+                    od.set(*aux_res.sl_od_buffers.merge(idx))
+
+    @staticmethod
+    def __sparse_sl_od(c: TrafficClass) -> bool:
+        """Whether the select link OD matrices of a class only keep the OD pairs that use the selected links"""
+        return c._aon_results.select_link_od_storage == "sparse"
+
+    def __new_sl_od(self, c: TrafficClass):
+        zones, classes = c.graph.num_zones, c.results.classes["number"]
+        if self.__sparse_sl_od(c):
+            return SparseODMatrix(zones, classes)
+        return np.zeros((zones, zones, classes), dtype=c.graph.default_types("float"))
+
+    def __copy_sl_od(self, target, source):
+        if isinstance(target, SparseODMatrix):
+            target.copy_from(source)
+        else:
+            copy_three_dimensions(target, source, self.cores)
+
+    def __linear_combination_sl_od(self, results, matrix1, matrix2, stepsize):
+        if isinstance(results, SparseODMatrix):
+            results.linear_combination(matrix1, matrix2, stepsize)
+        else:
+            linear_combination_skims(results, matrix1, matrix2, stepsize, self.cores)
+
+    def __triple_linear_combination_sl_od(self, results, matrix1, matrix2, matrix3, stepsizes):
+        if isinstance(results, SparseODMatrix):
+            results.triple_linear_combination(matrix1, matrix2, matrix3, stepsizes)
+        else:
+            triple_linear_combination_skims(results, matrix1, matrix2, matrix3, stepsizes, self.cores)
+
+    def _skims_at_iteration(self) -> bool:
+        """Whether the all-or-nothing assignment of the current iteration is skimmed, given the skimming policy"""
+        policy = self.assig.skimming_policy
+        if policy == "interval":
+            return self.iter % self.assig.skimming_interval == 0
+        return policy == "blended"
+
+    def __blend_skims(self, c: TrafficClass) -> bool:
+        return c.results.num_skims > 0 and self.assig.skimming_policy == "blended"
+
+    def __interval_skims(self, c: TrafficClass) -> bool:
+        return c.results.num_skims > 0 and self.assig.skimming_policy == "interval"
+
+    def __blend_interval_skims(self, stepsize: float):
+        """Blends the skims of the iterations skimmed by the 'interval' policy
+
+        Skims of a skimmed iteration take the weight that all iterations since the previous skimmed one have in the
+        solution, as their flows are not represented by any skims yet
+        """
+        self.__unskimmed_weight = 1.0 - (1.0 - self.__unskimmed_weight) * (1.0 - stepsize)
+        if not self._skims_at_iteration():
+            return
+        for c in self.traffic_classes:
+            if c.results.num_skims > 0:
+                self.__blend_unskimmed(c.results.skims.matrix_view, c._aon_results.skims.matrix_view)
+        self.__unskimmed_weight = 0.0
+
+    def __blend_unskimmed(self, blended: np.ndarray, skims: np.ndarray):
+        """Blends skims into the blended ones with the weight of the iterations not represented in them"""
+        # Skims are copied or left alone at the extreme weights, so unreachable pairs do not become NaN
+        if self.__unskimmed_weight >= 1.0:
+            copy_three_dimensions(blended, skims, self.cores)
+        elif self.__unskimmed_weight > 0:
+            linear_combination_skims(blended, skims, blended, self.__unskimmed_weight, self.cores)
+
+    def _skim_final_costs(self):
+        """Skims all classes along the shortest paths for the final link costs
+
+        Used by the skimming policies that do not skim every iteration. Skims are stored as the ones for the last
+        iteration. They are also stored as the blended ones, blended with the skims of the iterations skimmed by the
+        'interval' policy with the weight of the iterations since the last one of them
+        """
+        for c in self.traffic_classes:
+            if c.results.num_skims == 0:
+                continue
+            aggregate_link_costs(c.fixed_cost + self.congested_time, c.graph.compact_cost, c.results.crosswalk)
+
+            skimming = NetworkSkimming(c.graph)
+            skimming.cores = self.cores
+            skimming.results.skim_storage = self.assig.skim_storage
+            skimming.set_backend(c._aon_results.backend, c._aon_results.processes)
+            skimming.execute()
+            c._aon_results.skims.matrix_view[:, :, :] = skimming.results.skims.matrix_view[:, :, :]
+            self.__blend_unskimmed(c.results.skims.matrix_view, c._aon_results.skims.matrix_view)
+            skimming.results.skims.close()
+            if skimming.results.skims.file_path is not None:
+                os.remove(skimming.results.skims.file_path)
+
+    def __warm_start(self):
+        """Loads the initial link loads and computes their congested travel times"""
+        for i, c in enumerate(self.traffic_classes):
+            if c._selected_links:
+                raise ValueError("Select link analysis is not available when starting from initial link loads")
+            c.results.link_loads[:, :] = self.assig.initial_link_loads[c._id]
+            class_flows(
+                c.results.link_loads,
+                c.results.link_loads,
+                c.pce,
+                c.results.total_link_loads,
+                self.class_flow,
+                i == 0,
+                self.cores,
+            )
+        self._add_preload()
+
+        self.__update_congested_times()
+
+        for c in self.traffic_classes:
+            if self.time_field not in c.graph.skim_fields:
+                continue
+            k = c.graph.skim_fields.index(self.time_field)
+            aggregate_link_costs(self.congested_time[:], c.graph.compact_skims[:, k], c.results.crosswalk)
+            c.graph.skims[:, k] = self.congested_time[:]
+
+    def __update_congested_times(self):
+        """Congested times for the current flows. The conjugate directions also need their derivatives, which are
+        computed in the same pass"""
+        self.vdf.apply_vdf_and_derivative(
+            self.congested_time,
+            self.vdf_der if self.algorithm in ["cfw", "bfw"] else None,
+            self.fw_total_flow,
+            self.capacity,
+            self.free_flow_tt,
+            *self.vdf_parameters,
+            self.cores,
+        )
+
+    def __checkpoint_due(self) -> bool:
+        if self.assig.checkpoint_directory is None:
+            return False
+        iterations, minutes = self.assig.checkpoint_iterations, self.assig.checkpoint_minutes
+        if iterations is not None and self.iter % iterations == 0:
+            return True
+        return minutes is not None and monotonic() - self.__last_checkpoint >= minutes * 60
+
+    def __write_checkpoint(self):
+        state = {
+            "algorithm": self.algorithm,
+            "classes": [c._id for c in self.traffic_classes],
+            "iteration": self.iter,
+            "first_iteration": self.__first_iteration,
+            "unskimmed_weight": self.__unskimmed_weight,
+            "rgap": self.rgap,
+            "stepsize": self.stepsize,
+            "conjugate_stepsize": self.conjugate_stepsize,
+            "betas": self.betas.tolist(),
+            "steps_below": self.steps_below,
+            "do_fw_step": self.do_fw_step,
+            "conjugate_failed": self.conjugate_failed,
+            "do_conjugate_step": self.do_conjugate_step,
+            "convergence_report": self.convergence_report,
+        }
+        folder = write_checkpoint(self.assig.checkpoint_directory, self.iter, state, self._checkpoint_arrays())
+        self.logger.info(f"Assignment checkpoint for iteration {self.iter} written to {folder}")
+        self.__last_checkpoint = monotonic()
+
+    def __resume(self, directory) -> int:
+        """Restores the state of the assignment from a checkpoint, and returns the first iteration left to run"""
+        state, stored = read_checkpoint(directory)
+        if state["algorithm"] != self.algorithm or state["classes"] != [c._id for c in self.traffic_classes]:
+            raise ValueError("Checkpoint was written by an assignment with a different algorithm or traffic classes")
+
+        arrays = self._checkpoint_arrays()
+        # Sparse OD matrices have as many OD pairs as were stored, so they are replaced instead of copied into
+        sparse = {nm: m for nm, m in self.__checkpoint_od_matrices().items() if isinstance(m, SparseODMatrix)}
+        resized = {f"{nm}_{part}" for nm in sparse for part in ["keys", "values"]}
+        if sorted(arrays) != sorted(stored) or any(
+            arrays[nm].shape != stored[nm].shape for nm in arrays if nm not in resized
+        ):
+            raise ValueError("Checkpoint arrays do not match the assignment being resumed")
+        for nm, array in arrays.items():
+            if nm not in resized:
+                array[...] = stored[nm]
+        for nm, m in sparse.items():
+            m.set(np.array(stored[f"{nm}_keys"]), np.array(stored[f"{nm}_values"]))
+
+        self.__first_iteration = state["first_iteration"]
+        self.__unskimmed_weight = state["unskimmed_weight"]
+        self.rgap = state["rgap"]
+        self.stepsize = state["stepsize"]
+        self.conjugate_stepsize = state["conjugate_stepsize"]
+        self.betas[:] = state["betas"]
+        self.steps_below = state["steps_below"]
+        self.do_fw_step = state["do_fw_step"]
+        self.conjugate_failed = state["conjugate_failed"]
+        self.do_conjugate_step = state["do_conjugate_step"]
+        self.convergence_report = state["convergence_report"]
+
+        # Flows and costs are computed from the class loads exactly as they were at the end of the iteration
+        for i, c in enumerate(self.traffic_classes):
+            res = c.results
+            class_flows(res.link_loads, res.link_loads, 1.0, res.total_link_loads, self.class_flow, i == 0, self.cores)
+        self._add_preload()
+        self.__update_congested_times()
+
+        for c in self.traffic_classes:
+            if self.time_field not in c.graph.skim_fields:
+                continue
+            k = c.graph.skim_fields.index(self.time_field)
+            aggregate_link_costs(self.congested_time[:], c.graph.compact_skims[:, k], c.results.crosswalk)
+            c.graph.skims[:, k] = self.congested_time[:]
+
+        self.logger.info(f"Assignment resumed from the checkpoint for iteration {state['iteration']}")
+        return state["iteration"] + 1
+
+    def _checkpoint_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays that hold the state of the assignment between iterations, by name"""
+        arrays = {
+            "step_direction_flow": self.step_direction_flow,
+            "previous_step_direction_flow": self.previous_step_direction_flow,
+        }
+        # Only conjugate directions carry the step directions of previous iterations over
+        directions = self.algorithm in ["cfw", "bfw"]
+        for i, c in enumerate(self.traffic_classes):
+            res = {"": c.results}
+            if directions:
+                res["step_direction_"] = self.step_direction[c._id]
+                res["previous_step_direction_"] = self.previous_step_direction[c._id]
+            for prefix, r in res.items():
+                arrays[f"class_{i}_{prefix}link_loads"] = r.link_loads
+                if self.__blend_skims(c) or (prefix == "" and self.__interval_skims(c)):
+                    arrays[f"class_{i}_{prefix}skims"] = r.skims.matrix_view
+
+            for s, name in enumerate(c._selected_links):
+                arrays[f"class_{i}_select_link_{s}_loading"] = c.results.select_link_loading[name]
+                if not directions:
+                    continue
+                for d in ["sdr", "prev_sdr"]:
+                    arrays[f"class_{i}_select_link_{s}_{d}_loading"] = self.sl_step_dir_ll[c._id][name][d]
+
+        for nm, m in self.__checkpoint_od_matrices().items():
+            if isinstance(m, SparseODMatrix):
+                arrays[f"{nm}_keys"] = m.keys
+                arrays[f"{nm}_values"] = m.values
+            else:
+                arrays[nm] = m
+        return arrays
+
+    def __checkpoint_od_matrices(self) -> dict:
+        """Select link OD matrices that hold the state of the assignment between iterations, by name"""
+        matrices = {}
+        directions = self.algorithm in ["cfw", "bfw"]
+        for i, c in enumerate(self.traffic_classes):
+            for s, name in enumerate(c._selected_links):
+                matrices[f"class_{i}_select_link_{s}_od"] = c.results.select_link_od.matrix[name]
+                if directions:
+                    for d in ["sdr", "prev_sdr"]:
+                        matrices[f"class_{i}_select_link_{s}_{d}_od"] = self.sl_step_dir_od[c._id][name][d]
+        return matrices
+
     def __derivative_of_objective_stepsize_dependent(self, stepsize, const_term):
         """The stepsize-dependent part of the derivative of the objective function. If fixed costs are defined,
         the corresponding contribution needs to be passed in"""
-        x = np.zeros_like(self.fw_total_flow)
-        linear_combination_1d(x, self.step_direction_flow, self.fw_total_flow, stepsize, self.cores)
-        # x = self.fw_total_flow + stepsize * (self.step_direction_flow - self.fw_total_flow)
-        self.vdf.apply_vdf(self.congested_value, x, self.capacity, self.free_flow_tt, *self.vdf_parameters, self.cores)
-        link_cost_term = sum_a_times_b_minus_c(
-            self.congested_value, self.step_direction_flow, self.fw_total_flow, self.cores
+        # Congested times are evaluated at x = self.fw_total_flow + stepsize * (self.step_direction_flow -
+        # self.fw_total_flow) and reduced on the fly, without materializing x
+        link_cost_term = self.vdf.directional_derivative(
+            stepsize,
+            self.step_direction_flow,
+            self.fw_total_flow,
+            self.capacity,
+            self.free_flow_tt,
+            *self.vdf_parameters,
+            self.cores,
         )
         return link_cost_term + const_term
 
@@ -709,8 +1147,8 @@ class LinearApproximation:
 
     def check_convergence(self):
         """Calculate relative gap and return ``True`` if it is smaller than desired precision"""
-        aon_cost = np.sum(self.congested_time * self.aon_total_flow)
-        current_cost = np.sum(self.congested_time * self.fw_total_flow)
+        aon_cost = np.dot(self.congested_time, self.aon_total_flow)
+        current_cost = np.dot(self.congested_time, self.fw_total_flow)
         self.rgap = abs(current_cost - aon_cost) / current_cost
         if self.rgap_target >= self.rgap:
             return True
@@ -0,0 +1,360 @@
+"""
+Process pool backend for all-or-nothing assignments and network skimming
+
+Threads only run in parallel inside the Cython kernels, so everything else they do is serialised by the GIL. With
+this backend, origins are split into one shard per worker process instead, and each worker runs the same kernels on
+its shard with its own (small) number of threads.
+
+Worker processes are spawned once and kept for all assignments. The arrays of the compressed graph, the link costs,
+the demand and all outputs are placed in POSIX shared memory blocks, which workers attach to by name, so nothing
+but the names of the blocks and the origins of each shard is ever sent to them. Each shard accumulates its link
+loads in its own slot of a shared array, and these are reduced once all shards are done. Skims are written directly
+to the rows of the origins of each shard.
+"""
+
+import multiprocessing as mp
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Dict
+
+import numpy as np
+
+from aequilibrae import global_logger
+from aequilibrae.paths.multi_threaded_aon import MultiThreadedAoN
+from aequilibrae.paths.multi_threaded_skimming import MultiThreadedNetworkSkimming
+
+try:
+    from aequilibrae.paths.AoN import all_to_all, assign_link_loads, skimming_all_origins, sum_axis0
+except ImportError as ie:
+    global_logger.warning(f"Could not import procedures from the binary. {ie.args}")
+
+EXECUTION_BACKENDS = ["threads", "processes"]
+
+# Worker pools, by number of processes
+_pools = {}
+
+
+class SharedArrays:
+    """Numpy arrays kept in POSIX shared memory blocks, which worker processes attach to by name
+
+    Blocks are reused while the arrays put in them keep their shape and type, so consecutive executions (such as the
+    iterations of an equilibrium assignment) only copy data. Arrays that do not change between executions are only
+    copied the first time.
+    """
+
+    def __init__(self):
+        self.arrays = {}  # type: Dict[str, np.ndarray]
+        self.__blocks = {}  # type: Dict[str, shared_memory.SharedMemory]
+        self.__external = {}
+
+    def put(self, name: str, array: np.ndarray) -> np.ndarray:
+        """Copies an array into shared memory, returning the shared copy"""
+        shared = self.empty(name, array.shape, array.dtype)
+        shared[...] = array
+        return shared
+
+    def put_once(self, name: str, array: np.ndarray) -> np.ndarray:
+        """Copies an array into shared memory unless it was already shared, returning the shared copy"""
+        if name in self.arrays:
+            return self.arrays[name]
+        return self.put(name, array)
+
+    def empty(self, name: str, shape, dtype) -> np.ndarray:
+        """Shared array with the given shape and type. Its contents are undefined"""
+        dtype = np.dtype(dtype)
+        shape = tuple(int(x) for x in shape)
+        current = self.arrays.get(name)
+        if name in self.__blocks and current.shape == shape and current.dtype == dtype:
+            return current
+
+        self.__release(name)
+        nbytes = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.__blocks[name] = block
+        self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return self.arrays[name]
+
+    def use(self, name: str, block: shared_memory.SharedMemory, array: np.ndarray) -> None:
+        """Shares an array that already lives in a shared memory block, without copying it"""
+        self.__release(name)
+        self.__external[name] = block
+        self.arrays[name] = array
+
+    def spec(self) -> dict:
+        """Everything a worker needs to attach to the arrays: block name, shape and type of each array"""
+        blocks = {**self.__blocks, **self.__external}
+        return {nm: (blocks[nm].name, arr.shape, arr.dtype.str) for nm, arr in self.arrays.items()}
+
+    def close(self) -> None:
+        """Releases all blocks created for the arrays"""
+        for name in list(self.arrays.keys()):
+            self.__release(name)
+
+    def __release(self, name: str) -> None:
+        self.arrays.pop(name, None)
+        self.__external.pop(name, None)
+        block = self.__blocks.pop(name, None)
+        if block is not None:
+            block.close()
+            block.unlink()
+
+    def __del__(self):
+        self.close()
+
+
+def check_backend(backend: str, processes=None) -> None:
+    if backend not in EXECUTION_BACKENDS:
+        raise ValueError(f"Execution backend needs to be one of {EXECUTION_BACKENDS}: {backend}")
+    if processes is not None and (not isinstance(processes, int) or processes < 1):
+        raise ValueError("Number of processes needs to be a positive integer")
+
+
+def assign_in_processes(aon, origins: np.ndarray, cost=None) -> None:
+    """All-or-nothing assignment of the origins of *aon* in worker processes, one shard of origins per worker
+
+    The graph and the demand are shared with the workers on the first call for *aon* only, as they do not change
+    between its executions. Link costs and skims of the graph are shared again on every call
+
+    :Arguments:
+        **aon** (:obj:`allOrNothing`): All-or-nothing assignment, with its results object set to the *processes*
+        backend
+
+        **origins** (:obj:`np.ndarray`): Indices of the origins to assign in the compressed graph
+
+        **cost** (:obj:`np.ndarray`, *Optional*): Link costs in the compressed graph. Defaults to the graph's ones
+    """
+    res, g = aon.results, aon.graph
+    workers = res.processes or res.cores
+    threads = max(1, res.cores // workers)
+    skims = len(g.skim_fields) if res.compute_skims else 0
+
+    shared = aon._shared_arrays
+    _share_graph(shared, g, g.compact_cost if cost is None else cost, skims > 0)
+    if aon._dense:
+        shared.put_once("demand", aon.matrix.matrix_view)
+    if aon.demand_csr is not None:
+        for nm, arr in zip(["demand_ptr", "demand_destinations", "demand_values"], aon.demand_csr):
+            shared.put_once(nm, arr)
+
+    classes = res.classes["number"]
+    shared.empty("link_loads", (workers,) + res.compact_link_loads.shape, np.float64).fill(0)
+    shared.put("no_path", res.no_path)
+    in_place = skims > 0 and _share_skims(shared, res.skims)
+
+    settings = {
+        "kind": "assignment",
+        "nodes": g.compact_num_nodes,
+        "links": g.compact_num_links,
+        "zones": g.num_zones,
+        "skims": skims,
+        "block_centroid_flows": g.block_centroid_flows,
+        "int_type": np.dtype(g.default_types("int")).str,
+        "float_type": np.dtype(g.default_types("float")).str,
+        "classes": classes,
+        "early_exit": res.early_exit,
+        "save_path_file": res.save_path_file,
+        "path_file_dir": res.path_file_dir,
+        "write_feather": res.write_feather,
+        "dense": aon._dense,
+        "sparse": aon.demand_csr is not None,
+    }
+    _run_shards(shared, settings, origins, workers, threads, aon._report_progress)
+
+    # Link loads of all shards are reduced into the results
+    sum_axis0(res.compact_link_loads, shared.arrays["link_loads"], res.cores)
+    assign_link_loads(res.link_loads, res.compact_link_loads, res.crosswalk, res.cores)
+    res.no_path[:, :] = shared.arrays["no_path"]
+    if skims > 0 and not in_place:
+        res.skims.matrix_view[:, :, :] = shared.arrays["skims"]
+
+
+def skim_in_processes(skimming, origins: np.ndarray) -> None:
+    """Skims the origins given in worker processes, one shard of origins per worker
+
+    :Arguments:
+        **skimming** (:obj:`NetworkSkimming`): Network skimming set to the *processes* backend
+
+        **origins** (:obj:`np.ndarray`): Indices of the origins to skim in the compressed graph
+    """
+    res, g = skimming.results, skimming.graph
+    workers = skimming.processes or res.cores
+    threads = max(1, res.cores // workers)
+
+    shared = SharedArrays()
+    try:
+        _share_graph(shared, g, g.compact_cost, True)
+        in_place = _share_skims(shared, res.skims)
+        settings = {
+            "kind": "skimming",
+            "nodes": g.compact_num_nodes,
+            "links": g.compact_num_links,
+            "zones": g.num_zones,
+            "skims": res.num_skims,
+            "block_centroid_flows": g.block_centroid_flows,
+            "int_type": np.dtype(g.default_types("int")).str,
+            "float_type": np.dtype(g.default_types("float")).str,
+        }
+        _run_shards(shared, settings, origins, workers, threads, skimming._report_progress)
+        if not in_place:
+            res.skims.matrix_view[:, :, :] = shared.arrays["skims"]
+    finally:
+        shared.close()
+
+
+def _share_graph(shared: SharedArrays, graph, cost: np.ndarray, skims: bool) -> None:
+    # Equilibrium assignments update link costs and the congested time skims between iterations, but not the topology
+    shared.put_once("fs", graph.compact_fs)
+    shared.put_once("ids", graph.compact_graph.id.values)
+    shared.put_once("b_nodes", graph.compact_graph.b_node.values)
+    shared.put("cost", cost)
+    if skims:
+        shared.put("graph_skims", graph.compact_skims)
+
+
+def _share_skims(shared: SharedArrays, skims) -> bool:
+    """Shares the skim matrices with the workers, returning whether they write to them directly"""
+    # Skim matrices already in shared memory (see *skim_storage*) are written to directly by the workers
+    block = getattr(skims, "shared_memory", None)
+    if block is not None and skims.matrix_view.shape == skims.matrices.shape:
+        shared.use("skims", block, skims.matrices)
+        return True
+    shared.empty("skims", skims.matrix_view.shape, skims.matrix_view.dtype)
+    return False
+
+
+def _run_shards(shared: SharedArrays, settings: dict, origins: np.ndarray, workers: int, threads: int, report):
+    """Runs one shard of origins per worker, passing the number of origins done so far to *report* while they run"""
+    progress = shared.empty("progress", (workers, threads), np.int64)
+    progress.fill(0)
+    spec = shared.spec()
+
+    pool = _pool(workers)
+    # Origins are dealt round-robin, which spreads the expensive ones across shards
+    jobs = [pool.submit(_run_shard, spec, settings, origins[i::workers], i, threads) for i in range(workers)]
+    while True:
+        done, pending = wait(jobs, timeout=0.1, return_when=FIRST_EXCEPTION)
+        report(int(progress.sum()))
+        if not pending or any(job.exception() is not None for job in done):
+            break
+    for job in jobs:
+        job.result()
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    # Workers are spawned, as forking a process that has already started OpenMP threads is not safe
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+    return _pools[workers]
+
+
+def _run_shard(spec: dict, settings: dict, origins: np.ndarray, shard: int, threads: int) -> None:
+    """Entry point of the worker processes"""
+    blocks = []
+    try:
+        arrays = {}
+        for nm, (block_name, shape, dtype) in spec.items():
+            # Spawned workers share the resource tracker of the parent process, which unlinks the blocks
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[nm] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+        if settings["kind"] == "assignment":
+            _assign_shard(arrays, settings, origins, shard, threads)
+        else:
+            _skim_shard(arrays, settings, origins, shard, threads)
+        del arrays
+    finally:
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                # Views are still referenced by the traceback of an exception, which is being raised anyway
+                pass
+
+
+def _assign_shard(arrays: dict, settings: dict, origins: np.ndarray, shard: int, threads: int) -> None:
+    graph = _WorkerGraph(arrays, settings)
+    results = _WorkerResults(arrays, settings, threads)
+    aux_res = MultiThreadedAoN()
+    aux_res.prepare(graph, results)
+
+    matrix = _WorkerMatrix(arrays["demand"]) if settings["dense"] else None
+    csr = None
+    if settings["sparse"]:
+        csr = (arrays["demand_ptr"], arrays["demand_destinations"], arrays["demand_values"])
+    all_to_all(origins, matrix, graph, results, aux_res, arrays["progress"][shard], threads, csr)
+    sum_axis0(arrays["link_loads"][shard], aux_res.temp_link_loads, threads)
+
+
+def _skim_shard(arrays: dict, settings: dict, origins: np.ndarray, shard: int, threads: int) -> None:
+    graph = _WorkerGraph(arrays, settings)
+    results = _WorkerResults(arrays, settings, threads)
+    aux_res = MultiThreadedNetworkSkimming()
+    aux_res.prepare(graph, results)
+    skimming_all_origins(origins, graph, results, aux_res, arrays["progress"][shard], threads)
+
+
+class _WorkerGraph:
+    """Compressed graph of a worker process, with only the attributes used by the path computation kernels"""
+
+    def __init__(self, arrays: dict, settings: dict):
+        self._id = "shared"
+        self.compact_num_nodes = settings["nodes"]
+        self.compact_num_links = settings["links"]
+        self.num_zones = settings["zones"]
+        self.skim_fields = list(range(settings["skims"]))
+        self.block_centroid_flows = settings["block_centroid_flows"]
+        self.compact_fs = arrays["fs"]
+        self.compact_cost = arrays["cost"]
+        self.compact_skims = arrays.get("graph_skims")
+        self.compact_graph = _WorkerLinks(arrays["ids"], arrays["b_nodes"])
+        self.__types = {"int": settings["int_type"], "float": settings["float_type"]}
+
+    def default_types(self, tp: str):
+        return np.dtype(self.__types[tp])
+
+
+class _WorkerLinks:
+    def __init__(self, ids: np.ndarray, b_nodes: np.ndarray):
+        self.id = _WorkerColumn(ids)
+        self.b_node = _WorkerColumn(b_nodes)
+        self.shape = (ids.shape[0], 2)
+
+
+class _WorkerColumn:
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self.shape = values.shape
+
+
+class _WorkerMatrix:
+    def __init__(self, matrix_view: np.ndarray):
+        self.matrix_view = matrix_view
+
+
+class _WorkerResults:
+    """Results of a worker process, writing skims and unreachable pairs into the shared arrays"""
+
+    def __init__(self, arrays: dict, settings: dict, threads: int):
+        self._graph_id = "shared"
+        self.cores = threads
+        self.nodes = settings["nodes"] + 1
+        self.compact_nodes = settings["nodes"]
+        self.compact_links = settings["links"]
+        self.num_skims = settings["skims"]
+        self.compute_skims = settings["skims"] > 0
+        self.skims = _WorkerMatrix(arrays.get("skims"))
+        self.classes = {"number": settings.get("classes", 1)}
+        self.no_path = arrays.get("no_path")
+        self.compact_link_loads = None
+        self._selected_links = {}
+        self.link_loads_accumulation = "per-thread"
+        # Select link analysis always runs on the threads of the main process
+        self.select_link_od_storage = "dense"
+        self.early_exit = settings.get("early_exit", False)
+        self.save_path_file = settings.get("save_path_file", False)
+        self.path_file_dir = settings.get("path_file_dir")
+        self.write_feather = settings.get("write_feather", True)
+        # Path and tree stores are written by the threads of the main process only
+        self.path_store = None
+        self.tree_store = None
@@ -1,5 +1,15 @@
 import numpy as np
 
+from aequilibrae import global_logger
+
+try:
+    from aequilibrae.paths.AoN import SelectLinkODBuffers
+except ImportError as ie:
+    global_logger.warning(f"Could not import procedures from the binary. {ie.args}")
+
+# Per-thread link load arrays larger than this (in bytes) are replaced by a single shared array in the "auto" mode
+MAX_PER_THREAD_LINK_LOADS_MEMORY = 2**28
+
 
 class MultiThreadedAoN:
     def __init__(self):
@@ -13,6 +23,8 @@ class MultiThreadedAoN:
         self.connectors = np.array([])
         # Temporary results for assignment. Necessary for parallelization
         self.temp_link_loads = np.array([])
+        # Whether all threads accumulate link loads directly into the results, instead of into temp_link_loads
+        self.shared_link_loads = False
         # Temporary nodes for assignment. Necessary for cascading
         self.temp_node_loads = np.array([])
         #  holds the b_nodes in case of flows through centroid connectors are blocked
@@ -23,14 +35,43 @@ class MultiThreadedAoN:
         self.select_links = np.array([])
         # Stores all select link OD matrices
         self.temp_sl_od_matrix = np.array([])
+        # Per-thread buffers with the OD pairs that use each link set, when select link OD matrices are sparse
+        self.sl_od_buffers = None
         # Stores all link loading matrices
         self.temp_sl_link_loading = np.array([])
         # Maps the names of the SL link sets to array indices
         self.sl_idx = {}
+        # Graph and results the arrays were last sized for
+        self.__prepared_for = None
 
     # In case we want to do by hand, we can prepare each method individually
 
     def prepare(self, graph, results):
+        # Arrays are reused by consecutive assignments with the same graph and results, such as the iterations of an
+        # equilibrium assignment. Only the ones that accumulate results over origins need to be cleared
+        prepared_for = (
+            graph._id,
+            graph.compact_graph.shape[0],
+            results.cores,
+            results.compact_nodes,
+            results.compact_links,
+            results.classes["number"],
+            len(results._selected_links),
+            results.select_link_od_storage,
+            results.num_skims,
+            self.use_shared_link_loads(results),
+        )
+        if prepared_for == self.__prepared_for:
+            self.temp_link_loads.fill(0)
+            if results._selected_links:
+                self.select_links = results.select_links
+                self.temp_sl_od_matrix.fill(0)
+                self.temp_sl_link_loading.fill(0)
+                if self.sl_od_buffers is not None:
+                    self.sl_od_buffers.clear()
+            return
+        self.__prepared_for = prepared_for
+
         itype = graph.default_types("int")
         ftype = graph.default_types("float")
         self.predecessors = np.zeros((results.cores, results.compact_nodes), dtype=itype)
@@ -38,15 +79,16 @@ class MultiThreadedAoN:
             self.has_flow_mask = np.zeros((results.cores, graph.compact_num_links), dtype=bool)
             # Copying the select link matrices from results
             self.select_links = results.select_links
+            sets, classes = len(results._selected_links), results.classes["number"]
+            self.sl_od_buffers = None
+            if results.select_link_od_storage == "sparse":
+                # Only the OD pairs that use the selected links are kept, so the dense array is just a placeholder
+                zones = 1
+                self.sl_od_buffers = SelectLinkODBuffers(results.cores, sets, graph.num_zones, classes)
+            else:
+                zones = graph.num_zones
             self.temp_sl_od_matrix = np.zeros(
-                (
-                    results.cores,
-                    len(results._selected_links),
-                    graph.num_zones,
-                    graph.num_zones,
-                    results.classes["number"],
-                ),
-                dtype=graph.default_types("float"),
+                (results.cores, sets, zones, zones, classes), dtype=graph.default_types("float")
             )
             self.temp_sl_link_loading = np.zeros(
                 (results.cores, len(results._selected_links), graph.compact_num_links, results.classes["number"]),
@@ -59,8 +101,27 @@ class MultiThreadedAoN:
             self.temporary_skims = np.zeros((results.cores, 1, 1), dtype=ftype)
         self.reached_first = np.zeros((results.cores, results.compact_nodes), dtype=itype)
         self.connectors = np.zeros((results.cores, results.compact_nodes), dtype=itype)
-        self.temp_link_loads = np.zeros((results.cores, results.links + 1, results.classes["number"]), dtype=ftype)
+        classes = results.classes["number"]
+        self.shared_link_loads = self.use_shared_link_loads(results)
+        if self.shared_link_loads:
+            self.temp_link_loads = np.zeros((1, 1, classes), dtype=ftype)
+        else:
+            self.temp_link_loads = np.zeros((results.cores, results.compact_links + 1, classes), dtype=ftype)
         self.temp_node_loads = np.zeros((results.cores, results.compact_nodes, results.classes["number"]), dtype=ftype)
         self.temp_b_nodes = np.zeros((results.cores, graph.compact_graph.b_node.shape[0]), dtype=itype)
         for i in range(results.cores):
             self.temp_b_nodes[i, :] = graph.compact_graph.b_node.values[:]
+
+    @staticmethod
+    def use_shared_link_loads(results) -> bool:
+        """Whether link loads are accumulated into a single array shared by all threads
+
+        In the "auto" mode, this happens when the per-thread arrays would exceed
+        *MAX_PER_THREAD_LINK_LOADS_MEMORY*. Select link analysis always uses per-thread arrays.
+        """
+        if results._selected_links or results.cores == 1:
+            return False
+        if results.link_loads_accumulation == "auto":
+            memory = results.cores * (results.compact_links + 1) * results.classes["number"] * 8
+            return memory > MAX_PER_THREAD_LINK_LOADS_MEMORY
+        return results.link_loads_accumulation == "shared"
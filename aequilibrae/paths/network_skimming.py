@@ -1,17 +1,21 @@
 import multiprocessing as mp
 import sys
-import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from multiprocessing.dummy import Pool as ThreadPool
+from typing import Optional
 from uuid import uuid4
 
+import numpy as np
+
 from aequilibrae import global_logger
 from aequilibrae.context import get_active_project
+from aequilibrae.paths.multi_process_aon import check_backend, skim_in_processes
 from aequilibrae.paths.multi_threaded_skimming import MultiThreadedNetworkSkimming
 from aequilibrae.paths.results.skim_results import SkimResults
+from aequilibrae.paths.results.skim_storage import check_skim_storage
 
 try:
-    from aequilibrae.paths.AoN import skimming_single_origin
+    from aequilibrae.paths.AoN import skimming_all_origins
 except ImportError as ie:
     global_logger.warning(f"Could not import procedures from the binary. {ie.args}")
 
@@ -63,6 +67,8 @@ class NetworkSkimming:
         self.origins = origins
         self.graph = graph
         self.cores = mp.cpu_count()
+        self.backend = "threads"
+        self.processes = None
         self.results = SkimResults()
         self.aux_res = MultiThreadedNetworkSkimming()
         self.report = []
@@ -78,11 +84,7 @@ class NetworkSkimming:
         self.skimming.emit(["zones finalized", 0])
         self.results.cores = self.cores
         self.results.prepare(self.graph)
-        self.aux_res = MultiThreadedNetworkSkimming()
-        self.aux_res.prepare(self.graph, self.results)
-
-        pool = ThreadPool(self.results.cores)
-        all_threads = {"count": 0}
+        origins = []
         for orig in list(self.graph.centroids):
             i = int(self.graph.nodes_to_indices[orig])
             if i >= self.graph.nodes_to_indices.shape[0]:
@@ -90,9 +92,23 @@ class NetworkSkimming:
             elif self.graph.fs[int(i)] == self.graph.fs[int(i) + 1]:
                 self.report.append(f"Centroid {orig} does not exist in the graph")
             else:
-                pool.apply_async(self.__func_skim_thread, args=(orig, all_threads))
-        pool.close()
-        pool.join()
+                origins.append(self.graph.compact_nodes_to_indices[orig])
+        origins = np.array(origins, dtype=np.int64)
+
+        if self.backend == "processes":
+            skim_in_processes(self, origins)
+        else:
+            # All origins are skimmed in a single call that releases the GIL, while we poll its progress from here
+            self.aux_res = MultiThreadedNetworkSkimming()
+            self.aux_res.prepare(self.graph, self.results)
+            progress = np.zeros(self.results.cores, dtype=np.int64)
+            args = (origins, self.graph, self.results, self.aux_res, progress, self.results.cores)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                job = executor.submit(skimming_all_origins, *args)
+                while not wait([job], timeout=0.1).done:
+                    self._report_progress(int(progress.sum()))
+                job.result()
+        self._report_progress(origins.shape[0])
         self.aux_res = None
         self.procedure_id = uuid4().hex
         self.procedure_date = str(datetime.today())
@@ -126,6 +142,37 @@ class NetworkSkimming:
         else:
             raise ValueError("Number of cores needs to be an integer")
 
+    def set_backend(self, backend: str, processes: Optional[int] = None) -> None:
+        """
+        Sets how origins are distributed for skimming
+
+        With *threads* (default), all origins are skimmed by the threads of this process. With *processes*, origins
+        are split into shards skimmed by separate worker processes, each one using its share of the cores, which
+        avoids contention for the GIL. The graph and skims are placed in shared memory, so they are not copied to the
+        workers.
+
+        :Arguments:
+            **backend** (:obj:`str`): One of 'threads' or 'processes'
+
+            **processes** (:obj:`int`, *Optional*): Number of worker processes. Defaults to the number of cores
+        """
+        check_backend(backend, processes)
+        self.backend = backend
+        self.processes = processes
+
+    def set_skim_storage(self, storage) -> None:
+        """
+        Sets where the skim matrices are kept
+
+        With *memory* (default), skims are kept in the memory of the process. With *shared*, they are kept in a POSIX
+        shared memory block that other processes can attach to by name. Providing a directory memory-maps skims to
+        files in it.
+
+        :Arguments:
+            **storage** (:obj:`Union[str, Path]`): One of 'memory' or 'shared', or an existing directory
+        """
+        self.results.skim_storage = check_skim_storage(storage)
+
     def save_to_project(self, name: str, format="omx", project=None) -> None:
         """Saves skim results to the project folder and creates record in the database
 
@@ -148,18 +195,7 @@ class NetworkSkimming:
         record.procedure = "Network skimming"
         record.save()
 
-    def __func_skim_thread(self, origin, all_threads):
-        if threading.get_ident() in all_threads:
-            th = all_threads[threading.get_ident()]
-        else:
-            all_threads[threading.get_ident()] = all_threads["count"]
-            th = all_threads["count"]
-            all_threads["count"] += 1
-        x = skimming_single_origin(origin, self.graph, self.results, self.aux_res, th)
-        self.cumulative += 1
-        if x != origin:
-            self.report.append(x)
-
+    def _report_progress(self, cumulative: int):
+        self.cumulative = cumulative
         self.skimming.emit(["zones finalized", self.cumulative])
-        txt = str(self.cumulative) + " / " + str(self.matrix.zones)
-        self.skimming.emit(["text skimming", txt])
+        self.skimming.emit(["text skimming", f"{self.cumulative} / {self.graph.num_zones}"])
@@ -0,0 +1,342 @@
+from typing import Optional
+
+import numpy as np
+from aequilibrae.matrix import SparseDemand
+from aequilibrae.paths.AoN import aggregate_link_costs, assign_link_loads, class_flows
+
+from aequilibrae.paths.all_or_nothing import allOrNothing
+from aequilibrae.paths.linear_approximation import LinearApproximation
+from aequilibrae.paths.traffic_class import TrafficClass
+
+
+class OriginBasedAssignment(LinearApproximation):
+    """Base class for equilibrium assignments that keep their solution disaggregated by origin
+
+    Subclasses store the flows of each origin (and user class) in their own structures and update them one origin at
+    a time, while this class takes care of link costs, convergence, skims and select link results.
+
+    The relative gap, the skims of the last iteration (AoN) and the convergence report are computed exactly as for
+    the link-based algorithms.
+    """
+
+    def __init__(self, assig_spec, algorithm, project=None) -> None:
+        super().__init__(assig_spec, algorithm, project=project)
+        self.convergence_report = {"iteration": [], "rgap": [], "warnings": []}
+
+        # Maximum number of flow shifting passes over each origin, per iteration
+        self.inner_iterations = 10
+
+        self._workspaces = {}
+
+    def _prepare_step_directions(self):
+        # The solution is kept per origin, so there are no descent directions to keep
+        pass
+
+    def _skims_at_iteration(self) -> bool:
+        # Skims are averaged over the paths used from each origin, so those of intermediate iterations are not used
+        return self.assig.skimming_policy == "blended"
+
+    def execute(self, resume_from=None):  # noqa: C901
+        if self.assig.initial_link_loads is not None:
+            raise ValueError(f"The {self.algorithm} assignment cannot start from initial link loads")
+        if resume_from is not None or self.assig.checkpoint_directory is not None:
+            raise ValueError(f"Checkpoints are not available for the {self.algorithm} assignment")
+
+        self._prepare_iteration_arrays()
+        for c in self.traffic_classes:
+            if c._aon_results.save_path_file:
+                raise ValueError(f"Saving path files is not supported by the {self.algorithm} assignment")
+            if c._aon_results.save_trees:
+                raise ValueError(f"Saving shortest path trees is not supported by the {self.algorithm} assignment")
+
+            c._aon_results._selected_links = c._selected_links
+            c.results._selected_links = c._selected_links
+
+            c.results.skim_storage = self.assig.skim_storage
+            c._aon_results.skim_storage = self.assig.skim_storage
+            c.results.prepare(c.graph, c.matrix)
+            c._aon_results.prepare(c.graph, c.matrix)
+            c.results.reset()
+
+            if c.fixed_cost_field:
+                v = c.graph.graph[c.fixed_cost_field].values[:]
+                c.fixed_cost[c.graph.graph.__supernet_id__] = v * c.fc_multiplier / c.vot
+                c.fixed_cost[np.isnan(c.fixed_cost)] = 0
+
+            c.graph.set_graph(self.time_field)
+
+            c._prepare_demand_csr()
+            self.aons[c._id] = allOrNothing(c._id, c.matrix, c.graph, c._aon_results, c._demand_csr)
+            self._workspaces[c._id] = self._prepare_workspace(c)
+        self._prepare_aon_runs()
+
+        self.equilibration.emit(["start", self.max_iter, "Equilibrium Assignment"])
+        self.logger.info(f"{self.algorithm} Assignment STATS")
+        self.logger.info("Iteration, RelativeGap")
+        for self.iter in range(1, self.max_iter + 1):  # noqa: B020
+            self.iteration_issue = []
+            self.equilibration.emit(["key_value", "rgap", self.rgap])
+            self.equilibration.emit(["key_value", "iterations", self.iter])
+
+            self._update_costs()
+            for c in self.traffic_classes:  # type: TrafficClass
+                self.assignment.emit(["start", c.matrix.zones, self.algorithm])
+                for cnt, (i, k) in enumerate(self._workspaces[c._id]["origins"]):
+                    links = self._update_origin(c, i, k)
+                    # Costs were linearly approximated while shifting flows, so we update them to their exact values.
+                    # The first iteration loads all origins with free-flow costs, as an all-or-nothing assignment
+                    if self.iter > 1:
+                        self._update_costs(c, links)
+                    if cnt % 10 == 0:
+                        self.assignment.emit(["update", cnt, self.algorithm])
+
+            for i, c in enumerate(self.traffic_classes):
+                res = c.results
+                class_flows(
+                    res.link_loads, res.link_loads, 1.0, res.total_link_loads, self.class_flow, i == 0, self.cores
+                )
+            self._add_preload()
+
+            # The gap is measured against an all-or-nothing assignment with the costs of the current solution
+            for c in self.traffic_classes:
+                if self.time_field in c.graph.skim_fields:
+                    k = c.graph.skim_fields.index(self.time_field)
+                    aggregate_link_costs(self.congested_time[:], c.graph.compact_skims[:, k], c.results.crosswalk)
+                    c.graph.skims[:, k] = self.congested_time[:]
+                c._aon_results.reset()
+            self._execute_aons(self._skims_at_iteration())
+
+            converged = self.check_convergence()
+            self.equilibration.emit(["update", self.iter, f"Equilibrium Assignment: RGap - {self.rgap:.3E}"])
+
+            self.convergence_report["iteration"].append(self.iter)
+            self.convergence_report["rgap"].append(self.rgap)
+            self.convergence_report["warnings"].append("; ".join(self.iteration_issue))
+            self.equilibration.emit(["key_value", "rgap", self.rgap])
+            self.equilibration.emit(["key_value", "iterations", self.iter])
+
+            self.logger.info(f"{self.iter},{self.rgap}")
+            if converged:
+                self.steps_below += 1
+                if self.steps_below >= self.steps_below_needed_to_terminate:
+                    break
+            else:
+                self.steps_below = 0
+
+        if self.assig.skimming_policy != "blended":
+            self._skim_final_costs()
+
+        for c in self.traffic_classes:
+            if c.results.num_skims > 0:
+                self.__compute_skims(c)
+            if c._selected_links:
+                self.__compute_select_link(c)
+            c.results.link_loads /= c.pce
+            c.results.total_flows()
+
+        if self.rgap > self.rgap_target:
+            self.logger.error(f"Desired RGap of {self.rgap_target} was NOT reached")
+        self.logger.info(f"{self.algorithm} Assignment finished. {self.iter} iterations and {self.rgap} final gap")
+        self.equilibration.emit(["update", self.max_iter, f"Equilibrium Assignment: RGap - {self.rgap:.3E}"])
+        self.assignment.emit(["finished"])
+        self.equilibration.emit(["finished"])
+
+    def _prepare_workspace(self, c: TrafficClass) -> dict:
+        """Arrays used for the origins of a traffic class. Subclasses add the ones that hold their solution"""
+        g = c.graph
+        classes = c.results.classes["number"]
+        if not isinstance(c.matrix, SparseDemand):
+            c.matrix.matrix_view = c.matrix.matrix_view.reshape((g.num_zones, g.num_zones, classes))
+
+        # Origins (and user classes) with demand to be assigned, given by their matrix index
+        origins = []
+        for orig in c.matrix.index:
+            i = int(g.compact_nodes_to_indices[orig])
+            if g.compact_fs[i] == g.compact_fs[i + 1]:
+                continue
+            for k in range(classes):
+                if np.nansum(self._demand(c, i, k)) > 0:
+                    origins.append((i, k))
+
+        # Links of the network in each link of the compressed graph, so costs can be updated for a few links only
+        crosswalk = c.results.crosswalk
+        network_fs = np.zeros(g.compact_num_links + 2, dtype=np.int64)
+        network_fs[1:] = np.cumsum(np.bincount(crosswalk, minlength=g.compact_num_links + 1))
+
+        ftype = g.default_types("float")
+        return {
+            "origins": origins,
+            "cost": np.zeros(g.compact_num_links + 1, dtype=ftype),
+            "derivative": np.zeros(g.compact_num_links + 1, dtype=ftype),
+            "network_fs": network_fs,
+            "network_links": np.argsort(crosswalk, kind="stable"),
+            "link_buffer": np.zeros(crosswalk.shape[0], dtype=ftype),
+        }
+
+    @staticmethod
+    def _demand(c: TrafficClass, origin: int, user_class: int) -> np.ndarray:
+        """Demand from an origin to all destinations for a user class. Sparse demand is expanded one origin at a time"""
+        if isinstance(c.matrix, SparseDemand):
+            return c.matrix.row(origin, user_class)
+        return c.matrix.matrix_view[origin, :, user_class]
+
+    def _update_origin(self, c: TrafficClass, origin: int, user_class: int) -> np.ndarray:
+        """Updates the flows of an origin, keeping *c.results.compact_link_loads* consistent with them
+
+        Returns the links of the compressed graph whose flows may have changed
+        """
+        raise NotImplementedError
+
+    def _origin_skims(self, c: TrafficClass, origin: int, user_class: int, origin_skims: np.ndarray):
+        """Writes the skims from an origin to all destinations into *origin_skims*"""
+        raise NotImplementedError
+
+    def _origin_select_link(self, c, origin, user_class, link_set_mask, sl_od, sl_loading):
+        """Adds the select link OD flows from an origin and the link loads of its select link flows"""
+        raise NotImplementedError
+
+    def _update_costs(self, c: Optional[TrafficClass] = None, links: Optional[np.ndarray] = None):
+        """Computes link costs and their derivatives for the current flows of all origins
+
+        When the flows of a single origin of class *c* changed, only its *links* of the compressed graph are updated.
+        Gathering the links involved costs more than a full pass over the network when they are many, so that is only
+        done for up to a fifth of the links of the graph
+        """
+        if links is not None and links.shape[0] * 5 < c.graph.compact_num_links:
+            self.__update_link_costs(c, links)
+            return
+
+        for i, c in enumerate(self.traffic_classes):
+            res = c.results
+            assign_link_loads(res.link_loads, res.compact_link_loads, res.crosswalk, self.cores)
+            class_flows(
+                res.link_loads, res.link_loads, c.pce, res.total_link_loads, self.class_flow, i == 0, self.cores
+            )
+        self._add_preload()
+
+        self.vdf.apply_vdf_and_derivative(
+            self.congested_time,
+            self.vdf_der,
+            self.fw_total_flow,
+            self.capacity,
+            self.free_flow_tt,
+            *self.vdf_parameters,
+            self.cores,
+        )
+
+        for c in self.traffic_classes:
+            ws = self._workspaces[c._id]
+            buffer = ws["link_buffer"]
+            np.add(c.fixed_cost, self.congested_time, out=buffer)
+            aggregate_link_costs(buffer, ws["cost"], c.results.crosswalk)
+            # Flows are kept in vehicles, while link costs respond to PCEs
+            np.multiply(self.vdf_der, c.pce, out=buffer)
+            aggregate_link_costs(buffer, ws["derivative"], c.results.crosswalk)
+
+    def __update_link_costs(self, c: TrafficClass, links: np.ndarray):
+        """Same as *_update_costs*, but only for the links of the network in some links of the graph of a class"""
+        res = c.results
+        network_links = self.__network_links(self._workspaces[c._id], links)
+        res.link_loads[network_links] = res.compact_link_loads[res.crosswalk[network_links]] * c.pce
+        res.total_link_loads[network_links] = res.link_loads[network_links].sum(axis=1)
+
+        flows = self.traffic_classes[0].results.total_link_loads[network_links]
+        for other in self.traffic_classes[1:]:
+            flows += other.results.total_link_loads[network_links]
+        self.class_flow[network_links] = flows
+        if self.preload is not None:
+            flows += self.preload[network_links]
+        self.fw_total_flow[network_links] = flows
+
+        self.vdf.apply_vdf_and_derivative(
+            self.congested_time,
+            self.vdf_der,
+            self.fw_total_flow,
+            self.capacity,
+            self.free_flow_tt,
+            *self.vdf_parameters,
+            self.cores,
+            links=network_links,
+        )
+
+        # Links of the graphs of all classes that hold the links updated, recomputed from all links in them
+        for other in self.traffic_classes:
+            ws = self._workspaces[other._id]
+            crosswalk = other.results.crosswalk
+            compact = np.unique(crosswalk[network_links])
+            updated = self.__network_links(ws, compact)
+            ws["cost"][compact] = 0
+            np.add.at(ws["cost"], crosswalk[updated], other.fixed_cost[updated] + self.congested_time[updated])
+            ws["derivative"][compact] = 0
+            np.add.at(ws["derivative"], crosswalk[updated], self.vdf_der[updated] * other.pce)
+
+    @staticmethod
+    def __network_links(ws: dict, links: np.ndarray) -> np.ndarray:
+        """Links of the network in the links of the compressed graph given, in network order within each of them"""
+        starts = ws["network_fs"][links]
+        counts = ws["network_fs"][links + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return ws["network_links"][offsets]
+
+    def __compute_skims(self, c: TrafficClass):
+        """Skims are averaged over all paths used from each origin, weighted by their flows"""
+        skims = c.results.skims.matrix_view
+
+        # Origins without demand are skimmed along the shortest paths of the last iteration
+        skims[:, :, :] = c._aon_results.skims.matrix_view[:, :, :]
+
+        origin_skims = np.zeros((c.graph.num_zones, c.results.num_skims), dtype=np.float64)
+        total = {}
+        weights = {}
+        for i, k in self._workspaces[c._id]["origins"]:
+            self._origin_skims(c, i, k, origin_skims)
+
+            # User classes in the same matrix are combined according to their demand
+            w = np.nan_to_num(self._demand(c, i, k))
+            total[i] = total.get(i, 0) + origin_skims * w[:, None]
+            weights[i] = weights.get(i, 0) + w
+
+        for i, skm in total.items():
+            has_demand = weights[i] > 0
+            skims[i, has_demand, :] = skm[has_demand, :] / weights[i][has_demand, None]
+
+    def __compute_select_link(self, c: TrafficClass):
+        links = c.graph.compact_num_links
+
+        names = list(c._selected_links.keys())
+        link_set_mask = np.zeros((len(names), links + 1), dtype=np.uint8)
+        for s, name in enumerate(names):
+            link_set_mask[s, c._selected_links[name]] = 1
+
+        sl_od = np.zeros((len(names), c.graph.num_zones), dtype=np.float64)
+        sl_loading = np.zeros((len(names), links + 1), dtype=np.float64)
+
+        # Sparse OD matrices are built from the OD pairs with demand through the selected links of all origins
+        sparse = c.results.select_link_od_storage == "sparse"
+        zones, classes = c.graph.num_zones, c.results.classes["number"]
+        entries = {name: ([], []) for name in names}
+        for name in names:
+            if not sparse:
+                c.results.select_link_od.matrix[name].fill(0)
+            c.results.select_link_loading[name].fill(0)
+
+        for i, k in self._workspaces[c._id]["origins"]:
+            sl_od.fill(0)
+            sl_loading.fill(0)
+            self._origin_select_link(c, i, k, link_set_mask, sl_od, sl_loading)
+            for s, name in enumerate(names):
+                if sparse:
+                    destinations = np.flatnonzero(sl_od[s, :])
+                    values = np.zeros((destinations.shape[0], classes))
+                    values[:, k] = sl_od[s, destinations]
+                    entries[name][0].append(i * zones + destinations)
+                    entries[name][1].append(values)
+                else:
+                    c.results.select_link_od.matrix[name][i, :, k] += sl_od[s, :]
+                c.results.select_link_loading[name][:, k] += sl_loading[s, :links]
+
+        if sparse:
+            for name, (keys, values) in entries.items():
+                keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+                values = np.concatenate(values) if values else np.zeros((0, classes))
+                c.results.select_link_od.matrix[name].set_entries(keys, values)
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+from aequilibrae.paths.AoN import path_shortest_tree, path_equilibrate, path_skims, path_select_link
+
+from aequilibrae.paths.origin_based_assignment import OriginBasedAssignment
+from aequilibrae.paths.traffic_class import TrafficClass
+
+
+class PathBasedAssignment(OriginBasedAssignment):
+    """Path-based equilibrium assignment using gradient projection
+
+    The paths used by each origin (and user class) are kept in a column store on the compressed graph. At every
+    iteration the shortest path to each destination is added to its path set, and flows are shifted from all other
+    paths towards it with Newton steps. Paths left without flow are dropped, so the store only holds active paths.
+
+    Path flows are available after the assignment through *path_flows*.
+    """
+
+    def __init__(self, assig_spec, algorithm, project=None) -> None:
+        super().__init__(assig_spec, algorithm, project=project)
+        self.inner_iterations = 3
+
+    def _prepare_workspace(self, c: TrafficClass) -> dict:
+        ws = super()._prepare_workspace(c)
+        g = c.graph
+        itype = g.default_types("int")
+        nodes = g.compact_num_nodes
+
+        ws.update(
+            {
+                "paths": {},
+                "b_nodes": g.compact_graph.b_node.values.astype(itype),
+                "ids": g.compact_graph.id.values.astype(itype),
+                "temp_b_nodes": np.zeros(g.compact_graph.shape[0], dtype=itype),
+                "pred": np.zeros(nodes, dtype=itype),
+                "conn": np.zeros(nodes, dtype=itype),
+                "reached_first": np.zeros(nodes, dtype=itype),
+                "tree_length": np.zeros(g.num_zones, dtype=itype),
+                "link_stamp": np.zeros(g.compact_num_links + 1, dtype=itype),
+            }
+        )
+        return ws
+
+    def _update_origin(self, c: TrafficClass, origin: int, user_class: int) -> np.ndarray:
+        g = c.graph
+        ws = self._workspaces[c._id]
+        demand = self._demand(c, origin, user_class)
+        zones = g.num_zones
+
+        tree_links = path_shortest_tree(
+            origin,
+            zones,
+            bool(g.block_centroid_flows),
+            demand,
+            ws["cost"],
+            g.compact_fs,
+            ws["b_nodes"],
+            ws["ids"],
+            ws["temp_b_nodes"],
+            ws["pred"],
+            ws["conn"],
+            ws["reached_first"],
+            ws["tree_length"],
+        )
+
+        od_ptr, path_ptr, path_links, path_flow = ws["paths"].get((origin, user_class), self.__empty_path_set(zones))
+        num_paths = path_flow.shape[0] + zones
+        new_od_ptr = np.zeros(zones + 1, dtype=np.int64)
+        new_path_ptr = np.zeros(num_paths + 1, dtype=np.int64)
+        new_path_links = np.zeros(path_links.shape[0] + tree_links, dtype=np.int32)
+        new_path_flow = np.zeros(num_paths, dtype=np.float64)
+
+        num_paths = path_equilibrate(
+            origin,
+            zones,
+            demand,
+            ws["pred"],
+            ws["conn"],
+            ws["tree_length"],
+            ws["cost"],
+            ws["derivative"],
+            c.results.compact_link_loads[:, user_class],
+            od_ptr,
+            path_ptr,
+            path_links,
+            path_flow,
+            new_od_ptr,
+            new_path_ptr,
+            new_path_links,
+            new_path_flow,
+            ws["link_stamp"],
+            1 if self.iter == 1 else self.inner_iterations,
+        )
+
+        # Only the active paths are kept
+        num_links = new_path_ptr[num_paths]
+        ws["paths"][(origin, user_class)] = (
+            new_od_ptr,
+            new_path_ptr[: num_paths + 1].copy(),
+            new_path_links[:num_links].copy(),
+            new_path_flow[:num_paths].copy(),
+        )
+        # Flows only change on the links of the paths, before and after they are updated
+        return np.union1d(path_links, new_path_links[:num_links])
+
+    def _origin_skims(self, c: TrafficClass, origin: int, user_class: int, origin_skims: np.ndarray):
+        path_skims(
+            c.graph.num_zones,
+            c.graph.compact_skims,
+            *self._workspaces[c._id]["paths"][(origin, user_class)],
+            origin_skims,
+        )
+
+    def _origin_select_link(self, c, origin, user_class, link_set_mask, sl_od, sl_loading):
+        od_ptr, path_ptr, path_links, path_flow = self._workspaces[c._id]["paths"][(origin, user_class)]
+        path_select_link(c.graph.num_zones, od_ptr, path_ptr, path_links, path_flow, link_set_mask, sl_od, sl_loading)
+
+    def path_flows(self, traffic_class: TrafficClass) -> pd.DataFrame:
+        """Paths used at equilibrium by a traffic class, with their flows
+
+        Paths are given as arrays of link IDs in the compressed graph, in the order they are traversed
+
+        :Arguments:
+            **traffic_class** (:obj:`TrafficClass`): Traffic class assigned
+
+        :Returns:
+            **paths** (:obj:`pd.DataFrame`): Origin, destination, matrix core, flow and links of each path
+        """
+        c = traffic_class
+        centroids = c.graph.centroids
+        records = []
+        for (i, k), (od_ptr, path_ptr, path_links, path_flow) in self._workspaces[c._id]["paths"].items():
+            for j in range(c.graph.num_zones):
+                for p in range(od_ptr[j], od_ptr[j + 1]):
+                    links = path_links[path_ptr[p] : path_ptr[p + 1]]
+                    records.append([centroids[i], centroids[j], c.matrix.view_names[k], path_flow[p], links])
+        return pd.DataFrame(records, columns=["origin", "destination", "matrix_core", "flow", "links"])
+
+    @staticmethod
+    def __empty_path_set(zones):
+        return np.zeros(zones + 1, np.int64), np.zeros(1, np.int64), np.zeros(0, np.int32), np.zeros(0, np.float64)
@@ -0,0 +1,246 @@
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from aequilibrae import global_logger
+
+try:
+    import pyarrow as pa
+except ImportError as ie:
+    global_logger.warning(f"Could not import pyarrow. Path stores are not available. {ie.args}")
+
+PATH_STORE_COMPRESSION = ["zstd", "lz4", None]
+
+# Arrays kept for each origin in path stores, and in stores of shortest path trees
+PATH_COLUMNS = ("links", "index")
+TREE_COLUMNS = ("predecessors", "connectors")
+
+# Origins written to each chunk of a path store. Reading the paths of an origin decompresses its whole chunk
+ORIGINS_PER_CHUNK = 64
+
+
+def path_store_file(path_base_dir: str, iteration: int, mode: str, class_id: str) -> str:
+    """Path store with the paths of a traffic class in an iteration, inside the path files of an assignment"""
+    return os.path.join(path_base_dir, f"iter{iteration}", f"path_c{mode}_{class_id}.arrow")
+
+
+def check_path_store_compression(compression: Optional[str]) -> Optional[str]:
+    if compression not in PATH_STORE_COMPRESSION:
+        raise ValueError(f"Path store compression needs to be one of {PATH_STORE_COMPRESSION}: {compression}")
+    return compression
+
+
+class PathStoreWriter:
+    """Writes the shortest path trees of all origins of an iteration into a single file
+
+    Paths are kept in the Arrow IPC file format, with one record batch (chunk) per *ORIGINS_PER_CHUNK* origins.
+    Each origin has the same data as the *o{origin}.feather* and *o{origin}_indexdata.feather* path files, in its
+    *links* and *index* columns. The origins in the file are listed in its metadata, so the chunk of each origin is
+    found without reading the chunks themselves. Other arrays can be kept for each origin instead, such as the
+    predecessors and connectors of their shortest path trees (*TREE_COLUMNS*).
+
+    Origins whose paths did not change since the previous iteration are not written again. Their row only has the
+    iteration in which their paths were written.
+
+    Origins can be added in any order and from several threads. Chunks are written as soon as all their origins
+    have been added.
+
+    :Arguments:
+        **file_name** (:obj:`str`): Path to the file to be written
+
+        **zones** (:obj:`int`): Number of zones in the graph
+
+        **iteration** (:obj:`int`): Iteration of the assignment
+
+        **compression** (:obj:`str`, *Optional*): One of 'zstd', 'lz4' or None. Defaults to 'zstd'
+
+        **previous** (:obj:`PathStoreWriter`, *Optional*): Writer of the previous iteration, used to find the
+        origins whose paths did not change
+
+        **columns** (:obj:`Tuple[str]`, *Optional*): Names of the arrays kept for each origin. Defaults to
+        *PATH_COLUMNS*
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        zones: int,
+        iteration: int,
+        compression: Optional[str] = "zstd",
+        previous: Optional["PathStoreWriter"] = None,
+        columns: Tuple[str, ...] = PATH_COLUMNS,
+    ):
+        self.file_name = file_name
+        self.columns = tuple(columns)
+        self.zones = zones
+        self.iteration = iteration
+        self.compression = check_path_store_compression(compression)
+
+        # Digests of the paths of each origin, and the iteration in which they were written
+        if previous is not None and previous.zones == zones:
+            self.digests = list(previous.digests)
+            self.stored_in = previous.stored_in.copy()
+        else:
+            self.digests = [None] * zones
+            self.stored_in = np.full(zones, -1, dtype=np.int64)
+
+        self.origins = np.zeros(0, dtype=np.int64)
+        self.__positions = {}
+        self.__pending = {}
+        self.__next_chunk = 0
+        self.__writer = None
+        self.__sink = None
+        self.__lock = threading.Lock()
+
+    def open(self, origins: np.ndarray) -> None:
+        """Starts the file for the origins that will be added
+
+        :Arguments:
+            **origins** (:obj:`np.ndarray`): Indices of the origins whose paths will be added
+        """
+        self.origins = np.sort(np.asarray(origins, dtype=np.int64))
+        self.__positions = {o: i for i, o in enumerate(self.origins.tolist())}
+        self.__pending = {}
+        self.__next_chunk = 0
+
+        metadata = {
+            "zones": str(self.zones),
+            "iteration": str(self.iteration),
+            "origins_per_chunk": str(ORIGINS_PER_CHUNK),
+            "origins": self.origins.astype("<i8").tobytes(),
+        }
+        fields = [("origin", pa.int64()), ("iteration", pa.int64())]
+        schema = pa.schema(fields + [(c, pa.large_list(pa.int64())) for c in self.columns], metadata=metadata)
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        self.__sink = pa.OSFile(self.file_name, "wb")
+        self.__writer = pa.ipc.new_file(self.__sink, schema, options=options)
+
+    def add(self, origin: int, *arrays: np.ndarray) -> None:
+        """Adds the paths from an origin, as computed for the path files
+
+        :Arguments:
+            **origin** (:obj:`int`): Index of the origin
+
+            **arrays** (:obj:`np.ndarray`): One array per column. For paths, the links of the paths to all
+            destinations (from the destination backwards) and the position in the links where the path to each
+            destination ends
+        """
+        digest = hashlib.blake2b(b"".join(a.tobytes() for a in arrays), digest_size=16).digest()
+        with self.__lock:
+            if digest == self.digests[origin] and self.stored_in[origin] >= 0:
+                arrays = tuple(a[:0] for a in arrays)
+            else:
+                self.digests[origin] = digest
+                self.stored_in[origin] = self.iteration
+            self.__pending[self.__positions[origin]] = (origin, self.stored_in[origin], *arrays)
+            self.__write_complete_chunks()
+
+    def close(self) -> None:
+        """Writes the remaining chunks and closes the file"""
+        if self.__writer is None:
+            return
+        with self.__lock:
+            self.__write_complete_chunks(force=True)
+            self.__writer.close()
+            self.__sink.close()
+            self.__writer = None
+
+    def __write_complete_chunks(self, force=False):
+        while self.__next_chunk * ORIGINS_PER_CHUNK < self.origins.shape[0]:
+            first = self.__next_chunk * ORIGINS_PER_CHUNK
+            positions = range(first, min(first + ORIGINS_PER_CHUNK, self.origins.shape[0]))
+            if not force and any(p not in self.__pending for p in positions):
+                return
+
+            # Origins that were never added (only when forced) are written without paths
+            empty = (np.zeros(0, dtype=np.int64),) * len(self.columns)
+            rows = [self.__pending.pop(p, (self.origins[p], -1, *empty)) for p in positions]
+            columns = [pa.array([r[0] for r in rows], type=pa.int64()), pa.array([r[1] for r in rows], type=pa.int64())]
+            columns += [_list_array([r[2 + i] for r in rows]) for i in range(len(self.columns))]
+            self.__writer.write_batch(pa.record_batch(columns, names=["origin", "iteration", *self.columns]))
+            self.__next_chunk += 1
+
+
+class PathStore:
+    """Reads the paths of single origins from a path store, without reading the rest of the file
+
+    The file is memory-mapped, so only the chunk with the origin requested is read (and decompressed)
+
+    .. code-block:: python
+
+        >>> store = PathStore(path_store_file)  # doctest: +SKIP
+        >>> iteration, links, index = store.read_origin(origin)  # doctest: +SKIP
+
+    :Arguments:
+        **file_name** (:obj:`str`): Path to the path store
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.__reader = pa.ipc.open_file(pa.memory_map(file_name, "r"))
+        metadata = self.__reader.schema.metadata
+        self.zones = int(metadata[b"zones"])
+        self.iteration = int(metadata[b"iteration"])
+        self.origins_per_chunk = int(metadata[b"origins_per_chunk"])
+        self.origins = np.frombuffer(metadata[b"origins"], dtype="<i8")
+        self.columns = tuple(self.__reader.schema.names[2:])
+
+    @property
+    def chunks(self) -> int:
+        return self.__reader.num_record_batches
+
+    def read_origin(self, origin: int) -> Tuple[np.ndarray, ...]:
+        """Paths from an origin
+
+        :Arguments:
+            **origin** (:obj:`int`): Index of the origin
+
+        :Returns:
+            **iteration** (:obj:`int`): Iteration in which the paths were stored. When it is not the iteration of
+            this store, the paths did not change since then and are only available in the store of that iteration
+
+            **arrays** (:obj:`np.ndarray`): One array per column, empty if they are in the store of another
+            iteration. For paths, *links* and *index*: the links of the paths and the position in *links* where the
+            path to each destination ends
+        """
+        position = int(np.searchsorted(self.origins, origin))
+        if position == self.origins.shape[0] or self.origins[position] != origin:
+            raise KeyError(f"There are no paths for origin {origin} in {self.file_name}")
+
+        batch = self.__reader.get_batch(position // self.origins_per_chunk)
+        row = position % self.origins_per_chunk
+        arrays = [batch.column(2 + i)[row].values.to_numpy(zero_copy_only=False) for i in range(len(self.columns))]
+        return (int(batch.column(1)[row].as_py()), *arrays)
+
+    def read_chunk(self, chunk: int) -> Tuple[np.ndarray, np.ndarray, Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+        """All origins in a chunk of the store
+
+        :Arguments:
+            **chunk** (:obj:`int`): Position of the chunk
+
+        :Returns:
+            **origins** (:obj:`np.ndarray`): Indices of the origins in the chunk
+
+            **iterations** (:obj:`np.ndarray`): Iteration in which the arrays of each origin were stored
+
+            **columns** (:obj:`Dict[str, Tuple[np.ndarray, np.ndarray]]`): Offsets and values of each column. The
+            array of the i-th origin is *values[offsets[i]:offsets[i + 1]]*
+        """
+        batch = self.__reader.get_batch(chunk)
+        columns = {}
+        for i, name in enumerate(self.columns):
+            column = batch.column(2 + i)
+            offsets = column.offsets.to_numpy(zero_copy_only=False)
+            values = column.values.to_numpy(zero_copy_only=False)
+            columns[name] = (offsets - offsets[0], values[offsets[0] : offsets[-1]])
+        return batch.column(0).to_numpy(), batch.column(1).to_numpy(), columns
+
+
+def _list_array(arrays) -> "pa.LargeListArray":
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([a.shape[0] for a in arrays])
+    values = np.concatenate(arrays).astype(np.int64) if arrays else np.zeros(0, dtype=np.int64)
+    return pa.LargeListArray.from_arrays(pa.array(offsets), pa.array(values))
@@ -1,9 +1,13 @@
 import multiprocessing as mp
 from abc import ABC, abstractmethod
+from typing import Optional
 
 import numpy as np
-from aequilibrae.matrix import AequilibraeMatrix, AequilibraeData
+from aequilibrae.matrix import AequilibraeMatrix, AequilibraeData, SparseDemand
 from aequilibrae.paths.graph import Graph, TransitGraph, GraphBase, _get_graph_to_network_mapping
+from aequilibrae.paths.multi_process_aon import check_backend
+from aequilibrae.paths.results.select_link_od import SparseSelectLinkOD, check_select_link_od_storage
+from aequilibrae.paths.results.skim_storage import check_skim_storage, create_skim_matrix
 from aequilibrae.parameters import Parameters
 from aequilibrae import global_logger
 from pathlib import Path
@@ -112,6 +116,33 @@ class AssignmentResults(AssignmentResultsBase):
         self.save_path_file = False
         self.path_file_dir = None
         self.write_feather = True  # we use feather as default, parquet is slower but with better compression
+        # Paths of all origins can instead go to a single path store per iteration and class, written by *path_store*
+        self.use_path_store = False
+        self.path_store_compression = "zstd"
+        self.path_store = None  # Writer of the path store for the current iteration
+
+        # Shortest path trees kept for select link analysis after the assignment. See *SelectLinkReplay*
+        self.save_trees = False
+        self.tree_store = None  # Writer of the tree store for the current iteration
+
+        # How threads accumulate link loads during all-or-nothing assignments
+        self.link_loads_accumulation = "auto"
+
+        # Stops shortest path searches once all destinations with demand are reached. Not used when skimming
+        self.early_exit = True
+
+        # Whether the all-or-nothing assignment skims the graph, when it has skim fields
+        self.compute_skims = True
+
+        # Where skim matrices are kept. See *set_skim_storage*
+        self.skim_storage = "memory"
+
+        # Whether select link OD matrices are dense arrays or only keep the OD pairs that use the selected links
+        self.select_link_od_storage = "dense"
+
+        # Whether origins are assigned by threads or by worker processes. See *set_backend*
+        self.backend = "threads"
+        self.processes = None
 
     # In case we want to do by hand, we can prepare each method individually
     def prepare(self, graph: Graph, matrix: AequilibraeMatrix) -> None:
@@ -121,8 +152,8 @@ class AssignmentResults(AssignmentResultsBase):
         :Arguments:
             **graph** (:obj:`Graph`): Needs to have been set with number of centroids and list of skims (if any)
 
-            **matrix** (:obj:`AequilibraeMatrix`): Matrix properly set for computation with
-            ``matrix.computational_view(:obj:`list`)``
+            **matrix** (:obj:`Union[AequilibraeMatrix, SparseDemand]`): Matrix properly set for computation with
+            ``matrix.computational_view(:obj:`list`)``, or sparse demand
         """
 
         self.__float_type = graph.default_types("float")
@@ -131,7 +162,9 @@ class AssignmentResults(AssignmentResultsBase):
         if matrix.view_names is None:
             raise ValueError("Please set the matrix_procedures computational view")
         self.classes["number"] = 1
-        if len(matrix.matrix_view.shape) > 2:
+        if isinstance(matrix, SparseDemand):
+            self.classes["number"] = len(matrix.view_names)
+        elif len(matrix.matrix_view.shape) > 2:
             self.classes["number"] = matrix.matrix_view.shape[2]
         self.classes["names"] = matrix.view_names
 
@@ -156,13 +189,19 @@ class AssignmentResults(AssignmentResultsBase):
         self._graph_id = graph._id
 
         if self._selected_links:
-            self.select_link_od = AequilibraeMatrix()
-            self.select_link_od.create_empty(
-                memory_only=True,
-                zones=matrix.zones,
-                matrix_names=list(self._selected_links.keys()),
-                index_names=matrix.index_names,
-            )
+            if self.select_link_od_storage == "sparse":
+                index_name = matrix.index_names[0] if matrix.index_names else "main_index"
+                self.select_link_od = SparseSelectLinkOD(
+                    list(self._selected_links.keys()), graph.centroids, self.classes["number"], index_name
+                )
+            else:
+                self.select_link_od = AequilibraeMatrix()
+                self.select_link_od.create_empty(
+                    memory_only=True,
+                    zones=matrix.zones,
+                    matrix_names=list(self._selected_links.keys()),
+                    index_names=matrix.index_names,
+                )
 
             self.select_link_loading = {}
             # Combine each set of selected links into one large matrix that can be parsed into Cython
@@ -182,10 +221,11 @@ class AssignmentResults(AssignmentResultsBase):
                 # Multidimensional arrays where each row has different lengths
                 self.select_links[i][: len(arr)] = arr
                 # Correctly sets the dimensions for the final output matrices
-                self.select_link_od.matrix[name] = np.zeros(
-                    (graph.num_zones, graph.num_zones, self.classes["number"]),
-                    dtype=graph.default_types("float"),
-                )
+                if self.select_link_od_storage == "dense":
+                    self.select_link_od.matrix[name] = np.zeros(
+                        (graph.num_zones, graph.num_zones, self.classes["number"]),
+                        dtype=graph.default_types("float"),
+                    )
                 self.select_link_loading[name] = np.zeros(
                     (graph.compact_num_links, self.classes["number"]),
                     dtype=graph.default_types("float"),
@@ -218,19 +258,74 @@ class AssignmentResults(AssignmentResultsBase):
         self.no_path = np.zeros((self.zones, self.zones), dtype=self.__integer_type)
 
         if self.num_skims > 0:
-            self.skims = AequilibraeMatrix()
-
-            self.skims.create_empty(file_name=self.skims.random_name(), zones=self.zones, matrix_names=self.skim_names)
-            self.skims.index[:] = self.centroids[:]
-            self.skims.computational_view()
-            if len(self.skims.matrix_view.shape[:]) == 2:
-                self.skims.matrix_view = self.skims.matrix_view.reshape((self.zones, self.zones, 1))
+            self.skims = create_skim_matrix(self.zones, self.skim_names, self.centroids, self.skim_storage)
         else:
             self.skims = AequilibraeMatrix()
             self.skims.matrix_view = np.array((1, 1, 1))
 
         self.reset()
 
+    def set_skim_storage(self, storage) -> None:
+        """
+        Sets where skim matrices are kept. Takes effect the next time results are prepared
+
+        With *memory* (default), skims are kept in the memory of the process. With *shared*, they are kept in a POSIX
+        shared memory block that other processes can attach to by name. Providing a directory memory-maps skims to
+        files in it, which keeps them out of memory for very large models.
+
+        :Arguments:
+            **storage** (:obj:`Union[str, Path]`): One of 'memory' or 'shared', or an existing directory
+        """
+        self.skim_storage = check_skim_storage(storage)
+
+    def set_select_link_od_storage(self, storage: str) -> None:
+        """
+        Sets how the OD matrices of select link analysis are kept. Takes effect the next time results are prepared
+
+        With *dense* (default), each set of selected links has a full OD matrix, and every thread keeps its own copy
+        during the all-or-nothing assignment. With *sparse*, only the OD pairs whose paths use the selected links are
+        kept, both by the threads and in the results, which are then :obj:`SparseSelectLinkOD` matrices. This keeps
+        select link analysis of many link sets on models with many zones within memory.
+
+        :Arguments:
+            **storage** (:obj:`str`): One of 'dense' or 'sparse'
+        """
+        self.select_link_od_storage = check_select_link_od_storage(storage)
+
+    def set_backend(self, backend: str, processes: Optional[int] = None) -> None:
+        """
+        Sets how origins are distributed during all-or-nothing assignments
+
+        With *threads* (default), all origins are assigned by the threads of this process. With *processes*, origins
+        are split into shards assigned by separate worker processes, each one using its share of the cores, and their
+        link loads are summed at the end. The graph, costs and demand are placed in shared memory, so they are not
+        copied to the workers. Select link analysis always uses threads.
+
+        :Arguments:
+            **backend** (:obj:`str`): One of 'threads' or 'processes'
+
+            **processes** (:obj:`int`, *Optional*): Number of worker processes. Defaults to the number of cores
+        """
+        check_backend(backend, processes)
+        self.backend = backend
+        self.processes = processes
+
+    def set_link_loads_accumulation(self, mode: str) -> None:
+        """
+        Sets how link loads are accumulated across threads during all-or-nothing assignments
+
+        With *per-thread*, each thread keeps its own copy of the link loads, which are summed at the end. With *shared*,
+        all threads add their loads to a single array, which bounds memory consumption for large networks with many
+        threads at the cost of some synchronization. The default (*auto*) uses per-thread arrays unless they are
+        predicted to take more than 256 MB. Select link analysis always uses per-thread arrays.
+
+        :Arguments:
+            **mode** (:obj:`str`): One of 'auto', 'per-thread' or 'shared'
+        """
+        if mode not in ["auto", "per-thread", "shared"]:
+            raise ValueError(f"Link loads accumulation mode not valid: {mode}")
+        self.link_loads_accumulation = mode
+
     def total_flows(self) -> None:
         """
         Totals all link flows for this class into a single link load
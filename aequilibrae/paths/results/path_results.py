@@ -1,11 +1,14 @@
+import multiprocessing as mp
+
 import numpy as np
+import pyarrow as pa
 
 from aequilibrae import global_logger
 from aequilibrae.paths.graph import Graph
 from typing import Union, List
 
 try:
-    from aequilibrae.paths.AoN import update_path_trace, path_computation, HEURISTIC_MAP
+    from aequilibrae.paths.AoN import update_path_trace, path_computation, batched_path_finding, HEURISTIC_MAP
 except ImportError as ie:
     global_logger.warning(f"Could not import procedures from the binary. {ie.args}")
 
@@ -63,6 +66,7 @@ class PathResults:
         self.graph: Graph = None
         self.early_exit = False
         self.a_star = False
+        self.bidirectional = False
         self.links = -1
         self.nodes = -1
         self.zones = -1
@@ -74,6 +78,7 @@ class PathResults:
         self._early_exit = self.early_exit
         self._a_star = self.a_star
         self._heuristic = "equirectangular"
+        self.contraction_hierarchy = None
 
     def compute_path(
         self,
@@ -82,10 +87,16 @@ class PathResults:
         early_exit: bool = False,
         a_star: bool = False,
         heuristic: Union[str, None] = None,
+        bidirectional: bool = False,
     ) -> None:
         """Computes the path between two nodes in the network.
 
-        `A*` heuristics are currently only valid distance cost fields.
+        The haversine and equirectangular `A*` heuristics are only valid for distance cost fields. The landmarks
+        heuristic is valid for any non-negative cost, and requires landmarks computed with ``Graph.prepare_landmarks``.
+
+        When a contraction hierarchy is set with ``set_contraction_hierarchy``, paths are found with it unless
+        ``a_star`` is ``True``. Only the nodes on the path are then part of the shortest path tree, and skims are only
+        computed for the destination.
 
         :Arguments:
             **origin** (:obj:`int`): Origin for the path
@@ -99,24 +110,164 @@ class PathResults:
             When ``True``, ``early_exit`` is always ``True``. Default is ``False``.
 
             **heuristic** (:obj:`str`): Heuristic to use if ``a_star`` is enabled. Default is ``None``.
+
+            **bidirectional** (:obj:`bool`): Whether to search from both the origin and the destination until the
+            searches meet, which scans fewer nodes than Dijkstra's algorithm for long paths. When ``True``,
+            ``early_exit`` is always ``True`` and skims are not computed. Ignored if ``a_star`` is ``True``.
+            Default is ``False``.
         """
 
         if self.graph is None:
             raise Exception("You need to set graph skimming before you compute a path")
 
-        if a_star and self.graph.lonlat_index.empty:
+        if heuristic is not None:
+            self.set_heuristic(heuristic)
+
+        if a_star and self._heuristic == "landmarks":
+            if self.graph.landmarks is None or not self.graph.landmarks.valid_for(self.graph):
+                raise ValueError("You need landmarks for the current costs of the graph. See graph.prepare_landmarks")
+        elif a_star and self.graph.lonlat_index.empty:
             raise Exception("You need to supply a lon/lat index to graph.prepare_graph to use A*")
 
-        self.early_exit = self._early_exit = early_exit or a_star
+        self.early_exit = self._early_exit = early_exit or a_star or bidirectional
         self.a_star = self._a_star = a_star
-        if heuristic is not None:
-            self.set_heuristic(heuristic)
+        self.bidirectional = bidirectional
+        if self.contraction_hierarchy is not None and not a_star:
+            # The tree only has the nodes on the path, so tracing other destinations requires a new search
+            self._early_exit = True
+            self.__contraction_hierarchy_path(origin, destination)
+            return
         path_computation(origin, destination, self.graph, self)
         if self.graph.skim_fields:
             self.skims.fill(np.inf)
             self.skims[self.graph.all_nodes, :] = self._skimming_array[:-1, :]
             self.skims[self.skims > self.__graph_sum] = np.inf
 
+    def compute_paths(self, origins: np.ndarray, destinations: np.ndarray, cores: int = 0) -> pa.Table:
+        """Computes the paths between many pairs of nodes at once
+
+        Pairs are grouped by origin, and each origin is searched only once, until all its destinations are found.
+        Origins are searched in parallel. The state of this object (e.g. ``path`` and ``predecessors``) is not changed.
+
+        :Arguments:
+            **origins** (:obj:`np.ndarray`): Origin of each path
+
+            **destinations** (:obj:`np.ndarray`): Destination of each path
+
+            **cores** (:obj:`int`, *Optional*): Number of threads. Zero uses all available, and negative values
+            leave that many out. Default is ``0``.
+
+        :Returns:
+            **paths** (:obj:`pa.Table`): One row per pair, in the order given, with its *origin*, *destination*, the
+            link IDs (*path*) and directions (*path_link_directions*) of its path, its *cost* and one column per skim.
+            Paths are empty and costs infinite for destinations that cannot be reached
+        """
+        if self.graph is None:
+            raise Exception("You need to set graph skimming before you compute a path")
+
+        graph = self.graph
+        origins = np.asarray(origins, dtype=np.int64)
+        destinations = np.asarray(destinations, dtype=np.int64)
+        if origins.shape != destinations.shape or origins.ndim != 1:
+            raise ValueError("Origins and destinations must be one-dimensional arrays of the same size")
+
+        indices = []
+        for nodes in (origins, destinations):
+            in_range = (nodes >= 0) & (nodes < graph.nodes_to_indices.shape[0])
+            idx = np.full(nodes.shape[0], -1, dtype=np.int64)
+            idx[in_range] = graph.nodes_to_indices[nodes[in_range]]
+            if np.any(idx < 0):
+                raise ValueError(f"Nodes {np.unique(nodes[idx < 0]).tolist()} are not in the graph")
+            indices.append(idx)
+        origin_idx, destination_idx = indices
+
+        order = np.argsort(origin_idx, kind="stable")
+        groups, first = np.unique(origin_idx[order], return_index=True)
+        group_offsets = np.append(first, order.shape[0]).astype(np.int64)
+
+        if cores <= 0:
+            cores = max(1, mp.cpu_count() + cores)
+        zones = graph.num_zones if graph.block_centroid_flows and graph.num_zones > 0 else 0
+        skims = np.ascontiguousarray(graph.skims[:, : self.num_skims]) if self.num_skims else np.zeros((1, 0))
+        offsets, links, costs, path_skims = batched_path_finding(
+            groups.astype(np.int64),
+            group_offsets,
+            destination_idx[order],
+            order.astype(np.int64),
+            graph.cost,
+            graph.graph.b_node.to_numpy(),
+            graph.fs,
+            graph.graph.id.to_numpy(),
+            skims,
+            graph.num_nodes + 1,
+            zones,
+            min(cores, max(groups.shape[0], 1)),
+        )
+
+        offsets = pa.array(offsets)
+        table = {
+            "origin": origins,
+            "destination": destinations,
+            "path": pa.LargeListArray.from_arrays(offsets, pa.array(graph.graph.link_id.to_numpy()[links])),
+            "path_link_directions": pa.LargeListArray.from_arrays(
+                offsets, pa.array(graph.graph.direction.to_numpy()[links])
+            ),
+            "cost": costs,
+        }
+        for i, field in enumerate(graph.skim_fields):
+            table[field] = path_skims[:, i]
+        return pa.table(table)
+
+    def set_contraction_hierarchy(self, hierarchy) -> None:
+        """
+        Sets a contraction hierarchy to compute paths with, or removes it when None
+
+        :Arguments:
+            **hierarchy** (:obj:`ContractionHierarchy`): Hierarchy built for the graph this object was prepared with,
+            with its current costs
+        """
+        if hierarchy is not None:
+            if self.graph is None:
+                raise Exception("You need to prepare the results with a graph before setting a contraction hierarchy")
+            if not hierarchy.built_for(self.graph):
+                raise ValueError("Contraction hierarchy was not built for this graph and its current costs")
+        self.contraction_hierarchy = hierarchy
+
+    def __contraction_hierarchy_path(self, origin: int, destination: int) -> None:
+        graph = self.graph
+        self.origin = origin
+        self.destination = destination
+        origin_index = graph.nodes_to_indices[origin]
+        dest_index = graph.nodes_to_indices[destination]
+
+        self.predecessors.fill(-1)
+        self.connectors.fill(-1)
+        if self.skims is not None:
+            self.skims.fill(np.inf)
+            self.skims[origin, :] = 0
+
+        hierarchy = self.contraction_hierarchy
+        cost, links = hierarchy.compute_path(origin_index, dest_index)
+        if links is None or origin_index == dest_index:
+            self.path = None
+            self.path_nodes = None
+            self.path_link_directions = None
+            self.milepost = None
+            return
+
+        nodes = np.empty(links.shape[0] + 1, dtype=self.__integer_type)
+        nodes[0] = origin_index
+        nodes[1:] = hierarchy._link_heads[links]
+        self.predecessors[nodes[1:]] = nodes[:-1]
+        self.connectors[nodes[1:]] = hierarchy._link_graph_ids[links]
+        self.path = hierarchy._link_ids[links].astype(self.__integer_type)
+        self.path_nodes = graph.all_nodes[nodes]
+        self.path_link_directions = hierarchy._link_directions[links].astype(self.__integer_type)
+        self.milepost = np.zeros(links.shape[0] + 1, dtype=self.__float_type)
+        np.cumsum(graph.cost[links], out=self.milepost[1:])
+        if self.skims is not None:
+            self.skims[destination, :] = graph.skims[links, : self.num_skims].sum(axis=0)
+
     def prepare(self, graph: Graph) -> None:
         """
         Prepares the object with dimensions corresponding to the graph object
@@ -150,6 +301,7 @@ class PathResults:
         # where one needs to traverse all links (or almost all) in both directions.
         self.__graph_sum = 2 * graph.cost.sum()
         self.graph = graph
+        self.contraction_hierarchy = None
 
     def reset(self) -> None:
         """
@@ -167,6 +319,7 @@ class PathResults:
             self.milepost = None
             self._early_exit = self.early_exit = False
             self._a_star = self.a_star = False
+            self.bidirectional = False
             self._heuristic = "equirectangular"
 
         else:
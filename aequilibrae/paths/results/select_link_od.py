@@ -0,0 +1,153 @@
+from typing import List, Tuple
+
+import numpy as np
+import openmatrix as omx
+import scipy.sparse
+import tables
+
+SELECT_LINK_OD_STORAGE_TYPES = ["dense", "sparse"]
+
+# Rows of the dense matrices written at a time when exporting sparse matrices
+EXPORT_ROWS = 256
+
+
+class SparseODMatrix:
+    """OD matrix of a set of selected links, kept only for the OD pairs whose paths use any of the links
+
+    OD pairs are identified by their key *origin * zones + destination*, with origins and destinations given by their
+    position in the index of the demand matrix. Keys are sorted and unique, and *values* has the demand of all classes
+    for the pair in the same position of *keys*.
+
+    :Arguments:
+        **zones** (:obj:`int`): Number of zones
+
+        **classes** (:obj:`int`): Number of classes in the demand matrix
+    """
+
+    def __init__(self, zones: int, classes: int):
+        self.zones = zones
+        self.classes = classes
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.values = np.zeros((0, classes), dtype=np.float64)
+
+    @property
+    def nnz(self) -> int:
+        """Number of OD pairs kept"""
+        return self.keys.shape[0]
+
+    def set(self, keys: np.ndarray, values: np.ndarray) -> None:
+        """Replaces the contents of the matrix with OD pairs given by sorted and unique keys"""
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64).reshape((-1, self.classes))
+
+    def set_entries(self, keys: np.ndarray, values: np.ndarray) -> None:
+        """Replaces the contents of the matrix with OD pairs in any order, summing the values of repeated keys"""
+        unique, position = np.unique(keys, return_inverse=True)
+        summed = np.zeros((unique.shape[0], self.classes), dtype=np.float64)
+        np.add.at(summed, position, values)
+        self.set(unique, summed)
+
+    def clear(self) -> None:
+        self.set(np.zeros(0, dtype=np.int64), np.zeros((0, self.classes)))
+
+    def copy_from(self, other: "SparseODMatrix") -> None:
+        self.set(other.keys.copy(), other.values.copy())
+
+    def linear_combination(self, matrix1: "SparseODMatrix", matrix2: "SparseODMatrix", stepsize: float) -> None:
+        """Sets the matrix to *matrix1 * stepsize + matrix2 * (1 - stepsize)*, as *linear_combination_skims* does for
+        dense matrices"""
+        self.__combine([(stepsize, matrix1), (1.0 - stepsize, matrix2)])
+
+    def triple_linear_combination(self, matrix1, matrix2, matrix3, stepsizes: np.ndarray) -> None:
+        """Sets the matrix to the combination of three matrices with the given stepsizes, as
+        *triple_linear_combination_skims* does for dense matrices"""
+        self.__combine([(stepsizes[0], matrix1), (stepsizes[1], matrix2), (stepsizes[2], matrix3)])
+
+    def __combine(self, terms: List[Tuple[float, "SparseODMatrix"]]) -> None:
+        # The result has the union of the OD pairs of all matrices, as any of them may be the only one with demand
+        keys = np.unique(np.concatenate([m.keys for _, m in terms]))
+        values = np.zeros((keys.shape[0], self.classes), dtype=np.float64)
+        for factor, m in terms:
+            if factor != 0:
+                values[np.searchsorted(keys, m.keys)] += factor * m.values
+
+        # Pairs dropped by a full step of the combination are dropped from the structure as well
+        keep = np.any(values != 0, axis=1)
+        self.set(keys[keep], values[keep])
+
+    def to_scipy(self, core: int = 0) -> scipy.sparse.coo_matrix:
+        """The matrix for one of the classes, as a scipy sparse matrix"""
+        return scipy.sparse.coo_matrix(
+            (self.values[:, core], (self.keys // self.zones, self.keys % self.zones)), shape=(self.zones, self.zones)
+        )
+
+    def to_dense(self, first: int = 0, last: int = None) -> np.ndarray:
+        """Dense copy of the rows of the matrix for origins from *first* up to (but not including) *last*
+
+        :Returns:
+            **matrix** (:obj:`np.ndarray`): Array with origins, destinations and classes as its dimensions, as in the
+            dense select link OD matrices
+        """
+        last = self.zones if last is None else last
+        dense = np.zeros((last - first, self.zones, self.classes), dtype=np.float64)
+        lower, upper = np.searchsorted(self.keys, [first * self.zones, last * self.zones])
+        keys = self.keys[lower:upper]
+        dense[keys // self.zones - first, keys % self.zones, :] = self.values[lower:upper]
+        return dense
+
+
+class SparseSelectLinkOD:
+    """Sparse OD matrices of all sets of selected links of a traffic class
+
+    Used as the *select_link_od* of assignment results when select link OD matrices are kept sparse. Just like the
+    dense matrices, the matrix of each set of links is in *matrix[name]*.
+
+    :Arguments:
+        **names** (:obj:`List[str]`): Names of the sets of selected links
+
+        **index** (:obj:`np.ndarray`): Centroids of the OD matrices
+
+        **classes** (:obj:`int`): Number of classes in the demand matrix
+
+        **index_name** (:obj:`str`, *Optional*): Name of the index when exported. Defaults to 'main_index'
+    """
+
+    def __init__(self, names: List[str], index: np.ndarray, classes: int, index_name: str = "main_index"):
+        self.names = list(names)
+        self.index = np.array(index, dtype=np.int64)
+        self.index_names = [index_name]
+        self.zones = self.index.shape[0]
+        self.classes = classes
+        self.matrix = {name: SparseODMatrix(self.zones, classes) for name in self.names}
+
+    def export(self, output_name: str, cores: List[str] = None) -> None:
+        """Exports the matrices to OMX, with the same layout as the dense select link OD matrices
+
+        Matrices are written a block of rows at a time, so their dense versions are never built in full
+
+        :Arguments:
+            **output_name** (:obj:`str`): Path to the output file
+
+            **cores** (:obj:`list`, *Optional*): Names of the sets of selected links to export. Defaults to all
+        """
+        if not output_name.upper().endswith(".OMX"):
+            raise NotImplementedError("Sparse select link matrices can only be exported to OMX")
+
+        omx_export = omx.open_file(output_name, "w")
+        try:
+            for name in cores or self.names:
+                m = self.matrix[name]
+                shape = (self.zones, self.zones, self.classes)
+                stored = omx_export.create_matrix(name, atom=tables.Float64Atom(), shape=shape)
+                for first in range(0, self.zones, EXPORT_ROWS):
+                    last = min(first + EXPORT_ROWS, self.zones)
+                    stored[first:last] = m.to_dense(first, last)
+            omx_export.create_mapping(self.index_names[0], self.index)
+        finally:
+            omx_export.close()
+
+
+def check_select_link_od_storage(storage: str) -> str:
+    if storage not in SELECT_LINK_OD_STORAGE_TYPES:
+        raise ValueError(f"Select link OD storage needs to be one of {SELECT_LINK_OD_STORAGE_TYPES}: {storage}")
+    return storage
@@ -2,6 +2,7 @@ import multiprocessing as mp
 
 from aequilibrae.matrix.aequilibrae_matrix import AequilibraeMatrix
 from aequilibrae.paths.graph import Graph
+from aequilibrae.paths.results.skim_storage import create_skim_matrix
 
 
 class SkimResults:
@@ -35,6 +36,9 @@ class SkimResults:
         self.skims = AequilibraeMatrix()
         self.cores = mp.cpu_count()
 
+        # Where skim matrices are kept: 'memory', 'shared' or a directory
+        self.skim_storage = "memory"
+
         self.links = -1
         self.nodes = -1
         self.zones = -1
@@ -58,12 +62,6 @@ class SkimResults:
         self.links = graph.compact_num_links + 1
         self.num_skims = len(graph.skim_fields)
 
-        self.skims = AequilibraeMatrix()
-        self.skims.create_empty(
-            file_name=AequilibraeMatrix().random_name(), zones=self.zones, matrix_names=graph.skim_fields
-        )
-        self.skims.index[:] = graph.centroids[:]
-        self.skims.computational_view(core_list=self.skims.names)
-        self.skims.matrix_view = self.skims.matrix_view.reshape(self.zones, self.zones, self.num_skims)
+        self.skims = create_skim_matrix(self.zones, list(graph.skim_fields), graph.centroids, self.skim_storage)
         self._graph_id = graph._id
         self.graph = graph
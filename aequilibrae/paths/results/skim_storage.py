@@ -0,0 +1,68 @@
+import weakref
+from multiprocessing import shared_memory
+from os import path
+from pathlib import Path
+from typing import List, Union
+from uuid import uuid4
+
+import numpy as np
+
+from aequilibrae.matrix import AequilibraeMatrix
+
+SKIM_STORAGE_TYPES = ["memory", "shared"]
+
+
+def check_skim_storage(storage: Union[str, Path]) -> Union[str, Path]:
+    """Validates a storage for skim matrices: 'memory', 'shared' or an existing directory"""
+    if isinstance(storage, str) and storage in SKIM_STORAGE_TYPES:
+        return storage
+    if isinstance(storage, (str, Path)) and path.isdir(storage):
+        return storage
+    raise ValueError(f"Skim storage needs to be one of {SKIM_STORAGE_TYPES} or an existing directory: {storage}")
+
+
+def create_skim_matrix(zones: int, names: List[str], centroids: np.ndarray, storage="memory") -> AequilibraeMatrix:
+    """Creates an empty skim matrix with its computational view set for all cores
+
+    :Arguments:
+        **zones** (:obj:`int`): Number of zones
+
+        **names** (:obj:`List[str]`): Names of the skim cores
+
+        **centroids** (:obj:`np.ndarray`): Centroids used as the matrix index
+
+        **storage** (:obj:`Union[str, Path]`, *Optional*): 'memory' keeps the skims in the memory of the process,
+        'shared' puts them in a POSIX shared memory block (available as *shared_memory*) that other processes can
+        attach to by name, and a directory memory-maps them to a file in it. Defaults to 'memory'
+
+    :Returns:
+        **skims** (:obj:`AequilibraeMatrix`): Empty skim matrix
+    """
+    storage = check_skim_storage(storage)
+    skims = AequilibraeMatrix()
+    if storage in SKIM_STORAGE_TYPES:
+        skims.create_empty(zones=zones, matrix_names=names, memory_only=True)
+    else:
+        file_name = path.join(storage, f"Aequilibrae_matrix_{uuid4()}.aem")
+        skims.create_empty(file_name=file_name, zones=zones, matrix_names=names, memory_only=False)
+
+    if storage == "shared":
+        _move_to_shared_memory(skims)
+
+    skims.index[:] = centroids[:]
+    skims.computational_view(core_list=skims.names)
+    skims.matrix_view = skims.matrix_view.reshape((zones, zones, len(names)))
+    return skims
+
+
+def _move_to_shared_memory(skims: AequilibraeMatrix):
+    shm = shared_memory.SharedMemory(create=True, size=max(skims.matrices.nbytes, 1))
+    matrices = np.ndarray(skims.matrices.shape, dtype=skims.matrices.dtype, buffer=shm.buf)
+    matrices.fill(np.nan)
+    skims.matrices = matrices
+    skims.matrix = {nm: matrices[:, :, i] for i, nm in enumerate(skims.names)}
+    skims.shared_memory = shm
+
+    # The block is released once the matrix is no longer used. Views into it may outlive the matrix, so its mapping
+    # is left for the interpreter to close
+    weakref.finalize(skims, shm.unlink)
@@ -34,6 +34,8 @@ class RouteChoice:
             "cutoff_prob": 0.0,
             "beta": 1.0,
             "store_results": True,
+            "a_star": False,
+            "bidirectional": False,
         },
         "link-penalisation": {},
         "bfsle": {"penalty": 1.0},
@@ -92,6 +94,11 @@ class RouteChoice:
 
         `seed` is a BFSLE specific parameters.
 
+        `a_star` finds paths with A* and the landmarks heuristic, instead of Dijkstra's algorithm. It requires landmarks
+        for the current costs of the graph, computed with `Graph.prepare_landmarks`. Route sets are the same.
+
+        `bidirectional` finds paths with bidirectional Dijkstra's, searching from both ends of each OD pair.
+
         Setting `max_depth` or `max_misses`, while not required, is strongly recommended to prevent runaway algorithms.
         `max_misses` is the maximum amount of duplicate routes found per OD pair. If it is exceeded then the route set
         if returned with fewer than `max_routes`. It has a default value of `100`.
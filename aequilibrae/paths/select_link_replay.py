@@ -0,0 +1,256 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from aequilibrae import global_logger
+from aequilibrae.matrix import SparseDemand
+from aequilibrae.paths.path_store import PathStore
+from aequilibrae.paths.results import AssignmentResults
+from aequilibrae.paths.traffic_class import TrafficClass
+
+try:
+    from aequilibrae.paths.AoN import replay_select_links, sum_axis0
+except ImportError as ie:
+    global_logger.warning(f"Could not import procedures from the binary. {ie.args}")
+
+# Steps of the assignment and origins of each tree store, kept next to the tree stores
+TREE_MANIFEST = "trees.json"
+
+
+def tree_store_file(path_base_dir: str, iteration: int, mode: str, class_id: str) -> str:
+    """Store with the shortest path trees of a traffic class in an iteration, inside the path files of an assignment"""
+    return os.path.join(path_base_dir, f"iter{iteration}", f"trees_c{mode}_{class_id}.arrow")
+
+
+def write_tree_manifest(path_base_dir: str, manifest: dict) -> None:
+    """Writes the manifest of the tree stores of an assignment, replacing the previous one only once written"""
+    file_name = os.path.join(path_base_dir, TREE_MANIFEST)
+    with open(f"{file_name}.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{file_name}.tmp", file_name)
+
+
+def iteration_weights(steps: List[dict]) -> Dict[int, float]:
+    """Weight of the all-or-nothing assignment of each iteration in the final results of an equilibrium assignment
+
+    Select link results are blended across iterations exactly as link loads are, so they are a linear combination of
+    the results of the all-or-nothing assignments of all iterations.
+
+    :Arguments:
+        **steps** (:obj:`List[dict]`): Steps of the assignment, as recorded by it. Each step has its *iteration*,
+        the *direction* it took ('aon' for the first iteration, 'fw', 'conjugate' or 'biconjugate'), the
+        *coefficients* of the direction and the *stepsize*
+
+    :Returns:
+        **weights** (:obj:`Dict[int, float]`): Weight of each iteration
+    """
+    n = len(steps)
+    results, direction, previous_direction = np.zeros(n), np.zeros(n), np.zeros(n)
+    for i, step in enumerate(steps):
+        aon = np.zeros(n)
+        aon[i] = 1.0
+        if step["direction"] == "aon":
+            results = aon
+            continue
+
+        if step["direction"] == "fw":
+            direction = aon
+        elif step["direction"] == "conjugate":
+            previous_direction = direction
+            direction = step["coefficients"][0] * direction + (1.0 - step["coefficients"][0]) * aon
+        elif step["direction"] == "biconjugate":
+            b = step["coefficients"]
+            previous_direction, direction = direction, b[0] * aon + b[1] * direction + b[2] * previous_direction
+        else:
+            raise ValueError(f"Unknown step direction {step['direction']}")
+        results = step["stepsize"] * direction + (1.0 - step["stepsize"]) * results
+    return {step["iteration"]: float(w) for step, w in zip(steps, results)}
+
+
+class SelectLinkReplay:
+    """Select link and select zone analysis of a finished assignment, from the shortest path trees it stored
+
+    Trees are stored by assignments with *TrafficAssignment.set_save_trees*, so any number of select link and select
+    zone questions can be answered after the assignment without running it again. Results are the same as if the
+    links had been selected before the assignment.
+
+    .. code-block:: python
+
+        >>> assig.set_save_trees(True)  # doctest: +SKIP
+        >>> assig.execute()  # doctest: +SKIP
+
+        >>> replay = assig.select_link_replay()  # doctest: +SKIP
+        >>> replay.set_select_links("car", {"bridge": [(9, 1), (6, 1)]})  # doctest: +SKIP
+        >>> replay.set_select_zones("car", {"downtown": ([1, 2, 3], None)})  # doctest: +SKIP
+        >>> replay.execute()  # doctest: +SKIP
+        >>> replay.select_link_flows()  # doctest: +SKIP
+
+    Traffic classes must have the same graph and demand used in the assignment.
+
+    :Arguments:
+        **trees_directory** (:obj:`str`): Directory with the path files of the assignment
+
+        **classes** (:obj:`List[TrafficClass]`): Traffic classes of the assignment
+
+        **cores** (:obj:`int`, *Optional*): Number of threads. Defaults to all cores available
+    """
+
+    def __init__(self, trees_directory: str, classes: List[TrafficClass], cores: int = 0):
+        manifest_file = os.path.join(trees_directory, TREE_MANIFEST)
+        if not os.path.isfile(manifest_file):
+            raise FileNotFoundError(f"There are no shortest path trees in {trees_directory}")
+        with open(manifest_file, "r") as f:
+            self.manifest = json.load(f)
+
+        self.trees_directory = trees_directory
+        self.classes = {c._id: c for c in classes}
+        for c in classes:
+            info = self.manifest["classes"].get(c._id)
+            if info is None:
+                raise ValueError(f"There are no shortest path trees for traffic class {c._id}")
+            if info["nodes"] != c.graph.compact_num_nodes or info["zones"] != c.graph.num_zones:
+                raise ValueError(f"Graph of traffic class {c._id} is not the one its trees were built on")
+
+        self.weights = iteration_weights(self.manifest["steps"])
+        self.set_cores(cores)
+        self._selected_links = {c._id: {} for c in classes}
+        self._selected_zones = {c._id: {} for c in classes}
+        self.results = {}  # type: Dict[str, AssignmentResults]
+
+    def set_cores(self, cores: int) -> None:
+        """Sets the number of threads used to replay the trees
+
+        :Arguments:
+            **cores** (:obj:`int`): Number of threads
+        """
+        res = AssignmentResults()
+        res.set_cores(cores)
+        self.cores = res.cores
+
+    def set_select_links(self, class_id: str, links: Dict[str, List[Tuple[int, int]]]) -> None:
+        """Sets the selected links of a traffic class, as *TrafficClass.set_select_links* does
+
+        :Arguments:
+            **class_id** (:obj:`str`): Id of the traffic class
+
+            **links** (:obj:`Dict[str, List[Tuple[int, int]]]`): Name of each link set and the link IDs and
+            directions in it
+        """
+        self._selected_links[class_id] = self.__class(class_id)._select_link_ids(links)
+
+    def set_select_zones(
+        self, class_id: str, zones: Dict[str, Tuple[Optional[List[int]], Optional[List[int]]]]
+    ) -> None:
+        """Sets the select zone analysis of a traffic class, with the flows between sets of origins and destinations
+
+        :Arguments:
+            **class_id** (:obj:`str`): Id of the traffic class
+
+            **zones** (:obj:`Dict[str, Tuple[List[int], List[int]]]`): Name of each set and its origins and
+            destinations. None selects all zones
+        """
+        c = self.__class(class_id)
+        masks = {}
+        for name, (origins, destinations) in zones.items():
+            masks[name] = (self.__zone_mask(c, origins), self.__zone_mask(c, destinations))
+        self._selected_zones[class_id] = masks
+
+    def execute(self) -> None:
+        """Replays the trees of all traffic classes with selected links or zones"""
+        self.results = {}
+        for class_id, c in self.classes.items():
+            if self._selected_links[class_id] or self._selected_zones[class_id]:
+                self.results[class_id] = self.__replay_class(c)
+
+    def select_link_flows(self) -> pd.DataFrame:
+        """
+        Returns a dataframe of the select link flows for each class, as *TrafficAssignment.select_link_flows* does
+        """
+        class_flows = []
+        for class_id, res in self.results.items():
+            df = pd.DataFrame(res.get_sl_results().data)
+            df.rename(
+                columns={x: class_id + "_" + x if (x != "index") else "link_id" for x in df.columns}, inplace=True
+            )
+            df.set_index("link_id", inplace=True)
+            class_flows.append(df)
+        return pd.concat(class_flows, axis=1)
+
+    def __replay_class(self, c: TrafficClass) -> AssignmentResults:
+        if isinstance(c.matrix, SparseDemand):
+            raise ValueError("Select link analysis can only be replayed with dense demand matrices")
+
+        links, zones = self._selected_links[c._id], self._selected_zones[c._id]
+        if set(links) & set(zones):
+            raise ValueError(f"Names of link sets and zone sets must be unique: {set(links) & set(zones)}")
+        selected = {**links, **{name: np.zeros(0, dtype=c.graph.default_types("int")) for name in zones}}
+
+        res = AssignmentResults()
+        res.set_cores(self.cores)
+        res._selected_links = selected
+        res.prepare(c.graph, c.matrix)
+
+        num_zones, classes, sets = c.graph.num_zones, res.classes["number"], len(selected)
+        origin_mask = np.ones((sets, num_zones), dtype=np.uint8)
+        destination_mask = np.ones((sets, num_zones), dtype=np.uint8)
+        for name, (origins, destinations) in zones.items():
+            origin_mask[res._selected_links[name]] = origins
+            destination_mask[res._selected_links[name]] = destinations
+
+        od = np.zeros((sets, num_zones, num_zones, classes), dtype=np.float64)
+        loading = np.zeros((self.cores, sets, c.graph.compact_num_links, classes), dtype=np.float64)
+        has_flow_mask = np.zeros((self.cores, c.graph.compact_num_links), dtype=np.uint8)
+        demand = c.matrix.matrix_view.reshape((num_zones, num_zones, classes))
+
+        # Each tree is loaded once, with the weights of all iterations that kept it
+        tree_weights = self.__tree_weights(c)
+        for iteration, weights in tree_weights.items():
+            store = PathStore(tree_store_file(self.trees_directory, iteration, c.mode, c._id))
+            for chunk in range(store.chunks):
+                origins, stored_in, columns = store.read_chunk(chunk)
+                rows = np.flatnonzero((stored_in == iteration) & (weights[origins] != 0))
+                if rows.shape[0] == 0:
+                    continue
+                pred, conn = (self.__tree_rows(*columns[name], rows) for name in ["predecessors", "connectors"])
+                args = (origins[rows], weights[origins[rows]], pred, conn, demand, res.select_links, origin_mask)
+                replay_select_links(*args, destination_mask, od, loading, has_flow_mask, self.cores)
+
+        for name, idx in res._selected_links.items():
+            res.select_link_od.matrix[name] = od[idx]
+            sum_axis0(res.select_link_loading[name], loading[:, idx, :, :], self.cores)
+        return res
+
+    def __tree_weights(self, c: TrafficClass) -> Dict[int, np.ndarray]:
+        """Weight of the tree of each origin in each tree store"""
+        tree_weights = {}
+        for iteration, stores in self.manifest["classes"][c._id]["iterations"].items():
+            weight = self.weights.get(int(iteration), 0.0)
+            if weight == 0:
+                continue
+            for origin, stored_in in zip(stores["origins"], stores["stored_in"]):
+                weights = tree_weights.setdefault(stored_in, np.zeros(c.graph.num_zones, dtype=np.float64))
+                weights[origin] += weight
+        return tree_weights
+
+    @staticmethod
+    def __tree_rows(offsets: np.ndarray, values: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        return np.stack([values[offsets[r] : offsets[r + 1]] for r in rows]).astype(np.int64)
+
+    def __class(self, class_id: str) -> TrafficClass:
+        if class_id not in self.classes:
+            raise ValueError(f"Traffic class {class_id} is not part of this replay")
+        return self.classes[class_id]
+
+    @staticmethod
+    def __zone_mask(c: TrafficClass, zones: Optional[List[int]]) -> np.ndarray:
+        if zones is None:
+            return np.ones(c.graph.num_zones, dtype=np.uint8)
+        missing = np.setdiff1d(zones, c.matrix.index)
+        if missing.shape[0]:
+            raise ValueError(f"Zones {missing.tolist()} are not centroids of traffic class {c._id}")
+        mask = np.zeros(c.graph.num_zones, dtype=np.uint8)
+        mask[c.graph.compact_nodes_to_indices[np.array(zones)]] = 1
+        return mask
@@ -5,21 +5,29 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 from os import path
 from pathlib import Path
-from typing import List, Dict, Union
+from typing import Any, List, Dict, Optional, Union
 from uuid import uuid4
 
 import numpy as np
+import openmatrix as omx
 import pandas as pd
 from numpy import nan_to_num
 
 from aequilibrae import Parameters
 from aequilibrae.context import get_active_project
 from aequilibrae.matrix import AequilibraeData
-from aequilibrae.matrix import AequilibraeMatrix
+from aequilibrae.matrix import AequilibraeMatrix, SparseDemand
+from aequilibrae.paths.bush_based_assignment import BushBasedAssignment
+from aequilibrae.paths.graph import _get_graph_to_network_mapping
 from aequilibrae.paths.linear_approximation import LinearApproximation
+from aequilibrae.paths.origin_based_assignment import OriginBasedAssignment
 from aequilibrae.paths.optimal_strategies import OptimalStrategies
+from aequilibrae.paths.path_based_assignment import PathBasedAssignment
+from aequilibrae.paths.path_store import check_path_store_compression
+from aequilibrae.paths.results.skim_storage import check_skim_storage
+from aequilibrae.paths.select_link_replay import SelectLinkReplay
 from aequilibrae.paths.traffic_class import TrafficClass, TransportClassBase
-from aequilibrae.paths.vdf import VDF, all_vdf_functions
+from aequilibrae.paths.vdf import VDF, all_vdf_functions, builtin_vdf_functions
 from aequilibrae.project.database_connection import database_connection
 
 
@@ -216,7 +224,18 @@ class TrafficAssignment(AssignmentBase):
     """
 
     bpr_parameters = ["alpha", "beta"]
-    all_algorithms = ["all-or-nothing", "msa", "frank-wolfe", "fw", "cfw", "bfw"]
+    all_algorithms = [
+        "all-or-nothing",
+        "msa",
+        "frank-wolfe",
+        "fw",
+        "cfw",
+        "bfw",
+        "algorithm-b",
+        "bush",
+        "gradient-projection",
+        "gp",
+    ]
 
     def __init__(self, project=None) -> None:
         """"""
@@ -237,6 +256,13 @@ class TrafficAssignment(AssignmentBase):
         self.congested_time = None  # type: np.ndarray
         self.save_path_files = False  # type: bool
         self.preloads = None  # type: pd.DataFrame
+        self.initial_link_loads = None  # type: Dict[str, np.ndarray]
+        self.skimming_policy = "blended"  # type: str
+        self.skimming_interval = 1  # type: int
+        self.skim_storage = "memory"  # type: Union[str, Path]
+        self.checkpoint_directory = None  # type: Union[str, Path]
+        self.checkpoint_iterations = None  # type: int
+        self.checkpoint_minutes = None  # type: float
 
         self.steps_below_needed_to_terminate = 1
 
@@ -301,6 +327,42 @@ class TrafficAssignment(AssignmentBase):
         """
         self.vdf = vdf_function
 
+    def set_vdf_by_field(self, field: str, functions: Dict[Any, str]) -> None:
+        """
+        Sets a different Volume-delay function for groups of links, given by the values of a network field
+
+        Links with values not in *functions* keep using the VDF set with *set_vdf*. Any compiled function registered
+        with *register_vdf* can be used. It needs to be called after *set_vdf* and *set_classes*. VDF parameters
+        already set are checked again for the built-in functions now used by each link
+
+        .. code-block:: python
+
+            >>> assig.set_vdf_by_field("link_type", {"motorway": "conical", "trunk": "conical"})  # doctest: +SKIP
+
+        :Arguments:
+            **field** (:obj:`str`): Network field with the groups of links
+
+            **functions** (:obj:`Dict[Any, str]`): Name of the VDF used by the links with each value of the field
+        """
+        if self.classes is None or self.vdf.function == "":
+            raise RuntimeError("Before setting VDFs by link, you need to set traffic classes and choose a VDF function")
+
+        g = self.classes[0].graph.graph
+        if field not in g.columns:
+            raise ValueError(f"Field {field} is not in the graph")
+
+        names = [self.vdf.function.lower()] + sorted({v.lower() for v in functions.values()})
+        codes = pd.Series({k: names.index(v.lower()) for k, v in functions.items()}, dtype=np.int64)
+
+        function_ids = np.zeros(g.shape[0], dtype=np.int64)
+        function_ids[g.__supernet_id__] = g[field].map(codes).fillna(0).to_numpy(np.int64)
+        if self.vdf_parameters is not None:
+            # Parameters were checked for the links that used built-in functions so far
+            builtin = np.isin(names, builtin_vdf_functions)[function_ids]
+            self.__vdf_parameter_arrays(self._config["VDF parameters"], builtin)
+        self.vdf.set_link_functions(function_ids, names)
+        self._config["VDF by field"] = {"field": field, "functions": functions}
+
     def set_classes(self, classes: List[TrafficClass]) -> None:
         """
         Sets Traffic classes to be assigned
@@ -332,9 +394,10 @@ class TrafficAssignment(AssignmentBase):
     # TODO: We also need procedures to check that all graphs are compatible (i.e. originated from the same network)
     def set_algorithm(self, algorithm: str):
         """
-        Chooses the assignment algorithm. e.g. 'frank-wolfe', 'bfw', 'msa'
+        Chooses the assignment algorithm. e.g. 'frank-wolfe', 'bfw', 'msa', 'algorithm-b', 'gradient-projection'
 
-        'fw' is also accepted as an alternative to 'frank-wolfe'
+        'fw' is also accepted as an alternative to 'frank-wolfe', 'bush' as an alternative to 'algorithm-b' and 'gp'
+        as an alternative to 'gradient-projection'
 
         :Arguments:
             **algorithm** (:obj:`str`): Algorithm to be used
@@ -344,6 +407,8 @@ class TrafficAssignment(AssignmentBase):
 
         algo_dict = {i: i for i in self.all_algorithms}
         algo_dict["fw"] = "frank-wolfe"
+        algo_dict["bush"] = "algorithm-b"
+        algo_dict["gp"] = "gradient-projection"
         algo = algo_dict.get(algorithm.lower())
 
         if algo is None:
@@ -351,6 +416,10 @@ class TrafficAssignment(AssignmentBase):
 
         if algo in ["all-or-nothing", "msa", "frank-wolfe", "cfw", "bfw"]:
             self.assignment = LinearApproximation(self, algo, project=self.project)
+        elif algo == "algorithm-b":
+            self.assignment = BushBasedAssignment(self, algo, project=self.project)
+        elif algo == "gradient-projection":
+            self.assignment = PathBasedAssignment(self, algo, project=self.project)
         else:
             raise ValueError("Algorithm not listed in the case selection")
 
@@ -374,35 +443,41 @@ class TrafficAssignment(AssignmentBase):
             raise RuntimeError(
                 "Before setting vdf parameters, you need to set traffic classes and choose a VDF function"
             )
-        self.__dict__["vdf_parameters"] = par
+        # All VDFs take the same parameters, but only the built-in ones have known ranges for them
+        pars = self.__vdf_parameter_arrays(par, self.vdf.links_using(builtin_vdf_functions))
+        self.__dict__["vdf_parameters"] = pars
         self._config["VDF parameters"] = par
+        self._config["VDF function"] = self.vdf.function.lower()
+
+    def __vdf_parameter_arrays(self, par: dict, builtin: np.ndarray) -> List[np.ndarray]:
+        """Values of the VDF parameters for all links, checked for the links that use built-in functions"""
         pars = []
-        if self.vdf.function in ["BPR", "BPR2", "CONICAL", "INRETS"]:
-            for p1 in ["alpha", "beta"]:
-                if p1 not in par:
-                    raise ValueError(f"{p1} should exist in the set of parameters provided")
-                p = par[p1]
-                if isinstance(self.vdf_parameters[p1], str):
-                    c = self.classes[0]
-                    array = np.zeros(c.graph.graph.shape[0], c.graph.default_types("float"))
-                    array[c.graph.graph.__supernet_id__] = c.graph.graph[p]
-                else:
-                    array = np.zeros(self.classes[0].graph.graph.shape[0], np.float64)
-                    array.fill(self.vdf_parameters[p1])
-                pars.append(array)
-
-                if np.any(np.isnan(array)):
-                    raise ValueError(f"At least one {p1} is NaN")
-
-                if p1 == "alpha":
-                    if array.min() < 0:
-                        raise ValueError(f"At least one {p1} is smaller than zero")
-                else:
-                    if array.min() < 1:
-                        raise ValueError(f"At least one {p1} is smaller than one. Results will make no sense")
+        for p1 in ["alpha", "beta"]:
+            if p1 not in par:
+                raise ValueError(f"{p1} should exist in the set of parameters provided")
+            p = par[p1]
+            if isinstance(p, str):
+                c = self.classes[0]
+                array = np.zeros(c.graph.graph.shape[0], c.graph.default_types("float"))
+                array[c.graph.graph.__supernet_id__] = c.graph.graph[p]
+            else:
+                array = np.zeros(self.classes[0].graph.graph.shape[0], np.float64)
+                array.fill(p)
+            pars.append(array)
 
-        self.__dict__["vdf_parameters"] = pars
-        self._config["VDF function"] = self.vdf.function.lower()
+            if np.any(np.isnan(array)):
+                raise ValueError(f"At least one {p1} is NaN")
+
+            checked = array[np.broadcast_to(builtin, array.shape)]
+            if checked.shape[0] == 0:
+                continue
+            if p1 == "alpha":
+                if checked.min() < 0:
+                    raise ValueError(f"At least one {p1} is smaller than zero")
+            else:
+                if checked.min() < 1:
+                    raise ValueError(f"At least one {p1} is smaller than one. Results will make no sense")
+        return pars
 
     def set_cores(self, cores: int) -> None:
         """Allows one to set the number of cores to be used AFTER traffic classes have been added
@@ -420,6 +495,158 @@ class TrafficAssignment(AssignmentBase):
             c.results.set_cores(cores)
             c._aon_results.set_cores(cores)
 
+    def set_link_loads_accumulation(self, mode: str) -> None:
+        """Sets how link loads are accumulated across threads during all-or-nothing assignments
+
+        See :obj:`AssignmentResults.set_link_loads_accumulation` for the available modes
+
+        :Arguments:
+            **mode** (:obj:`str`): One of 'auto', 'per-thread' or 'shared'
+        """
+        if not self.classes:
+            raise RuntimeError("You need load traffic classes before setting how link loads are accumulated")
+
+        for c in self.classes:
+            c.results.set_link_loads_accumulation(mode)
+            c._aon_results.set_link_loads_accumulation(mode)
+
+    def set_select_link_od_storage(self, storage: str) -> None:
+        """Sets how the select link OD matrices of all classes are kept
+
+        See :obj:`AssignmentResults.set_select_link_od_storage` for the available storage types
+
+        :Arguments:
+            **storage** (:obj:`str`): One of 'dense' or 'sparse'
+        """
+        if not self.classes:
+            raise RuntimeError("You need load traffic classes before setting how select link OD matrices are kept")
+
+        for c in self.classes:
+            c.results.set_select_link_od_storage(storage)
+            c._aon_results.set_select_link_od_storage(storage)
+
+    def set_backend(self, backend: str, processes: Optional[int] = None) -> None:
+        """Sets how origins are distributed during the all-or-nothing assignments of all classes
+
+        With 'processes', origins are split across worker processes that read the graph, costs and demand from shared
+        memory. See :obj:`AssignmentResults.set_backend` for details
+
+        :Arguments:
+            **backend** (:obj:`str`): One of 'threads' or 'processes'
+
+            **processes** (:obj:`int`, *Optional*): Number of worker processes. Defaults to the number of cores
+        """
+        if not self.classes:
+            raise RuntimeError("You need load traffic classes before setting the execution backend")
+
+        for c in self.classes:
+            c.results.set_backend(backend, processes)
+            c._aon_results.set_backend(backend, processes)
+        self._config["Execution backend"] = backend if processes is None else f"{backend} ({processes})"
+
+    def set_early_exit(self, early_exit: bool) -> None:
+        """Turns on or off stopping shortest path searches once all destinations with demand from each origin are
+        reached. It only applies to classes that are not skimmed and do not save path files, and it is on by default
+
+        :Arguments:
+            **early_exit** (:obj:`bool`): Whether shortest path searches stop early
+        """
+        if not self.classes:
+            raise RuntimeError("You need load traffic classes before setting early exit for their shortest paths")
+
+        for c in self.classes:
+            c.results.early_exit = early_exit
+            c._aon_results.early_exit = early_exit
+
+    def set_skim_storage(self, storage: Union[str, Path]) -> None:
+        """Sets where the skim matrices of all classes are kept during the assignment
+
+        * 'memory': In the memory of the process. This is the default
+        * 'shared': In POSIX shared memory blocks that other processes can attach to by name
+        * A directory: Memory-mapped to files in that directory, which keeps skims for very large models out of memory
+
+        :Arguments:
+            **storage** (:obj:`Union[str, Path]`): One of 'memory' or 'shared', or an existing directory
+        """
+        self.skim_storage = check_skim_storage(storage)
+        self._config["Skim storage"] = str(self.skim_storage)
+
+    def set_skimming_policy(self, policy: str, interval: int = 1) -> None:
+        """Sets when classes with skim fields are skimmed during the equilibrium assignment
+
+        * 'blended': Skims every iteration, keeping the skims for the last iteration and the ones blended across all
+          iterations. This is the default
+        * 'final': Only skims once, on the shortest paths for the final link costs
+        * 'interval': Skims every *interval* iterations, and once more for the final link costs. Blended skims
+          weight the skims of each skimmed iteration by the share of the solution assigned since the previous one
+
+        With 'final' and 'interval', skims for the final link costs are kept as the final ones. Origin-based
+        algorithms average their skims over the paths used, so they skim 'interval' as they skim 'final'.
+
+        :Arguments:
+            **policy** (:obj:`str`): Skimming policy. One of 'blended', 'final' or 'interval'
+
+            **interval** (:obj:`int`, *Optional*): Number of iterations between skims for the 'interval' policy.
+            Defaults to 1
+        """
+        if policy not in ["blended", "final", "interval"]:
+            raise ValueError(f"Skimming policy {policy} is not available")
+        if not isinstance(interval, int) or interval < 1:
+            raise ValueError("Skimming interval needs to be a positive integer")
+
+        self.skimming_policy = policy
+        self.skimming_interval = interval
+        self._config["Skimming policy"] = policy if policy != "interval" else f"every {interval} iterations"
+
+    def set_checkpoints(
+        self, directory: Union[str, Path], iterations: Optional[int] = None, minutes: Optional[float] = None
+    ) -> None:
+        """Writes a checkpoint of the equilibrium assignment every number of iterations and/or minutes
+
+        Checkpoints hold the loads of all classes, the step directions, the skims being blended and the convergence
+        report, as memory-mapped arrays. Only the latest checkpoint is kept. An interrupted assignment set up in the
+        same way can continue from it with *execute(resume_from=directory)*. Not available for the bush-based and
+        path-based algorithms
+
+        .. code-block:: python
+
+            >>> assig.set_checkpoints(checkpoint_folder, iterations=10, minutes=30)  # doctest: +SKIP
+
+        :Arguments:
+            **directory** (:obj:`Union[str, Path]`): Existing directory where checkpoints are written
+
+            **iterations** (:obj:`int`, *Optional*): Number of iterations between checkpoints
+
+            **minutes** (:obj:`float`, *Optional*): Minutes between checkpoints
+        """
+        if not path.isdir(directory):
+            raise ValueError(f"Checkpoint directory {directory} does not exist")
+        if iterations is None and minutes is None:
+            raise ValueError("Checkpoints need to be written every number of iterations, minutes or both")
+        if iterations is not None and (not isinstance(iterations, int) or iterations < 1):
+            raise ValueError("Iterations between checkpoints need to be a positive integer")
+        if minutes is not None and minutes <= 0:
+            raise ValueError("Minutes between checkpoints need to be positive")
+
+        self.checkpoint_directory = directory
+        self.checkpoint_iterations = iterations
+        self.checkpoint_minutes = minutes
+        self._config["Checkpoints"] = {"directory": str(directory), "iterations": iterations, "minutes": minutes}
+
+    def execute(self, log_specification=True, resume_from: Optional[Union[str, Path]] = None) -> None:
+        """Processes assignment
+
+        :Arguments:
+            **log_specification** (:obj:`bool`, *Optional*): Whether the assignment specification is logged.
+            Defaults to True
+
+            **resume_from** (:obj:`Union[str, Path]`, *Optional*): Checkpoint directory to continue an interrupted
+            assignment from, written with *set_checkpoints*. Defaults to None
+        """
+        if log_specification:
+            self.log_specification()
+        self.assignment.execute(resume_from=resume_from)
+
     def set_save_path_files(self, save_it: bool) -> None:
         """Turn path saving on or off.
 
@@ -433,11 +660,86 @@ class TrafficAssignment(AssignmentBase):
         for c in self.classes:
             c._aon_results.save_path_file = save_it
 
-    def set_path_file_format(self, file_format: str) -> None:
-        """Specify path saving format. Either parquet or feather.
+    def set_initial_link_loads(self, link_loads: Union[Dict[str, np.ndarray], str, None], project=None) -> None:
+        """
+        Sets the link loads the equilibrium assignment starts from, instead of an all-or-nothing assignment with
+        free-flow travel times
+
+        Link loads can be given in memory, as a dictionary with the loads of each traffic class keyed on their names
+        and shaped like *TrafficClass.results.link_loads*, or as the name of a table saved with *save_results*.
+        Supply None to start from free-flow travel times again.
+
+        Link loads should be consistent with the demand being assigned, as when re-running a scenario after small
+        changes to the network. Warm starts are not available for MSA, whose step sizes would give the initial link
+        loads the weight of a single iteration, nor for the origin-based algorithms or select link analysis.
+
+        :Arguments:
+            **link_loads** (:obj:`Union[Dict[str, np.ndarray], str]`): Link loads per traffic class or name of the
+            results table with them
+
+            **project** (:obj:`Project`, *Optional*): Project with the results table. Defaults to the active project
+        """
+        if link_loads is None:
+            self.initial_link_loads = None
+            self._config.pop("Initial link loads", None)
+            return
+
+        if self.classes is None:
+            raise RuntimeError("You need to set traffic classes before setting their initial link loads")
+
+        if isinstance(link_loads, str):
+            self._config["Initial link loads"] = link_loads
+            if not project:
+                project = self.project or get_active_project()
+            conn = sqlite3.connect(path.join(project.project_base_path, "results_database.sqlite"))
+            df = pd.read_sql(f"select * from '{link_loads}'", conn).set_index("link_id")
+            conn.close()
+            link_loads = {c._id: self.__link_loads_from_results(c, df) for c in self.classes}
+        else:
+            self._config["Initial link loads"] = "in memory"
+
+        loads = {}
+        for c in self.classes:
+            if c._id not in link_loads:
+                raise ValueError(f"Initial link loads missing for traffic class {c._id}")
+            arr = np.array(link_loads[c._id], dtype=np.float64)
+            if arr.ndim == 1:
+                arr = arr.reshape(-1, 1)
+            if arr.shape != (c.graph.num_links, len(c.matrix.view_names)):
+                raise ValueError(f"Initial link loads for traffic class {c._id} have the wrong shape {arr.shape}")
+            loads[c._id] = np.nan_to_num(arr)
+        self.initial_link_loads = loads
+
+    @staticmethod
+    def __link_loads_from_results(c: TrafficClass, df: pd.DataFrame) -> np.ndarray:
+        g = c.graph.graph
+        lids = g.link_id.values
+        m = _get_graph_to_network_mapping(lids, g.direction.values)
+        df = df.reindex(np.unique(lids))
+
+        loads = np.zeros((c.graph.num_links, len(c.matrix.view_names)), dtype=np.float64)
+        for k, n in enumerate(c.matrix.view_names):
+            if f"{n}_ab" not in df.columns or f"{n}_ba" not in df.columns:
+                raise ValueError(f"Results table does not have link loads for {n}, in traffic class {c._id}")
+            flows = np.zeros(g.shape[0], dtype=np.float64)
+            flows[m.graph_ab_idx] = df[f"{n}_ab"].values[m.network_ab_idx]
+            flows[m.graph_ba_idx] = df[f"{n}_ba"].values[m.network_ba_idx]
+            loads[g.__supernet_id__.values, k] = flows
+        return loads
+
+    def set_path_file_format(self, file_format: str, compression: Optional[str] = "zstd") -> None:
+        """Specify path saving format. Either parquet, feather or store.
+
+        With *feather* and *parquet*, the paths from each origin are saved to their own files. With *store*, the
+        paths from all origins of each traffic class are saved to a single file per iteration, in chunks of origins
+        that can be read individually. Origins whose paths did not change since the previous iteration are only
+        saved once. Path stores are read with :obj:`AssignmentPaths`.
 
         :Arguments:
             **file_format** (:obj:`str`): Name of file format to use for path files
+
+            **compression** (:obj:`str`, *Optional*): Compression of path stores. One of 'zstd', 'lz4' or None.
+            Defaults to 'zstd'
         """
         if self.classes is None:
             raise RuntimeError("You need to set traffic classes before specifying path saving options")
@@ -445,11 +747,34 @@ class TrafficAssignment(AssignmentBase):
         if file_format == "feather":
             for c in self.classes:
                 c._aon_results.write_feather = True
+                c._aon_results.use_path_store = False
         elif file_format == "parquet":
             for c in self.classes:
                 c._aon_results.write_feather = False
+                c._aon_results.use_path_store = False
+        elif file_format == "store":
+            check_path_store_compression(compression)
+            for c in self.classes:
+                c._aon_results.use_path_store = True
+                c._aon_results.path_store_compression = compression
         else:
-            raise TypeError(f"Unsupported path file format {file_format} - only feather or parquet available.")
+            raise TypeError(f"Unsupported path file format {file_format} - only feather, parquet or store available.")
+
+    def set_save_trees(self, save_it: bool) -> None:
+        """Saves the shortest path trees of all classes in every iteration, to replay select link analysis from them
+
+        Trees are saved with the path files of the assignment, with the step taken in each iteration. After the
+        assignment, :obj:`TrafficAssignment.select_link_replay` answers select link and select zone questions from
+        them without running the assignment again. Only available for linear approximation algorithms.
+
+        :Arguments:
+            **save_it** (:obj:`bool`): Boolean to indicate whether trees should be saved
+        """
+        if not self.classes:
+            raise RuntimeError("You need to set traffic classes before saving shortest path trees")
+
+        for c in self.classes:
+            c._aon_results.save_trees = save_it
 
     def set_time_field(self, time_field: str) -> None:
         """
@@ -686,7 +1011,9 @@ class TrafficAssignment(AssignmentBase):
         for cls in self.classes:
             uclass = {}
 
-            if len(cls.matrix.view_names) == 1:
+            if isinstance(cls.matrix, SparseDemand):
+                uclass["matrix_totals"] = cls.matrix.totals()
+            elif len(cls.matrix.view_names) == 1:
                 uclass["matrix_totals"] = {nm: np.sum(cls.matrix.matrix_view[:, :]) for nm in cls.matrix.view_names}
             else:
                 uclass["matrix_totals"] = {
@@ -700,6 +1027,8 @@ class TrafficAssignment(AssignmentBase):
                 uclass["Fixed cost multiplier"] = cls.fc_multiplier
             uclass["save_path_files"] = cls._aon_results.save_path_file
             uclass["path_file_feather_format"] = cls._aon_results.write_feather
+            if cls._aon_results.use_path_store:
+                uclass["path_store_compression"] = cls._aon_results.path_store_compression
 
             classes[cls._id] = uclass
 
@@ -721,7 +1050,7 @@ class TrafficAssignment(AssignmentBase):
 
             **which_ones** (:obj:`str`, *Optional*): {'final': Results of the final iteration, 'blended': Averaged results
             for all iterations, 'all': Saves skims for both the final iteration and the blended ones}.
-            Default is 'final'
+            Default is 'final'. Unless the skimming policy is 'blended', both are the skims for the final link costs
 
             **format** (:obj:`str`, *Optional*): File format ('aem' or 'omx'). Default is 'omx'
 
@@ -754,57 +1083,42 @@ class TrafficAssignment(AssignmentBase):
             # The ones for the last iteration are here
             last_skims = cls._aon_results.skims  # type: AequilibraeMatrix
 
-            names = []
+            # Cores are written straight from the assignment results to the output file
+            cores = []
             if which_ones in ["final", "all"]:
-                for core in last_skims.names:
-                    names.append(f"{core}_final")
-
+                cores.extend((f"{core}_final", last_skims.matrix[core]) for core in last_skims.names)
             if which_ones in ["blended", "all"]:
-                for core in avg_skims.names:
-                    names.append(f"{core}_blended")
+                cores.extend((f"{core}_blended", avg_skims.matrix[core]) for core in avg_skims.names)
 
-            if not names:
+            if not cores:
                 continue
-            # Assembling a single final skim file can be done like this
-            # We will want only the time for the last iteration and the distance averaged out for all iterations
-            working_name = export_name if mat_format == "aem" else AequilibraeMatrix().random_name()
-
-            kwargs = {
-                "file_name": working_name,
-                "zones": self.classes[0].graph.centroids.shape[0],
-                "matrix_names": names,
-                "memory_only": False,
-            }
-
-            # Create the matrix to manipulate
-            out_skims = AequilibraeMatrix()
-            out_skims.create_empty(**kwargs)
 
-            out_skims.index[:] = self.classes[0].graph.centroids[:]
-            out_skims.description = f"Assignment skim from procedure ID {self.procedure_id}. Class name {cls._id}"
-
-            if which_ones in ["final", "all"]:
-                for core in last_skims.names:
-                    out_skims.matrix[f"{core}_final"][:, :] = last_skims.matrix[core][:, :]
-
-            if which_ones in ["blended", "all"]:
-                for core in avg_skims.names:
-                    out_skims.matrix[f"{core}_blended"][:, :] = avg_skims.matrix[core][:, :]
-
-            out_skims.matrices.flush()  # Make sure that all data went to the disk
-
-            # If it were supposed to be an OMX, we export to one
+            centroids = self.classes[0].graph.centroids
             if mat_format == "omx":
-                out_skims.export(export_name)
+                out_omx = omx.open_file(export_name, "w")
+                for name, core in cores:
+                    out_omx[name] = core
+                out_omx.create_mapping("main_index", centroids)
+                out_omx.close()
+            else:
+                out_skims = AequilibraeMatrix()
+                out_skims.create_empty(
+                    file_name=export_name,
+                    zones=centroids.shape[0],
+                    matrix_names=[name for name, _ in cores],
+                    memory_only=False,
+                )
+                out_skims.index[:] = centroids[:]
+                for name, core in cores:
+                    out_skims.matrix[name][:, :] = core[:, :]
+                out_skims.close()
 
-            out_skims.description = f"Skimming for assignment procedure. Class {cls._id}"
             # Now we create the appropriate record
-
             record = mats.new_record(f"{matrix_name}_{cls._id}", file_name)
             record.procedure_id = self.procedure_id
             record.timestamp = self.procedure_date
             record.procedure = "Traffic Assignment"
-            record.description = out_skims.description
+            record.description = f"Skimming for assignment procedure. Class {cls._id}"
             record.save()
 
     def select_link_flows(self) -> Dict[str, pd.DataFrame]:
@@ -826,6 +1140,22 @@ class TrafficAssignment(AssignmentBase):
             class_flows.append(df)
         return pd.concat(class_flows, axis=1)
 
+    def select_link_replay(self, cores: int = 0) -> SelectLinkReplay:
+        """Select link and select zone analysis from the shortest path trees saved by this assignment
+
+        See :obj:`TrafficAssignment.set_save_trees` and :obj:`SelectLinkReplay`
+
+        :Arguments:
+            **cores** (:obj:`int`, *Optional*): Number of threads. Defaults to the number of cores of the assignment
+
+        :Returns:
+            **replay** (:obj:`SelectLinkReplay`): Replay of the assignment, ready to have links and zones selected
+        """
+        if not isinstance(self.assignment, LinearApproximation) or isinstance(self.assignment, OriginBasedAssignment):
+            raise ValueError("Shortest path trees are only saved by the link-based linear approximation algorithms")
+        directory = path.join(self.assignment.project_path, "path_files", self.procedure_id)
+        return SelectLinkReplay(directory, self.classes, cores or self.cores or 0)
+
     def save_select_link_flows(self, table_name: str, project=None) -> None:
         """
         Saves the select link link flows for all classes into the results database. Additionally, it exports
@@ -4,8 +4,10 @@ from typing import Union, List, Tuple, Dict
 from abc import ABC, abstractmethod
 
 import numpy as np
+import pandas as pd
 
-from aequilibrae.matrix import AequilibraeMatrix
+from aequilibrae.matrix import AequilibraeMatrix, SparseDemand
+from aequilibrae.paths.all_or_nothing import demand_csr
 from aequilibrae.paths.graph import Graph, TransitGraph, GraphBase
 from aequilibrae.paths.results import AssignmentResults, TransitAssignmentResults
 
@@ -25,7 +27,7 @@ class TransportClassBase(ABC):  # noqa: B024
         if not np.array_equal(matrix.index, graph.centroids):
             raise ValueError("Matrix and graph do not have compatible sets of centroids.")
 
-        if matrix.matrix_view.dtype != graph.default_types("float"):
+        if not isinstance(matrix, SparseDemand) and matrix.matrix_view.dtype != graph.default_types("float"):
             raise TypeError("Matrix's computational view need to be of type np.float64")
         self._config = {}
         self.graph = graph
@@ -47,7 +49,9 @@ class TransportClassBase(ABC):  # noqa: B024
             "Number of centroids": matrix.zones,
             "Matrix cores": matrix.view_names,
         }
-        if len(matrix.view_names) == 1:
+        if isinstance(matrix, SparseDemand):
+            mat_config["Matrix totals"] = matrix.totals()
+        elif len(matrix.view_names) == 1:
             mat_config["Matrix totals"] = {
                 nm: np.sum(np.nan_to_num(matrix.matrix_view)[:, :]) for nm in matrix.view_names
             }
@@ -90,7 +94,7 @@ class TrafficClass(TransportClassBase):
         >>> tc.set_pce(1.3)
     """
 
-    def __init__(self, name: str, graph: Graph, matrix: AequilibraeMatrix) -> None:
+    def __init__(self, name: str, graph: Graph, matrix: Union[AequilibraeMatrix, SparseDemand, pd.DataFrame]) -> None:
         """
         Instantiates the class
 
@@ -99,8 +103,12 @@ class TrafficClass(TransportClassBase):
 
             **graph** (:obj:`Graph`): Class/mode-specific graph
 
-            **matrix** (:obj:`AequilibraeMatrix`): Class/mode-specific matrix. Supports multiple user classes
+            **matrix** (:obj:`Union[AequilibraeMatrix, SparseDemand, pd.DataFrame, pa.Table]`): Class/mode-specific
+            matrix. Supports multiple user classes. Demand given as a DataFrame or Arrow table of OD pairs is kept in
+            a *SparseDemand*, and is assigned without ever building a dense matrix
         """
+        if not isinstance(matrix, (AequilibraeMatrix, SparseDemand)):
+            matrix = SparseDemand(matrix, graph.centroids)
         super().__init__(name, graph, matrix)
         self.pce = 1.0
         self.vot = 1.0
@@ -112,6 +120,7 @@ class TrafficClass(TransportClassBase):
         self.results = AssignmentResults()
         self._aon_results = AssignmentResults()
         self._selected_links = {}  # maps human name to link_set
+        self._demand_csr = None
 
     def set_pce(self, pce: Union[float, int]) -> None:
         """Sets Passenger Car equivalent
@@ -161,7 +170,12 @@ class TrafficClass(TransportClassBase):
         :Arguments:
             **links** (:obj:`Union[None, Dict[str, List[Tuple[int, int]]]]`): name of link set and
             Link IDs and directions to be used in select link analysis"""
-        self._selected_links = {}
+        self._selected_links = self._select_link_ids(links)
+        self._config["select_links"] = str(links)
+
+    def _select_link_ids(self, links: Dict[str, List[Tuple[int, int]]]) -> Dict[str, np.ndarray]:
+        """Compact graph ids of the links in each set of selected links"""
+        selected_links = {}
         for name, link_set in links.items():
             if len(name.split(" ")) != 1:
                 warnings.warn("Input string name has a space in it. Replacing with _")
@@ -186,8 +200,18 @@ class TrafficClass(TransportClassBase):
                         )
                     else:
                         link_ids.append(comp_id)
-            self._selected_links[name] = np.array(link_ids, dtype=self.graph.default_types("int"))
-        self._config["select_links"] = str(links)
+            selected_links[name] = np.array(link_ids, dtype=self.graph.default_types("int"))
+        return selected_links
+
+    def _prepare_demand_csr(self) -> None:
+        """Keeps a sparse copy of the demand, so link loads only go through the destinations with demand
+
+        The copy is only kept for matrices with density up to *SPARSE_DEMAND_MAX_DENSITY*. It must be rebuilt if
+        the matrix changes"""
+        if isinstance(self.matrix, SparseDemand):
+            self._demand_csr = self.matrix.csr
+        else:
+            self._demand_csr = demand_csr(self.matrix.matrix_view)
 
     def __setattr__(self, key, value):
         if key not in [
@@ -205,6 +229,7 @@ class TrafficClass(TransportClassBase):
             "fc_multiplier",
             "fixed_cost_field",
             "_selected_links",
+            "_demand_csr",
             "_config",
         ]:
             raise KeyError(f"Traffic Class does not have '{key}'")
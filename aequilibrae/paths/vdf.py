@@ -1,16 +1,86 @@
+import ctypes
+from typing import List
+
+import numpy as np
+
 from aequilibrae import global_logger
 
 try:
     from aequilibrae.paths.AoN import bpr, delta_bpr, bpr2, delta_bpr2, conical, delta_conical, inrets, delta_inrets
+    from aequilibrae.paths.AoN import builtin_vdf_address, vdf_value_and_derivative, vdf_directional_derivative
 except ImportError as ie:
     global_logger.warning(f"Could not import procedures from the binary. {ie.args}")
 
-all_vdf_functions = ["bpr", "bpr2", "conical", "inrets"]
+builtin_vdf_functions = ["bpr", "bpr2", "conical", "inrets"]
+all_vdf_functions = list(builtin_vdf_functions)
+
+# Compiled functions registered by users, and the objects they came from (which need to be kept alive)
+_compiled_vdfs = {}
+
+
+def register_vdf(name: str, function) -> None:
+    """Registers a compiled volume-delay function, so it can be used in traffic assignment
+
+    The function needs to have the C signature
+    *void f(double flow, double capacity, double fftime, double alpha, double beta, double\\* value,
+    double\\* derivative)*, writing the congested time and its derivative with respect to the flow, and must not
+    require the GIL. Numba cfuncs, ctypes function pointers and addresses of Cython cdef functions are accepted.
+
+    .. code-block:: python
+
+        >>> from numba import cfunc, types  # doctest: +SKIP
+        >>> from aequilibrae.paths.vdf import register_vdf
+
+        >>> sig = types.void(*[types.double] * 5, types.CPointer(types.double), types.CPointer(types.double))
+
+        >>> @cfunc(sig, nopython=True)  # doctest: +SKIP
+        ... def davidson(flow, capacity, fftime, alpha, beta, value, derivative):
+        ...     x = min(flow / capacity, 0.99)
+        ...     value[0] = fftime * (1 + alpha * x / (1 - x))
+        ...     derivative[0] = fftime * alpha / (capacity * (1 - x) ** 2)
+
+        >>> register_vdf("davidson", davidson)  # doctest: +SKIP
+
+    :Arguments:
+        **name** (:obj:`str`): Name of the VDF. Not case-sensitive
+
+        **function**: Numba cfunc (or any object with an *address* attribute), ctypes function pointer or address
+    """
+    name = name.lower()
+    if name in builtin_vdf_functions:
+        raise ValueError(f"{name} is a built-in VDF and cannot be replaced")
+
+    if isinstance(function, int):
+        address = function
+    elif hasattr(function, "address"):
+        address = function.address
+    elif isinstance(function, ctypes._CFuncPtr):
+        address = ctypes.cast(function, ctypes.c_void_p).value
+    else:
+        raise TypeError("VDFs need to be compiled functions (e.g. Numba cfuncs) or their addresses")
+
+    if not address:
+        raise ValueError("VDF has a NULL address")
+
+    _compiled_vdfs[name] = (address, function)
+    if name not in all_vdf_functions:
+        all_vdf_functions.append(name)
+
+
+def vdf_address(name: str) -> int:
+    """Address of the compiled version of a VDF, either built-in or registered"""
+    name = name.lower()
+    if name in _compiled_vdfs:
+        return _compiled_vdfs[name][0]
+    return builtin_vdf_address(name)
 
 
 class VDF:
     """Volume-Delay function
 
+    Besides the built-in functions, compiled functions registered with *register_vdf* can be used, and different
+    links can use different functions.
+
     .. code-block:: python
 
         >>> from aequilibrae.paths import VDF
@@ -26,10 +96,19 @@ class VDF:
         self.__dict__["apply_vdf"] = None
         self.__dict__["apply_derivative"] = None
 
+        # Addresses of the compiled functions in use, and the position of the function of each link among them. With
+        # no function IDs, all links use the first function
+        self.__dict__["_functions"] = np.zeros(0, dtype=np.uintp)
+        self.__dict__["_function_ids"] = np.zeros(0, dtype=np.int64)
+
     def __setattr__(self, instance, value) -> None:
         if instance == "function":
             value = value.upper()
+            if value.lower() not in all_vdf_functions:
+                raise ValueError("VDF function not available")
             self.__dict__[instance] = value
+            self.__dict__["_functions"] = np.array([vdf_address(value)], dtype=np.uintp)
+            self.__dict__["_function_ids"] = np.zeros(0, dtype=np.int64)
             if value == "BPR":
                 self.__dict__["apply_vdf"] = bpr
                 self.__dict__["apply_derivative"] = delta_bpr
@@ -43,10 +122,103 @@ class VDF:
                 self.__dict__["apply_vdf"] = inrets
                 self.__dict__["apply_derivative"] = delta_inrets
             else:
-                raise ValueError("VDF function not available")
+                self.__dict__["apply_vdf"] = self.__compiled_vdf
+                self.__dict__["apply_derivative"] = self.__compiled_derivative
         else:
             raise AttributeError("This class only allows you to set the VDF to use")
 
+    def set_link_functions(self, function_ids: np.ndarray, functions: List[str]) -> None:
+        """Sets the VDF used by each link
+
+        :Arguments:
+            **function_ids** (:obj:`np.ndarray`): Position in *functions* of the VDF of each link
+
+            **functions** (:obj:`List[str]`): Names of the VDFs used
+        """
+        if self.function == "":
+            raise RuntimeError("First you need to set the Volume-Delay Function to use")
+        for f in functions:
+            if f.lower() not in all_vdf_functions:
+                raise ValueError(f"VDF function {f} not available")
+        function_ids = np.asarray(function_ids, dtype=np.int64)
+        if function_ids.shape[0] and (function_ids.min() < 0 or function_ids.max() >= len(functions)):
+            raise ValueError("Function IDs need to refer to one of the VDFs provided")
+
+        self.__dict__["_functions"] = np.array([vdf_address(f) for f in functions], dtype=np.uintp)
+        self.__dict__["_function_ids"] = function_ids
+        self.__dict__["apply_vdf"] = self.__compiled_vdf
+        self.__dict__["apply_derivative"] = self.__compiled_derivative
+
+    def links_using(self, functions: List[str]) -> np.ndarray:
+        """Boolean mask of the links that use any of the VDFs given
+
+        :Arguments:
+            **functions** (:obj:`List[str]`): Names of the VDFs
+
+        :Returns:
+            **mask** (:obj:`np.ndarray`): Whether each link uses any of the functions. It has a single element
+            when all links use the same function
+        """
+        addresses = [vdf_address(f) for f in functions if f.lower() in all_vdf_functions]
+        uses = np.isin(self._functions, np.array(addresses, dtype=np.uintp))
+        return uses[self._function_ids] if self._function_ids.shape[0] else uses
+
+    def apply_vdf_and_derivative(
+        self, congested_times, derivatives, link_flows, capacity, fftime, alpha, beta, cores, links=None
+    ) -> None:
+        """Computes congested times and their derivatives in a single pass over the links
+
+        Either *congested_times* or *derivatives* can be None, in which case they are not computed. With *links*, only
+        the links in those positions are computed
+        """
+        if links is not None:
+            function_ids = self._function_ids[links] if self._function_ids.shape[0] else self._function_ids
+            times = None if congested_times is None else np.zeros(links.shape[0])
+            ders = None if derivatives is None else np.zeros(links.shape[0])
+            vdf_value_and_derivative(
+                times,
+                ders,
+                link_flows[links],
+                capacity[links],
+                fftime[links],
+                alpha[links],
+                beta[links],
+                function_ids,
+                self._functions,
+                cores,
+            )
+            if times is not None:
+                congested_times[links] = times
+            if ders is not None:
+                derivatives[links] = ders
+            return
+
+        vdf_value_and_derivative(
+            congested_times,
+            derivatives,
+            link_flows,
+            capacity,
+            fftime,
+            alpha,
+            beta,
+            self._function_ids,
+            self._functions,
+            cores,
+        )
+
+    def directional_derivative(self, stepsize, direction, solution, capacity, fftime, alpha, beta, cores) -> float:
+        """Derivative of the Beckmann objective at the flows *solution + stepsize * (direction - solution)*,
+        along the direction *direction - solution*"""
+        return vdf_directional_derivative(
+            stepsize, direction, solution, capacity, fftime, alpha, beta, self._function_ids, self._functions, cores
+        )
+
     def functions_available(self) -> list:
         """returns a list of all functions available"""
         return all_vdf_functions
+
+    def __compiled_vdf(self, congested_times, link_flows, capacity, fftime, alpha, beta, cores):
+        self.apply_vdf_and_derivative(congested_times, None, link_flows, capacity, fftime, alpha, beta, cores)
+
+    def __compiled_derivative(self, derivatives, link_flows, capacity, fftime, alpha, beta, cores):
+        self.apply_vdf_and_derivative(None, derivatives, link_flows, capacity, fftime, alpha, beta, cores)
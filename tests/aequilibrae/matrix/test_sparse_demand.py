@@ -0,0 +1,53 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from aequilibrae.matrix import SparseDemand
+
+
+class TestSparseDemand(TestCase):
+    def setUp(self) -> None:
+        self.centroids = np.array([10, 20, 30, 40])
+        self.df = pd.DataFrame(
+            {
+                "origin": [20, 10, 10, 20, 40, 10],
+                "destination": [10, 30, 20, 10, 40, 40],
+                "car": [1.0, 2.0, 3.0, 4.0, np.nan, 0.0],
+                "truck": np.array([0.5, 0.0, 0.0, 0.0, 0.0, 0.0], dtype=np.float32),
+            }
+        ).set_index(["origin", "destination"])
+
+    def test_csr(self):
+        demand = SparseDemand(self.df, self.centroids)
+        self.assertEqual(demand.view_names, ["car", "truck"])
+        self.assertEqual(demand.zones, 4)
+
+        # Repeated OD pairs are added up, and pairs without demand are dropped
+        ptr, destinations, values = demand.csr
+        np.testing.assert_array_equal(ptr, [0, 2, 3, 3, 3])
+        np.testing.assert_array_equal(destinations, [1, 2, 0])
+        np.testing.assert_allclose(values, [[3.0, 0.0], [2.0, 0.0], [5.0, 0.5]])
+
+        np.testing.assert_allclose(demand.row(0, 0), [0.0, 3.0, 2.0, 0.0])
+        self.assertEqual(demand.totals(), {"car": 10.0, "truck": 0.5})
+
+    def test_arrow(self):
+        table = pa.Table.from_pandas(self.df.reset_index())
+        demand = SparseDemand(table, self.centroids)
+        for x, y in zip(demand.csr, SparseDemand(self.df, self.centroids).csr):
+            np.testing.assert_array_equal(x, y)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            SparseDemand(self.df, self.centroids[:3])
+
+        with self.assertRaises(ValueError):
+            SparseDemand(self.df.reset_index(), self.centroids)
+
+        with self.assertRaises(TypeError):
+            SparseDemand(self.df.assign(car=1), self.centroids)
+
+        with self.assertRaises(TypeError):
+            SparseDemand(self.df.to_numpy(), self.centroids)
@@ -1,11 +1,17 @@
 import os
+from itertools import product
 from tempfile import gettempdir
 from unittest import TestCase
 import uuid
+
+import numpy as np
+
 from aequilibrae.utils.create_example import create_example
 from aequilibrae.paths import Graph
 from aequilibrae.paths.results import AssignmentResults
-from aequilibrae.paths.all_or_nothing import allOrNothing
+from aequilibrae.paths.all_or_nothing import allOrNothing, demand_csr, execute_concurrently
+from aequilibrae.paths.multi_threaded_aon import MultiThreadedAoN
+from aequilibrae.paths import one_to_all
 from ...data import test_graph
 
 
@@ -65,3 +71,127 @@ class TestAllOrNothing(TestCase):
         load2 = res2.get_load_results()
 
         self.assertEqual(list(load1.matrix_tot * 2), list(load2.matrix_tot), "Something wrong with the AoN")
+
+    def test_execute_matches_single_origin(self):
+        # Results do not depend on the number of threads, and match the ones computed one origin at a time
+        loads = []
+        for cores in [1, 3]:
+            res = AssignmentResults()
+            res.set_cores(cores)
+            res.prepare(self.g, self.matrix)
+            assig = allOrNothing("name", self.matrix, self.g, res)
+            assig.execute()
+            self.assertEqual(assig.cumulative, self.matrix.zones)
+            loads.append(np.array(res.link_loads, copy=True))
+            skims = np.array(res.skims.distance, copy=True)
+
+        res = AssignmentResults()
+        res.set_cores(1)
+        res.prepare(self.g, self.matrix)
+        aux_res = MultiThreadedAoN()
+        aux_res.prepare(self.g, res)
+        for orig in self.matrix.index:
+            one_to_all(orig, self.matrix, self.g, res, aux_res, 0)
+
+        np.testing.assert_allclose(loads[0], loads[1])
+        np.testing.assert_allclose(loads[0], aux_res.temp_link_loads[0][res.crosswalk, :])
+        np.testing.assert_array_equal(skims, res.skims.distance)
+
+    def test_link_loads_accumulation(self):
+        res = AssignmentResults()
+        with self.assertRaises(ValueError):
+            res.set_link_loads_accumulation("atomic")
+
+        loads = {}
+        for mode in ["per-thread", "shared", "auto"]:
+            res = AssignmentResults()
+            res.set_cores(4)
+            res.set_link_loads_accumulation(mode)
+            res.prepare(self.g, self.matrix)
+            assig = allOrNothing("name", self.matrix, self.g, res)
+            assig.execute()
+            loads[mode] = np.array(res.link_loads, copy=True)
+
+            if mode == "shared" and res.cores > 1:
+                self.assertTrue(assig.aux_res.shared_link_loads)
+                self.assertEqual(assig.aux_res.temp_link_loads.size, 1)
+
+        np.testing.assert_allclose(loads["per-thread"], loads["shared"])
+        np.testing.assert_allclose(loads["per-thread"], loads["auto"])
+
+    def test_processes_backend(self):
+        # Worker processes give the same loads and skims as threads, for dense and sparse demand
+        loads, skims = [], []
+        for backend, csr in product(["threads", "processes"], [None, demand_csr(self.matrix.matrix_view)]):
+            res = AssignmentResults()
+            res.set_backend(backend, processes=2)
+            res.prepare(self.g, self.matrix)
+            assig = allOrNothing("name", self.matrix, self.g, res, csr)
+            assig.execute()
+            self.assertEqual(assig.cumulative, self.matrix.zones)
+            loads.append(np.array(res.link_loads, copy=True))
+            skims.append(np.array(res.skims.distance, copy=True))
+
+        for i in range(1, 4):
+            np.testing.assert_allclose(loads[i], loads[0])
+            np.testing.assert_array_equal(skims[i], skims[0])
+
+    def test_early_exit(self):
+        self.g.set_skimming([])
+        self.matrix.matrix_view[:, 5:, :] = 0
+
+        loads = []
+        for early_exit in [False, True]:
+            res = AssignmentResults()
+            res.early_exit = early_exit
+            res.prepare(self.g, self.matrix)
+            assig = allOrNothing("name", self.matrix, self.g, res)
+            assig.execute()
+            loads.append(np.array(res.link_loads, copy=True))
+
+        np.testing.assert_allclose(loads[0], loads[1])
+
+    def test_execute_concurrently(self):
+        # Classes on the same graph with different costs give the same results as when assigned one after the other
+        costs = [np.array(self.g.compact_cost), np.array(self.g.compact_cost) + 1.0]
+        matrices = [self.matrix, self.matrix2]
+
+        expected = []
+        for matrix, cost in zip(matrices, costs):
+            self.g.compact_cost[:] = cost
+            res = AssignmentResults()
+            res.set_cores(3)
+            res.prepare(self.g, matrix)
+            allOrNothing("name", matrix, self.g, res).execute()
+            expected.append((np.array(res.link_loads, copy=True), np.array(res.skims.distance, copy=True)))
+
+        aons = []
+        for matrix in matrices:
+            res = AssignmentResults()
+            res.set_cores(3)
+            res.prepare(self.g, matrix)
+            aons.append(allOrNothing("name", matrix, self.g, res))
+        execute_concurrently(aons, costs)
+
+        for aon, (loads, skims) in zip(aons, expected):
+            np.testing.assert_allclose(aon.results.link_loads, loads)
+            np.testing.assert_allclose(aon.results.skims.distance, skims)
+
+    def test_demand_csr(self):
+        self.assertIsNone(demand_csr(np.ones((10, 10, 1))))
+
+        self.matrix.matrix_view[:, 3:, :] = 0
+        self.matrix.matrix_view[0, 1, :] = np.nan
+        ptr, destinations, demand = demand_csr(self.matrix.matrix_view)
+        self.assertEqual(ptr[-1], destinations.shape[0])
+        self.assertTrue(np.all(destinations < 3))
+
+        loads = []
+        for csr in [None, (ptr, destinations, demand)]:
+            res = AssignmentResults()
+            res.set_cores(3)
+            res.prepare(self.g, self.matrix)
+            allOrNothing("name", self.matrix, self.g, res, csr).execute()
+            loads.append(np.array(res.link_loads, copy=True))
+
+        np.testing.assert_allclose(loads[0], loads[1])
@@ -0,0 +1,35 @@
+import os
+
+import numpy as np
+import pytest
+
+from aequilibrae.paths.assignment_checkpoint import read_checkpoint, write_checkpoint
+
+
+def test_write_and_read_checkpoint(tmp_path):
+    arrays = {"link_loads": np.arange(12, dtype=np.float64).reshape(6, 2), "skims": np.ones((3, 3, 1))}
+    state = {"iteration": 4, "rgap": float("inf"), "convergence_report": {"rgap": [1.0, 0.5]}}
+
+    write_checkpoint(tmp_path, 4, state, arrays)
+    arrays["link_loads"] *= 2
+    write_checkpoint(tmp_path, 8, {**state, "iteration": 8}, arrays)
+
+    # Only the latest checkpoint is kept
+    assert sorted(os.listdir(tmp_path)) == ["iteration_000008", "latest.json"]
+
+    stored_state, stored = read_checkpoint(tmp_path)
+    assert stored_state["iteration"] == 8
+    assert stored_state["rgap"] == float("inf")
+    assert stored_state["convergence_report"] == state["convergence_report"]
+    assert isinstance(stored["link_loads"], np.memmap)
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(stored[name], array)
+
+    # Checkpoint folders can also be read directly
+    stored_state, _ = read_checkpoint(tmp_path / "iteration_000008")
+    assert stored_state["iteration"] == 8
+
+
+def test_read_missing_checkpoint(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        read_checkpoint(tmp_path)
@@ -1,5 +1,11 @@
+from multiprocessing import shared_memory
+from tempfile import TemporaryDirectory
 from unittest import TestCase
+
+import numpy as np
+
 from aequilibrae.paths.results import AssignmentResults
+from aequilibrae.paths.results.skim_storage import create_skim_matrix
 import multiprocessing as mp
 
 
@@ -29,6 +35,51 @@ class TestAssignmentResults(TestCase):
         # Never save by default
         self.assertEqual(a.save_path_file, False)
 
+    def test_set_skim_storage(self):
+        a = AssignmentResults()
+        self.assertEqual(a.skim_storage, "memory")
+
+        with self.assertRaises(ValueError):
+            a.set_skim_storage("disk")
+
+        with TemporaryDirectory() as fldr:
+            a.set_skim_storage(fldr)
+            self.assertEqual(a.skim_storage, fldr)
+
+    def test_set_backend(self):
+        a = AssignmentResults()
+        self.assertEqual(a.backend, "threads")
+
+        with self.assertRaises(ValueError):
+            a.set_backend("gpu")
+
+        with self.assertRaises(ValueError):
+            a.set_backend("processes", processes=0)
+
+        a.set_backend("processes", processes=2)
+        self.assertEqual((a.backend, a.processes), ("processes", 2))
+
+    def test_create_skim_matrix(self):
+        centroids = np.arange(1, 5)
+        with TemporaryDirectory() as fldr:
+            for storage in ["memory", "shared", fldr]:
+                skims = create_skim_matrix(4, ["time", "distance"], centroids, storage)
+                self.assertEqual(skims.matrix_view.shape, (4, 4, 2))
+                np.testing.assert_array_equal(skims.index, centroids)
+
+                # The computational view writes to the matrix cores
+                skims.matrix_view[:, :, 1] = 2.0
+                np.testing.assert_array_equal(skims.matrix["distance"], 2.0)
+
+            # Other processes can attach to shared skims by name
+            skims = create_skim_matrix(4, ["time", "distance"], centroids, "shared")
+            skims.matrix["time"][1, 2] = 5.0
+            shm = shared_memory.SharedMemory(name=skims.shared_memory.name)
+            attached = np.ndarray(skims.matrices.shape, dtype=skims.matrices.dtype, buffer=shm.buf)
+            self.assertEqual(attached[1, 2, 0], 5.0)
+            del attached
+            shm.close()
+
     # def test_set_critical_links(self):
     #     self.fail()
     #
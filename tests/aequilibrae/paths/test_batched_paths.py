@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from aequilibrae.paths.results import PathResults
+
+from .utils import grid_graph
+
+
+@pytest.mark.parametrize("block_centroid_flows", [True, False])
+def test_same_paths_as_compute_path(block_centroid_flows):
+    graph = grid_graph(10, 13)
+    graph.set_blocked_centroid_flows(block_centroid_flows)
+    res = PathResults()
+    res.prepare(graph)
+
+    rng = np.random.default_rng(3)
+    origins, destinations = rng.integers(1, 101, (2, 400))
+    origins[:5] = destinations[:5]
+    paths = res.compute_paths(origins, destinations, cores=2)
+    assert paths.num_rows == 400
+    assert res.path is None
+
+    for row, (origin, destination) in enumerate(zip(origins.tolist(), destinations.tolist())):
+        res.compute_path(origin, destination)
+        batch = {column: paths.column(column)[row].as_py() for column in paths.column_names}
+        assert batch["origin"] == origin and batch["destination"] == destination
+        if origin == destination:
+            assert batch["path"] == [] and batch["cost"] == 0
+        elif res.path is None:
+            assert batch["path"] == [] and batch["cost"] == np.inf
+        else:
+            assert batch["path"] == res.path.tolist()
+            assert batch["path_link_directions"] == res.path_link_directions.tolist()
+            assert batch["cost"] == pytest.approx(res.milepost[-1])
+            assert batch["distance"] == pytest.approx(res.skims[destination, 0])
+
+
+def test_errors():
+    graph = grid_graph(4, 1)
+    res = PathResults()
+    res.prepare(graph)
+    with pytest.raises(ValueError):
+        res.compute_paths(np.array([1, 2]), np.array([3]))
+    with pytest.raises(ValueError):
+        res.compute_paths(np.array([1, 2]), np.array([3, 1000]))
+
+    paths = res.compute_paths(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    assert paths.num_rows == 0
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from aequilibrae.paths import RouteChoice
+from aequilibrae.paths.results import PathResults
+
+from .utils import grid_graph
+
+
+@pytest.mark.parametrize("block_centroid_flows", [True, False])
+def test_same_paths_as_dijkstra(block_centroid_flows):
+    graph = grid_graph(12, 11)
+    graph.set_blocked_centroid_flows(block_centroid_flows)
+    dijkstra, bidirectional = PathResults(), PathResults()
+    dijkstra.prepare(graph)
+    bidirectional.prepare(graph)
+
+    rng = np.random.default_rng(5)
+    for origin, destination in rng.integers(1, 145, (300, 2)):
+        origin, destination = int(origin), int(destination)
+        dijkstra.compute_path(origin, destination)
+        bidirectional.compute_path(origin, destination, bidirectional=True)
+        if dijkstra.path is None:
+            assert bidirectional.path is None
+            continue
+
+        assert bidirectional.milepost[-1] == pytest.approx(dijkstra.milepost[-1])
+        assert bidirectional.path_nodes[0] == origin and bidirectional.path_nodes[-1] == destination
+        if block_centroid_flows:
+            assert not np.isin(bidirectional.path_nodes[1:-1], np.arange(1, 13)).any()
+
+
+def test_update_trace():
+    graph = grid_graph(10, 2)
+    dijkstra, bidirectional = PathResults(), PathResults()
+    dijkstra.prepare(graph)
+    bidirectional.prepare(graph)
+    dijkstra.compute_path(1, 100)
+    bidirectional.compute_path(1, 100, bidirectional=True)
+
+    # Nodes scanned by the forward search are traced from the tree, and all others are searched again
+    for destination in [2, 11, 55, 90]:
+        dijkstra.update_trace(destination)
+        bidirectional.update_trace(destination)
+        assert bidirectional.milepost[-1] == pytest.approx(dijkstra.milepost[-1])
+
+    bidirectional.reset()
+    assert not bidirectional.bidirectional
+
+
+def test_route_choice():
+    graph = grid_graph(10, 4)
+    route_sets = []
+    for bidirectional in [False, True]:
+        rc = RouteChoice(graph)
+        rc.set_choice_set_generation("bfsle", max_routes=5, bidirectional=bidirectional)
+        rc.prepare([1, 4, 10])
+        rc.execute(perform_assignment=False)
+        route_sets.append(rc.get_results().to_pandas()["route set"].map(tuple))
+    assert route_sets[0].equals(route_sets[1])
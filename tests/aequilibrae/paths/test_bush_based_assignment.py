@@ -0,0 +1,58 @@
+import numpy as np
+
+from aequilibrae.paths import TrafficAssignment, TrafficClass
+
+from .utils import grid_demand, grid_graph
+
+
+def test_bushes_are_stored_sparsely():
+    graph = grid_graph(10, 5)
+    graph.set_graph("free_flow_time")
+    matrix = grid_demand(graph, ["cars", "trucks"], 1)
+
+    assignment = TrafficAssignment()
+    assignclass = TrafficClass("car", graph, matrix)
+    assignment.set_classes([assignclass])
+    assignment.set_vdf("BPR")
+    assignment.set_vdf_parameters({"alpha": 0.15, "beta": 4.0})
+    assignment.set_capacity_field("capacity")
+    assignment.set_time_field("free_flow_time")
+    assignment.set_algorithm("bush")
+    assignment.max_iter = 10
+    assignment.execute()
+
+    # Only the links of each bush are stored, and their flows add up to the link loads of each user class
+    bushes = assignment.assignment._workspaces[assignclass._id]["bushes"]
+    assert len(bushes) == graph.num_zones * 2
+    loads = np.zeros((graph.compact_num_links + 1, 2))
+    for (_, user_class), (links, in_bush, flows) in bushes.items():
+        assert links.shape[0] < graph.compact_num_links
+        assert np.all(in_bush[flows > 1e-10])
+        np.add.at(loads[:, user_class], links, flows)
+    np.testing.assert_allclose(loads, assignclass.results.compact_link_loads, atol=1e-9)
+
+
+def test_costs_of_some_links_match_a_full_update():
+    graph = grid_graph(20, 5)
+    graph.set_graph("free_flow_time")
+    assignment = TrafficAssignment()
+    assignclass = TrafficClass("car", graph, grid_demand(graph, ["cars"], 1))
+    assignment.set_classes([assignclass])
+    assignment.set_vdf("BPR")
+    assignment.set_vdf_parameters({"alpha": 0.15, "beta": 4.0})
+    assignment.set_capacity_field("capacity")
+    assignment.set_time_field("free_flow_time")
+    assignment.set_algorithm("bush")
+    assignment.max_iter = 2
+    assignment.execute()
+
+    # Flows shifted by an origin only change the costs of its links
+    algorithm = assignment.assignment
+    links = np.arange(0, graph.compact_num_links, 10)
+    assignclass.results.compact_link_loads[links] += 5
+    algorithm._update_costs(assignclass, links)
+    ws = algorithm._workspaces[assignclass._id]
+    partial = [np.array(a, copy=True) for a in [ws["cost"], ws["derivative"], algorithm.congested_time]]
+    algorithm._update_costs()
+    for updated, full in zip(partial, [ws["cost"], ws["derivative"], algorithm.congested_time]):
+        np.testing.assert_allclose(updated, full)
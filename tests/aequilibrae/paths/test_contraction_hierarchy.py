@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from aequilibrae.paths import ContractionHierarchy
+from aequilibrae.paths.results import PathResults
+
+from .utils import grid_graph
+
+
+@pytest.mark.parametrize("block_centroid_flows", [True, False])
+def test_same_costs_as_dijkstra(block_centroid_flows):
+    graph = grid_graph(12, 42)
+    graph.set_blocked_centroid_flows(block_centroid_flows)
+    hierarchy = ContractionHierarchy(graph)
+    assert hierarchy.num_shortcuts > 0
+
+    dijkstra, ch = PathResults(), PathResults()
+    dijkstra.prepare(graph)
+    ch.prepare(graph)
+    ch.set_contraction_hierarchy(hierarchy)
+
+    rng = np.random.default_rng(0)
+    for origin, destination in rng.integers(1, 145, (300, 2)):
+        origin, destination = int(origin), int(destination)
+        dijkstra.compute_path(origin, destination)
+        ch.compute_path(origin, destination)
+        if dijkstra.path is None:
+            assert ch.path is None
+            continue
+
+        assert ch.milepost[-1] == pytest.approx(dijkstra.milepost[-1])
+        assert ch.path_nodes[0] == origin and ch.path_nodes[-1] == destination
+        assert ch.skims[destination, 0] == pytest.approx(dijkstra.skims[destination, 0])
+        # Paths only go through centroids when flows through them are not blocked
+        if block_centroid_flows:
+            assert not np.isin(ch.path_nodes[1:-1], np.arange(1, 13)).any()
+
+        # Links of the path are consecutive
+        links = graph.graph.set_index(["link_id", "direction"]).loc[zip(ch.path, ch.path_link_directions)]
+        np.testing.assert_array_equal(links.a_node.values[1:], links.b_node.values[:-1])
+
+
+def test_update_trace():
+    graph = grid_graph(8, 3)
+    res = PathResults()
+    res.prepare(graph)
+    res.set_contraction_hierarchy(ContractionHierarchy(graph))
+
+    res.compute_path(1, 64)
+    middle = int(res.path_nodes[len(res.path_nodes) // 2])
+    milepost = res.milepost[len(res.path_nodes) // 2]
+
+    # Nodes on the path are traced from the path found, and all others are searched again
+    res.update_trace(middle)
+    assert res.milepost[-1] == pytest.approx(milepost)
+    res.update_trace(20)
+    assert res.path_nodes[-1] == 20
+
+
+def test_hierarchy_for_other_costs():
+    graph = grid_graph(5, 1)
+    hierarchy = ContractionHierarchy(graph, "distance")
+    res = PathResults()
+    res.prepare(graph)
+    with pytest.raises(ValueError):
+        res.set_contraction_hierarchy(hierarchy)
+
+    graph.set_graph("distance")
+    res.prepare(graph)
+    res.set_contraction_hierarchy(hierarchy)
+
+    # Node indices are used directly, without the path results
+    origin, destination = graph.nodes_to_indices[1], graph.nodes_to_indices[25]
+    res.compute_path(1, 25)
+    assert hierarchy.compute_cost(origin, destination) == pytest.approx(res.milepost[-1])
+    graph.set_blocked_centroid_flows(False)
+    assert not hierarchy.built_for(graph)
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import uuid
+
+import numpy as np
+import pytest
+
+from aequilibrae.paths import Graph, RouteChoice
+from aequilibrae.paths.results import PathResults
+
+from .utils import grid_graph
+
+
+@pytest.fixture
+def graph():
+    graph = grid_graph(12, 7)
+    graph.prepare_landmarks(6)
+    return graph
+
+
+@pytest.mark.parametrize("block_centroid_flows", [True, False])
+def test_same_paths_as_dijkstra(graph, block_centroid_flows):
+    graph.set_blocked_centroid_flows(block_centroid_flows)
+    dijkstra, a_star = PathResults(), PathResults()
+    dijkstra.prepare(graph)
+    a_star.prepare(graph)
+
+    rng = np.random.default_rng(1)
+    for origin, destination in rng.integers(1, 145, (300, 2)):
+        origin, destination = int(origin), int(destination)
+        dijkstra.compute_path(origin, destination)
+        a_star.compute_path(origin, destination, a_star=True, heuristic="landmarks")
+        if dijkstra.path is None:
+            assert a_star.path is None
+            continue
+        assert a_star.milepost[-1] == pytest.approx(dijkstra.milepost[-1])
+        assert a_star.path_nodes[-1] == destination
+
+
+def test_landmarks_for_higher_costs(graph):
+    assert len(set(graph.landmarks.nodes)) == 6
+    assert np.all(graph.landmarks.from_landmarks[graph.landmarks.nodes, np.arange(6)] == 0)
+
+    res = PathResults()
+    res.prepare(graph)
+    # As an assignment does with congested travel times
+    graph.cost = graph.cost * np.random.default_rng(2).uniform(1, 3, graph.cost.shape[0])
+    res.compute_path(1, 144, a_star=True, heuristic="landmarks")
+    milepost = res.milepost[-1]
+    res.compute_path(1, 144)
+    assert milepost == pytest.approx(res.milepost[-1])
+
+    graph.set_graph("distance")
+    assert not graph.landmarks.valid_for(graph)
+    with pytest.raises(ValueError):
+        res.compute_path(1, 144, a_star=True, heuristic="landmarks")
+
+
+def test_save_with_graph(graph):
+    file_name = os.path.join(tempfile.gettempdir(), f"graph_{uuid.uuid4().hex}.aeg")
+    graph.save_to_disk(file_name)
+    loaded = Graph()
+    loaded.load_from_disk(file_name)
+    os.unlink(file_name)
+
+    assert loaded.landmarks.valid_for(loaded)
+    np.testing.assert_array_equal(loaded.landmarks.from_landmarks, graph.landmarks.from_landmarks)
+    np.testing.assert_array_equal(loaded.landmarks.to_landmarks, graph.landmarks.to_landmarks)
+
+    loaded.prepare_graph(loaded.centroids)
+    assert loaded.landmarks is None
+
+
+def test_route_choice(graph):
+    route_sets = []
+    for a_star in [False, True]:
+        rc = RouteChoice(graph)
+        rc.set_choice_set_generation("link-penalisation", max_routes=5, penalty=1.1, a_star=a_star)
+        rc.prepare([1, 5, 12])
+        rc.execute(perform_assignment=False)
+        route_sets.append(rc.get_results().to_pandas())
+    assert route_sets[0]["route set"].map(tuple).equals(route_sets[1]["route set"].map(tuple))
+
+    graph.landmarks = None
+    rc = RouteChoice(graph)
+    rc.set_choice_set_generation("link-penalisation", max_routes=5, a_star=True)
+    with pytest.raises(ValueError):
+        rc.execute_single(1, 12)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from aequilibrae.paths import TrafficAssignment, TrafficClass
+
+from .utils import grid_demand, grid_graph
+
+
+@pytest.fixture
+def graph():
+    graph = grid_graph(8, 2)
+    graph.set_graph("free_flow_time")
+    return graph
+
+
+def assignment_for(classes, algorithm="bfw", max_iter=5):
+    assignment = TrafficAssignment()
+    assignment.set_classes(classes)
+    assignment.set_vdf("BPR")
+    assignment.set_vdf_parameters({"alpha": 0.15, "beta": 4.0})
+    assignment.set_capacity_field("capacity")
+    assignment.set_time_field("free_flow_time")
+    assignment.set_algorithm(algorithm)
+    assignment.max_iter = max_iter
+    return assignment
+
+
+def selected_link(graph) -> int:
+    return int(graph.graph.loc[graph.graph.direction == 1].link_id.iloc[0])
+
+
+def flows_on_link(data, link_id: int, field: str) -> float:
+    return float(data.data[field][data.data["index"] == link_id][0])
+
+
+@pytest.mark.parametrize("algorithm", ["msa", "fw", "cfw", "bfw"])
+def test_select_link_with_several_user_classes(graph, algorithm):
+    link_id = selected_link(graph)
+    car = TrafficClass("car", graph, grid_demand(graph, ["cars", "trucks"], 1))
+    car.set_select_links({"link": [(link_id, 1)]})
+    assignment_for([car], algorithm).execute()
+
+    # All flow of each user class on the selected link goes through it
+    loads, sl_loads = car.results.get_load_results(), car.results.get_sl_results()
+    for user_class in ["cars", "trucks"]:
+        flow = flows_on_link(loads, link_id, f"{user_class}_ab")
+        assert flow > 0
+        assert flows_on_link(sl_loads, link_id, f"link_{user_class}_ab") == pytest.approx(flow)
+
+
+def test_select_link_on_first_of_classes_sharing_a_graph(graph):
+    link_id = selected_link(graph)
+    car = TrafficClass("car", graph, grid_demand(graph, ["cars"], 1))
+    truck = TrafficClass("truck", graph, grid_demand(graph, ["trucks"], 2))
+    car.set_select_links({"link": [(link_id, 1)]})
+    assignment_for([car, truck]).execute()
+
+    flow = flows_on_link(car.results.get_load_results(), link_id, "cars_ab")
+    assert flow > 0
+    assert flows_on_link(car.results.get_sl_results(), link_id, "link_cars_ab") == pytest.approx(flow)
+
+
+def blended_skims(graph, policy, interval=1) -> np.ndarray:
+    car = TrafficClass("car", graph, grid_demand(graph, ["cars"], 1))
+    assignment = assignment_for([car], "msa")
+    assignment.set_skimming_policy(policy, interval)
+    assignment.execute()
+    return np.array(car.results.skims.distance, copy=True)
+
+
+def test_interval_skims_are_blended(graph):
+    blended = blended_skims(graph, "blended")
+    np.testing.assert_allclose(blended_skims(graph, "interval", 1), blended)
+
+    # Skims of the iterations skimmed by the policy are blended with the ones for the final costs
+    interval = blended_skims(graph, "interval", 2)
+    final = blended_skims(graph, "final")
+    assert not np.allclose(interval, blended)
+    assert not np.allclose(interval, final)
+
+
+def test_msa_does_not_start_from_initial_link_loads(graph):
+    car = TrafficClass("car", graph, grid_demand(graph, ["cars"], 1))
+    assignment = assignment_for([car], "msa")
+    assignment.set_initial_link_loads({"car": np.ones(graph.num_links)})
+    with pytest.raises(ValueError, match="MSA"):
+        assignment.execute()
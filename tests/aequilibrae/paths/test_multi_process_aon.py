@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from aequilibrae.paths import NetworkSkimming
+from aequilibrae.paths.all_or_nothing import allOrNothing
+from aequilibrae.paths.multi_process_aon import SharedArrays
+from aequilibrae.paths.results import AssignmentResults
+
+from .utils import grid_demand, grid_graph
+
+
+@pytest.fixture
+def graph():
+    return grid_graph(8, 3)
+
+
+@pytest.fixture
+def matrix(graph):
+    return grid_demand(graph, ["cars"], 0)
+
+
+def test_assignment_in_processes(graph, matrix):
+    # Workers prepare their auxiliary arrays with stand-ins for the graph and results, which must have every
+    # attribute the kernels and *MultiThreadedAoN.prepare* read
+    loads, skims = [], []
+    for backend in ["threads", "processes"]:
+        res = AssignmentResults()
+        res.set_backend(backend, processes=2)
+        res.prepare(graph, matrix)
+        allOrNothing("cars", matrix, graph, res).execute()
+        loads.append(np.array(res.link_loads, copy=True))
+        skims.append(np.array(res.skims.distance, copy=True))
+
+    assert loads[0].sum() > 0
+    np.testing.assert_allclose(loads[1], loads[0])
+    np.testing.assert_array_equal(skims[1], skims[0])
+
+
+def test_skimming_in_processes(graph):
+    skims = []
+    for backend in ["threads", "processes"]:
+        skimming = NetworkSkimming(graph)
+        skimming.set_backend(backend, processes=2)
+        skimming.execute()
+        skims.append(np.array(skimming.results.skims.distance, copy=True))
+    np.testing.assert_array_equal(skims[1], skims[0])
+
+
+def test_costs_are_shared_again_on_each_execution(graph, matrix):
+    res = AssignmentResults()
+    res.set_backend("processes", processes=2)
+    res.prepare(graph, matrix)
+    aon = allOrNothing("cars", matrix, graph, res)
+    aon.execute()
+
+    graph.compact_cost[:] = graph.compact_cost[::-1]
+    res.reset()
+    aon.execute()
+
+    expected = AssignmentResults()
+    expected.prepare(graph, matrix)
+    allOrNothing("cars", matrix, graph, expected).execute()
+    np.testing.assert_allclose(res.link_loads, expected.link_loads)
+
+
+def test_unchanging_arrays_are_copied_once():
+    shared = SharedArrays()
+    try:
+        shared.put_once("fs", np.arange(5))
+        np.testing.assert_array_equal(shared.put_once("fs", np.zeros(5, dtype=int)), np.arange(5))
+    finally:
+        shared.close()
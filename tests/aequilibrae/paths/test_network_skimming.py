@@ -96,3 +96,25 @@ class TestNetwork_skimming(TestCase):
 
         if skm.report:
             self.fail("Skimming returned an error:" + str(skm.report))
+
+    def test_processes_backend(self):
+        self.network.build_graphs()
+        graph = self.network.graphs["c"]
+        graph.set_graph(cost_field="distance")
+        graph.set_skimming(["distance", "free_flow_time"])
+        graph.set_blocked_centroid_flows(False)
+
+        skm = NetworkSkimming(graph)
+        skm.execute()
+
+        with self.assertRaises(ValueError):
+            skm.set_backend("gpu")
+
+        # Worker processes write directly to skims kept in shared memory
+        for storage in ["memory", "shared"]:
+            skm_processes = NetworkSkimming(graph)
+            skm_processes.set_backend("processes", processes=2)
+            skm_processes.set_skim_storage(storage)
+            skm_processes.execute()
+            np.testing.assert_array_equal(skm_processes.results.skims.matrix_view, skm.results.skims.matrix_view)
+        self.project.close()
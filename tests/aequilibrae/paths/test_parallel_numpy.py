@@ -1,7 +1,8 @@
 import unittest
 import numpy as np
-from aequilibrae.paths.AoN import copy_one_dimension, sum_axis1, linear_combination, linear_combination_skims
+from aequilibrae.paths.AoN import copy_one_dimension, sum_axis0, sum_axis1, linear_combination, linear_combination_skims
 from aequilibrae.paths.AoN import copy_two_dimensions, copy_three_dimensions
+from aequilibrae.paths.AoN import class_flows, conjugate_direction_terms, biconjugate_direction_terms
 
 
 class TestParallel(unittest.TestCase):
@@ -13,6 +14,13 @@ class TestParallel(unittest.TestCase):
         sum_axis1(target, source, 1)
         self.assertEqual((b - target).max(), 0, "Sum Axis 1 failed")
 
+    def test_sum_axis0(self):
+        target = np.ones((50, 4))
+        source = np.random.rand(600).reshape(3, 50, 4)
+
+        sum_axis0(target, source, 2)
+        np.testing.assert_allclose(target, np.sum(source, axis=0))
+
     def test_linear_combination(self):
         target = np.zeros((50, 1))
         source = np.random.rand(50).reshape(50, 1)
@@ -63,6 +71,36 @@ class TestParallel(unittest.TestCase):
         if target.sum() == 0:
             self.fail("Target and source are the other way around for copying one dimension")
 
+    def test_class_flows(self):
+        first = np.random.rand(50, 2)
+        second = np.random.rand(50, 3)
+        class_totals = np.zeros(50)
+        totals = np.ones(50)
+
+        class_flows(first, first, 2.0, class_totals, totals, True, 2)
+        np.testing.assert_allclose(class_totals, first.sum(axis=1))
+        np.testing.assert_allclose(totals, class_totals)
+
+        target = np.zeros((50, 3))
+        class_flows(target, second, 1.0, class_totals, totals, False, 2)
+        np.testing.assert_array_equal(target, second)
+        np.testing.assert_allclose(totals, first.sum(axis=1) + second.sum(axis=1))
+
+    def test_direction_terms(self):
+        der, sd, psd, sol, aon = np.random.rand(5, 50)
+        terms = np.zeros(4)
+
+        conjugate_direction_terms(terms, der, sd, sol, aon, 2)
+        self.assertAlmostEqual(terms[0], np.sum(der * (sd - sol) * (aon - sol)))
+        self.assertAlmostEqual(terms[1], np.sum(der * (sd - sol) * (aon - sd)))
+
+        biconjugate_direction_terms(terms, der, sd, psd, sol, aon, 0.3, 2)
+        x = sd * 0.3 + psd * 0.7 - sol
+        self.assertAlmostEqual(terms[0], np.sum(der * x * (aon - sol)))
+        self.assertAlmostEqual(terms[1], np.sum(der * x * (psd - sd)))
+        self.assertAlmostEqual(terms[2], np.sum(der * (sd - sol) * (aon - sol)))
+        self.assertAlmostEqual(terms[3], np.sum(der * (sd - sol) ** 2))
+
 
 if __name__ == "__main__":
     unittest.main()
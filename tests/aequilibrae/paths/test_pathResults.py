@@ -71,7 +71,7 @@ class TestPathResults(TestCase):
             new_r.reset()
 
     def test_heuristics(self):
-        self.assertEqual(self.r.get_heuristics(), ["haversine", "equirectangular"])
+        self.assertEqual(self.r.get_heuristics(), ["haversine", "equirectangular", "landmarks"])
 
         self.r.set_heuristic("haversine")
         self.assertEqual(self.r._heuristic, "haversine")
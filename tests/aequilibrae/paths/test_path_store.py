@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from aequilibrae.paths.path_store import ORIGINS_PER_CHUNK, PathStore, PathStoreWriter
+
+
+def origin_paths(origin: int, zones: int, shift: int = 0):
+    rng = np.random.default_rng(origin + shift)
+    index = np.cumsum(rng.integers(0, 5, zones))
+    return rng.integers(0, 1000, index[-1]), index
+
+
+@pytest.mark.parametrize("compression", ["zstd", "lz4", None])
+def test_write_and_read(tmp_path, compression):
+    zones = 200
+    origins = np.arange(0, zones, 2)
+    assert origins.shape[0] > ORIGINS_PER_CHUNK
+
+    writer = PathStoreWriter(str(tmp_path / "paths.arrow"), zones, 1, compression)
+    writer.open(origins)
+    # Origins are added out of order, as they are by the threads of an assignment
+    for o in origins[::-1]:
+        writer.add(int(o), *origin_paths(o, zones))
+    writer.close()
+
+    store = PathStore(str(tmp_path / "paths.arrow"))
+    np.testing.assert_array_equal(store.origins, origins)
+    for o in origins:
+        iteration, links, index = store.read_origin(o)
+        expected_links, expected_index = origin_paths(o, zones)
+        assert iteration == 1
+        np.testing.assert_array_equal(links, expected_links)
+        np.testing.assert_array_equal(index, expected_index)
+
+    with pytest.raises(KeyError):
+        store.read_origin(1)
+
+
+def test_unchanged_paths_are_not_written_again(tmp_path):
+    zones, origins = 10, np.arange(10)
+
+    first = PathStoreWriter(str(tmp_path / "iter1.arrow"), zones, 1)
+    first.open(origins)
+    for o in origins:
+        first.add(int(o), *origin_paths(o, zones))
+    first.close()
+
+    # Paths only change for even origins
+    second = PathStoreWriter(str(tmp_path / "iter2.arrow"), zones, 2, previous=first)
+    second.open(origins)
+    for o in origins:
+        second.add(int(o), *origin_paths(o, zones, 100 * (o % 2 == 0)))
+    second.close()
+
+    store = PathStore(str(tmp_path / "iter2.arrow"))
+    for o in origins:
+        iteration, links, index = store.read_origin(o)
+        if o % 2 == 0:
+            assert iteration == 2
+            np.testing.assert_array_equal(links, origin_paths(o, zones, 100)[0])
+        else:
+            assert iteration == 1
+            assert links.shape[0] == 0 and index.shape[0] == 0
+
+
+def test_invalid_compression(tmp_path):
+    with pytest.raises(ValueError):
+        PathStoreWriter(str(tmp_path / "paths.arrow"), 10, 1, "gzip")
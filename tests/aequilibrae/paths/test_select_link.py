@@ -233,6 +233,93 @@ class TestSelectLink(TestCase):
                     delta=1e-6,
                 )
 
+    def test_sparse_od_storage(self):
+        select_links = {"sl_9_or_6": [(9, 1), (6, 1)], "just_3": [(3, 1)]}
+        for algorithm in ["all-or-nothing", "msa", "cfw", "bfw"]:
+            with self.subTest(algorithm=algorithm):
+                results = {}
+                for storage in ["dense", "sparse"]:
+                    assignment = TrafficAssignment()
+                    assignclass = TrafficClass("car", self.car_graph, self.matrix)
+                    assignment.set_classes([assignclass])
+                    assignment.set_vdf("BPR")
+                    assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+                    assignment.set_capacity_field("capacity")
+                    assignment.set_time_field("free_flow_time")
+                    assignment.max_iter = 10
+                    assignment.set_algorithm(algorithm)
+                    assignment.set_select_link_od_storage(storage)
+
+                    assignclass.set_select_links(select_links)
+                    assignment.execute()
+                    results[storage] = assignclass.results
+
+                for name in select_links:
+                    sparse = results["sparse"].select_link_od.matrix[name]
+                    np.testing.assert_allclose(results["dense"].select_link_od.matrix[name], sparse.to_dense())
+                    np.testing.assert_allclose(
+                        results["dense"].select_link_loading[name], results["sparse"].select_link_loading[name]
+                    )
+                    self.assertLess(sparse.nnz, 24 * 24, "Sparse matrices should not keep OD pairs without demand")
+
+    def test_select_link_replay(self):
+        select_links = {"sl_9_or_6": [(9, 1), (6, 1)], "just_3": [(3, 1)]}
+        for algorithm in ["all-or-nothing", "msa", "fw", "cfw", "bfw"]:
+            with self.subTest(algorithm=algorithm):
+                assignment = TrafficAssignment()
+                assignclass = TrafficClass("car", self.car_graph, self.matrix)
+                assignment.set_classes([assignclass])
+                assignment.set_vdf("BPR")
+                assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+                assignment.set_capacity_field("capacity")
+                assignment.set_time_field("free_flow_time")
+                assignment.max_iter = 10
+                assignment.set_algorithm(algorithm)
+                assignment.set_save_trees(True)
+
+                assignclass.set_select_links(select_links)
+                assignment.execute()
+
+                replay = assignment.select_link_replay()
+                replay.set_select_links("car", select_links)
+                replay.set_select_zones("car", {"from_1_to_2": ([1], [2]), "everything": (None, None)})
+                replay.execute()
+                results = replay.results["car"]
+
+                for name in select_links:
+                    np.testing.assert_allclose(
+                        results.select_link_od.matrix[name], assignclass.results.select_link_od.matrix[name]
+                    )
+                    np.testing.assert_allclose(
+                        results.select_link_loading[name], assignclass.results.select_link_loading[name]
+                    )
+                flows = assignment.select_link_flows()
+                np.testing.assert_allclose(replay.select_link_flows()[flows.columns], flows)
+
+                od = results.select_link_od.matrix["from_1_to_2"][:, :, 0]
+                self.assertAlmostEqual(od.sum(), od[0, 1])
+                self.assertAlmostEqual(od[0, 1], self.matrix.matrix_view[0, 1])
+                self.assertAlmostEqual(results.select_link_od.matrix["everything"].sum(), self.matrix.matrix_view.sum())
+
+    def test_select_link_replay_origin_based(self):
+        # Origin-based algorithms do not save shortest path trees
+        for algorithm in ["bush", "gp"]:
+            with self.subTest(algorithm=algorithm):
+                assignment = TrafficAssignment()
+                assignclass = TrafficClass("car", self.car_graph, self.matrix)
+                assignment.set_classes([assignclass])
+                assignment.set_vdf("BPR")
+                assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+                assignment.set_capacity_field("capacity")
+                assignment.set_time_field("free_flow_time")
+                assignment.set_algorithm(algorithm)
+                assignment.set_save_trees(True)
+
+                with self.assertRaises(ValueError):
+                    assignment.execute()
+                with self.assertRaises(ValueError):
+                    assignment.select_link_replay()
+
 
 def create_od_mask(demand: np.array, graph: Graph, sl):
     res = PathResults()
@@ -0,0 +1,93 @@
+import numpy as np
+import openmatrix as omx
+import pytest
+
+from aequilibrae.paths.results import AssignmentResults
+from aequilibrae.paths.results.select_link_od import SparseODMatrix, SparseSelectLinkOD
+
+
+def sparse_matrix(dense: np.ndarray) -> SparseODMatrix:
+    zones, _, classes = dense.shape
+    m = SparseODMatrix(zones, classes)
+    origins, destinations = np.nonzero(dense.any(axis=2))
+    m.set(origins * zones + destinations, dense[origins, destinations, :])
+    return m
+
+
+@pytest.fixture
+def dense_matrices():
+    rng = np.random.default_rng(42)
+    matrices = []
+    for _ in range(3):
+        m = rng.random((12, 12, 2))
+        m[rng.random((12, 12)) < 0.7] = 0
+        matrices.append(m)
+    return matrices
+
+
+def test_set_entries_sums_repeated_pairs():
+    m = SparseODMatrix(4, 1)
+    m.set_entries(np.array([5, 1, 5, 14]), np.array([[1.0], [2.0], [3.0], [4.0]]))
+
+    np.testing.assert_array_equal(m.keys, [1, 5, 14])
+    np.testing.assert_array_equal(m.values[:, 0], [2.0, 4.0, 4.0])
+    assert m.to_dense()[1, 1, 0] == 4.0
+    assert m.to_dense()[3, 2, 0] == 4.0
+
+    m.clear()
+    assert m.nnz == 0
+
+
+def test_linear_combinations(dense_matrices):
+    m1, m2, m3 = dense_matrices
+    s1, s2, s3 = sparse_matrix(m1), sparse_matrix(m2), sparse_matrix(m3)
+
+    result = SparseODMatrix(12, 2)
+    result.linear_combination(s1, s2, 0.3)
+    np.testing.assert_allclose(result.to_dense(), m1 * 0.3 + m2 * 0.7)
+
+    result.triple_linear_combination(s1, s2, s3, np.array([0.2, 0.5, 0.3]))
+    np.testing.assert_allclose(result.to_dense(), m1 * 0.2 + m2 * 0.5 + m3 * 0.3)
+
+    # A full step keeps only the OD pairs of the new matrix
+    result.linear_combination(s1, s2, 1.0)
+    np.testing.assert_array_equal(result.keys, s1.keys)
+
+    # Matrices can be combined into one of their terms
+    s1.linear_combination(s1, s2, 0.5)
+    np.testing.assert_allclose(s1.to_dense(), (m1 + m2) * 0.5)
+
+
+def test_conversions(dense_matrices):
+    m = sparse_matrix(dense_matrices[0])
+
+    np.testing.assert_array_equal(m.to_dense(), dense_matrices[0])
+    np.testing.assert_array_equal(m.to_dense(3, 7), dense_matrices[0][3:7])
+    np.testing.assert_array_equal(m.to_scipy(1).toarray(), dense_matrices[0][:, :, 1])
+
+
+def test_export(tmp_path, dense_matrices):
+    index = np.arange(1, 13) * 10
+    select_link_od = SparseSelectLinkOD(["first", "second"], index, 2, "taz")
+    select_link_od.matrix["first"].copy_from(sparse_matrix(dense_matrices[0]))
+    select_link_od.matrix["second"].copy_from(sparse_matrix(dense_matrices[1]))
+
+    select_link_od.export(str(tmp_path / "select_link.omx"))
+    with omx.open_file(str(tmp_path / "select_link.omx")) as f:
+        np.testing.assert_array_equal(np.array(f["first"]), dense_matrices[0])
+        np.testing.assert_array_equal(np.array(f["second"]), dense_matrices[1])
+        assert f.mapping("taz") == {i: p for p, i in enumerate(index)}
+
+    with pytest.raises(NotImplementedError):
+        select_link_od.export(str(tmp_path / "select_link.aem"))
+
+
+def test_set_select_link_od_storage():
+    res = AssignmentResults()
+    assert res.select_link_od_storage == "dense"
+
+    res.set_select_link_od_storage("sparse")
+    assert res.select_link_od_storage == "sparse"
+
+    with pytest.raises(ValueError):
+        res.set_select_link_od_storage("compressed")
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from aequilibrae.paths.AoN import replay_select_links
+from aequilibrae.paths.select_link_replay import iteration_weights
+
+
+def test_msa_weights_are_even():
+    steps = [{"iteration": 1, "direction": "aon"}]
+    steps += [{"iteration": i, "direction": "fw", "coefficients": [], "stepsize": 1 / i} for i in range(2, 6)]
+
+    weights = iteration_weights(steps)
+    assert list(weights) == [1, 2, 3, 4, 5]
+    np.testing.assert_allclose(list(weights.values()), 0.2)
+
+
+def test_weights_follow_step_directions():
+    steps = [
+        {"iteration": 1, "direction": "aon"},
+        {"iteration": 2, "direction": "fw", "coefficients": [], "stepsize": 0.5},
+        {"iteration": 3, "direction": "conjugate", "coefficients": [0.4], "stepsize": 0.5},
+        {"iteration": 4, "direction": "biconjugate", "coefficients": [0.5, 0.3, 0.2], "stepsize": 0.25},
+    ]
+
+    # The same blending the assignment does, applied to unit loads of each iteration
+    aon = np.eye(4)
+    results = aon[0]
+    direction = aon[1]
+    results = 0.5 * direction + 0.5 * results
+    previous, direction = direction, 0.4 * direction + 0.6 * aon[2]
+    results = 0.5 * direction + 0.5 * results
+    direction = 0.5 * aon[3] + 0.3 * direction + 0.2 * previous
+    results = 0.25 * direction + 0.75 * results
+
+    weights = iteration_weights(steps)
+    np.testing.assert_allclose(list(weights.values()), results)
+    assert sum(weights.values()) == pytest.approx(1.0)
+
+
+def test_unknown_direction():
+    with pytest.raises(ValueError):
+        iteration_weights([{"iteration": 1, "direction": "aon"}, {"iteration": 2, "direction": "newton"}])
+
+
+def test_replay_select_links():
+    # Zones 0 and 1, and node 2 between them. Links: 0 (0->2), 1 (2->1), 2 (1->2), 3 (2->0)
+    pred = np.array([[-1, 2, 0], [2, -1, 1]], dtype=np.int64)
+    conn = np.array([[-1, 1, 0], [3, -1, 2]], dtype=np.int64)
+    demand = np.array([[[0.0], [10.0]], [[4.0], [0.0]]])
+    selected = np.array([[1, -1], [-1, -1]], dtype=np.int64)
+    origin_mask = np.ones((2, 2), dtype=np.uint8)
+    destination_mask = np.ones((2, 2), dtype=np.uint8)
+    od = np.zeros((2, 2, 2, 1))
+    loading = np.zeros((1, 2, 4, 1))
+    has_flow = np.zeros((1, 4), dtype=np.uint8)
+
+    origins, weights = np.array([0, 1], dtype=np.int64), np.array([0.5, 0.25])
+    args = (origins, weights, pred, conn, demand, selected, origin_mask, destination_mask, od, loading, has_flow, 1)
+    replay_select_links(*args)
+
+    # The first set only has the path through link 1, and the second set has all paths
+    np.testing.assert_allclose(od[0, :, :, 0], [[0.0, 5.0], [0.0, 0.0]])
+    np.testing.assert_allclose(od[1, :, :, 0], [[0.0, 5.0], [1.0, 0.0]])
+    np.testing.assert_allclose(loading[0, 0, :, 0], [5.0, 5.0, 0.0, 0.0])
+    np.testing.assert_allclose(loading[0, 1, :, 0], [5.0, 5.0, 1.0, 1.0])
+    assert not has_flow.any()
+
+    # Zone sets only take the origins and destinations selected
+    origin_mask[1, 0] = 0
+    od[:], loading[:] = 0, 0
+    replay_select_links(*args)
+    np.testing.assert_allclose(od[1, :, :, 0], [[0.0, 0.0], [1.0, 0.0]])
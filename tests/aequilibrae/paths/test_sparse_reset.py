@@ -0,0 +1,22 @@
+import itertools
+
+import pytest
+
+from aequilibrae.paths import RouteChoice
+
+from .utils import grid_graph
+
+
+@pytest.mark.parametrize("algorithm", ["bfsle", "link-penalisation"])
+def test_route_sets_do_not_depend_on_previous_searches(algorithm):
+    # Each thread reuses its search workspace for all ODs, so leftovers from a previous search would change the routes
+    graph = grid_graph(10, 7)
+    nodes = [1, 3, 5, 8, 10]
+    route_sets = []
+    for bidirectional in [False, True]:
+        rc = RouteChoice(graph)
+        rc.set_choice_set_generation(algorithm, max_routes=5, penalty=1.1, bidirectional=bidirectional)
+        rc.prepare([(o, d) for o, d in itertools.product(nodes, nodes) if o != d])
+        rc.execute(perform_assignment=False)
+        route_sets.append(rc.get_results().to_pandas()["route set"].map(tuple))
+    assert route_sets[0].equals(route_sets[1])
@@ -1,3 +1,4 @@
+import ctypes
 import random
 import sqlite3
 import string
@@ -10,6 +11,8 @@ import pandas as pd
 import pytest
 
 from aequilibrae import TrafficAssignment, TrafficClass, Graph, Project
+from aequilibrae.paths import NetworkSkimming
+from aequilibrae.paths.vdf import register_vdf
 from aequilibrae.utils.create_example import create_example
 from ...data import siouxfalls_project
 
@@ -48,7 +51,7 @@ def assignment(project):
 
 
 class TestTrafficAssignmentSetup:
-    algorithms = ["msa", "cfw", "bfw", "frank-wolfe"]
+    algorithms = ["msa", "cfw", "bfw", "frank-wolfe", "algorithm-b", "gradient-projection"]
 
     def test_matrix_with_wrong_type(self, matrix, car_graph):
         matrix.matrix_view = np.array(matrix.matrix_view, np.int32)
@@ -71,7 +74,18 @@ class TestTrafficAssignmentSetup:
 
     def test_algorithms_available(self, assignment: TrafficAssignment):
         algs = assignment.algorithms_available()
-        real = ["all-or-nothing", "msa", "frank-wolfe", "bfw", "cfw", "fw"]
+        real = [
+            "all-or-nothing",
+            "msa",
+            "frank-wolfe",
+            "bfw",
+            "cfw",
+            "fw",
+            "algorithm-b",
+            "bush",
+            "gradient-projection",
+            "gp",
+        ]
 
         diff = [x for x in real if x not in algs]
         diff2 = [x for x in algs if x not in real]
@@ -121,6 +135,51 @@ class TestTrafficAssignmentSetup:
         assignment.add_class(assigclass)
         assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
 
+    def test_set_vdf_by_field(self, assignment: TrafficAssignment, assigclass: TrafficClass):
+        functions = {v: "conical" for v in np.unique(assigclass.graph.graph["b"])}
+        with pytest.raises(RuntimeError):
+            assignment.set_vdf_by_field("b", functions)
+
+        assignment.set_vdf("bpr")
+        assignment.add_class(assigclass)
+        with pytest.raises(ValueError):
+            assignment.set_vdf_by_field("not_a_field", functions)
+
+        # All links use the conical function, so results are the same as for it
+        assignment.set_vdf_by_field("b", functions)
+        assert assignment.vdf.links_using(["conical"]).all()
+        assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+        assignment.set_capacity_field("capacity")
+        assignment.set_time_field("free_flow_time")
+        assignment.set_algorithm("bfw")
+        assignment.max_iter = 10
+        assignment.execute()
+
+        reference = TrafficAssignment(assignment.project)
+        reference.set_vdf("conical")
+        reference.add_class(TrafficClass("car", assigclass.graph, assigclass.matrix))
+        reference.set_vdf_parameters({"alpha": "b", "beta": "power"})
+        reference.set_capacity_field("capacity")
+        reference.set_time_field("free_flow_time")
+        reference.set_algorithm("bfw")
+        reference.max_iter = 10
+        reference.execute()
+
+        np.testing.assert_allclose(assigclass.results.link_loads, reference.classes[0].results.link_loads)
+
+        # Parameters set for a registered function are checked again when links switch to a built-in one
+        @ctypes.CFUNCTYPE(None, *[ctypes.c_double] * 5, *[ctypes.POINTER(ctypes.c_double)] * 2)
+        def linear(flow, capacity, fftime, alpha, beta, value, derivative):
+            value[0] = fftime * (1 + alpha * flow / capacity)
+            derivative[0] = fftime * alpha / capacity
+
+        register_vdf("linear", linear)
+        assignment.set_vdf("linear")
+        assignment.set_vdf_parameters({"alpha": 0.15, "beta": 0.5})
+        with pytest.raises(ValueError):
+            assignment.set_vdf_by_field("b", functions)
+        assert not assignment.vdf.links_using(["conical"]).any()
+
     def test_set_time_field(self, assignment: TrafficAssignment, assigclass: TrafficClass):
         with pytest.raises(ValueError):
             assignment.set_time_field("capacity")
@@ -331,3 +390,241 @@ class TestTrafficAssignment:
 
         with pytest.raises(FileNotFoundError):
             assignment.save_results("anything")
+
+    @pytest.mark.parametrize("algorithm", ["bush", "gp"])
+    def test_execute_origin_based(self, assignment: TrafficAssignment, car_graph: Graph, matrix, algorithm: str):
+        car_graph.set_skimming(["free_flow_time", "distance"])
+        assigclass = TrafficClass("car", car_graph, matrix)
+        assigclass.set_select_links({"sl_9_1": [(9, 1)]})
+
+        assignment.set_classes([assigclass])
+        assignment.set_vdf("BPR")
+        assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+        assignment.set_capacity_field("capacity")
+        assignment.set_time_field("free_flow_time")
+        assignment.max_iter = 500
+        assignment.rgap_target = 0.00001
+
+        assignment.set_algorithm("bfw")
+        assignment.execute()
+        bfw_iters = assignment.assignment.iter
+        bfw_flows = np.array(assigclass.results.total_link_loads, copy=True)
+        bfw_skims = np.array(assigclass.results.skims.matrix_view[:, :, 0], copy=True)
+        bfw_sl_od = assigclass.results.select_link_od.matrix["sl_9_1"].sum()
+
+        assignment.set_algorithm(algorithm)
+        assignment.execute()
+
+        assert assignment.assignment.rgap < assignment.rgap_target
+        assert assignment.assignment.iter < bfw_iters
+        assert list(assignment.report().columns) == ["iteration", "rgap", "warnings"]
+
+        # Both algorithms converge to the same link flows, but path flows (and distance skims) are not unique
+        np.testing.assert_allclose(assigclass.results.total_link_loads, bfw_flows, atol=10)
+        np.testing.assert_allclose(assigclass.results.skims.matrix_view[:, :, 0], bfw_skims, atol=0.5)
+        assert assigclass.results.select_link_od.matrix["sl_9_1"].sum() == pytest.approx(bfw_sl_od, rel=0.01)
+
+        df = assignment.results()
+        assert df.matrix_tot.sum() == pytest.approx(bfw_flows.sum(), rel=1e-3)
+
+        if algorithm == "gp":
+            paths = assignment.assignment.path_flows(assigclass)
+            assert paths.flow.sum() == pytest.approx(np.nansum(matrix.matrix_view))
+            assert (paths.flow > 0).all()
+            assert all(p.dtype == np.int32 for p in paths.links)
+
+        assignment.set_save_path_files(True)
+        with pytest.raises(ValueError):
+            assignment.execute()
+
+    def test_execute_warm_start(self, assignment: TrafficAssignment, assigclass: TrafficClass):
+        assignment.set_classes([assigclass])
+        assignment.set_vdf("BPR")
+        assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+        assignment.set_capacity_field("capacity")
+        assignment.set_time_field("free_flow_time")
+        assignment.max_iter = 500
+        assignment.rgap_target = 0.0001
+        assignment.set_algorithm("bfw")
+        assignment.execute()
+        cold_iters = assignment.assignment.iter
+        cold_flows = np.array(assigclass.results.link_loads, copy=True)
+        assignment.save_results("cold_start")
+
+        with pytest.raises(ValueError):
+            assignment.set_initial_link_loads({"car": cold_flows[:-1, :]})
+        with pytest.raises(ValueError):
+            assignment.set_initial_link_loads({"truck": cold_flows})
+
+        for loads in [{"car": cold_flows}, "cold_start"]:
+            assignment.set_initial_link_loads(loads)
+            assignment.set_algorithm("bfw")
+            assignment.execute()
+
+            assert assignment.assignment.rgap < assignment.rgap_target
+            assert assignment.assignment.iter < cold_iters
+            assert assignment.report().iteration.min() == 2
+            np.testing.assert_allclose(assigclass.results.link_loads, cold_flows, atol=10)
+
+        assignment.set_algorithm("bush")
+        with pytest.raises(ValueError):
+            assignment.execute()
+
+        assignment.set_initial_link_loads(None)
+        assignment.set_algorithm("bfw")
+        assignment.execute()
+        assert assignment.report().iteration.min() == 1
+
+    def test_execute_shared_trees(self, project: Project, assignment: TrafficAssignment, car_graph: Graph, matrix):
+        car_graph.set_skimming(["free_flow_time", "distance"])
+        matrix2 = project.matrices.get_matrix("demand_omx")
+        matrix2.computational_view()
+        matrix2.matrix_view = matrix2.matrix_view * 0.5
+
+        def assign(graph2):
+            classes = [TrafficClass("car", car_graph, matrix), TrafficClass("car2", graph2, matrix2)]
+            assignment.set_classes(classes)
+            assignment.set_vdf("BPR")
+            assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+            assignment.set_capacity_field("capacity")
+            assignment.set_time_field("free_flow_time")
+            assignment.max_iter = 20
+            assignment.set_algorithm("bfw")
+            assignment.execute()
+            return assignment.assignment._aon_runs, [
+                (c.results.link_loads, c.results.skims.matrix_view) for c in classes
+            ]
+
+        # Both classes share the graph, so their trees are built only once per iteration
+        runs, shared = assign(car_graph)
+        assert len(runs) == 1
+
+        project.network.build_graphs()
+        graph2 = project.network.graphs["c"]
+        graph2.set_graph("free_flow_time")
+        graph2.set_skimming(["free_flow_time", "distance"])
+        graph2.set_blocked_centroid_flows(False)
+        runs, separate = assign(graph2)
+        assert len(runs) == 2
+
+        for (loads1, skims1), (loads2, skims2) in zip(shared, separate):
+            np.testing.assert_array_equal(loads1, loads2)
+            np.testing.assert_array_equal(skims1, skims2)
+
+    @pytest.mark.parametrize("algorithm", ["bfw", "algorithm-b"])
+    def test_execute_sparse_demand(self, assignment: TrafficAssignment, car_graph: Graph, matrix, algorithm):
+        car_graph.set_skimming(["free_flow_time", "distance"])
+        o, d = np.nonzero(matrix.matrix_view)
+        df = pd.DataFrame(
+            {"origin": matrix.index[o], "destination": matrix.index[d], "matrix": matrix.matrix_view[o, d]}
+        )
+
+        results = []
+        for demand in [matrix, df.set_index(["origin", "destination"])]:
+            assigclass = TrafficClass("car", car_graph, demand)
+            assigclass.set_select_links({"sl_9_1": [(9, 1)]})
+            assignment.set_classes([assigclass])
+            assignment.set_vdf("BPR")
+            assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+            assignment.set_capacity_field("capacity")
+            assignment.set_time_field("free_flow_time")
+            assignment.max_iter = 10
+            assignment.set_algorithm(algorithm)
+            assignment.execute()
+            res = assigclass.results
+            results.append((res.link_loads, res.skims.matrix_view, res.select_link_od.matrix["sl_9_1"]))
+
+        for dense, sparse in zip(*results):
+            np.testing.assert_allclose(dense, sparse)
+
+    def test_set_skimming_policy(self, assignment: TrafficAssignment):
+        with pytest.raises(ValueError):
+            assignment.set_skimming_policy("sometimes")
+        with pytest.raises(ValueError):
+            assignment.set_skimming_policy("interval", 0)
+
+        assignment.set_skimming_policy("interval", 5)
+        assert assignment.skimming_policy == "interval"
+        assert assignment.skimming_interval == 5
+
+    @pytest.mark.parametrize("policy", ["final", "interval"])
+    def test_execute_skimming_policy(self, assignment: TrafficAssignment, assigclass: TrafficClass, policy):
+        assigclass.graph.set_skimming(["free_flow_time", "distance"])
+        assignment.set_classes([assigclass])
+        assignment.set_vdf("BPR")
+        assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+        assignment.set_capacity_field("capacity")
+        assignment.set_time_field("free_flow_time")
+        assignment.max_iter = 10
+        assignment.set_algorithm("bfw")
+        assignment.set_skimming_policy(policy, 3)
+        assignment.execute()
+
+        # Skims are the ones for the shortest paths with the final link costs
+        skimming = NetworkSkimming(assigclass.graph)
+        skimming.execute()
+        expected = skimming.results.skims.matrix_view
+        np.testing.assert_allclose(assigclass._aon_results.skims.matrix_view, expected)
+        np.testing.assert_allclose(assigclass.results.skims.matrix_view, expected)
+
+    @pytest.mark.parametrize("algorithm", ["frank-wolfe", "cfw", "bfw"])
+    def test_checkpoint_and_resume(self, project, car_graph, matrix, tmp_path, algorithm):
+        car_graph.set_skimming(["free_flow_time", "distance"])
+
+        def assignment_for(max_iter):
+            assig = TrafficAssignment(project)
+            assig.set_classes([TrafficClass("car", car_graph, matrix)])
+            assig.set_vdf("BPR")
+            assig.set_vdf_parameters({"alpha": "b", "beta": "power"})
+            assig.set_capacity_field("capacity")
+            assig.set_time_field("free_flow_time")
+            assig.max_iter = max_iter
+            assig.rgap_target = 1e-10
+            assig.set_algorithm(algorithm)
+            return assig
+
+        with pytest.raises(ValueError):
+            assignment_for(5).set_checkpoints(tmp_path / "not_a_folder", iterations=5)
+
+        reference = assignment_for(12)
+        reference.execute()
+
+        interrupted = assignment_for(8)
+        interrupted.set_checkpoints(tmp_path, iterations=4)
+        interrupted.execute()
+
+        resumed = assignment_for(12)
+        resumed.execute(resume_from=tmp_path)
+
+        res, ref = resumed.classes[0].results, reference.classes[0].results
+        np.testing.assert_allclose(res.link_loads, ref.link_loads)
+        np.testing.assert_allclose(res.skims.matrix_view, ref.skims.matrix_view)
+        assert resumed.report().shape == reference.report().shape
+
+        # Checkpoints can only be resumed by the same algorithm
+        other = assignment_for(12)
+        other.set_algorithm("msa")
+        with pytest.raises(ValueError):
+            other.execute(resume_from=tmp_path)
+
+    def test_set_backend(self, project, car_graph, matrix):
+        car_graph.set_skimming(["free_flow_time", "distance"])
+
+        results = []
+        for backend in ["threads", "processes"]:
+            assig = TrafficAssignment(project)
+            assig.set_classes([TrafficClass("car", car_graph, matrix)])
+            with pytest.raises(ValueError):
+                assig.set_backend("gpu")
+            assig.set_backend(backend, processes=2)
+            assig.set_vdf("BPR")
+            assig.set_vdf_parameters({"alpha": "b", "beta": "power"})
+            assig.set_capacity_field("capacity")
+            assig.set_time_field("free_flow_time")
+            assig.max_iter = 10
+            assig.set_algorithm("bfw")
+            assig.execute()
+            results.append(assig.classes[0].results)
+
+        np.testing.assert_allclose(results[1].link_loads, results[0].link_loads)
+        np.testing.assert_allclose(results[1].skims.matrix_view, results[0].skims.matrix_view)
@@ -6,9 +6,11 @@ from os.path import join, dirname
 from tempfile import gettempdir
 from unittest import TestCase
 
+import numpy as np
 import pandas as pd
 
-from aequilibrae import TrafficAssignment, TrafficClass, Graph, Project
+from aequilibrae import AssignmentPaths, TrafficAssignment, TrafficClass, Graph, Project
+from aequilibrae.paths.path_store import PathStore, path_store_file
 from ...data import siouxfalls_project
 
 
@@ -61,6 +63,15 @@ class TestTrafficAssignmentPathFiles(TestCase):
         self.assignment.set_path_file_format("feather")
         for c in self.assignment.classes:
             self.assertEqual(c._aon_results.write_feather, True)
+        self.assignment.set_path_file_format("store", "lz4")
+        for c in self.assignment.classes:
+            self.assertEqual(c._aon_results.use_path_store, True)
+            self.assertEqual(c._aon_results.path_store_compression, "lz4")
+        with self.assertRaises(ValueError):
+            self.assignment.set_path_file_format("store", "gzip")
+        self.assignment.set_path_file_format("feather")
+        for c in self.assignment.classes:
+            self.assertEqual(c._aon_results.use_path_store, False)
 
     def test_save_path_files(self):
         self.assignment.add_class(self.assigclass)
@@ -115,3 +126,69 @@ class TestTrafficAssignmentPathFiles(TestCase):
                 this_o_index_file = pd.read_feather(class_dir / f"o{o_ind}_indexdata.feather")
                 ref_this_o_index_file = pd.read_feather(ref_class_dir / f"o{o_ind}_indexdata.feather")
                 pd.testing.assert_frame_equal(ref_this_o_index_file, this_o_index_file)
+
+    def test_save_path_store(self):
+        self.assignment.add_class(self.assigclass)
+        self.assignment.set_save_path_files(True)
+        self.assignment.set_path_file_format("store")
+
+        self.assignment.set_vdf("BPR")
+        self.assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+
+        self.assignment.set_capacity_field("capacity")
+        self.assignment.set_time_field("free_flow_time")
+
+        self.assignment.max_iter = 2
+        self.assignment.set_algorithm("msa")
+        self.assignment.execute()
+
+        pid = self.assignment.procedure_id
+        path_file_dir = join(str(self.project.project_base_path), "path_files", pid)
+
+        # Paths in the stores are the same as in the reference path files
+        class_id = f"c{self.assigclass.mode}_{self.assigclass._id}"
+        reference_path_file_dir = pathlib.Path(siouxfalls_project) / "path_files"
+        for i in range(1, self.assignment.max_iter + 1):
+            self.assertFalse((pathlib.Path(path_file_dir) / f"iter{i}" / f"path_{class_id}").exists())
+            store = PathStore(path_store_file(path_file_dir, i, self.assigclass.mode, self.assigclass._id))
+            ref_class_dir = reference_path_file_dir / f"iter{i}" / f"path_{class_id}"
+            for o in self.assigclass.matrix.index:
+                o_ind = self.assigclass.graph.compact_nodes_to_indices[o]
+                iteration, links, index = store.read_origin(o_ind)
+                if iteration != i:
+                    _, links, index = PathStore(
+                        path_store_file(path_file_dir, iteration, self.assigclass.mode, self.assigclass._id)
+                    ).read_origin(o_ind)
+
+                ref_path_file = pd.read_feather(ref_class_dir / f"o{o_ind}.feather")
+                ref_index_file = pd.read_feather(ref_class_dir / f"o{o_ind}_indexdata.feather")
+                self.assertListEqual(list(ref_path_file["data"]), list(links))
+                self.assertListEqual(list(ref_index_file["data"]), list(index))
+
+    def test_get_paths(self):
+        self.assignment.add_class(self.assigclass)
+        self.assignment.set_save_path_files(True)
+
+        self.assignment.set_vdf("BPR")
+        self.assignment.set_vdf_parameters({"alpha": "b", "beta": "power"})
+
+        self.assignment.set_capacity_field("capacity")
+        self.assignment.set_time_field("free_flow_time")
+
+        self.assignment.max_iter = 2
+        self.assignment.set_algorithm("msa")
+        self.assignment.execute()
+        self.assignment.save_results("assignment_with_paths")
+
+        paths = AssignmentPaths("assignment_with_paths", project=self.project, cache_size=4)
+        rng = np.random.default_rng(0)
+        origins, destinations = rng.integers(0, 24, 200), rng.integers(0, 24, 200)
+        iterations = rng.integers(1, 3, 200)
+        offsets, links = paths.get_paths(origins, destinations, iterations, self.assigclass.mode)
+
+        self.assertEqual(offsets.shape[0], 201)
+        for i, (o, d, it) in enumerate(zip(origins, destinations, iterations)):
+            path_o, path_o_index = paths.read_path_file(o, it, self.assigclass.mode)
+            expected = paths.get_path_for_destination_from_files(path_o, path_o_index, d)
+            np.testing.assert_array_equal(links[offsets[i] : offsets[i + 1]], expected)
+            np.testing.assert_array_equal(paths.get_path_for_destination(o, d, it, self.assigclass.mode), expected)
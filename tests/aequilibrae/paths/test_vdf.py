@@ -1,5 +1,9 @@
+import ctypes
 from unittest import TestCase
-from aequilibrae.paths.vdf import VDF
+
+import numpy as np
+
+from aequilibrae.paths.vdf import VDF, register_vdf
 
 
 class TestVDF(TestCase):
@@ -16,3 +20,89 @@ class TestVDF(TestCase):
 
         with self.assertRaises(AttributeError):
             v.apply_vdf = isinstance
+
+    def test_apply_vdf_and_derivative(self):
+        rng = np.random.default_rng(0)
+        flows, capacity, fftime = rng.uniform(0, 3000, 100), rng.uniform(500, 2000, 100), rng.uniform(1, 10, 100)
+        alpha, beta = rng.uniform(0.1, 1, 100), rng.uniform(1, 5, 100)
+        flows[:5] = 0
+
+        for function in ["bpr", "bpr2", "conical", "inrets"]:
+            v = VDF()
+            v.function = function
+            expected_value, expected_derivative = np.zeros(100), np.zeros(100)
+            v.apply_vdf(expected_value, flows, capacity, fftime, alpha, beta, 1)
+            v.apply_derivative(expected_derivative, flows, capacity, fftime, alpha, beta, 1)
+
+            value, derivative = np.zeros(100), np.zeros(100)
+            v.apply_vdf_and_derivative(value, derivative, flows, capacity, fftime, alpha, beta, 1)
+            np.testing.assert_allclose(value, expected_value, rtol=1e-12, err_msg=function)
+            np.testing.assert_allclose(derivative, expected_derivative, rtol=1e-12, err_msg=function)
+
+            value.fill(0)
+            v.apply_vdf_and_derivative(value, None, flows, capacity, fftime, alpha, beta, 1)
+            np.testing.assert_allclose(value, expected_value, rtol=1e-12, err_msg=function)
+
+    def test_link_functions(self):
+        rng = np.random.default_rng(1)
+        flows, capacity, fftime = rng.uniform(0, 3000, 100), rng.uniform(500, 2000, 100), rng.uniform(1, 10, 100)
+        alpha, beta = rng.uniform(0.1, 1, 100), rng.uniform(1, 5, 100)
+        function_ids = rng.integers(0, 2, 100)
+
+        v = VDF()
+        v.function = "bpr"
+        v.set_link_functions(function_ids, ["bpr", "conical"])
+        np.testing.assert_array_equal(v.links_using(["conical"]), function_ids == 1)
+
+        value, derivative = np.zeros(100), np.zeros(100)
+        v.apply_vdf_and_derivative(value, derivative, flows, capacity, fftime, alpha, beta, 1)
+
+        for i, function in enumerate(["bpr", "conical"]):
+            single = VDF()
+            single.function = function
+            expected_value, expected_derivative = np.zeros(100), np.zeros(100)
+            single.apply_vdf_and_derivative(
+                expected_value, expected_derivative, flows, capacity, fftime, alpha, beta, 1
+            )
+            np.testing.assert_allclose(value[function_ids == i], expected_value[function_ids == i])
+            np.testing.assert_allclose(derivative[function_ids == i], expected_derivative[function_ids == i])
+
+        # The derivative of the objective along a direction is the sum of the link costs at the intermediate flows
+        direction = rng.uniform(0, 3000, 100)
+        v.apply_vdf(value, 0.3 * direction + 0.7 * flows, capacity, fftime, alpha, beta, 1)
+        expected = np.sum(value * (direction - flows))
+        actual = v.directional_derivative(0.3, direction, flows, capacity, fftime, alpha, beta, 1)
+        self.assertAlmostEqual(actual / expected, 1.0, places=10)
+
+        with self.assertRaises(ValueError):
+            v.set_link_functions(function_ids, ["bpr", "cubic"])
+        with self.assertRaises(ValueError):
+            v.set_link_functions(function_ids, ["bpr"])
+
+    def test_register_vdf(self):
+        signature = ctypes.CFUNCTYPE(None, *[ctypes.c_double] * 5, *[ctypes.POINTER(ctypes.c_double)] * 2)
+
+        # Linear costs, as a stand-in for a compiled function
+        @signature
+        def linear(flow, capacity, fftime, alpha, beta, value, derivative):
+            value[0] = fftime * (1 + alpha * flow / capacity)
+            derivative[0] = fftime * alpha / capacity
+
+        register_vdf("Linear", linear)
+        self.assertIn("linear", VDF().functions_available())
+
+        with self.assertRaises(ValueError):
+            register_vdf("bpr", linear)
+        with self.assertRaises(TypeError):
+            register_vdf("python", lambda *args: None)
+
+        v = VDF()
+        v.function = "linear"
+        flows, capacity, fftime = np.arange(10.0), np.full(10, 5.0), np.full(10, 2.0)
+        alpha, beta = np.full(10, 0.5), np.full(10, 4.0)
+
+        value, derivative = np.zeros(10), np.zeros(10)
+        v.apply_vdf(value, flows, capacity, fftime, alpha, beta, 1)
+        v.apply_derivative(derivative, flows, capacity, fftime, alpha, beta, 1)
+        np.testing.assert_allclose(value, 2.0 * (1 + 0.5 * flows / 5.0))
+        np.testing.assert_allclose(derivative, np.full(10, 0.2))
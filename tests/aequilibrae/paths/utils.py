@@ -0,0 +1,54 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from aequilibrae.matrix import AequilibraeMatrix
+from aequilibrae.paths import Graph
+
+
+def grid_graph(size: int, seed: int) -> Graph:
+    """Graph of a *size* x *size* grid with random link directions, distances and travel times, built in memory
+
+    Centroids are the nodes of the first row. Links have a capacity and free flow travel times, so the graph can be
+    used in traffic assignments.
+    """
+    rng = np.random.default_rng(seed)
+    nodes = np.arange(size * size).reshape(size, size) + 1
+    a_node = np.r_[nodes[:, :-1].ravel(), nodes[:-1, :].ravel()]
+    b_node = np.r_[nodes[:, 1:].ravel(), nodes[1:, :].ravel()]
+    links = a_node.shape[0]
+    network = pd.DataFrame(
+        {
+            "link_id": np.arange(1, links + 1),
+            "a_node": a_node,
+            "b_node": b_node,
+            "direction": np.where(rng.random(links) < 0.2, 1, 0),
+            "distance": rng.uniform(1, 10, links),
+        }
+    )
+    network["time_ab"] = network.distance * rng.uniform(0.5, 1.5, links)
+    network["time_ba"] = network.distance * rng.uniform(0.5, 1.5, links)
+    network["free_flow_time_ab"] = network.time_ab
+    network["free_flow_time_ba"] = network.time_ba
+    network["capacity_ab"] = 20.0
+    network["capacity_ba"] = 20.0
+
+    graph = Graph()
+    graph.network = network
+    graph.mode = "c"
+    graph.prepare_graph(np.arange(1, size + 1))
+    graph.set_graph("time")
+    graph.set_skimming(["distance"])
+    return graph
+
+
+def grid_demand(graph: Graph, names: List[str], seed: int) -> AequilibraeMatrix:
+    """Random demand between all centroids of a graph, with one core per name, kept in memory"""
+    matrix = AequilibraeMatrix()
+    matrix.create_empty(zones=graph.num_zones, matrix_names=names, memory_only=True)
+    matrix.index[:] = graph.centroids[:]
+    shape = (graph.num_zones, graph.num_zones, len(names))
+    matrix.matrices[:, :, :] = np.random.default_rng(seed).uniform(0, 10, shape)
+    matrix.computational_view(names)
+    return matrix